@@ -1,11 +1,17 @@
 """glymur - read, write, and interrogate JPEG 2000 files
 """
+import sys
 import unittest
 
 from glymur import version
 __version__ = version.version
 
-from .jp2k import Jp2k
+from .jp2k import (Jp2k, encode, read_many, get_decodeoptions,
+                   set_decodeoptions)
+from .rangereader import RangeReader
+from .tilecache import TileCache
+from .metadatacache import MetadataCache
+from .lib.openjp2 import Profiler
 from .jp2box import (get_printoptions,
                      set_printoptions,
                      get_parseoptions,
@@ -13,6 +19,10 @@ from .jp2box import (get_printoptions,
 
 from . import data
 
+# The asyncio facade uses syntax not available before Python 3.7.
+if sys.hexversion >= 0x03070000:
+    from .aio import AsyncJp2k
+
 
 def runtests():
     """Discover and run all tests for the glymur package.
@@ -21,5 +31,9 @@ def runtests():
     unittest.TextTestRunner(verbosity=2).run(suite)
 
 
-__all__ = [__version__, Jp2k, get_printoptions, set_printoptions,
-           get_parseoptions, set_parseoptions, data, runtests]
+__all__ = [__version__, Jp2k, encode, read_many, get_printoptions,
+           set_printoptions, get_parseoptions, set_parseoptions,
+           get_decodeoptions, set_decodeoptions, RangeReader, TileCache,
+           MetadataCache, Profiler, data, runtests]
+if sys.hexversion >= 0x03070000:
+    __all__.append(AsyncJp2k)
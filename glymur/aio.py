@@ -0,0 +1,263 @@
+"""This file is part of glymur, a Python interface for accessing JPEG 2000.
+
+http://glymur.readthedocs.org
+
+Copyright 2013 John Evans
+
+License:  MIT
+"""
+import asyncio
+import concurrent.futures
+import functools
+import os
+import threading
+import weakref
+
+import numpy as np
+
+from .jp2k import Jp2k, _ceildiv
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _default_executor():
+    """Thread pool shared by all AsyncJp2k objects not given an executor.
+
+    The library releases the GIL while decoding, so the threads decode in
+    parallel.  There is one thread per processor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1)
+        return _executor
+
+
+class AsyncJp2k(object):
+    """Asyncio facade for reading a JPEG 2000 file.
+
+    Parsing and decoding run in an executor, so they do not block the event
+    loop.  A read is decoded one row of tiles at a time, each row by a single
+    job in the executor, so a cancelled read stops after the row being
+    decoded.  The rows of one read are decoded one after another, and the
+    number of rows of the file being decoded at once by concurrent reads is
+    capped, so that many concurrent reads of one file share the executor
+    with reads of other files.
+
+    Attributes
+    ----------
+    jp2k : Jp2k
+        The JPEG 2000 file being read.
+    executor : concurrent.futures.Executor
+        Executor running the parsing and decoding.
+    max_decodes : int
+        Number of concurrent reads of the file that may be decoding at once.
+        A single read never decodes more than one row of tiles at a time, so
+        this only limits reads running side by side.  Reads in different
+        event loops are limited separately.
+
+    Examples
+    --------
+    >>> import asyncio, glymur
+    >>> async def thumbnail(path):
+    ...     jp2 = await glymur.AsyncJp2k.open(path)
+    ...     return await jp2.read(rlevel=1)
+    >>> asyncio.run(thumbnail(glymur.data.nemo())).shape
+    (728, 1296, 3)
+    """
+    def __init__(self, jp2k, executor=None, max_decodes=2):
+        if max_decodes < 1:
+            msg = "max_decodes must be a positive integer, not {0}."
+            raise ValueError(msg.format(max_decodes))
+        self.jp2k = jp2k
+        self.executor = _default_executor() if executor is None else executor
+        self.max_decodes = max_decodes
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+
+    def __repr__(self):
+        return 'glymur.AsyncJp2k({0!r}, max_decodes={1})'.format(
+            self.jp2k, self.max_decodes)
+
+    @classmethod
+    async def open(cls, filename, executor=None, max_decodes=2):
+        """Open and parse a file without blocking the event loop.
+
+        Parameters
+        ----------
+        filename : str or file
+            Path to the JPEG 2000 file, or anything else Jp2k accepts.
+        executor : concurrent.futures.Executor, optional
+            Executor running the parsing and decoding.  Defaults to a thread
+            pool shared by all AsyncJp2k objects.
+        max_decodes : int, optional
+            Number of concurrent reads of the file that may be decoding at
+            once.
+
+        Returns
+        -------
+        jp2 : AsyncJp2k
+            The opened file.
+        """
+        self = cls(None, executor=executor, max_decodes=max_decodes)
+        loop = asyncio.get_running_loop()
+        self.jp2k = await loop.run_in_executor(self.executor, Jp2k, filename)
+        return self
+
+    @property
+    def shape(self):
+        return self.jp2k.shape
+
+    async def read(self, area=None, rlevel=0, layer=None, verbose=False):
+        """Decode the image, or a window of it.
+
+        Parameters
+        ----------
+        area : tuple, optional
+            Specifies decoding image area,
+            (first_row, first_col, last_row, last_col)
+        rlevel : int, optional
+            Factor by which to rlevel output resolution.  Use -1 to get the
+            lowest resolution thumbnail.
+        layer : int, optional
+            Number of quality layer to decode.  Defaults to the layer
+            property of the Jp2k object.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+
+        Returns
+        -------
+        image : ndarray
+            The image data.
+
+        Raises
+        ------
+        IOError
+            If the area lies outside of the image or the rlevel is invalid.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(loop)
+
+        # The arguments are checked and the image allocated by the job
+        # decoding the first row of tiles, so the event loop only waits.
+        func = functools.partial(_start_read, self.jp2k, area=area,
+                                 rlevel=rlevel, layer=layer, verbose=verbose)
+        async with semaphore:
+            image, pieces, rlevel, layer = await loop.run_in_executor(
+                self.executor, func)
+
+        for piece, rows in pieces:
+            func = functools.partial(self.jp2k._read, area=piece,
+                                     rlevel=rlevel, layer=layer,
+                                     verbose=verbose, out=image[rows])
+            # A cancelled read is interrupted here, once the row being
+            # decoded is done.
+            async with semaphore:
+                await loop.run_in_executor(self.executor, func)
+
+        if image.shape[2] == 1:
+            image.shape = image.shape[0:2]
+
+        return image
+
+    def _semaphore(self, loop):
+        """Semaphore capping the decodes run from an event loop.
+
+        Semaphores cannot be shared by event loops, so each loop gets one of
+        its own.
+        """
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_decodes)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+
+def _start_read(jp2k, area, rlevel, layer, verbose):
+    """Set up a read and decode the first row of tiles in the window.
+
+    Returns
+    -------
+    image : ndarray
+        The image being decoded, always with a band axis.
+    pieces : list
+        (area, rows) of the rows of tiles left to decode, as made by
+        _split_window.
+    rlevel, layer : int
+        The resolution level and quality layer resolved by _populate_dparams.
+    """
+    jp2k._subsampling_sanity_check()
+
+    # Validate the arguments here, resolving an rlevel of -1.
+    dparams = jp2k._populate_dparams(rlevel, area=area, layer=layer)
+    rlevel, layer = dparams.cp_reduce, dparams.cp_layer
+
+    shape, pieces = _split_window(jp2k, dparams)
+    numbands = 1 if len(jp2k.shape) == 2 else jp2k.shape[2]
+    image = np.empty(shape + (numbands,), dtype=jp2k._image_dtype())
+
+    piece, rows = pieces[0]
+    jp2k._read(area=piece, rlevel=rlevel, layer=layer, verbose=verbose,
+               out=image[rows])
+    return image, pieces[1:], rlevel, layer
+
+
+def _split_window(jp2k, dparams):
+    """Split the decode window of the parameters at the tile row boundaries.
+
+    Each row of tiles is decoded by one call to the library, so that the
+    main header is only read once per row rather than once per tile.
+
+    Parameters
+    ----------
+    jp2k : Jp2k
+        The JPEG 2000 file being read.
+    dparams : DecompressionParametersType
+        Decompression parameters made by _populate_dparams.
+
+    Returns
+    -------
+    shape : tuple
+        Rows and columns of the decoded window.
+    pieces : list
+        (area, rows) of the part of each row of tiles lying in the window,
+        where area is on the reference grid and rows locate the part in the
+        decoded window.
+    """
+    siz = jp2k.codestream.segment[1]
+    rlevel = dparams.cp_reduce
+
+    # The library clips the decode area to the image, so do the same.
+    x0, y0 = max(dparams.DA_x0, siz.xosiz), max(dparams.DA_y0, siz.yosiz)
+    x1, y1 = dparams.DA_x1, dparams.DA_y1
+    if x1 == 0 and y1 == 0:
+        x1, y1 = siz.xsiz, siz.ysiz
+    x1, y1 = min(x1, siz.xsiz), min(y1, siz.ysiz)
+    if x0 >= x1 or y0 >= y1:
+        msg = "The decode area {0} lies outside the image."
+        raise IOError(msg.format((y0, x0, y1, x1)))
+
+    # Scale factors from the reference grid to the decoded image.
+    fx = siz.xrsiz[0] * 2 ** rlevel
+    fy = siz.yrsiz[0] * 2 ** rlevel
+
+    shape = (_ceildiv(y1, fy) - _ceildiv(y0, fy),
+             _ceildiv(x1, fx) - _ceildiv(x0, fx))
+    if shape[0] == 0 or shape[1] == 0:
+        raise IOError("Decoded area is too small.")
+
+    pieces = []
+    for row in range((y0 - siz.ytosiz) // siz.ytsiz,
+                     _ceildiv(y1 - siz.ytosiz, siz.ytsiz)):
+        r0 = max(siz.ytosiz + row * siz.ytsiz, y0)
+        r1 = min(siz.ytosiz + (row + 1) * siz.ytsiz, y1)
+        rows = slice(_ceildiv(r0, fy) - _ceildiv(y0, fy),
+                     _ceildiv(r1, fy) - _ceildiv(y0, fy))
+        if rows.start == rows.stop:
+            continue
+        pieces.append(((r0, x0, r1, x1), rows))
+
+    return shape, pieces
@@ -0,0 +1,11 @@
+"""Benchmarks for glymur.
+
+Each module in this package times one aspect of reading or writing JPEG 2000
+imagery and can be run on its own, e.g.
+
+    $ python -m glymur.bench.threads
+
+or all together with
+
+    $ python -m glymur.bench
+"""
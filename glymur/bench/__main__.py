@@ -0,0 +1,26 @@
+"""Run all of the glymur benchmarks with their default settings."""
+from . import calls, codestream, memory, parsing, suite, threads
+
+
+def main():
+    print("Multi-threaded decoding")
+    threads.main([])
+    print("")
+    print("Peak memory when decoding")
+    memory.main([])
+    print("")
+    print("Latency of opening a file")
+    parsing.main([])
+    print("")
+    print("Full codestream parsing")
+    codestream.main([])
+    print("")
+    print("Parse, decode, and encode hot paths")
+    suite.main([])
+    print("")
+    print("Overhead of library calls")
+    calls.main([])
+
+
+if __name__ == '__main__':
+    main()
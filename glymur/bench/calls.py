@@ -0,0 +1,101 @@
+"""Benchmark the overhead of calling into the OpenJPEG library.
+
+Times a few cheap library functions three ways: setting the argument and
+result types before every call, as the wrappers once did, calling a function
+whose prototype was set once when the library was loaded, and calling the
+glymur wrapper, which adds the cost of a Python function call and of the
+profiling check.  The routines chosen do almost no work of their own, so the
+times are dominated by the per-call overhead.
+"""
+import argparse
+import ctypes
+import timeit
+
+from glymur.lib import openjp2 as opj2
+
+
+def _best_time(func, number, repeat):
+    """Best time per call over several repetitions."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def _cases(stream, dparams):
+    """Name, argtypes, restype, arguments, and wrapper of each function."""
+    return [
+        ('opj_stream_set_user_data_length',
+         [opj2.STREAM_TYPE_P, ctypes.c_uint64], ctypes.c_void_p,
+         (stream, 0),
+         lambda: opj2.stream_set_user_data_length(stream, 0)),
+        ('opj_set_default_decoder_parameters',
+         [ctypes.POINTER(opj2.DecompressionParametersType)], ctypes.c_void_p,
+         (ctypes.byref(dparams),),
+         opj2.set_default_decoder_parameters),
+    ]
+
+
+def run(number=100000, repeat=5):
+    """Time calls with per-call and one-time prototypes.
+
+    Parameters
+    ----------
+    number : int, optional
+        Number of calls in each repetition.
+    repeat : int, optional
+        Number of repetitions, the fastest is reported.
+
+    Returns
+    -------
+    list
+        One dictionary per function with keys 'function', 'per_call' (types
+        set before each call), 'bound' (types set once), and 'wrapper' (the
+        glymur wrapper).  Times are in seconds per call.
+    """
+    stream = opj2.stream_create(isa_read_stream=True)
+    dparams = opj2.DecompressionParametersType()
+    results = []
+    try:
+        for name, argtypes, restype, args, wrapper in _cases(stream, dparams):
+            # A function object of our own, so the one used by glymur keeps
+            # its prototype.
+            func = opj2.OPENJP2[name]
+
+            def per_call():
+                func.argtypes = argtypes
+                func.restype = restype
+                func(*args)
+
+            bound = getattr(opj2._FUNCTIONS, name)
+            results.append({
+                'function': name,
+                'per_call': _best_time(per_call, number, repeat),
+                'bound': _best_time(lambda: bound(*args), number, repeat),
+                'wrapper': _best_time(wrapper, number, repeat),
+            })
+    finally:
+        opj2.stream_destroy(stream)
+
+    return results
+
+
+def main(argv=None):
+    """Entry point for the call overhead benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=100000,
+                        help='number of calls per repetition')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of repetitions')
+    args = parser.parse_args(argv)
+
+    results = run(number=args.number, repeat=args.repeat)
+
+    fmt = "{0:<36}  {1:>14}  {2:>10}  {3:>12}"
+    print(fmt.format('function', 'per-call (us)', 'bound (us)',
+                     'wrapper (us)'))
+    fmt = "{0:<36}  {1:>14.3f}  {2:>10.3f}  {3:>12.3f}"
+    for result in results:
+        print(fmt.format(result['function'], result['per_call'] * 1e6,
+                         result['bound'] * 1e6, result['wrapper'] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
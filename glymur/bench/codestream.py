@@ -0,0 +1,120 @@
+"""Benchmark full-codestream parsing.
+
+Parses every marker segment of a many-tile codestream, i.e. what happens
+with glymur.set_parseoptions(full_codestream=True), and reports the best
+time of several repetitions along with the number of segments parsed per
+second and the memory the parsed codestream holds on to.  Without a file
+argument, a synthetic image is written to a temporary file first, with or
+without SOP and EPH markers in the tile-part bit streams.
+"""
+import argparse
+import gc
+import os
+import tempfile
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import glymur
+from glymur.codestream import Codestream
+
+
+def make_image(filename, shape=(2048, 2048), tilesize=(32, 32),
+               sop_eph=True):
+    """Write a synthetic many-tile raw codestream.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the J2K file to write.
+    shape : tuple, optional
+        Image size.
+    tilesize : tuple, optional
+        Tile size, small tiles make for many SOT and SOD segments.
+    sop_eph : bool, optional
+        Whether or not to write SOP and EPH markers.
+    """
+    rows, cols = np.indices(shape)
+    image = ((rows ^ cols) & 0xff).astype(np.uint8)
+    glymur.Jp2k(filename, data=image, tilesize=tilesize, sop=sop_eph,
+                eph=sop_eph)
+
+
+def run(filename=None, repeat=3, sop_eph=True):
+    """Time parsing every segment of a codestream.
+
+    Parameters
+    ----------
+    filename : str, optional
+        Raw JPEG 2000 codestream.  Defaults to a synthetic image.
+    repeat : int, optional
+        Number of parses, the fastest is reported.
+    sop_eph : bool, optional
+        Whether or not the synthetic image has SOP and EPH markers.
+
+    Returns
+    -------
+    dict
+        Keys 'filename', 'segments', 'seconds', 'segments_per_second', and
+        'retained_bytes'.
+    """
+    tfile = None
+    if filename is None:
+        tfile = tempfile.NamedTemporaryFile(suffix='.j2k', delete=False)
+        tfile.close()
+        make_image(tfile.name, sop_eph=sop_eph)
+        filename = tfile.name
+
+    length = os.path.getsize(filename)
+
+    def parse():
+        with open(filename, 'rb') as fptr:
+            return Codestream(fptr, length, header_only=False)
+
+    try:
+        tracemalloc.start()
+        try:
+            codestream = parse()
+            gc.collect()
+            retained, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        num_segments = len(codestream.segment)
+        del codestream
+
+        seconds = min(timeit.repeat(parse, number=1, repeat=repeat))
+    finally:
+        if tfile is not None:
+            os.unlink(tfile.name)
+
+    return {'filename': filename,
+            'segments': num_segments,
+            'seconds': seconds,
+            'segments_per_second': num_segments / seconds,
+            'retained_bytes': retained}
+
+
+def main(argv=None):
+    """Entry point for the codestream parsing benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filename', nargs='?', default=None,
+                        help='raw codestream (defaults to a synthetic image)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of parses')
+    parser.add_argument('--no-sop-eph', dest='sop_eph', action='store_false',
+                        help='leave SOP and EPH markers out of the '
+                             'synthetic image')
+    args = parser.parse_args(argv)
+
+    result = run(args.filename, repeat=args.repeat, sop_eph=args.sop_eph)
+    print("{0:>10}  {1:>10}  {2:>14}  {3:>12}".format('segments', 'seconds',
+                                                      'segments/sec',
+                                                      'retained MB'))
+    print("{0:>10}  {1:>10.4f}  {2:>14.0f}  {3:>12.2f}".format(
+        result['segments'], result['seconds'], result['segments_per_second'],
+        result['retained_bytes'] / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark peak memory when decoding.
+
+Compares the peak memory allocated while slicing an image into a new array
+with the peak when decoding into a preallocated array with read_into.  Only
+allocations made through Python (including numpy) are traced, the buffers
+allocated by the OpenJPEG library itself are the same in both cases.
+Requires the tracemalloc module (Python 3.4 or later).
+"""
+import argparse
+import tracemalloc
+
+import numpy as np
+
+import glymur
+
+
+def _traced_peak(func):
+    """Run a function, returning the peak number of bytes allocated."""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run(filename=None, rlevel=0):
+    """Measure the peak memory of decoding with and without out=.
+
+    Parameters
+    ----------
+    filename : str, optional
+        JPEG 2000 file to decode.  Defaults to glymur.data.nemo().
+    rlevel : int, optional
+        Resolution level to decode.
+
+    Returns
+    -------
+    dict
+        Image size in bytes along with the peak bytes allocated by slicing
+        ('slice_peak') and by read_into ('read_into_peak').
+    """
+    if filename is None:
+        filename = glymur.data.nemo()
+
+    jp2 = glymur.Jp2k(filename)
+    index = np.s_[::2 ** rlevel, ::2 ** rlevel]
+
+    # Warm up so that one-time allocations (parsing the codestream header,
+    # the library's own structures) are not charged to either method.
+    out = jp2[index]
+
+    results = {'image_nbytes': out.nbytes}
+    results['slice_peak'] = _traced_peak(lambda: jp2[index])
+    results['read_into_peak'] = _traced_peak(
+        lambda: jp2.read_into(out, index))
+    return results
+
+
+def main(argv=None):
+    """Entry point for the memory benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filename', nargs='?', default=None,
+                        help='JPEG 2000 file (defaults to nemo.jp2)')
+    parser.add_argument('--rlevel', type=int, default=0,
+                        help='resolution level to decode')
+    args = parser.parse_args(argv)
+
+    results = run(args.filename, rlevel=args.rlevel)
+
+    nbytes = results['image_nbytes']
+    print("{0:>10}  {1:>14}  {2:>10}".format('method', 'peak bytes',
+                                             'x image'))
+    for method in ['slice', 'read_into']:
+        peak = results[method + '_peak']
+        print("{0:>10}  {1:>14d}  {2:>10.2f}".format(method, peak,
+                                                     peak / float(nbytes)))
+
+
+if __name__ == '__main__':
+    main()
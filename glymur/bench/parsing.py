@@ -0,0 +1,116 @@
+"""Benchmark the latency of opening a file.
+
+Times constructing a Jp2k object with eager box parsing, where every box
+payload is parsed on open, and with lazy box parsing, where only the box
+headers are read until a box is used.  The time to open a file and then read
+its shape is also reported for lazy parsing, since that is the common case
+of opening a file just to look at its size.  Finally, opening a file and
+getting its codestream header and tile index is timed with and without a
+metadata cache that already holds the file, in which case the file is not
+read.
+"""
+import argparse
+import shutil
+import tempfile
+import timeit
+
+import glymur
+from glymur.jp2box import get_parseoptions, set_parseoptions
+
+
+def _best_time(func, number, repeat):
+    """Best time per call over several repetitions."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def run(filenames=None, number=100, repeat=5):
+    """Time opening files with eager and lazy box parsing.
+
+    Parameters
+    ----------
+    filenames : sequence of str, optional
+        JPEG 2000 files to open.  Defaults to glymur.data.nemo() and
+        glymur.data.jpxfile().
+    number : int, optional
+        Number of opens in each repetition.
+    repeat : int, optional
+        Number of repetitions, the fastest is reported.
+
+    Returns
+    -------
+    list
+        One dictionary per file with keys 'filename', 'eager', 'lazy',
+        'lazy_shape', 'speedup', 'index', and 'cached_index'.  Times are in
+        seconds per open.
+    """
+    if filenames is None:
+        filenames = [glymur.data.nemo(), glymur.data.jpxfile()]
+
+    options = dict(get_parseoptions())
+    results = []
+    tdir = tempfile.mkdtemp()
+    try:
+        for filename in filenames:
+            result = {'filename': filename}
+
+            set_parseoptions(full_codestream=False, lazy=False)
+            result['eager'] = _best_time(lambda: glymur.Jp2k(filename),
+                                         number, repeat)
+
+            set_parseoptions(full_codestream=False, lazy=True)
+            result['lazy'] = _best_time(lambda: glymur.Jp2k(filename),
+                                        number, repeat)
+            result['lazy_shape'] = _best_time(
+                lambda: glymur.Jp2k(filename).shape, number, repeat)
+
+            def index():
+                return glymur.Jp2k(filename).codestream.tile_index
+
+            set_parseoptions(full_codestream=False, lazy=False)
+            result['index'] = _best_time(index, number, repeat)
+
+            set_parseoptions(full_codestream=False,
+                             metadata_cache=glymur.MetadataCache(tdir))
+            index()
+            result['cached_index'] = _best_time(index, number, repeat)
+            set_parseoptions(full_codestream=False, metadata_cache=None)
+
+            result['speedup'] = result['eager'] / result['lazy']
+            results.append(result)
+    finally:
+        set_parseoptions(**options)
+        shutil.rmtree(tdir)
+
+    return results
+
+
+def main(argv=None):
+    """Entry point for the parsing benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='*',
+                        help='JPEG 2000 files (defaults to nemo.jp2 and '
+                             'the JPX sample)')
+    parser.add_argument('-n', '--number', type=int, default=100,
+                        help='number of opens per repetition')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of repetitions')
+    args = parser.parse_args(argv)
+
+    results = run(args.filenames or None, number=args.number,
+                  repeat=args.repeat)
+
+    fmt = "{0:<20}  {1:>10}  {2:>10}  {3:>12}  {4:>8}  {5:>11}  {6:>12}"
+    print(fmt.format('file', 'eager (ms)', 'lazy (ms)', 'lazy+shape',
+                     'speedup', 'eager+index', 'cached+index'))
+    fmt = "{0:<20}  {1:>10.3f}  {2:>10.3f}  {3:>12.3f}  {4:>8.2f}  {5:>11.3f}"
+    fmt += "  {6:>12.3f}"
+    for result in results:
+        print(fmt.format(result['filename'].split('/')[-1][-20:],
+                         result['eager'] * 1000, result['lazy'] * 1000,
+                         result['lazy_shape'] * 1000, result['speedup'],
+                         result['index'] * 1000,
+                         result['cached_index'] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Benchmark the parse, decode, slice, and encode hot paths.
+
+Writes synthetic images of several sizes, tile layouts, and precisions to
+temporary files, then times encoding them losslessly and lossily, opening
+them, parsing the full codestream, and decoding the full image, a window,
+and a reduced resolution.  The best time of several repetitions is reported
+for each case and operation.  Results can be written as JSON, along with the
+glymur, OpenJPEG, and Python versions and the git commit, and compared with
+the results of an earlier run, e.g.
+
+    $ python -m glymur.bench.suite -o before.json
+    $ git checkout some-branch
+    $ python -m glymur.bench.suite -o after.json --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import timeit
+
+import numpy as np
+
+import glymur
+from glymur import version
+
+# name, image shape, data type, tile size (None for a single tile)
+CASES = [('gray8-512', (512, 512), np.uint8, None),
+         ('rgb8-1024', (1024, 1024, 3), np.uint8, None),
+         ('rgb8-1024-tiled', (1024, 1024, 3), np.uint8, (128, 128)),
+         ('gray16-1024-tiled', (1024, 1024), np.uint16, (256, 256))]
+
+LARGE_CASES = [('rgb8-4096-tiled', (4096, 4096, 3), np.uint8, (512, 512)),
+               ('gray16-4096-tiled', (4096, 4096), np.uint16, (1024, 1024))]
+
+OPERATIONS = ['encode_lossless', 'encode_lossy', 'open', 'parse_codestream',
+              'decode_full', 'decode_window', 'decode_reduced']
+
+
+def make_image(shape, dtype=np.uint8, seed=0):
+    """Synthetic image, smooth gradients with some noise on top.
+
+    Parameters
+    ----------
+    shape : tuple
+        Rows, columns, and optionally bands.
+    dtype : numpy data type, optional
+        Either uint8 or uint16.
+    seed : int, optional
+        Seed for the noise, so that every run compresses the same image.
+    """
+    maxval = np.iinfo(dtype).max
+    rows, cols = np.indices(shape[:2], dtype=np.float64)
+    base = (rows / shape[0] + cols / shape[1]) / 2
+    if len(shape) == 3:
+        base = base[:, :, np.newaxis] * np.linspace(0.5, 1, shape[2])
+    noise = np.random.RandomState(seed).normal(0, 0.02, size=shape)
+    image = np.clip(base + noise, 0, 1) * maxval
+    return image.astype(dtype)
+
+
+def _best_time(func, repeat):
+    """Best time per call, calling often enough to be measurable."""
+    timer = timeit.Timer(func)
+    if hasattr(timer, 'autorange'):
+        number, seconds = timer.autorange()
+    else:
+        # Timer.autorange is new in Python 3.6.  Like it, call often enough
+        # to take at least 0.2 seconds.
+        number = 1
+        seconds = timer.timeit(number=number)
+        while seconds < 0.2:
+            number *= 2
+            seconds = timer.timeit(number=number)
+    times = [seconds] + timer.repeat(number=number, repeat=repeat - 1)
+    return min(times) / number, number
+
+
+def _operations(filename, image, tilesize):
+    """Functions timing each operation on an image."""
+    kwargs = {} if tilesize is None else {'tilesize': tilesize}
+
+    # Encoding is timed on other files, the one being read stays as is.
+    lossless = filename[:-4] + '-lossless.jp2'
+    lossy = filename[:-4] + '-lossy.jp2'
+
+    glymur.Jp2k(filename, data=image, **kwargs)
+    jp2 = glymur.Jp2k(filename)
+    rows, cols = image.shape[:2]
+    window = (slice(rows // 4, rows // 2), slice(cols // 4, cols // 2))
+
+    return {
+        'encode_lossless': lambda: glymur.Jp2k(lossless, data=image,
+                                               **kwargs),
+        'encode_lossy': lambda: glymur.Jp2k(lossy, data=image, cratios=[20],
+                                            **kwargs),
+        'open': lambda: glymur.Jp2k(filename),
+        'parse_codestream': lambda: jp2.get_codestream(header_only=False),
+        'decode_full': lambda: jp2[:],
+        'decode_window': lambda: jp2[window],
+        'decode_reduced': lambda: jp2[::4, ::4],
+    }
+
+
+def run(cases=None, operations=None, repeat=3):
+    """Time each operation on each synthetic image.
+
+    Parameters
+    ----------
+    cases : list, optional
+        (name, shape, dtype, tilesize) of each image.  Defaults to CASES.
+    operations : list of str, optional
+        Operations to time.  Defaults to OPERATIONS.
+    repeat : int, optional
+        Number of repetitions, the fastest is reported.
+
+    Returns
+    -------
+    dict
+        Versions, commit, and time of the run, with one dictionary per case
+        and operation under 'results' with keys 'case', 'shape', 'dtype',
+        'tilesize', 'operation', 'seconds' (per call), and 'number' (calls per
+        repetition).
+    """
+    if cases is None:
+        cases = CASES
+    if operations is None:
+        operations = OPERATIONS
+
+    results = []
+    tdir = tempfile.mkdtemp()
+    try:
+        for name, shape, dtype, tilesize in cases:
+            image = make_image(shape, dtype)
+            filename = os.path.join(tdir, name + '.jp2')
+            funcs = _operations(filename, image, tilesize)
+            for operation in operations:
+                seconds, number = _best_time(funcs[operation], repeat)
+                results.append({'case': name,
+                                'shape': list(shape),
+                                'dtype': np.dtype(dtype).name,
+                                'tilesize': (None if tilesize is None
+                                             else list(tilesize)),
+                                'operation': operation,
+                                'seconds': seconds,
+                                'number': number})
+    finally:
+        shutil.rmtree(tdir)
+
+    return {'glymur_version': version.version,
+            'openjpeg_version': version.openjpeg_version,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': _commit(),
+            'date': datetime.datetime.now().isoformat(),
+            'results': results}
+
+
+def _commit():
+    """Git commit of the glymur source tree, if there is one."""
+    directory = os.path.dirname(os.path.abspath(glymur.__file__))
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         cwd=directory,
+                                         stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def compare(baseline, current):
+    """Ratio of current to baseline times for the cases both runs have.
+
+    Parameters
+    ----------
+    baseline, current : dict
+        Results as returned by run.
+
+    Returns
+    -------
+    list
+        (case, operation, baseline seconds, current seconds, ratio) tuples.
+        A ratio above 1 means that the current run is slower.
+    """
+    before = dict(((r['case'], r['operation']), r['seconds'])
+                  for r in baseline['results'])
+    rows = []
+    for result in current['results']:
+        key = (result['case'], result['operation'])
+        if key in before:
+            rows.append(key + (before[key], result['seconds'],
+                               result['seconds'] / before[key]))
+    return rows
+
+
+def main(argv=None):
+    """Entry point for the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-o', '--output', metavar='JSON',
+                        help='write the results to this file')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='compare with the results of an earlier run')
+    parser.add_argument('--large', action='store_true',
+                        help='add 4096x4096 images to the cases')
+    parser.add_argument('--operation', action='append', choices=OPERATIONS,
+                        help='time only this operation (may be repeated)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of repetitions')
+    args = parser.parse_args(argv)
+
+    cases = CASES + LARGE_CASES if args.large else CASES
+    current = run(cases, args.operation, repeat=args.repeat)
+
+    if args.output is not None:
+        with open(args.output, 'w') as fptr:
+            json.dump(current, fptr, indent=2)
+
+    if args.compare is None:
+        print("{0:<20}  {1:<18}  {2:>12}".format('case', 'operation',
+                                                 'seconds'))
+        for result in current['results']:
+            print("{0:<20}  {1:<18}  {2:>12.6f}".format(result['case'],
+                                                        result['operation'],
+                                                        result['seconds']))
+        return
+
+    with open(args.compare) as fptr:
+        baseline = json.load(fptr)
+    print("{0:<20}  {1:<18}  {2:>12}  {3:>12}  {4:>7}".format(
+        'case', 'operation', 'before', 'after', 'ratio'))
+    for row in compare(baseline, current):
+        print("{0:<20}  {1:<18}  {2:>12.6f}  {3:>12.6f}  {4:>7.2f}".format(
+            *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark multi-threaded decoding.
+
+Decodes the same image with an increasing number of libopenjp2 threads and
+reports the best wall clock time of several repetitions along with the
+speedup relative to a single thread.
+"""
+import argparse
+import multiprocessing
+import timeit
+
+import glymur
+from glymur.lib import openjp2 as opj2
+
+
+def default_thread_counts():
+    """Powers of two up to the number of processors, inclusive."""
+    ncpus = multiprocessing.cpu_count()
+    counts = []
+    num_threads = 1
+    while num_threads < ncpus:
+        counts.append(num_threads)
+        num_threads *= 2
+    counts.append(ncpus)
+    return counts
+
+
+def run(filename=None, thread_counts=None, repeat=3, rlevel=0):
+    """Time full-image decodes across thread counts.
+
+    Parameters
+    ----------
+    filename : str, optional
+        JPEG 2000 file to decode.  Defaults to glymur.data.nemo().
+    thread_counts : sequence of int, optional
+        Thread counts to time.  Defaults to powers of two up to the number of
+        processors.
+    repeat : int, optional
+        Number of decodes for each thread count, the fastest is reported.
+    rlevel : int, optional
+        Resolution level to decode.
+
+    Returns
+    -------
+    list
+        One dictionary per thread count with keys 'num_threads', 'seconds',
+        and 'speedup'.
+    """
+    if filename is None:
+        filename = glymur.data.nemo()
+    if thread_counts is None:
+        thread_counts = default_thread_counts()
+
+    jp2 = glymur.Jp2k(filename)
+    step = 2 ** rlevel
+
+    results = []
+    for num_threads in thread_counts:
+        jp2.num_threads = num_threads
+        times = timeit.repeat(lambda: jp2[::step, ::step],
+                              number=1, repeat=repeat)
+        results.append({'num_threads': num_threads, 'seconds': min(times)})
+
+    for result in results:
+        result['speedup'] = results[0]['seconds'] / result['seconds']
+
+    return results
+
+
+def main(argv=None):
+    """Entry point for the threads benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filename', nargs='?', default=None,
+                        help='JPEG 2000 file (defaults to nemo.jp2)')
+    parser.add_argument('-t', '--threads', type=int, nargs='+',
+                        help='thread counts to time')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of decodes per thread count')
+    parser.add_argument('--rlevel', type=int, default=0,
+                        help='resolution level to decode')
+    args = parser.parse_args(argv)
+
+    if not opj2.has_thread_support():
+        print("The OpenJPEG library does not support multi-threaded "
+              "decoding, all timings are single-threaded.")
+
+    results = run(args.filename, thread_counts=args.threads,
+                  repeat=args.repeat, rlevel=args.rlevel)
+
+    print("{0:>8}  {1:>10}  {2:>8}".format('threads', 'seconds', 'speedup'))
+    for result in results:
+        print("{num_threads:>8}  {seconds:>10.4f}  {speedup:>8.2f}".format(
+            **result))
+
+
+if __name__ == '__main__':
+    main()
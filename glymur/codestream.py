@@ -14,17 +14,25 @@ codestreams.
 # "Too few public methods"  Some segments don't define any new methods from
 # the base Segment class.
 
+import array
+from collections import OrderedDict
 import math
+import mmap
 import struct
 import sys
 import warnings
 
+if sys.hexversion >= 0x03030000:
+    from collections.abc import MutableSequence
+else:
+    from collections import MutableSequence
+
 import numpy as np
 
 from .core import (LRCP, RLCP, RPCL, PCRL, CPRL,
                    WAVELET_XFORM_9X7_IRREVERSIBLE,
                    WAVELET_XFORM_5X3_REVERSIBLE,
-                   _Keydefaultdict)
+                   _Keydefaultdict, _public_attributes)
 from .lib import openjp2 as opj2
 
 _factory = lambda x:  '{0} (invalid)'.format(x)
@@ -71,12 +79,17 @@ class Codestream(object):
 
     Attributes
     ----------
-    segment : iterable
-        list of marker segments
+    segment : sequence
+        Marker segments.  SOT, SOD, SOP, and EPH segments are stored
+        compactly and their Segment objects are created as they are accessed.
     offset : int
         Offset of the codestream from start of the file in bytes.
     length : int
         Length of the codestream in bytes.
+    tile_index : TileIndex
+        Byte ranges of the tile parts of each tile.  Built on first use from
+        the TLM segments if there are any, otherwise by skipping from one SOT
+        marker to the next.
 
     Raises
     ------
@@ -170,29 +183,63 @@ class Codestream(object):
         # Do we parse the tile part bit stream or not?
         self._parse_tpart_flag = False
 
-        self.segment = []
+        self.segment = _SegmentSequence()
 
         # First two bytes are the SOC marker.  We already know that.
-        read_buffer = fptr.read(2)
-        segment = SOCsegment(offset=fptr.tell() - 2, length=0)
+        segment = SOCsegment(offset=self.offset, length=0)
         self.segment.append(segment)
 
-        self._tile_offset = []
-        self._tile_length = []
+        # Where the current tile part ends.
+        self._tile_part_offset = None
+        self._tile_part_length = None
+
+        # Where the tile parts start, and how to get back to them in order to
+        # build the tile index.
+        self._first_sot = None
+        self._tile_index = None
+        self._filename = getattr(fptr, 'name', None)
+        self._source = fptr if self._filename is None else None
+
+        # Segments are parsed by offset into the codestream bytes rather
+        # than by reading the file a few bytes at a time.
+        buf = _CodestreamBuffer(fptr, self.offset)
+        self._scan(buf, process_marker_segment, header_only)
+
+        # Should the scan fail, its traceback may still refer to arrays
+        # sharing the memory of the buffer, so the buffer is left to be
+        # released along with them.
+        buf.close()
+        self.segment.consolidate()
+
+        # Leave the file positioned just past the last marker read.
+        fptr.seek(self._offset + 2)
+
+    def _scan(self, buf, process_marker_segment, header_only):
+        """Parse marker segments until the end of the (main) header.
 
+        Parameters
+        ----------
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        process_marker_segment : dict
+            Maps marker IDs to the methods parsing them.
+        header_only : bool
+            If True, only marker segments in the main header are parsed.
+        """
+        pos = self.offset + 2
         while True:
 
-            read_buffer = fptr.read(2)
-            self._marker_id, = struct.unpack('>H', read_buffer)
-            self._offset = fptr.tell() - 2
+            self._marker_id, = buf.unpack('>H', pos)
+            self._offset = pos
 
             if self._marker_id == 0xff90 and header_only:
                 # Start-of-tile (SOT) means that we are out of the main header
                 # and there is no need to go further.
+                self._first_sot = pos
                 break
 
             try:
-                segment = process_marker_segment[self._marker_id](fptr)
+                parse_segment = process_marker_segment[self._marker_id]
             except KeyError:
                 msg = 'Invalid marker id encountered at byte {0:d} '
                 msg += 'in codestream:  "0x{1:x}"'
@@ -200,6 +247,7 @@ class Codestream(object):
                 warnings.warn(msg, UserWarning)
                 break
 
+            segment = parse_segment(buf, pos)
             self.segment.append(segment)
 
             if self._marker_id == 0xffd9:
@@ -207,81 +255,227 @@ class Codestream(object):
                 break
 
             if self._marker_id == 0xff93:
-                # If SOD, then we need to seek past the tile part bit stream.
+                # If SOD, then we need to skip past the tile part bit stream.
                 if self._parse_tpart_flag and not header_only:
                     # But first parse the tile part bit stream for SOP and
                     # EPH segments.
-                    self._parse_tile_part_bit_stream(fptr, segment,
-                                                     self._tile_length[-1])
+                    self._parse_tile_part_bit_stream(buf, segment,
+                                                     self._tile_part_length)
+
+                pos = self._tile_part_offset + self._tile_part_length
+            elif segment.length > 0:
+                pos = segment.offset + 2 + segment.length
+            else:
+                pos += 2
+
+    @property
+    def tile_index(self):
+        if self._tile_index is None:
+            self._tile_index = self._build_tile_index()
+        return self._tile_index
+
+    def _build_tile_index(self):
+        """Locate the tile parts of every tile.
+
+        Returns
+        -------
+        TileIndex
+            Byte ranges of the tile parts.
+        """
+        siz = self.segment[1]
+        try:
+            num_tiles_x = math.ceil((siz.xsiz - siz.xtosiz) / float(siz.xtsiz))
+            num_tiles_y = math.ceil((siz.ysiz - siz.ytosiz) / float(siz.ytsiz))
+            num_tiles = int(num_tiles_x * num_tiles_y)
+        except ZeroDivisionError:
+            num_tiles = 0
+
+        sot = self.segment.sot
+        if len(sot) > 0:
+            # The whole codestream has already been parsed.
+            end = self.offset + self.length
+            tile_length = np.where(sot['psot'] == 0,
+                                   end - sot['offset'] - 2, sot['psot'])
+            tile_parts = list(zip(sot['isot'].tolist(),
+                                  sot['offset'].tolist(),
+                                  tile_length.tolist()))
+            return TileIndex(num_tiles, tile_parts, method='SOT')
+
+        tile_parts = self._tile_parts_from_tlm()
+        if tile_parts is not None:
+            return TileIndex(num_tiles, tile_parts, method='TLM')
+
+        if self._first_sot is None:
+            tile_parts = []
+        elif self._filename is not None:
+            with open(self._filename, 'rb') as fptr:
+                tile_parts = self._skip_scan_tile_parts(fptr)
+        else:
+            tile_parts = self._skip_scan_tile_parts(self._source)
+        return TileIndex(num_tiles, tile_parts, method='SOT')
+
+    def _tile_parts_from_tlm(self):
+        """Lay out the tile parts from the lengths in the TLM segments.
+
+        Returns
+        -------
+        list or None
+            (tile, offset, length) of each tile part, or None if there are no
+            usable TLM segments.
+        """
+        tlm = [seg for seg in self.segment if seg.marker_id == 'TLM']
+        if len(tlm) == 0 or self._first_sot is None:
+            return None
+
+        tile_parts = []
+        offset = self._first_sot
+        for segment in sorted(tlm, key=lambda x: x.ztlm):
+            if segment.ttlm is None:
+                # Tiles are in order, one tile part each.
+                tiles = range(len(tile_parts), len(tile_parts) +
+                              len(segment.ptlm))
+            else:
+                tiles = segment.ttlm
+            for tile, tile_length in zip(tiles, segment.ptlm):
+                tile_parts.append((tile, offset, tile_length))
+                offset += tile_length
+
+        if offset > self.offset + self.length:
+            msg = "The tile part lengths in the TLM segments run past the "
+            msg += "end of the codestream, skipping through the SOT "
+            msg += "segments instead."
+            warnings.warn(msg, UserWarning)
+            return None
+
+        return tile_parts
 
-                fptr.seek(self._tile_offset[-1] + self._tile_length[-1])
+    def _skip_scan_tile_parts(self, fptr):
+        """Lay out the tile parts by skipping from one SOT to the next.
+
+        Only the SOT marker segments are read, not the tile part bit streams.
+
+        Parameters
+        ----------
+        fptr : file
+            Open file object.
 
-    def _parse_unrecognized_segment(self, fptr):
+        Returns
+        -------
+        list
+            (tile, offset, length) of each tile part.
+        """
+        end = self.offset + self.length
+        tile_parts = []
+        buf = _CodestreamBuffer(fptr, self._first_sot)
+        try:
+            pos = self._first_sot
+            while pos < end:
+                try:
+                    marker_id, _, isot, psot = buf.unpack('>HHHI', pos)
+                except struct.error:
+                    # Truncated codestream.
+                    break
+                if marker_id != 0xff90:
+                    break
+                if psot == 0:
+                    # The last tile part runs to the end of the codestream.
+                    psot = end - pos - 2
+                tile_parts.append((isot, pos, psot))
+                pos += psot
+        finally:
+            buf.close()
+        return tile_parts
+
+    def _parse_unrecognized_segment(self, buf, offset):
         """Looks like a valid marker, but not sure from reading the specs.
         """
         msg = "Unrecognized marker id:  0x{0:x}".format(self._marker_id)
         warnings.warn(msg)
-        cpos = fptr.tell()
-        read_buffer = fptr.read(2)
-        next_item, = struct.unpack('>H', read_buffer)
-        fptr.seek(cpos)
+        next_item, = buf.unpack('>H', offset + 2)
         if ((next_item & 0xff00) >> 8) == 255:
-                # No segment associated with this marker, so reset
-                # to two bytes after it.
-            segment = Segment(id='0x{0:x}'.format(self._marker_id),
-                              offset=self._offset, length=0)
+            # No segment associated with this marker, so resume two bytes
+            # after it.
+            segment = Segment(marker_id='0x{0:x}'.format(self._marker_id),
+                              offset=offset, length=0)
         else:
-            segment = self._parse_reserved_segment(fptr)
+            segment = self._parse_reserved_segment(buf, offset)
         return segment
 
-    def _parse_reserved_segment(self, fptr):
+    def _parse_reserved_segment(self, buf, offset):
         """Parse valid marker segment, segment description is unknown.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         Segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
-        data = fptr.read(length-2)
+        length, = buf.unpack('>H', offset + 2)
+        data = buf.read(offset + 4, length - 2)
 
         segment = Segment(marker_id='0x{0:x}'.format(self._marker_id),
                           offset=offset, length=length, data=data)
         return segment
 
-    def _parse_tile_part_bit_stream(self, fptr, sod_marker, tile_length):
-        """Parse the tile part bit stream for SOP, EPH marker segments."""
-        read_buffer = fptr.read(tile_length)
+    def _parse_tile_part_bit_stream(self, buf, sod_marker, tile_length):
+        """Parse the tile part bit stream for SOP, EPH marker segments.
+
+        Every 0xff byte is a candidate, and the tests on the byte after it,
+        the bounds, and the Nsop fields are all done on arrays of candidates.
+        """
         # The tile length could possibly be too large and extend past
-        # the end of file.  We need to be a bit resilient.
-        count = min(tile_length, len(read_buffer))
-        packet = np.frombuffer(read_buffer, dtype=np.uint8, count=count)
+        # the end of file.  The buffer is resilient to that.
+        packet = buf.array(sod_marker.offset + 2, tile_length)
+        num_bytes = len(packet)
 
-        indices = np.where(packet == 0xff)
-        for idx in indices[0]:
-            try:
-                if packet[idx+1] == 0x91 and (idx < (len(packet) - 5)):
-                    offset = sod_marker.offset + 2 + idx
-                    length = 4
-                    nsop = packet[(idx + 4):(idx+6)].view('uint16')[0]
-                    if sys.byteorder == 'little':
-                        nsop = nsop.byteswap()
-                    segment = SOPsegment(nsop, length, offset)
-                    self.segment.append(segment)
-                elif packet[idx + 1] == 0x92:
-                    offset = sod_marker.offset + 2 + idx
-                    length = 0
-                    segment = EPHsegment(length, offset)
-                    self.segment.append(segment)
-            except IndexError:
-                continue
+        candidates = np.flatnonzero(packet[:-1] == 0xff)
+        following = packet[candidates + 1]
+
+        # An SOP segment needs room for Lsop and Nsop.
+        sop = (following == 0x91) & (candidates < num_bytes - 5)
+        eph = following == 0x92
+        keep = sop | eph
+        indices = candidates[keep]
+        sop = sop[keep]
+
+        rows = np.zeros(len(indices), dtype=_PACKET_DTYPE)
+        rows['marker'] = np.where(sop, 0xff91, 0xff92)
+        rows['offset'] = sod_marker.offset + 2 + indices
+        rows['length'] = np.where(sop, 4, 0)
+
+        # Nsop is big-endian.
+        sop_indices = indices[sop]
+        rows['nsop'][sop] = ((packet[sop_indices + 4].astype(np.uint16) << 8) |
+                             packet[sop_indices + 5])
+
+        self.segment.extend_packets(rows)
+
+    def to_dict(self):
+        """Codestream metadata as plain lists, dicts, strings and numbers.
+
+        Returns
+        -------
+        dict
+            Offset and length of the codestream, and the dictionary of each
+            marker segment under 'segment'.
+
+        Examples
+        --------
+        >>> import glymur
+        >>> c = glymur.Jp2k(glymur.data.nemo()).get_codestream()
+        >>> d = c.to_dict()
+        >>> [segment['marker_id'] for segment in d['segment']]
+        ['SOC', 'SIZ', 'COD', 'QCD', 'CME']
+        >>> d['segment'][1]['xsiz'], d['segment'][1]['bitdepth']
+        (2592, [8, 8, 8])
+        """
+        return OrderedDict([('offset', self.offset), ('length', self.length),
+                            ('segment', self.segment.to_dicts())])
 
     def __str__(self):
         msg = 'Codestream:\n'
@@ -293,84 +487,71 @@ class Codestream(object):
             msg += ''.join(strs)
         return msg
 
-    def _parse_cme_segment(self, fptr):
+    def _parse_cme_segment(self, buf, offset):
         """Parse the CME marker segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         CME segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(4)
-        data = struct.unpack('>HH', read_buffer)
-        length = data[0]
-        rcme = data[1]
-        ccme = fptr.read(length - 4)
+        length, rcme = buf.unpack('>HH', offset + 2)
+        ccme = buf.read(offset + 6, length - 4)
 
         return CMEsegment(rcme, ccme, length, offset)
 
-    def _parse_coc_segment(self, fptr):
+    def _parse_coc_segment(self, buf, offset):
         """Parse the COC marker segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         COC segment instance.
         """
-        kwargs = {}
-        offset = fptr.tell() - 2
-        kwargs['offset'] = offset
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
-        kwargs['length'] = length
+        length, = buf.unpack('>H', offset + 2)
 
         if self._csiz <= 255:
-            read_buffer = fptr.read(1)
-            component, = struct.unpack('>B', read_buffer)
+            ccoc, scoc = buf.unpack('>BB', offset + 4)
+            pos = offset + 6
         else:
-            read_buffer = fptr.read(2)
-            component, = struct.unpack('>H', read_buffer)
-        ccoc = component
-
-        read_buffer = fptr.read(1)
-        scoc, = struct.unpack('>B', read_buffer)
+            ccoc, scoc = buf.unpack('>HB', offset + 4)
+            pos = offset + 7
 
-        numbytes = offset + 2 + length - fptr.tell()
-        read_buffer = fptr.read(numbytes)
+        numbytes = offset + 2 + length - pos
+        read_buffer = buf.read(pos, numbytes)
         spcoc = np.frombuffer(read_buffer, dtype=np.uint8)
-        spcoc = spcoc
 
         return COCsegment(ccoc, scoc, spcoc, length, offset)
 
-    def _parse_cod_segment(self, fptr):
+    def _parse_cod_segment(self, buf, offset):
         """Parse the COD segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         COD segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
-        read_buffer = fptr.read(length - 2)
+        read_buffer = buf.read(offset + 4, length - 2)
         scod, = struct.unpack_from('>B', read_buffer, offset=0)
         spcod = read_buffer[1:]
         spcod = np.frombuffer(spcod, dtype=np.uint8)
@@ -393,48 +574,47 @@ class Codestream(object):
 
         return CODsegment(scod, spcod, length, offset)
 
-    def _parse_crg_segment(self, fptr):
+    def _parse_crg_segment(self, buf, offset):
         """Parse the CRG marker segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         CRG segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
-        read_buffer = fptr.read(4 * self._csiz)
-        data = struct.unpack('>' + 'HH' * self._csiz, read_buffer)
+        data = buf.unpack('>' + 'HH' * self._csiz, offset + 4)
         xcrg = data[0::2]
         ycrg = data[1::2]
 
         return CRGsegment(xcrg, ycrg, length, offset)
 
-    def _parse_eoc_segment(self, fptr):
+    def _parse_eoc_segment(self, buf, offset):
         """Parse the EOC (end-of-codestream) marker segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         EOC Segment instance.
         """
-        offset = fptr.tell() - 2
         length = 0
 
         return EOCsegment(length, offset)
 
-    def _parse_plt_segment(self, fptr):
+    def _parse_plt_segment(self, buf, offset):
         """Parse the PLT segment.
 
         The packet headers are not parsed, i.e. they remain "uninterpreted"
@@ -442,20 +622,19 @@ class Codestream(object):
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         PLT segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(3)
-        length, zplt = struct.unpack('>HB', read_buffer)
+        length, zplt = buf.unpack('>HB', offset + 2)
 
         numbytes = length - 3
-        read_buffer = fptr.read(numbytes)
+        read_buffer = buf.read(offset + 5, numbytes)
         iplt = np.frombuffer(read_buffer, dtype=np.uint8)
 
         packet_len = []
@@ -473,59 +652,55 @@ class Codestream(object):
 
         return PLTsegment(zplt, iplt, length, offset)
 
-    def _parse_pod_segment(self, fptr):
+    def _parse_pod_segment(self, buf, offset):
         """Parse the POD segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         POD segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
         if self._csiz < 257:
             numbytes = int((length - 2) / 7)
-            read_buffer = fptr.read(numbytes * 7)
             fmt = '>' + 'BBHBBB' * numbytes
         else:
             numbytes = int((length - 2) / 9)
-            read_buffer = fptr.read(numbytes * 9)
             fmt = '>' + 'BHHBHB' * numbytes
 
-        pod_params = struct.unpack(fmt, read_buffer)
+        pod_params = buf.unpack(fmt, offset + 4)
 
         return PODsegment(pod_params, length, offset)
 
-    def _parse_ppm_segment(self, fptr):
+    def _parse_ppm_segment(self, buf, offset):
         """Parse the PPM segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         PPM segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(3)
-        length, zppm = struct.unpack('>HB', read_buffer)
+        length, zppm = buf.unpack('>HB', offset + 2)
 
         numbytes = length - 3
-        read_buffer = fptr.read(numbytes)
+        read_buffer = buf.read(offset + 5, numbytes)
 
         return PPMsegment(zppm, read_buffer, length, offset)
 
-    def _parse_ppt_segment(self, fptr):
+    def _parse_ppt_segment(self, buf, offset):
         """Parse the PPT segment.
 
         The packet headers are not parsed, i.e. they remain "uninterpreted"
@@ -533,43 +708,39 @@ class Codestream(object):
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         PPT segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(3)
-        length, zppt = struct.unpack('>HB', read_buffer)
-        length = length
-        zppt = zppt
+        length, zppt = buf.unpack('>HB', offset + 2)
 
         numbytes = length - 3
-        ippt = fptr.read(numbytes)
+        ippt = buf.read(offset + 5, numbytes)
 
         return PPTsegment(zppt, ippt, length, offset)
 
-    def _parse_qcc_segment(self, fptr):
+    def _parse_qcc_segment(self, buf, offset):
         """Parse the QCC segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         QCC Segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
-        read_buffer = fptr.read(length - 2)
+        read_buffer = buf.read(offset + 4, length - 2)
         if self._csiz > 256:
             fmt = '>HB'
             mantissa_exponent_offset = 3
@@ -587,75 +758,69 @@ class Codestream(object):
 
         return QCCsegment(cqcc, sqcc, spqcc, length, offset)
 
-    def _parse_qcd_segment(self, fptr):
+    def _parse_qcd_segment(self, buf, offset):
         """Parse the QCD segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         QCD Segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(3)
-        length, sqcd = struct.unpack('>HB', read_buffer)
-        spqcd = fptr.read(length - 3)
+        length, sqcd = buf.unpack('>HB', offset + 2)
+        spqcd = buf.read(offset + 5, length - 3)
 
         return QCDsegment(sqcd, spqcd, length, offset)
 
-    def _parse_rgn_segment(self, fptr):
+    def _parse_rgn_segment(self, buf, offset):
         """Parse the RGN segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         RGN segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
         if self._csiz < 257:
-            read_buffer = fptr.read(3)
-            data = struct.unpack('>BBB', read_buffer)
+            data = buf.unpack('>BBB', offset + 4)
         else:
-            read_buffer = fptr.read(4)
-            data = struct.unpack('>HBB', read_buffer)
+            data = buf.unpack('>HBB', offset + 4)
 
-        length = length
         crgn = data[0]
         srgn = data[1]
         sprgn = data[2]
 
         return RGNsegment(crgn, srgn, sprgn, length, offset)
 
-    def _parse_siz_segment(self, fptr):
+    def _parse_siz_segment(self, buf, offset):
         """Parse the SIZ segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         SIZsegment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
-        read_buffer = fptr.read(length - 2)
+        read_buffer = buf.read(offset + 4, length - 2)
         data = struct.unpack_from('>HIIIIIIIIH', read_buffer)
 
         rsiz = data[0]
@@ -715,39 +880,39 @@ class Codestream(object):
 
         return segment
 
-    def _parse_sod_segment(self, fptr):
+    def _parse_sod_segment(self, buf, offset):
         """Parse the SOD (start-of-data) segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         SOD segment instance.
         """
-        offset = fptr.tell() - 2
         length = 0
 
         return SODsegment(length, offset)
 
-    def _parse_sot_segment(self, fptr):
+    def _parse_sot_segment(self, buf, offset):
         """Parse the SOT segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         SOT segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(10)
-        data = struct.unpack('>HHIBB', read_buffer)
+        data = buf.unpack('>HHIBB', offset + 2)
 
         length = data[0]
         isot = data[1]
@@ -759,35 +924,35 @@ class Codestream(object):
 
         # Need to keep easy access to tile offsets and lengths for when
         # we encounter start-of-data marker segments.
-
-        self._tile_offset.append(segment.offset)
+        if self._first_sot is None:
+            self._first_sot = offset
+        self._tile_part_offset = segment.offset
         if segment.psot == 0:
             tile_part_length = (self.offset + self.length -
                                 segment.offset - 2)
         else:
             tile_part_length = segment.psot
-        self._tile_length.append(tile_part_length)
+        self._tile_part_length = tile_part_length
 
         return segment
 
-    def _parse_tlm_segment(self, fptr):
+    def _parse_tlm_segment(self, buf, offset):
         """Parse the TLM segment.
 
         Parameters
         ----------
-        fptr : file
-            Open file object.
+        buf : _CodestreamBuffer
+            Codestream bytes.
+        offset : int
+            Offset of the marker in bytes from beginning of file.
 
         Returns
         -------
         TLM segment instance.
         """
-        offset = fptr.tell() - 2
-
-        read_buffer = fptr.read(2)
-        length, = struct.unpack('>H', read_buffer)
+        length, = buf.unpack('>H', offset + 2)
 
-        read_buffer = fptr.read(length - 2)
+        read_buffer = buf.read(offset + 4, length - 2)
         ztlm, stlm = struct.unpack_from('>BB', read_buffer)
         ttlm_st = (stlm >> 4) & 0x3
         ptlm_sp = (stlm >> 6) & 0x1
@@ -822,14 +987,494 @@ class Codestream(object):
 
         return TLMsegment(length, offset, ztlm, ttlm, ptlm)
 
-    def _parse_reserved_marker(self, fptr):
+    def _parse_reserved_marker(self, buf, offset):
         """Marker range between 0xff30 and 0xff39.
         """
         the_id = '0x{0:x}'.format(self._marker_id)
-        segment = Segment(marker_id=the_id, offset=self._offset, length=0)
+        segment = Segment(marker_id=the_id, offset=offset, length=0)
         return segment
 
 
+# Tile part segments are kept as rows of structured arrays rather than as
+# Segment objects, since a full codestream can have millions of them.
+_SOT_DTYPE = np.dtype([('offset', np.int64), ('length', np.uint16),
+                       ('isot', np.uint16), ('psot', np.uint32),
+                       ('tpsot', np.uint8), ('tnsot', np.uint8)])
+_PACKET_DTYPE = np.dtype([('marker', np.uint16), ('offset', np.int64),
+                          ('length', np.uint16), ('nsop', np.uint16)])
+_PACKET_MARKER_ID = {'SOD': 0xff93, 'SOP': 0xff91, 'EPH': 0xff92}
+_PACKET_MARKER_NAME = dict((value, key)
+                           for key, value in _PACKET_MARKER_ID.items())
+
+
+class _SegmentSequence(MutableSequence):
+    """Marker segments of a codestream in codestream order.
+
+    SOT segments are stored in one structured array, SOD, SOP, and EPH
+    segments in another, and all other segments as Segment objects.  Runs of
+    consecutive segments of the same kind record the order.  Segment objects
+    for the rows of the arrays are created on demand.
+
+    The sequence can be modified like a list.  Changes to the main header
+    segments are made in place, anything else rebuilds the sequence.
+
+    Parameters
+    ----------
+    segments : iterable, optional
+        Initial segments.
+    """
+    _OBJECT, _SOT, _PACKET = 0, 1, 2
+
+    def __init__(self, segments=()):
+        self._reset()
+        for segment in segments:
+            self.append(segment)
+
+    def _reset(self):
+        """Empty the sequence."""
+        self._objects = []
+        self._arrays = {self._SOT: np.zeros(0, dtype=_SOT_DTYPE),
+                        self._PACKET: np.zeros(0, dtype=_PACKET_DTYPE)}
+        self._dtypes = {self._SOT: _SOT_DTYPE, self._PACKET: _PACKET_DTYPE}
+
+        # Rows not yet folded into the arrays, either tuples or arrays.
+        self._pending = {self._SOT: [], self._PACKET: []}
+
+        self._run_kind = array.array('B')
+        self._run_length = array.array('L')
+        self._runs = None
+        self._count = 0
+
+    def __repr__(self):
+        return '<{0} marker segments>'.format(len(self))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        position = {self._OBJECT: 0, self._SOT: 0, self._PACKET: 0}
+        for kind, count in zip(self._run_kind, self._run_length):
+            start = position[kind]
+            position[kind] = start + count
+            if kind == self._OBJECT:
+                for segment in self._objects[start:start + count]:
+                    yield segment
+            else:
+                for row in self._array(kind)[start:start + count]:
+                    yield self._make_segment(kind, row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[j] for j in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('segment index out of range')
+
+        # Main header segments are the common case.
+        if self._run_kind[0] == self._OBJECT and index < self._run_length[0]:
+            return self._objects[index]
+
+        if self._runs is None:
+            self._runs = self._index_runs()
+        kinds, ends, starts = self._runs
+        run = np.searchsorted(ends, index, side='right')
+        kind = kinds[run]
+        pos = int(starts[run] + index - ends[run] + self._run_length[run])
+        if kind == self._OBJECT:
+            return self._objects[pos]
+        return self._make_segment(kind, self._array(kind)[pos])
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, slice):
+            index = self._normalize(index)
+            if self._in_header(index) and self._is_object(value):
+                self._objects[index] = value
+                return
+        segments = list(self)
+        segments[index] = value
+        self._rebuild(segments)
+
+    def __delitem__(self, index):
+        if not isinstance(index, slice):
+            index = self._normalize(index)
+            if self._in_header(index) and self._run_length[0] > 1:
+                del self._objects[index]
+                self._run_length[0] -= 1
+                self._count -= 1
+                self._runs = None
+                return
+        segments = list(self)
+        del segments[index]
+        self._rebuild(segments)
+
+    def insert(self, index, value):
+        """Insert a segment before the given index."""
+        # Out of range indices are clamped, as with lists.
+        if index < 0:
+            index = max(index + self._count, 0)
+        index = min(index, self._count)
+
+        if index == self._count:
+            self.append(value)
+        elif self._in_header(index) and self._is_object(value):
+            self._objects.insert(index, value)
+            self._run_length[0] += 1
+            self._count += 1
+            self._runs = None
+        else:
+            segments = list(self)
+            segments.insert(index, value)
+            self._rebuild(segments)
+
+    def _normalize(self, index):
+        """Non-negative form of an index, which must be in range."""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('segment index out of range')
+        return index
+
+    def _in_header(self, index):
+        """True if the index falls within the leading run of objects."""
+        return (self._count > 0 and self._run_kind[0] == self._OBJECT and
+                index < self._run_length[0])
+
+    @staticmethod
+    def _is_object(segment):
+        """True if the segment is stored as an object."""
+        return not isinstance(segment, (SOTsegment, SODsegment, SOPsegment,
+                                        EPHsegment))
+
+    def _rebuild(self, segments):
+        """Replace the contents with the given segments."""
+        self._reset()
+        for segment in segments:
+            self.append(segment)
+        self.consolidate()
+
+    @property
+    def sot(self):
+        """Structured array of the SOT segments."""
+        return self._array(self._SOT)
+
+    @property
+    def packets(self):
+        """Structured array of the SOD, SOP, and EPH segments."""
+        return self._array(self._PACKET)
+
+    def append(self, segment):
+        """Add a segment to the end of the sequence."""
+        if isinstance(segment, SOTsegment):
+            row = (segment.offset, segment.length, segment.isot,
+                   segment.psot, segment.tpsot, segment.tnsot)
+            self._add_rows(self._SOT, row, 1)
+        elif isinstance(segment, (SODsegment, SOPsegment, EPHsegment)):
+            nsop = getattr(segment, 'nsop', 0)
+            row = (_PACKET_MARKER_ID[segment.marker_id], segment.offset,
+                   segment.length, nsop)
+            self._add_rows(self._PACKET, row, 1)
+        else:
+            self._objects.append(segment)
+            self._add_run(self._OBJECT, 1)
+
+    def extend_packets(self, rows):
+        """Add SOD, SOP, or EPH segments given as a structured array."""
+        self._add_rows(self._PACKET, rows, len(rows))
+
+    def consolidate(self):
+        """Fold the segments added so far into the arrays."""
+        for kind in (self._SOT, self._PACKET):
+            self._array(kind)
+
+    def _add_rows(self, kind, rows, count):
+        if count > 0:
+            self._pending[kind].append(rows)
+            self._add_run(kind, count)
+
+    def _add_run(self, kind, count):
+        if len(self._run_kind) > 0 and self._run_kind[-1] == kind:
+            self._run_length[-1] += count
+        else:
+            self._run_kind.append(kind)
+            self._run_length.append(count)
+        self._count += count
+        self._runs = None
+
+    def _array(self, kind):
+        """Fold any pending rows into the array of one kind of segment."""
+        if len(self._pending[kind]) > 0:
+            pieces = [self._arrays[kind]]
+            rows = []
+            for item in self._pending[kind]:
+                if isinstance(item, tuple):
+                    rows.append(item)
+                    continue
+                if len(rows) > 0:
+                    pieces.append(np.array(rows, dtype=self._dtypes[kind]))
+                    rows = []
+                pieces.append(item)
+            if len(rows) > 0:
+                pieces.append(np.array(rows, dtype=self._dtypes[kind]))
+            self._arrays[kind] = np.concatenate(pieces)
+            self._pending[kind] = []
+        return self._arrays[kind]
+
+    def _index_runs(self):
+        """Kind, end in the sequence, and start in its store of each run."""
+        kinds = np.array(self._run_kind, dtype=np.uint8)
+        lengths = np.array(self._run_length, dtype=np.int64)
+        ends = np.cumsum(lengths)
+        starts = np.zeros_like(lengths)
+        for kind in (self._OBJECT, self._SOT, self._PACKET):
+            mask = kinds == kind
+            starts[mask] = np.cumsum(lengths[mask]) - lengths[mask]
+        return kinds, ends, starts
+
+    def to_dicts(self):
+        """Dictionary of each segment, the same as Segment.to_dict gives.
+
+        Rows of the arrays are converted directly, without creating Segment
+        objects along the way.
+        """
+        dicts = []
+        position = {self._OBJECT: 0, self._SOT: 0, self._PACKET: 0}
+        for kind, count in zip(self._run_kind, self._run_length):
+            start = position[kind]
+            position[kind] = start + count
+            if kind == self._OBJECT:
+                dicts.extend(segment.to_dict()
+                             for segment in self._objects[start:start + count])
+                continue
+
+            rows = self._array(kind)[start:start + count].tolist()
+            if kind == self._SOT:
+                for offset, length, isot, psot, tpsot, tnsot in rows:
+                    dicts.append(OrderedDict([
+                        ('marker_id', 'SOT'), ('offset', offset),
+                        ('length', length), ('data', None), ('isot', isot),
+                        ('psot', psot), ('tnsot', tnsot), ('tpsot', tpsot)]))
+                continue
+
+            for marker, offset, length, nsop in rows:
+                item = OrderedDict([('marker_id', _PACKET_MARKER_NAME[marker]),
+                                    ('offset', offset), ('length', length),
+                                    ('data', None)])
+                if marker == 0xff91:
+                    item['nsop'] = nsop
+                dicts.append(item)
+        return dicts
+
+    def _make_segment(self, kind, row):
+        """Segment object for a row of one of the arrays."""
+        offset = int(row['offset'])
+        length = int(row['length'])
+        if kind == self._SOT:
+            return SOTsegment(int(row['isot']), int(row['psot']),
+                              int(row['tpsot']), int(row['tnsot']),
+                              length, offset)
+        marker = row['marker']
+        if marker == 0xff91:
+            return SOPsegment(int(row['nsop']), length, offset)
+        elif marker == 0xff92:
+            return EPHsegment(length, offset)
+        else:
+            return SODsegment(length, offset)
+
+
+class _CodestreamBuffer(object):
+    """Random access to codestream bytes by their offset in the file.
+
+    Real files are memory-mapped and in-memory files are viewed through
+    their buffer, so that marker segments can be parsed by offset without
+    any reads or seeks.  Other file objects, such as range readers, are read
+    in increasingly large blocks as the scan proceeds, starting over with a
+    small block whenever the scan skips ahead.
+
+    Parameters
+    ----------
+    fptr : file
+        Open file object.
+    offset : int
+        Offset of the codestream from start of the file in bytes.
+    """
+    def __init__(self, fptr, offset):
+        self._fptr = None
+        self._mmap = None
+        self._view = None
+        self._base = 0
+
+        try:
+            self._mmap = mmap.mmap(fptr.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data = self._mmap
+        except (AttributeError, EnvironmentError, ValueError):
+            # No file descriptor, or an empty file.
+            if hasattr(fptr, 'getbuffer'):
+                self._view = fptr.getbuffer()
+                self._data = self._view
+            else:
+                self._fptr = fptr
+                self._base = offset
+                self._data = bytearray()
+
+    def _load(self, pos, end):
+        """Make sure that the bytes between two offsets are available."""
+        loaded = self._base + len(self._data)
+        if self._base <= pos and end <= loaded:
+            return
+        if self._base <= pos <= loaded:
+            # Carry on from what has already been read.
+            self._fptr.seek(loaded)
+            nbytes = max(end - loaded, len(self._data), 256)
+            self._data.extend(self._fptr.read(nbytes))
+        else:
+            self._fptr.seek(pos)
+            self._base = pos
+            self._data = bytearray(self._fptr.read(max(end - pos, 256)))
+
+    def unpack(self, fmt, pos):
+        """Unpack binary fields starting at the given offset.
+
+        Raises
+        ------
+        struct.error
+            If the codestream ends before the fields do.
+        """
+        if self._fptr is not None:
+            self._load(pos, pos + struct.calcsize(fmt))
+        return struct.unpack_from(fmt, self._data, pos - self._base)
+
+    def read(self, pos, nbytes):
+        """Copy of the bytes starting at the given offset.
+
+        Fewer bytes are returned if the codestream ends first.
+        """
+        if self._fptr is not None:
+            self._load(pos, pos + nbytes)
+        start = pos - self._base
+        data = self._data[start:start + nbytes]
+        return data.tobytes() if self._view is not None else bytes(data)
+
+    def array(self, pos, nbytes):
+        """Bytes starting at the given offset as a uint8 array.
+
+        The array shares memory with the buffer, so it must not outlive the
+        scan.  Fewer bytes are returned if the codestream ends first.
+        """
+        if self._fptr is not None:
+            self._load(pos, pos + nbytes)
+        start = pos - self._base
+        count = min(nbytes, len(self._data) - start)
+        if count <= 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.frombuffer(self._data, dtype=np.uint8, count=count,
+                             offset=start)
+
+    def close(self):
+        """Release the memory map or buffer view.
+
+        Raises
+        ------
+        BufferError
+            If an array from the array method is still around.
+        """
+        if self._view is not None:
+            self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+
+class TileIndex(object):
+    """Byte ranges of the tile parts making up each tile.
+
+    Looking up the tile parts of a tile takes constant time, so the index
+    can be used to extract tiles or to plan which byte ranges to fetch
+    without going through the codestream again.
+
+    Attributes
+    ----------
+    num_tiles : int
+        Number of tiles in the image, according to the SIZ segment.
+    method : str
+        'TLM' if the tile parts were laid out from the TLM segments, 'SOT'
+        if they were found from the SOT segments.
+    tile_parts : list
+        (tile, offset, length) of each tile part in codestream order.  The
+        offset is that of the SOT marker from the beginning of the file, the
+        length runs from there to the end of the tile part bit stream.
+
+    Examples
+    --------
+    >>> import glymur
+    >>> jp2 = glymur.Jp2k(glymur.data.nemo())
+    >>> c = jp2.get_codestream()
+    >>> c.tile_index[0]
+    [(3344, 1132173)]
+    """
+    def __init__(self, num_tiles, tile_parts, method='SOT'):
+        self.num_tiles = num_tiles
+        self.method = method
+        self.tile_parts = tile_parts
+        self._ranges = None
+
+    def __len__(self):
+        return self.num_tiles
+
+    def __getitem__(self, tile):
+        """(offset, length) of each tile part of a tile."""
+        return self._tile_ranges()[tile]
+
+    def __repr__(self):
+        msg = "glymur.codestream.TileIndex({0}, <{1} tile parts>, "
+        msg += "method='{2}')"
+        return msg.format(self.num_tiles, len(self.tile_parts), self.method)
+
+    def __str__(self):
+        msg = 'Tile Index (from {0}):  {1} tiles, {2} tile parts'
+        return msg.format(self.method, self.num_tiles, len(self.tile_parts))
+
+    def byte_ranges(self, tiles):
+        """Byte ranges covering the tile parts of some tiles.
+
+        Adjacent tile parts are merged into a single range.
+
+        Parameters
+        ----------
+        tiles : iterable
+            Tile numbers.
+
+        Returns
+        -------
+        list
+            (offset, length) of each range, sorted by offset.
+        """
+        tile_ranges = self._tile_ranges()
+        ranges = sorted(rng for tile in tiles for rng in tile_ranges[tile])
+        merged = []
+        for offset, length in ranges:
+            if len(merged) > 0 and offset == sum(merged[-1]):
+                merged[-1] = (merged[-1][0], merged[-1][1] + length)
+            else:
+                merged.append((offset, length))
+        return merged
+
+    def _tile_ranges(self):
+        """Tile parts grouped by tile."""
+        if self._ranges is None:
+            ranges = [[] for _ in range(self.num_tiles)]
+            for tile, offset, length in self.tile_parts:
+                if tile >= self.num_tiles:
+                    msg = "Tile part at byte {0} is for tile {1}, but there "
+                    msg += "are only {2} tiles."
+                    msg = msg.format(offset, tile, self.num_tiles)
+                    warnings.warn(msg, UserWarning)
+                    continue
+                ranges[tile].append((offset, length))
+            self._ranges = ranges
+        return self._ranges
+
+
 class Segment(object):
     """Segment information.
 
@@ -852,6 +1497,21 @@ class Segment(object):
         self.length = length
         self.data = data
 
+    def to_dict(self):
+        """Segment metadata as plain lists, dicts, strings and numbers.
+
+        Returns
+        -------
+        dict
+            Marker ID, offset, and length followed by the public attributes of
+            the segment.  Bytes are given as hex strings.
+        """
+        items = [('marker_id', self.marker_id), ('offset', self.offset),
+                 ('length', self.length)]
+        items.extend(_public_attributes(self, ('marker_id', 'offset',
+                                               'length')))
+        return OrderedDict(items)
+
     def __str__(self):
         msg = '{0} marker segment @ ({1}, {2})'.format(self.marker_id,
                                                        self.offset,
@@ -1073,6 +1733,13 @@ class CMEsegment(Segment):
         self.length = length
         self.offset = offset
 
+    def to_dict(self):
+        """Segment metadata, with a latin-1 comment given as a string."""
+        metadata = Segment.to_dict(self)
+        if self.rcme == 1:
+            metadata['ccme'] = self.ccme.decode('latin-1')
+        return metadata
+
     def __str__(self):
         msg = Segment.__str__(self) + '\n'
         if self.rcme == 1:
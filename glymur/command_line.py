@@ -2,10 +2,20 @@
 Entry point for console script jp2dump.
 """
 import argparse
+import collections
+import functools
+import glob
+import json
+import multiprocessing
 import os
+import sys
+import threading
 import warnings
 
-from . import Jp2k, set_printoptions, set_parseoptions, lib
+from . import Jp2k, set_printoptions, get_printoptions, set_parseoptions, lib
+
+# Files picked up when a directory is given.
+_EXTENSIONS = ('.jp2', '.jpx', '.jpf', '.jph', '.j2k', '.j2c', '.jpc')
 
 
 def main():
@@ -33,9 +43,34 @@ def main():
                         type=int,
                         default=[1])
 
-    parser.add_argument('filename')
+    parser.add_argument('-f', '--from-file',
+                        help='read paths, one per line, from a file ("-" for '
+                             'standard input)',
+                        metavar='LIST',
+                        dest='from_file',
+                        type=argparse.FileType('r'))
+    parser.add_argument('-j', '--jobs',
+                        help='number of worker processes',
+                        type=int,
+                        default=1)
+    parser.add_argument('--ndjson',
+                        help='print one JSON record per file',
+                        action='store_true')
+    parser.add_argument('--unordered',
+                        help='print results as they finish rather than in '
+                             'the order of the paths',
+                        action='store_true')
+
+    fhelp = 'JPEG 2000 files, directories (searched recursively), or glob '
+    fhelp += 'patterns'
+    parser.add_argument('filename', nargs='*', help=fhelp)
 
     args = parser.parse_args()
+    if not args.filename and args.from_file is None:
+        parser.error('no files given')
+    if args.jobs < 1:
+        parser.error('the number of jobs must be at least 1')
+
     if args.noxml:
         set_printoptions(xml=False)
     if args.short:
@@ -50,29 +85,204 @@ def main():
     elif codestream_level == 2:
         set_parseoptions(full_codestream=True)
 
-    filename = args.filename
+    paths = _paths(args.filename, args.from_file)
+    options = {'print': dict(get_printoptions()),
+               'full_codestream': codestream_level == 2,
+               'codestream_level': codestream_level,
+               'ndjson': args.ndjson}
+
+    failures = 0
+    for output, failed in _run(paths, options, args.jobs, args.unordered):
+        if failed:
+            failures += 1
+        if args.ndjson:
+            print(output)
+        elif failed:
+            sys.stderr.write(output + '\n')
+        else:
+            print(output)
+        sys.stdout.flush()
+
+    return 1 if failures else 0
+
+
+def _paths(patterns, from_file=None):
+    """Generate the files to dump, one at a time.
+
+    Parameters
+    ----------
+    patterns : list of str
+        Files, directories, or glob patterns from the command line.
+    from_file : file, optional
+        Open file listing one path per line.  These paths are taken as is.
+    """
+    for pattern in patterns:
+        if os.path.exists(pattern) or not glob.has_magic(pattern):
+            matches = [pattern]
+        else:
+            if sys.hexversion >= 0x03050000:
+                matches = sorted(glob.iglob(pattern, recursive=True))
+            else:
+                # "**" matches a single directory level before Python 3.5.
+                matches = sorted(glob.iglob(pattern))
+            if len(matches) == 0:
+                # Let it fail like any other missing file.
+                matches = [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                for filename in _walk(path):
+                    yield filename
+            else:
+                yield path
+
+    if from_file is None:
+        return
+
+    for line in from_file:
+        path = line.rstrip('\r\n')
+        if path:
+            yield path
+
+
+def _walk(directory):
+    """Generate the JPEG 2000 files under a directory in sorted order."""
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in _EXTENSIONS:
+                yield os.path.join(dirpath, filename)
+
+
+def _run(paths, options, jobs=1, unordered=False):
+    """Dump each file, with a pool of worker processes if asked.
+
+    At most a few files per worker are in flight at any time, so neither the
+    paths nor the results pile up in memory however many files there are.
 
+    Yields
+    ------
+    tuple
+        The output for one file and whether or not it failed.
+    """
+    if jobs == 1:
+        for path in paths:
+            yield _dump(path, options)
+        return
+
+    # The pool hands out paths from a thread of its own, which would
+    # otherwise exhaust the generator right away.
+    slots = threading.Semaphore(2 * jobs)
+    stopping = []
+
+    def throttled():
+        for path in paths:
+            slots.acquire()
+            if stopping:
+                return
+            yield path
+
+    pool = multiprocessing.Pool(jobs, _initialize, (options,))
+    try:
+        imap = pool.imap_unordered if unordered else pool.imap
+        dump = functools.partial(_dump, options=options)
+        for result in imap(dump, throttled()):
+            slots.release()
+            yield result
+        pool.close()
+    finally:
+        # Unblock the pool if the results were abandoned part way.
+        stopping.append(True)
+        for _ in range(2 * jobs):
+            slots.release()
+        pool.terminate()
+        pool.join()
+
+
+def _initialize(options):
+    """Give a worker process the same options as the main process."""
+    set_printoptions(**options['print'])
+    set_parseoptions(full_codestream=options['full_codestream'])
+
+
+def _dump(path, options):
+    """Dump one file.
+
+    Returns
+    -------
+    tuple
+        Text or JSON record for the file, and whether or not it failed.
+    """
     with warnings.catch_warnings(record=True) as wctx:
+        warnings.simplefilter('always')
 
         # JP2 metadata can be extensive, so don't print any warnings until we
         # are done with the metadata.
-        jp2 = Jp2k(filename)
-        if jp2._codec_format == lib.openjp2.CODEC_J2K:
-            if codestream_level == 0:
-                print('File:  {0}'.format(os.path.basename(filename)))
-            elif codestream_level == 1:
-                print(jp2)
-            elif codestream_level == 2:
-                print('File:  {0}'.format(os.path.basename(filename)))
-                print(jp2.get_codestream(header_only=False))
+        try:
+            jp2 = Jp2k(path)
+            if options['ndjson']:
+                output = _record(path, jp2, options['codestream_level'])
+            else:
+                output = _text(path, jp2, options['codestream_level'])
+        except Exception as exc:
+            if options['ndjson']:
+                record = collections.OrderedDict([('path', path),
+                                                  ('error', str(exc))])
+                record['warnings'] = _warnings(wctx)
+                return json.dumps(record), True
+            return '{0}: {1}'.format(path, exc), True
+
+    if options['ndjson']:
+        output['warnings'] = _warnings(wctx)
+        return json.dumps(output), False
+
+    # Re-emit any warnings that may have been suppressed.
+    lines = [output]
+    if len(wctx) > 0:
+        lines.append("\n")
+    for warning in wctx:
+        lines.append("{0}:{1}: {2}: {3}".format(warning.filename,
+                                                warning.lineno,
+                                                warning.category.__name__,
+                                                warning.message))
+    return '\n'.join(lines), False
+
+
+def _text(filename, jp2, codestream_level):
+    """Printed form of a file at a level of codestream information."""
+    if jp2._codec_format == lib.openjp2.CODEC_J2K:
+        if codestream_level == 0:
+            return 'File:  {0}'.format(os.path.basename(filename))
+        elif codestream_level == 1:
+            return str(jp2)
         else:
-            print(jp2)
-
-        # Re-emit any warnings that may have been suppressed.
-        if len(wctx) > 0:
-            print("\n")
-        for warning in wctx:
-            print("{0}:{1}: {2}: {3}".format(warning.filename,
-                                             warning.lineno,
-                                             warning.category.__name__,
-                                             warning.message))
+            return 'File:  {0}\n{1}'.format(
+                os.path.basename(filename),
+                jp2.get_codestream(header_only=False))
+    return str(jp2)
+
+
+def _record(path, jp2, codestream_level):
+    """JSON-ready record of the metadata of a file."""
+    record = collections.OrderedDict()
+    record['path'] = path
+    if jp2._codec_format == lib.openjp2.CODEC_J2K:
+        record['format'] = 'j2k'
+    else:
+        record['format'] = 'jp2'
+
+    metadata = jp2.metadata()
+    record['shape'] = metadata['shape']
+    record['box'] = metadata['box']
+    if codestream_level == 1:
+        record['codestream'] = metadata['codestream']
+    elif codestream_level == 2:
+        codestream = jp2.get_codestream(header_only=False)
+        record['codestream'] = codestream.to_dict()
+    return record
+
+
+def _warnings(wctx):
+    """Category and message of each recorded warning."""
+    return [collections.OrderedDict([('category', w.category.__name__),
+                                     ('message', str(w.message))])
+            for w in wctx]
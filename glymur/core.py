@@ -1,6 +1,14 @@
 """Core definitions to be shared amongst the modules.
 """
+import binascii
 import collections
+import datetime
+import numbers
+import sys
+import uuid
+
+import lxml.etree as ET
+import numpy as np
 
 
 class _Keydefaultdict(collections.defaultdict):
@@ -16,6 +24,65 @@ class _Keydefaultdict(collections.defaultdict):
             ret = self[key] = self.default_factory(key)
             return ret
 
+
+if sys.hexversion >= 0x03000000:
+    _TEXT_TYPES = (str,)
+else:
+    _TEXT_TYPES = (unicode,)
+
+
+def _to_builtin(value):
+    """Convert a metadata value into plain lists, dicts, strings and numbers.
+
+    The result can be given to json.dumps or msgpack.packb as is.  Bytes
+    become hex strings, XML becomes a string, and anything with a to_dict
+    method is converted with it.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (numbers.Real,) + _TEXT_TYPES):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        if isinstance(value, str) and _is_printable(value):
+            # Only reached on Python 2, which does not tell text from bytes.
+            return value
+        return binascii.hexlify(value).decode('ascii')
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(item) for item in value]
+    if isinstance(value, dict):
+        items = value.items()
+        if not isinstance(value, collections.OrderedDict):
+            items = sorted(items, key=lambda item: str(item[0]))
+        return collections.OrderedDict((str(key), _to_builtin(item))
+                                       for key, item in items)
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    if isinstance(value, (ET._ElementTree, ET._Element)):
+        return ET.tostring(value, encoding='unicode')
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+
+def _is_printable(text):
+    """True if a string only holds printable ASCII characters."""
+    return all(32 <= ord(char) < 127 for char in text)
+
+
+def _public_attributes(obj, exclude=()):
+    """Public instance attributes of an object, converted by _to_builtin.
+
+    The attributes are sorted by name, as instance dictionaries only keep
+    their order from Python 3.6 on.
+    """
+    return [(key, _to_builtin(value))
+            for key, value in sorted(obj.__dict__.items())
+            if not key.startswith('_') and key not in exclude]
+
 # Progression order
 LRCP = 0
 RLCP = 1
@@ -20,6 +20,7 @@ import pprint
 import struct
 import sys
 import textwrap
+import threading
 from uuid import UUID
 import warnings
 
@@ -31,7 +32,7 @@ from .core import (_COLORSPACE_MAP_DISPLAY, _COLOR_TYPE_MAP_DISPLAY,
                    SRGB, GREYSCALE, YCC,
                    ENUMERATED_COLORSPACE, RESTRICTED_ICC_PROFILE,
                    ANY_ICC_PROFILE, VENDOR_COLOR_METHOD,
-                   _Keydefaultdict)
+                   _Keydefaultdict, _public_attributes)
 
 from . import _uuid_io
 
@@ -72,6 +73,107 @@ class Jp2kBox(object):
         self.offset = offset
         self.box = []
 
+    def __getattr__(self, name):
+        # Only reached when normal lookup fails.  Boxes that were deferred
+        # when parsing lazily have nothing but their offset and length until
+        # their payload is parsed here.
+        if name.startswith('__') or '_deferred' not in self.__dict__:
+            msg = "'{0}' object has no attribute '{1}'"
+            raise AttributeError(msg.format(type(self).__name__, name))
+        self._materialize()
+        return getattr(self, name)
+
+    @classmethod
+    def _defer(cls, fptr, box_id, offset, length):
+        """Create a box whose payload is parsed only upon first use.
+
+        Parameters
+        ----------
+        fptr : file
+            Open file object, currently points to start of box payload.
+        box_id : bytes
+            4-letter identifier for the box.
+        offset, length : int
+            Byte offset and length of the box.
+
+        Returns
+        -------
+        box : Jp2kBox
+            Instance of the box class with only its offset and length set.
+        """
+        box = cls.__new__(cls)
+        box.offset = offset
+        box.length = length
+
+        # A named file is reopened later.  Anything else, e.g. an in-memory
+        # file, must be kept.
+        filename = getattr(fptr, 'name', None)
+        source = fptr if filename is None else None
+        box._deferred = (box_id, filename, source, fptr.tell())
+        return box
+
+    def _materialize(self):
+        """Parse the payload of a deferred box."""
+        # In-memory files and range readers are shared by all the boxes of a
+        # file, so only one thread at a time may seek and read through them.
+        with _materialize_lock:
+            if '_deferred' not in self.__dict__:
+                # Another thread got here first.
+                return
+            box_id, filename, fptr, payload_offset = self._deferred
+            if filename is not None:
+                with open(filename, 'rb') as fptr:
+                    fptr.seek(payload_offset)
+                    box = self._parse_this_box(fptr, box_id, self.offset,
+                                               self.length)
+            else:
+                fptr.seek(payload_offset)
+                box = self._parse_this_box(fptr, box_id, self.offset,
+                                           self.length)
+
+            # A payload that cannot be parsed turns into an unknown box.
+            # The box stays deferred if it could not be read at all.
+            self.__class__ = box.__class__
+            self.__dict__.update(box.__dict__)
+            del self.__dict__['_deferred']
+
+    def to_dict(self):
+        """Box metadata as plain lists, dicts, strings and numbers.
+
+        Unlike printing, no text is formatted, and the result can be written
+        out with json or msgpack directly.  Bytes are given as hex strings and
+        XML as a string.  Child boxes, if any, are listed under 'box'.  The
+        codestream of a contiguous codestream box is left out, see
+        Codestream.to_dict.
+
+        Returns
+        -------
+        dict
+            Box ID, long name, offset, and length followed by the public
+            attributes of the box.
+
+        Examples
+        --------
+        >>> import glymur
+        >>> jp2 = glymur.Jp2k(glymur.data.nemo())
+        >>> d = jp2.box[1].to_dict()
+        >>> print(d['box_id'])
+        ftyp
+        >>> d['brand'] == 'jp2 '
+        True
+        """
+        if '_deferred' in self.__dict__:
+            self._materialize()
+        items = [('box_id', self.box_id), ('longname', self.longname),
+                 ('offset', self.offset), ('length', self.length)]
+        items.extend(_public_attributes(self, self._to_dict_exclude))
+        if len(getattr(self, 'box', [])) > 0:
+            items.append(('box', [box.to_dict() for box in self.box]))
+        return OrderedDict(items)
+
+    # Public attributes left out of to_dict, or put there specially.
+    _to_dict_exclude = ('box_id', 'longname', 'offset', 'length', 'box')
+
     def __repr__(self):
         msg = "glymur.jp2box.Jp2kBox(box_id='{0}', offset={1}, length={2}, "
         msg += "longname='{3}')"
@@ -233,7 +335,10 @@ class Jp2kBox(object):
             if box_length == 0:
                 # The length of the box is presumed to last until the end of
                 # the file.  Compute the effective length of the box.
-                num_bytes = os.path.getsize(fptr.name) - fptr.tell() + 8
+                position = fptr.tell()
+                fptr.seek(0, os.SEEK_END)
+                num_bytes = fptr.tell() - position + 8
+                fptr.seek(position)
 
             elif box_length == 1:
                 # The length of the box is in the XL field, a 64-bit value.
@@ -244,7 +349,11 @@ class Jp2kBox(object):
                 # The box_length value really is the length of the box!
                 num_bytes = box_length
 
-            box = self._parse_this_box(fptr, box_id, start, num_bytes)
+            if _parseoptions['lazy'] and box_id in _BOX_WITH_ID:
+                box = _BOX_WITH_ID[box_id]._defer(fptr, box_id, start,
+                                                  num_bytes)
+            else:
+                box = self._parse_this_box(fptr, box_id, start, num_bytes)
 
             superbox.append(box)
 
@@ -1100,11 +1209,15 @@ class ContiguousCodestreamBox(Jp2kBox):
         main_header_offset = fptr.tell()
         if _parseoptions['full_codestream'] is True:
             codestream = Codestream(fptr, length, header_only=False)
+        elif not hasattr(fptr, 'name'):
+            # An in-memory source cannot be reopened later, so the main
+            # header is read now instead of lazily.
+            codestream = Codestream(fptr, length, header_only=True)
         else:
             codestream = None
         box = cls(codestream, main_header_offset=main_header_offset,
                   length=length, offset=offset)
-        box._filename = fptr.name
+        box._filename = getattr(fptr, 'name', None)
         box._length = length
         return box
 
@@ -3358,6 +3471,9 @@ class UUIDBox(Jp2kBox):
     box_id = 'uuid'
     longname = 'UUID'
 
+    # The data attribute already holds the payload, interpreted if possible.
+    _to_dict_exclude = Jp2kBox._to_dict_exclude + ('raw_data',)
+
     def __init__(self, the_uuid, raw_data, length=0, offset=-1):
         """
         Parameters
@@ -3506,10 +3622,18 @@ _BOX_WITH_ID = {
     b'uuid': UUIDBox,
     b'xml ': XMLBox}
 
-_parseoptions = {'full_codestream': False}
+_parseoptions = {'full_codestream': False, 'lazy': False,
+                 'metadata_cache': None}
+
+# Deferred boxes are parsed one at a time.
+_materialize_lock = threading.RLock()
 
+# Default of the parse options that are left as they are when not given.
+_UNCHANGED = object()
 
-def set_parseoptions(full_codestream=True):
+
+def set_parseoptions(full_codestream=True, lazy=_UNCHANGED,
+                     metadata_cache=_UNCHANGED):
     """Set parsing options.
 
     These options determine the way JPEG 2000 boxes are parsed.
@@ -3519,7 +3643,20 @@ def set_parseoptions(full_codestream=True):
     full_codestream : bool, defaults to True
         When False, only the codestream header is parsed for metadata.  This
         can results in faster JP2/JPX parsing.  When True, the entire
-        codestream is parsed for metadata.
+        codestream is parsed for metadata.  Every call sets this option, so
+        pass False along with the other options to keep parsing only the
+        codestream header.
+    lazy : bool, optional
+        When True, opening a file only reads the box headers.  The payload
+        of each box is parsed the first time one of its attributes is used,
+        so XML, Exif, ICC profiles and the like cost nothing unless they are
+        looked at.  Any warnings about a box are issued at that time.  Left
+        as it is if not given.
+    metadata_cache : MetadataCache or None, optional
+        When given, the metadata of files opened by path is taken from the
+        cache if the file has not changed since it was stored, and stored
+        there otherwise.  Not used when full_codestream is True.  Left as it
+        is if not given.
 
     See also
     --------
@@ -3530,9 +3667,14 @@ def set_parseoptions(full_codestream=True):
     To put back the default options, you can use:
 
     >>> import glymur
-    >>> glymur.set_parseoptions(full_codestream=True)
+    >>> glymur.set_parseoptions(full_codestream=False, lazy=False,
+    ...                         metadata_cache=None)
     """
     _parseoptions['full_codestream'] = full_codestream
+    if lazy is not _UNCHANGED:
+        _parseoptions['lazy'] = lazy
+    if metadata_cache is not _UNCHANGED:
+        _parseoptions['metadata_cache'] = metadata_cache
 
 
 def get_parseoptions():
@@ -3543,7 +3685,9 @@ def get_parseoptions():
     print_opts : dict
         Dictionary of current print options with keys
 
-          - codestream : bool
+          - full_codestream : bool
+          - lazy : bool
+          - metadata_cache : MetadataCache or None
 
         For a full description of these options, see `set_parseoptions`.
 
@@ -17,11 +17,17 @@ else:
     from contextlib2 import ExitStack
     from itertools import ifilterfalse as filterfalse
 
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 import ctypes
+import io
 import math
+import mmap
+import multiprocessing
+import numbers
 import os
 import re
+import sqlite3
 import struct
 from uuid import UUID
 import warnings
@@ -29,11 +35,26 @@ import warnings
 import numpy as np
 
 from .codestream import Codestream
-from . import core, version
+from . import core, transcode, version
 from .jp2box import (Jp2kBox, JPEG2000SignatureBox, FileTypeBox,
                      JP2HeaderBox, ColourSpecificationBox,
-                     ContiguousCodestreamBox, ImageHeaderBox)
+                     ContiguousCodestreamBox, ImageHeaderBox,
+                     get_parseoptions)
 from .lib import openjpeg as opj, openjp2 as opj2, c as libc
+from .metadatacache import MetadataCache
+from .rangereader import RangeReader
+
+
+def _extracted_nbytes(_, image):
+    """Bytes handed out by _extract_image, for the profilers."""
+    if isinstance(image, np.ndarray):
+        return image.nbytes
+    return sum(band.nbytes for band in image)
+
+
+def _stream_nbytes(_, nbytes):
+    """Bytes moved by a stream callback, for the profilers."""
+    return 0 if nbytes == _CallbackStream._EOF else nbytes
 
 
 class Jp2k(Jp2kBox):
@@ -42,7 +63,8 @@ class Jp2k(Jp2kBox):
     Attributes
     ----------
     filename : str
-        The path to the JPEG 2000 file.
+        The path to the JPEG 2000 file, or None if the image is held in
+        memory or read through a file object.
     box : sequence
         List of top-level boxes in the file.  Each box may in turn contain
         its own list of boxes.  Will be empty if the file consists only of a
@@ -57,12 +79,26 @@ class Jp2k(Jp2kBox):
         color transformation, defaults to False.
     layer : int
         zero-based number of quality layer to decode
+    num_threads : int
+        number of threads used by libopenjp2 when decoding, defaults to the
+        value given to set_decodeoptions
+    tile_cache : TileCache
+        cache of decoded tiles from which windows are assembled when
+        slicing, defaults to None
     verbose : bool
         whether or not to print informational messages produced by the
         OpenJPEG library, defaults to false
     codestream : object
         JP2 or J2K codestream object
 
+    Notes
+    -----
+    With libopenjp2, reading is thread-safe.  Several threads may read from
+    the same object at once, each read using its own codec, and the library's
+    errors are raised in the thread whose codec reported them.  A layer given
+    to a read applies to that read only, the layer property is left as it
+    is.  Changing the properties while other threads read is not safe.
+
     Examples
     --------
     >>> import glymur
@@ -79,6 +115,12 @@ class Jp2k(Jp2kBox):
     >>> thumbnail = jp2[::2, ::2]
     >>> thumbnail.shape
     (728, 1296, 3)
+
+    Images can also be decoded from and encoded to bytes.
+
+    >>> payload = jp2.to_bytes()
+    >>> glymur.Jp2k.from_bytes(payload)[::2, ::2].shape
+    (728, 1296, 3)
     """
 
     def __init__(self, filename, data=None, shape=None, **kwargs):
@@ -88,8 +130,9 @@ class Jp2k(Jp2kBox):
 
         Parameters
         ----------
-        filename : str or file
-            the path to JPEG 2000 file
+        filename : str, file, or RangeReader
+            the path to JPEG 2000 file, or for reading only, any object with
+            read, seek, and tell methods
         image_data : ndarray, optional
             image data to be written
         shape : tuple
@@ -142,6 +185,16 @@ class Jp2k(Jp2kBox):
         """
         Jp2kBox.__init__(self)
         self.filename = filename
+        self._buffer = None
+        self._reader = None
+        if all(hasattr(filename, attr) for attr in ('read', 'seek', 'tell')):
+            if data is not None or shape is not None:
+                msg = "Images can only be written to a file given by its path."
+                raise IOError(msg)
+            if not isinstance(filename, RangeReader):
+                filename = RangeReader.from_file(filename)
+            self._reader = filename
+            self.filename = None
 
         self.box = []
         self._codec_format = None
@@ -155,9 +208,15 @@ class Jp2k(Jp2kBox):
 
         self._ignore_pclr_cmap_cdef = False
         self._verbose = False
+        self._num_threads = None
+        self._tile_cache = None
+
+        # Identifies the source in the keys of a tile cache when there is no
+        # file name.
+        self._cache_token = object()
 
         # Parse the file for JP2/JPX contents only if we are reading it.
-        if data is None and shape is None:
+        if data is None and shape is None and filename is not None:
             self.parse()
         elif data is not None:
             self._write(data, **kwargs)
@@ -168,6 +227,10 @@ class Jp2k(Jp2kBox):
 
     @ignore_pclr_cmap_cdef.setter
     def ignore_pclr_cmap_cdef(self, ignore_pclr_cmap_cdef):
+        if ((self._tile_cache is not None and
+             ignore_pclr_cmap_cdef != self._ignore_pclr_cmap_cdef)):
+            # The cached tiles no longer match what would be decoded.
+            self._tile_cache.clear()
         self._ignore_pclr_cmap_cdef = ignore_pclr_cmap_cdef
 
     @property
@@ -200,6 +263,33 @@ class Jp2k(Jp2kBox):
     def verbose(self, verbose):
         self._verbose = verbose
 
+    @property
+    def tile_cache(self):
+        """Cache of decoded tiles used when slicing, None to disable."""
+        return self._tile_cache
+
+    @tile_cache.setter
+    def tile_cache(self, tile_cache):
+        if tile_cache is not None and version.openjpeg_version_tuple[0] < 2:
+            msg = "Tile cache not supported unless the version of "
+            msg += "OpenJPEG is 2.0 or higher."
+            raise RuntimeError(msg)
+        self._tile_cache = tile_cache
+
+    @property
+    def num_threads(self):
+        """Number of threads used by libopenjp2 when decoding.
+
+        When None, the value given to set_decodeoptions is used.
+        """
+        return self._num_threads
+
+    @num_threads.setter
+    def num_threads(self, num_threads):
+        if num_threads is not None:
+            _validate_num_threads(num_threads)
+        self._num_threads = num_threads
+
     @property
     def shape(self):
         if self._shape is not None:
@@ -238,12 +328,142 @@ class Jp2k(Jp2kBox):
     def shape(self, shape):
         self._shape = shape
 
+    @classmethod
+    def from_bytes(cls, buffer):
+        """Create a Jp2k object from a JPEG 2000 image held in memory.
+
+        The image is decoded straight from the buffer, nothing is written to
+        the file system.
+
+        Parameters
+        ----------
+        buffer : bytes, bytearray, or memoryview
+            The JP2/JPX file or raw codestream.  The buffer is not copied, so
+            it should not be modified while the object is in use.
+
+        Returns
+        -------
+        Jp2k
+            Object reading from the buffer.
+
+        Raises
+        ------
+        IOError
+            The buffer did not contain JPEG 2000 data.
+
+        Examples
+        --------
+        >>> import glymur
+        >>> with open(glymur.data.nemo(), 'rb') as f:
+        ...     payload = f.read()
+        >>> jp2 = glymur.Jp2k.from_bytes(payload)
+        >>> jp2.shape
+        (1456, 2592, 3)
+        """
+        if sys.hexversion < 0x03000000 and isinstance(buffer, memoryview):
+            # numpy cannot wrap a memoryview on Python 2.
+            buffer = buffer.tobytes()
+        jp2 = cls(None)
+        jp2._buffer = buffer
+        jp2.parse()
+        return jp2
+
+    def to_bytes(self):
+        """Return the entire JPEG 2000 file or codestream.
+
+        Returns
+        -------
+        bytes
+            The file contents.
+        """
+        if self._buffer is not None:
+            return memoryview(self._buffer).tobytes()
+        if self._reader is not None:
+            return self._reader.read_range(0, self._reader.length)
+        with open(self.filename, 'rb') as fptr:
+            return fptr.read()
+
+    @contextmanager
+    def _open_source(self):
+        """Open the file, file object, or in-memory buffer for reading.
+
+        Yields
+        ------
+        file object
+            Positioned at the start of the JPEG 2000 data.  A file object
+            given by the caller is left open.
+        """
+        if self._buffer is not None:
+            yield io.BytesIO(self._buffer)
+        elif self._reader is not None:
+            self._reader.seek(0)
+            yield self._reader
+        else:
+            with open(self.filename, 'rb') as fptr:
+                yield fptr
+
+    @contextmanager
+    def _map_source(self, copy=False):
+        """Make the file, file object, or in-memory buffer addressable.
+
+        Parameters
+        ----------
+        copy : bool, optional
+            If true, read the data into memory instead of mapping the file,
+            e.g. because the file is about to be overwritten.
+
+        Yields
+        ------
+        memoryview or bytes
+            The entire JPEG 2000 data.  A file is memory-mapped rather than
+            read, where the platform allows it.
+        """
+        if sys.hexversion < 0x03000000 or self._reader is not None or copy:
+            # Python 2 can neither view a memory map nor write a view, and
+            # a reader has no file to map.
+            yield self.to_bytes()
+            return
+        if self._buffer is not None:
+            yield memoryview(self._buffer)
+            return
+
+        with open(self.filename, 'rb') as fptr:
+            try:
+                mapped = mmap.mmap(fptr.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                # An empty file, or one that cannot be mapped.
+                mapped = None
+        if mapped is None:
+            yield self.to_bytes()
+            return
+
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            try:
+                mapped.close()
+            except BufferError:
+                # A traceback still holds a slice, the map goes with it.
+                pass
+
     def __repr__(self):
-        msg = "glymur.Jp2k('{0}')".format(self.filename)
+        if self._reader is not None:
+            msg = "glymur.Jp2k({0!r})".format(self._reader)
+        elif self.filename is None:
+            msg = "glymur.Jp2k.from_bytes(<{0} bytes>)".format(self.length)
+        else:
+            msg = "glymur.Jp2k('{0}')".format(self.filename)
         return msg
 
     def __str__(self):
-        metadata = ['File:  ' + os.path.basename(self.filename)]
+        if self._reader is not None:
+            metadata = ['Reader:  {0} bytes'.format(self.length)]
+        elif self.filename is None:
+            metadata = ['Buffer:  {0} bytes'.format(self.length)]
+        else:
+            metadata = ['File:  ' + os.path.basename(self.filename)]
         if len(self.box) > 0:
             for box in self.box:
                 metadata.append(str(box))
@@ -251,17 +471,101 @@ class Jp2k(Jp2kBox):
             metadata.append(str(self.codestream))
         return '\n'.join(metadata)
 
+    def metadata(self):
+        """File metadata as plain lists, dicts, strings and numbers.
+
+        This is the structured counterpart of printing the object.  No text
+        is formatted, and the result can be written out with json or msgpack
+        directly.
+
+        Returns
+        -------
+        dict
+            The filename (None if not read from a file), the image shape, the
+            dictionary of each top-level box under 'box' (empty for a raw
+            codestream), and the dictionary of the codestream under
+            'codestream'.
+
+        See also
+        --------
+        glymur.jp2box.Jp2kBox.to_dict, glymur.codestream.Codestream.to_dict
+
+        Examples
+        --------
+        >>> import glymur, json
+        >>> jp2 = glymur.Jp2k(glymur.data.nemo())
+        >>> metadata = jp2.metadata()
+        >>> [box['box_id'] for box in metadata['box']]
+        ['jP  ', 'ftyp', 'jp2h', 'uuid', 'jp2c']
+        >>> metadata['codestream']['segment'][1]['xsiz']
+        2592
+        >>> text = json.dumps(metadata)
+        """
+        return OrderedDict([('filename', self.filename),
+                            ('shape', list(self.shape)),
+                            ('box', [box.to_dict() for box in self.box]),
+                            ('codestream', self.codestream.to_dict())])
+
+    @opj2.profiled('parse')
     def parse(self):
         """Parses the JPEG 2000 file.
 
+        If a metadata cache has been given to set_parseoptions, files given
+        by path are only parsed when the cache has no up-to-date entry for
+        them.
+
         Raises
         ------
         IOError
             The file was not JPEG 2000.
         """
-        self.length = os.path.getsize(self.filename)
+        options = get_parseoptions()
+        cache = options['metadata_cache']
+        if (cache is None or self.filename is None or
+                options['full_codestream']):
+            self._parse()
+            return
 
-        with open(self.filename, 'rb') as fptr:
+        key = cache.key(self.filename)
+        metadata = cache.get(key)
+        if metadata is not None:
+            self._codec_format = metadata['codec_format']
+            self.length = metadata['length']
+            self.box = metadata['box']
+            self._codestream = metadata['codestream']
+            return
+
+        self._parse()
+        try:
+            codestream = self.get_codestream(header_only=True)
+            # The tile index is built now so that it is stored as well.
+            codestream.tile_index
+        except (IOError, struct.error):
+            # Nothing is cached, any problem with the codestream is reported
+            # when it is used.
+            return
+
+        self._codestream = codestream
+        metadata = {'codec_format': self._codec_format,
+                    'length': self.length,
+                    'box': self.box,
+                    'codestream': codestream}
+        try:
+            cache.put(key, metadata)
+        except (EnvironmentError, TypeError, sqlite3.Error) as err:
+            msg = 'Unable to store the metadata of {0} in the cache:  {1}'
+            warnings.warn(msg.format(self.filename, err), UserWarning)
+
+    def _parse(self):
+        """Parses the JPEG 2000 file, see parse."""
+        if self._buffer is not None:
+            self.length = np.frombuffer(self._buffer, dtype=np.uint8).size
+        elif self._reader is not None:
+            self.length = self._reader.length
+        else:
+            self.length = os.path.getsize(self.filename)
+
+        with self._open_source() as fptr:
 
             # Make sure we have a JPEG2000 file.  It could be either JP2 or
             # J2C.  Check for J2C first, single box in that case.
@@ -287,7 +591,11 @@ class Jp2k(Jp2kBox):
             signature = values[2:]
             if (((box_length != 12) or (box_id != b'jP  ') or
                  (signature != (13, 10, 135, 10)))):
-                msg = '{0} is not a JPEG 2000 file.'.format(self.filename)
+                if self.filename is None:
+                    msg = 'The data is not a JPEG 2000 file.'
+                else:
+                    msg = '{0} is not a JPEG 2000 file.'
+                    msg = msg.format(self.filename)
                 raise IOError(msg)
 
             # Back up and start again, we know we have a superbox (box of
@@ -393,15 +701,19 @@ class Jp2k(Jp2kBox):
         else:
             cparams = opj2.set_default_encoder_parameters()
 
-        outfile = self.filename.encode()
-        num_pad_bytes = opj2.PATH_LEN - len(outfile)
-        outfile += b'0' * num_pad_bytes
-        cparams.outfile = outfile
-
-        if self.filename[-4:].endswith(('.jp2', '.JP2')):
-            cparams.codec_fmt = opj2.CODEC_JP2
+        if self.filename is None:
+            # Encoding to memory, the caller has chosen the format.
+            cparams.codec_fmt = self._codec_format
         else:
-            cparams.codec_fmt = opj2.CODEC_J2K
+            outfile = self.filename.encode()
+            num_pad_bytes = opj2.PATH_LEN - len(outfile)
+            outfile += b'0' * num_pad_bytes
+            cparams.outfile = outfile
+
+            if self.filename[-4:].endswith(('.jp2', '.JP2')):
+                cparams.codec_fmt = opj2.CODEC_JP2
+            else:
+                cparams.codec_fmt = opj2.CODEC_J2K
 
         # Set defaults to lossless to begin.
         cparams.tcp_rates[0] = 0
@@ -567,9 +879,12 @@ class Jp2k(Jp2kBox):
             pos = opj.cio_tell(cio)
 
             blob = ctypes.string_at(cio.contents.buffer, pos)
-            fptr = open(self.filename, 'wb')
-            stack.callback(fptr.close)
-            fptr.write(blob)
+            if self.filename is None:
+                self._buffer = blob
+            else:
+                fptr = open(self.filename, 'wb')
+                stack.callback(fptr.close)
+                fptr.write(blob)
 
         self.parse()
 
@@ -715,6 +1030,7 @@ class Jp2k(Jp2kBox):
 
             self._colorspace = COLORSPACE_MAP[colorspace.lower()]
 
+    @opj2.profiled('write')
     def _write_openjp2(self, img_array, verbose=False):
         """
         Write JPEG 2000 file using OpenJPEG 2.x interface.
@@ -732,30 +1048,8 @@ class Jp2k(Jp2kBox):
 
             self._populate_image_struct(image, img_array)
 
-            codec = opj2.create_compress(self._cparams.codec_fmt)
-            stack.callback(opj2.destroy_codec, codec)
-
-            if self._verbose or verbose:
-                info_handler = _INFO_CALLBACK
-            else:
-                info_handler = None
-
-            opj2.set_info_handler(codec, info_handler)
-            opj2.set_warning_handler(codec, _WARNING_CALLBACK)
-            opj2.set_error_handler(codec, _ERROR_CALLBACK)
-
-            opj2.setup_encoder(codec, self._cparams, image)
-
-            if re.match("2.0", version.openjpeg_version) is not None:
-                fptr = libc.fopen(self.filename, 'wb')
-                strm = opj2.stream_create_default_file_stream(fptr, False)
-                stack.callback(opj2.stream_destroy, strm)
-                stack.callback(libc.fclose, fptr)
-            else:
-                # Introduced in 2.1 devel series.
-                strm = opj2.stream_create_default_file_stream(self.filename,
-                                                              False)
-                stack.callback(opj2.stream_destroy, strm)
+            codec, strm = self._setup_openjp2_encoder(stack, image,
+                                                      verbose=verbose)
 
             opj2.start_compress(codec, image, strm)
             opj2.encode(codec, strm)
@@ -764,6 +1058,133 @@ class Jp2k(Jp2kBox):
         # Refresh the metadata.
         self.parse()
 
+    def _setup_openjp2_encoder(self, stack, image, verbose=False):
+        """Create a libopenjp2 compressor and an output file stream.
+
+        The compression parameters must already have been populated.  All
+        resources are registered with the exit stack.
+
+        Parameters
+        ----------
+        stack : ExitStack
+            Owns the library resources.
+        image : reference to ImageType instance
+            Image structure describing the components.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+
+        Returns
+        -------
+        codec : CODEC_TYPE
+            The compressor, set up with the compression parameters.
+        stream : STREAM_TYPE_P
+            The file stream, or a memory stream if there is no filename.
+        """
+        codec = opj2.create_compress(self._cparams.codec_fmt)
+        stack.callback(opj2.destroy_codec, codec)
+
+        if self._verbose or verbose:
+            info_handler = _INFO_CALLBACK
+        else:
+            info_handler = None
+
+        opj2.set_info_handler(codec, info_handler, codec)
+        opj2.set_warning_handler(codec, _WARNING_CALLBACK, codec)
+        opj2.set_error_handler(codec, _ERROR_CALLBACK, codec)
+
+        opj2.setup_encoder(codec, self._cparams, image)
+
+        if self.filename is None:
+            # The encoded bytes accumulate in the buffer.
+            sink = _CallbackStream()
+            strm = sink.open(stack)
+            self._buffer = sink.buffer
+        elif re.match("2.0", version.openjpeg_version) is not None:
+            fptr = libc.fopen(self.filename, 'wb')
+            strm = opj2.stream_create_default_file_stream(fptr, False)
+            stack.callback(opj2.stream_destroy, strm)
+            stack.callback(libc.fclose, fptr)
+        else:
+            # Introduced in 2.1 devel series.
+            strm = opj2.stream_create_default_file_stream(self.filename,
+                                                          False)
+            stack.callback(opj2.stream_destroy, strm)
+
+        return codec, strm
+
+    def tile_writer(self, shape, tilesize, dtype=np.uint8, verbose=False,
+                    max_pending=None, **kwargs):
+        """Open a writer that encodes the image one tile at a time.
+
+        Only the tile being written needs to be in memory, so this is the way
+        to create images that are too large to fit in memory.  The library
+        encodes the tiles in raster order, tiles given out of order are held
+        in memory until all of the preceding tiles have been written, so
+        write the tiles in raster order or limit them with max_pending.
+
+        Parameters
+        ----------
+        shape : tuple
+            Size of the image, (numrows, numcols) or (numrows, numcols,
+            numbands).  If None, the shape given to the constructor is used.
+        tilesize : tuple
+            Tile size (numrows, numcols).
+        dtype : numpy datatype, optional
+            Either np.uint8 or np.uint16.  Tiles must have this datatype.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+        max_pending : int, optional
+            Most tiles that may be held waiting for the preceding tiles.  If
+            None, there is no limit.
+        kwargs : dict
+            Any of the compression keywords accepted by the constructor,
+            except for tilesize.
+
+        Returns
+        -------
+        writer : TileWriter
+            Context manager, the codestream is finished when the context is
+            exited.  If writing fails, the incomplete file is removed.
+
+        Examples
+        --------
+        >>> import glymur, numpy as np, tempfile
+        >>> image = glymur.Jp2k(glymur.data.nemo())[:]
+        >>> tfile = tempfile.NamedTemporaryFile(suffix='.jp2')
+        >>> jp2 = glymur.Jp2k(tfile.name, shape=image.shape)
+        >>> with jp2.tile_writer(image.shape, (512, 512)) as writer:
+        ...     for tile_row, tile_col in np.ndindex(writer.tile_grid):
+        ...         rows, cols = writer.tile_slices(tile_row, tile_col)
+        ...         writer[tile_row, tile_col] = image[rows, cols]
+        >>> jp2.codestream.segment[1].xtsiz
+        512
+        """
+        if opj2.OPENJP2 is None:
+            raise RuntimeError("You must have at least version 2.0.0 of "
+                               "OpenJPEG installed before using this "
+                               "functionality.")
+        if 'tilesize' in kwargs:
+            raise TypeError("Specify the tile size only once.")
+
+        if shape is None:
+            shape = self.shape
+        self._shape = tuple(shape)
+
+        # Stand-in for the image with the proper shape and datatype, taking
+        # no memory, so that the compression parameters can be validated.
+        img_array = np.lib.stride_tricks.as_strided(
+            np.zeros(1, dtype=dtype), shape=self._shape,
+            strides=(0,) * len(self._shape))
+
+        self._determine_colorspace(**kwargs)
+        self._populate_cparams(img_array, tilesize=tilesize, **kwargs)
+        if img_array.ndim == 2:
+            img_array = img_array[:, :, np.newaxis]
+        self._populate_comptparms(img_array)
+
+        return TileWriter(self, dtype=dtype, verbose=verbose,
+                          max_pending=max_pending)
+
     def append(self, box):
         """Append a JP2 box to the file in-place.
 
@@ -777,6 +1198,10 @@ class Jp2k(Jp2kBox):
             msg = "Only JP2 files can currently have boxes appended to them."
             raise IOError(msg)
 
+        if self.filename is None:
+            msg = "Boxes can only be appended to a file given by its path."
+            raise IOError(msg)
+
         if not ((box.box_id == 'xml ') or
                 (box.box_id == 'uuid' and
                  box.uuid == UUID('be7acfcb-97a9-42e8-9c71-999491e3afac'))):
@@ -853,6 +1278,78 @@ class Jp2k(Jp2kBox):
         jp2 = Jp2k(filename)
         return jp2
 
+    def truncate_layers(self, dest, layers):
+        """Write a copy keeping only the first quality layers.
+
+        The packets of the other layers are dropped from the codestream
+        without decoding anything, which is much faster than decoding and
+        encoding the image again.  The packets must be located through PLT
+        segments or SOP segments, e.g. those written with ``sop=True``.  The
+        boxes of a JP2 file are copied as they are.
+
+        Parameters
+        ----------
+        dest : str
+            Path of the new file.
+        layers : int
+            Number of quality layers to keep.
+
+        Returns
+        -------
+        jp2 : Jp2k object
+            The new file.
+
+        Raises
+        ------
+        ValueError
+            If the number of layers is not positive.
+        IOError
+            If the packets cannot be located without decoding them, or the
+            codestream has progression order changes, packed packet headers,
+            or packet lengths in the main header (PLM).
+
+        Examples
+        --------
+        >>> import glymur, tempfile
+        >>> image = glymur.Jp2k(glymur.data.nemo())[::2, ::2]
+        >>> src = tempfile.NamedTemporaryFile(suffix='.jp2')
+        >>> jp2 = glymur.Jp2k(src.name, data=image, cratios=[80, 20, 5],
+        ...                   sop=True)
+        >>> dest = tempfile.NamedTemporaryFile(suffix='.jp2')
+        >>> preview = jp2.truncate_layers(dest.name, layers=1)
+        >>> preview.get_codestream().segment[2].layers
+        1
+        """
+        # Writing over a mapped file would pull it out from under the map.
+        in_place = (self.filename is not None and os.path.exists(dest) and
+                    os.path.samefile(dest, self.filename))
+        jp2c = [box for box in self.box if box.box_id == 'jp2c']
+        with self._map_source(copy=in_place) as data:
+            if len(jp2c) == 0:
+                # Raw codestream.
+                codestream = transcode.truncate_layers(data, layers)
+                with open(dest, 'wb') as ofile:
+                    ofile.write(codestream)
+                return Jp2k(dest)
+
+            box = jp2c[0]
+            start = box.main_header_offset
+            end = box.offset + box.length
+            codestream = transcode.truncate_layers(data[start:end], layers)
+            with open(dest, 'wb') as ofile:
+                # The boxes around the codestream are copied from the source
+                # as they are.
+                ofile.write(data[:box.offset])
+                if len(codestream) + 8 < 2 ** 32:
+                    ofile.write(struct.pack('>I4s', len(codestream) + 8,
+                                            b'jp2c'))
+                else:
+                    ofile.write(struct.pack('>I4sQ', 1, b'jp2c',
+                                            len(codestream) + 16))
+                ofile.write(codestream)
+                ofile.write(data[end:])
+        return Jp2k(dest)
+
     def _write_wrapped_codestream(self, ofile, box):
         """Write wrapped codestream."""
         # Codestreams require a bit more care.
@@ -862,8 +1359,7 @@ class Jp2k(Jp2kBox):
             # of myself out to file.
             ofile.write(struct.pack('>I', self.length + 8))
             ofile.write(b'jp2c')
-            with open(self.filename, 'rb') as ifile:
-                ofile.write(ifile.read())
+            ofile.write(self.to_bytes())
             return
 
         # OK, I'm a jp2/jpx file.  Need to find out where the raw codestream
@@ -881,7 +1377,7 @@ class Jp2k(Jp2kBox):
             offset = jp2c[0].offset
 
         # Ready to write the codestream.
-        with open(self.filename, 'rb') as ifile:
+        with self._open_source() as ifile:
             ifile.seek(offset)
 
             # Verify that the specified codestream is right.
@@ -893,7 +1389,7 @@ class Jp2k(Jp2kBox):
             if L == 0:
                 # The length of the box is presumed to last until the end of
                 # the file.  Compute the effective length of the box.
-                L = os.path.getsize(ifile.name) - ifile.tell() + 8
+                L = self.length - ifile.tell() + 8
 
             elif L == 1:
                 # The length of the box is in the XL field, a 64-bit value.
@@ -993,6 +1489,247 @@ class Jp2k(Jp2kBox):
         """
         Slicing protocol.
         """
+        return self._getitem(pargs)
+
+    def read_into(self, out, index=Ellipsis):
+        """Slice the image, decoding straight into an existing array.
+
+        No intermediate copy of the image is made, so this is the way to
+        decode large images into preallocated or memory-mapped arrays.
+
+        Parameters
+        ----------
+        out : ndarray
+            Destination array, possibly strided or memory-mapped.  It must
+            have the shape that slicing with the same index would produce.
+            The image data is cast to the datatype of the array.
+        index : slice, tuple, int, or Ellipsis, optional
+            Same index as would be used for slicing, e.g. np.s_[::2, ::2].
+            Defaults to the entire image.
+
+        Returns
+        -------
+        out : ndarray
+            The destination array.
+
+        Raises
+        ------
+        ValueError
+            If the destination array does not have the proper shape.
+
+        Examples
+        --------
+        >>> import glymur, numpy as np
+        >>> jfile = glymur.data.nemo()
+        >>> jp2 = glymur.Jp2k(jfile)
+        >>> thumbnail = np.zeros((728, 1296, 3), dtype=np.uint8)
+        >>> thumbnail = jp2.read_into(thumbnail, np.s_[::2, ::2])
+        """
+        self._getitem(index, out=out)
+        return out
+
+    def read_parallel(self, workers=None, executor=None, rlevel=0,
+                      layer=None, verbose=False):
+        """Decode the image in several processes at once.
+
+        The image is partitioned along the tile boundaries given by the SIZ
+        segment, and each partition is decoded by a worker process straight
+        into an array in shared memory, so no pixel data is sent back from
+        the workers.  An image consisting of a single tile is decoded by a
+        single worker.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of partitions to make, and of worker processes if no
+            executor is given.  Defaults to the number of processors.
+        executor : concurrent.futures.Executor, optional
+            Executor to run the workers, e.g. a long-lived ProcessPoolExecutor.
+            It is not shut down afterwards.  By default a process pool is
+            started for the duration of the call.
+        rlevel : int, optional
+            Factor by which to rlevel output resolution.  Use -1 to get the
+            lowest resolution thumbnail.
+        layer : int, optional
+            Number of quality layer to decode.  Defaults to the layer property.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+
+        Returns
+        -------
+        image : ndarray
+            The image data.
+
+        Raises
+        ------
+        RuntimeError
+            If the image is not in a file, if the image has differing
+            subsample factors, or if OpenJPEG 2 or the multiprocessing
+            shared_memory module is not available.
+
+        Examples
+        --------
+        >>> import glymur
+        >>> jfile = glymur.data.nemo()
+        >>> jp2 = glymur.Jp2k(jfile)
+        >>> image = jp2.read_parallel(workers=4)  # doctest: +SKIP
+        """
+        if version.openjpeg_version_tuple[0] < 2:
+            raise RuntimeError("You must have at least version 2.0.0 of "
+                               "OpenJPEG installed before using this "
+                               "functionality.")
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            msg = "Parallel reads require the multiprocessing.shared_memory "
+            msg += "module of Python 3.8 or later."
+            raise RuntimeError(msg)
+        if self.filename is None:
+            msg = "Only images read from a file can be decoded in parallel."
+            raise RuntimeError(msg)
+
+        self._subsampling_sanity_check()
+
+        # Validate the arguments here rather than in every worker.
+        dparams = self._populate_dparams(rlevel, layer=layer)
+        rlevel, layer = dparams.cp_reduce, dparams.cp_layer
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        siz = self.codestream.segment[1]
+        fx = siz.xrsiz[0] * 2 ** rlevel
+        fy = siz.yrsiz[0] * 2 ** rlevel
+        numbands = 1 if len(self.shape) == 2 else self.shape[2]
+        shape = (_ceildiv(siz.ysiz, fy) - _ceildiv(siz.yosiz, fy),
+                 _ceildiv(siz.xsiz, fx) - _ceildiv(siz.xosiz, fx),
+                 numbands)
+        dtype = np.dtype(self._image_dtype())
+
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=int(np.prod(shape)) *
+                                         dtype.itemsize)
+        try:
+            if executor is None:
+                import concurrent.futures
+                with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                    self._run_partitions(pool, workers, shm.name, shape,
+                                         dtype, rlevel, layer, verbose)
+            else:
+                self._run_partitions(executor, workers, shm.name, shape,
+                                     dtype, rlevel, layer, verbose)
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        if image.shape[2] == 1:
+            image.shape = image.shape[0:2]
+
+        return image
+
+    def _run_partitions(self, executor, workers, shm_name, shape, dtype,
+                        rlevel, layer, verbose):
+        """Decode the partitions of the image, waiting for all of them.
+
+        Every worker must be finished with the shared memory before it is
+        released, so all are waited for even if one of them fails.
+        """
+        siz = self.codestream.segment[1]
+        fx = siz.xrsiz[0] * 2 ** rlevel
+        fy = siz.yrsiz[0] * 2 ** rlevel
+
+        futures = []
+        for area in self._tile_partitions(workers):
+            rows = slice(_ceildiv(area[0], fy) - _ceildiv(siz.yosiz, fy),
+                         _ceildiv(area[2], fy) - _ceildiv(siz.yosiz, fy))
+            cols = slice(_ceildiv(area[1], fx) - _ceildiv(siz.xosiz, fx),
+                         _ceildiv(area[3], fx) - _ceildiv(siz.xosiz, fx))
+            if rows.start == rows.stop or cols.start == cols.stop:
+                continue
+            futures.append(executor.submit(
+                _read_partition, self.filename, shm_name, shape, dtype, area,
+                rows, cols, rlevel, layer, self.ignore_pclr_cmap_cdef,
+                self._verbose or verbose))
+
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as error:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    def _tile_partitions(self, num_partitions):
+        """Split the tile grid into rectangles of whole tiles.
+
+        Tile rows are split first, and tile columns as well when there are
+        fewer tile rows than partitions.
+
+        Parameters
+        ----------
+        num_partitions : int
+            Number of partitions wanted.  There are fewer if there are fewer
+            tiles.
+
+        Returns
+        -------
+        list
+            (first_row, first_col, last_row, last_col) of each partition on
+            the reference grid, clipped to the image.
+        """
+        siz = self.codestream.segment[1]
+        num_tiles_x = _ceildiv(siz.xsiz - siz.xtosiz, siz.xtsiz)
+        num_tiles_y = _ceildiv(siz.ysiz - siz.ytosiz, siz.ytsiz)
+
+        num_row_groups = max(min(num_tiles_y, num_partitions), 1)
+        num_col_groups = max(min(num_tiles_x,
+                                 num_partitions // num_row_groups), 1)
+
+        areas = []
+        for tile_rows in np.array_split(np.arange(num_tiles_y),
+                                        num_row_groups):
+            for tile_cols in np.array_split(np.arange(num_tiles_x),
+                                            num_col_groups):
+                y0 = siz.ytosiz + int(tile_rows[0]) * siz.ytsiz
+                x0 = siz.xtosiz + int(tile_cols[0]) * siz.xtsiz
+                y1 = siz.ytosiz + (int(tile_rows[-1]) + 1) * siz.ytsiz
+                x1 = siz.xtosiz + (int(tile_cols[-1]) + 1) * siz.xtsiz
+                areas.append((max(y0, siz.yosiz), max(x0, siz.xosiz),
+                              min(y1, siz.ysiz), min(x1, siz.xsiz)))
+        return areas
+
+    def _image_dtype(self):
+        """Datatype of the decoded image, as determined from the headers.
+
+        The palette, if there is one and it is applied, determines the
+        datatype, otherwise the SIZ segment does.  The datatype is wide
+        enough for every component.
+        """
+        bitdepths = self.codestream.segment[1].bitdepth
+        signed = self.codestream.segment[1].signed
+
+        jp2h = [box for box in self.box if box.box_id == 'jp2h']
+        if jp2h and not self.ignore_pclr_cmap_cdef:
+            pclr = [box for box in jp2h[0].box if box.box_id == 'pclr']
+            if pclr:
+                bitdepths = pclr[0].bits_per_component
+                signed = pclr[0].signed
+
+        dtypes = []
+        for prec, sgnd in zip(bitdepths, signed):
+            if prec > 16:
+                msg = "Unhandled precision: {0} bits.".format(prec)
+                raise RuntimeError(msg)
+            if sgnd:
+                dtypes.append(np.int8 if prec <= 8 else np.int16)
+            else:
+                dtypes.append(np.uint8 if prec <= 8 else np.uint16)
+        return np.result_type(*dtypes)
+
+    def _getitem(self, pargs, out=None):
+        """Slicing, optionally decoding into a given array."""
         if len(self.shape) == 2:
             numrows, numcols = self.shape
             numbands = 1
@@ -1004,18 +1741,20 @@ class Jp2k(Jp2kBox):
             # This retrieves a single row.
             row = pargs
             area = (row, 0, row + 1, numcols)
+            if out is not None:
+                return self._read(area=area, out=out[np.newaxis]).squeeze()
             return self._read(area=area).squeeze()
 
         if pargs is Ellipsis:
             # Case of jp2[...]
-            return self._read()
+            return self._read(out=out)
 
         if isinstance(pargs, slice):
             if (((pargs.start is None) and
                  (pargs.stop is None) and
                  (pargs.step is None))):
                 # Case of jp2[:]
-                return self._read()
+                return self._read(out=out)
 
             # Corner case of jp2[x] where x is a slice object with non-null
             # members.  Just augment it with an ellipsis and let the code
@@ -1027,7 +1766,7 @@ class Jp2k(Jp2kBox):
 
             # Run once again because it is possible that there's another
             # Ellipsis object in the 2nd or 3rd position.
-            return self.__getitem__(newindex)
+            return self._getitem(newindex, out=out)
 
         if isinstance(pargs, tuple) and any(isinstance(x, int) for x in pargs):
             # Replace the first such integer argument, replace it with a slice.
@@ -1040,7 +1779,9 @@ class Jp2k(Jp2kBox):
 
             # Invoke array-based slicing again, as there may be additional
             # integer argument remaining.
-            data = self.__getitem__(newindex)
+            if out is not None:
+                out = np.expand_dims(out, idx)
+            data = self._getitem(newindex, out=out)
 
             # Reduce dimensionality in the scalar dimension.
             return np.squeeze(data, axis=idx)
@@ -1074,33 +1815,116 @@ class Jp2k(Jp2kBox):
                 numrows if rows.stop is None else rows.stop,
                 numcols if cols.stop is None else cols.stop
                 )
-        data = self._read(area=area, rlevel=rlevel)
-        if len(pargs) == 2:
-            return data
+        if len(pargs) == 2 or bands == slice(None, None, None):
+            return self._read(area=area, rlevel=rlevel, out=out)
+
+        # Ok, 3 arguments in pargs.  Decode only the selected bands if the
+        # library can do so.
+        requested = list(np.arange(numbands)[bands])
+        components = self._decodable_components(requested)
+        if components is None:
+            data = self._read(area=area, rlevel=rlevel)[:, :, bands]
+        elif components == requested and out is not None:
+            return self._read(area=area, rlevel=rlevel, components=components,
+                              out=out)
+        else:
+            data = self._read(area=area, rlevel=rlevel, components=components)
+            data = self._select_bands(data, components, requested)
 
-        # Ok, 3 arguments in pargs.
-        return data[:, :, bands]
+        if out is not None:
+            if out.shape != data.shape:
+                raise ValueError(_BAD_OUT_SHAPE.format(out.shape, data.shape))
+            out[...] = data
+            return out
+        return data
 
-    def _read(self, **kwargs):
-        """Read a JPEG 2000 image.
+    def _decodable_components(self, bands):
+        """Determine the components to hand to opj_set_decoded_components.
+
+        Parameters
+        ----------
+        bands : list
+            Indices of the requested bands.
 
         Returns
         -------
-        img_array : ndarray
-            The image data.
-
-        Raises
-        ------
-        RuntimeError
-            if the proper version of the OpenJPEG library is not available
+        list or None
+            The sorted, unique component indices to decode, or None if all
+            components must be decoded.  That is the case when the library
+            cannot select components, when every component is requested, when
+            a palette, component mapping, or channel definition box would
+            rearrange the components, or when a requested band is among the
+            first three components of an image using the multiple component
+            transform, which the library skips for a subset.
         """
-        if re.match("0|1.[01234]", version.openjpeg_version):
-            raise RuntimeError("You must have at least version 1.5.0 of "
-                               "OpenJPEG installed before you can read "
-                               "JPEG2000 images.")
+        if not opj2.has_function('opj_set_decoded_components'):
+            return None
 
-        if version.openjpeg_version_tuple[0] < 2:
-            img = self._read_openjpeg(**kwargs)
+        components = sorted(set(int(band) for band in bands))
+        numcomps = len(self.codestream.segment[1].xrsiz)
+        if len(components) == numcomps:
+            return None
+
+        if not self.ignore_pclr_cmap_cdef:
+            jp2h = [box for box in self.box if box.box_id == 'jp2h']
+            if len(jp2h) > 0:
+                box_ids = [box.box_id for box in jp2h[0].box]
+                if any(x in box_ids for x in ['pclr', 'cmap', 'cdef']):
+                    return None
+
+        cod = [segment for segment in self.codestream.segment
+               if segment.marker_id == 'COD'][0]
+        if cod.spcod[3] and components[0] < 3:
+            return None
+
+        return components
+
+    def _select_bands(self, image, components, bands):
+        """Rearrange decoded components into the requested bands.
+
+        Parameters
+        ----------
+        image : ndarray or list
+            The image data as returned for the decoded components.
+        components : list
+            Indices of the decoded components.
+        bands : list
+            Indices of the requested bands.
+
+        Returns
+        -------
+        ndarray or list
+            The requested bands.
+        """
+        positions = [components.index(band) for band in bands]
+        if isinstance(image, list):
+            return [image[k] for k in positions]
+        if image.ndim == 2:
+            image = image[:, :, np.newaxis]
+        if positions == list(range(len(components))):
+            return image
+        return image[:, :, positions]
+
+    def _read(self, **kwargs):
+        """Read a JPEG 2000 image.
+
+        Returns
+        -------
+        img_array : ndarray
+            The image data.
+
+        Raises
+        ------
+        RuntimeError
+            if the proper version of the OpenJPEG library is not available
+        """
+        if re.match("0|1.[01234]", version.openjpeg_version):
+            raise RuntimeError("You must have at least version 1.5.0 of "
+                               "OpenJPEG installed before you can read "
+                               "JPEG2000 images.")
+
+        if version.openjpeg_version_tuple[0] < 2:
+            img = self._read_openjpeg(**kwargs)
         else:
             img = self._read_openjp2(**kwargs)
         return img
@@ -1117,7 +1941,8 @@ class Jp2k(Jp2kBox):
         #     lowest resolution thumbnail.  This is the only keyword option
         #     available to use when the OpenJPEG version is 1.5 or earlier.
         # layer : int, optional
-        #     Number of quality layer to decode.
+        #     Number of quality layer to decode.  Defaults to the layer
+        #     property, which is left as it is.
         # area : tuple, optional
         #     Specifies decoding image area,
         #     (first_row, first_col, last_row, last_col)
@@ -1125,6 +1950,8 @@ class Jp2k(Jp2kBox):
         #     Number of tile to decode.
         # verbose : bool, optional
         #     Print informational messages produced by the OpenJPEG library.
+        # out : ndarray, optional
+        #     Destination array for the image data, which is then returned.
         #
         # Returns
         # -------
@@ -1153,7 +1980,7 @@ class Jp2k(Jp2kBox):
             msg += "the read_bands method instead."
             raise RuntimeError(msg)
 
-    def _read_openjpeg(self, rlevel=0, verbose=False, area=None):
+    def _read_openjpeg(self, rlevel=0, verbose=False, area=None, out=None):
         """Read a JPEG 2000 image using libopenjpeg.
 
         Parameters
@@ -1166,6 +1993,9 @@ class Jp2k(Jp2kBox):
         area : tuple, optional
             Specifies decoding image area,
             (first_row, first_col, last_row, last_col)
+        out : ndarray, optional
+            Destination array for the image data.  Libopenjpeg always decodes
+            the entire image, so the area is copied into it.
 
         Returns
         -------
@@ -1179,13 +2009,13 @@ class Jp2k(Jp2kBox):
         """
         self._subsampling_sanity_check()
 
-        self._populate_dparams(rlevel)
+        dparams = self._populate_dparams(rlevel)
 
         with ExitStack() as stack:
             try:
-                self._dparams.decod_format = self._codec_format
+                dparams.decod_format = self._codec_format
 
-                dinfo = opj.create_decompress(self._dparams.decod_format)
+                dinfo = opj.create_decompress(dparams.decod_format)
 
                 event_mgr = opj.EventMgrType()
                 info_handler = ctypes.cast(_INFO_CALLBACK, ctypes.c_void_p)
@@ -1199,10 +2029,9 @@ class Jp2k(Jp2kBox):
                                                       ctypes.c_void_p)
                 opj.set_event_mgr(dinfo, ctypes.byref(event_mgr))
 
-                opj.setup_decoder(dinfo, self._dparams)
+                opj.setup_decoder(dinfo, dparams)
 
-                with open(self.filename, 'rb') as fptr:
-                    src = fptr.read()
+                src = self.to_bytes()
                 cio = opj.cio_open(dinfo, src)
 
                 raw_image = opj.decode(dinfo, cio)
@@ -1233,10 +2062,18 @@ class Jp2k(Jp2kBox):
             cols = slice(area[1], area[3], None)
             image = image[rows, cols]
 
+        if out is not None:
+            if out.shape != image.shape:
+                raise ValueError(_BAD_OUT_SHAPE.format(out.shape, image.shape))
+            out[...] = image
+            return out
+
         return image
 
+    @opj2.profiled('read')
     def _read_openjp2(self, rlevel=0, layer=None, area=None, tile=None,
-                      verbose=False):
+                      verbose=False, num_threads=None, out=None,
+                      components=None):
         """Read a JPEG 2000 image using libopenjp2.
 
         Parameters
@@ -1253,60 +2090,58 @@ class Jp2k(Jp2kBox):
             Number of tile to decode.
         verbose : bool, optional
             Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of threads used by the library to decode the image.
+            Defaults to the num_threads property.
+        out : ndarray, optional
+            Destination array for the image data.
+        components : list, optional
+            Unique indices of the components to decode, in the order in which
+            they are returned.  Defaults to all components.
 
         Returns
         -------
         image : ndarray
-            The image data.
+            The image data, or the destination array if one was given.
 
         Raises
         ------
         RuntimeError
             If the image has differing subsample factors.
         """
-        if layer is not None:
-            self._layer = layer
-
         self._subsampling_sanity_check()
 
-        self._populate_dparams(rlevel, tile=tile, area=area)
+        # The parameters are kept local, so that reads on other threads
+        # cannot change them half way through.
+        dparams = self._populate_dparams(rlevel, tile=tile, area=area,
+                                         layer=layer)
 
-        with ExitStack() as stack:
-            if re.match("2.1", version.openjpeg_version):
-                filename = self.filename
-                stream = opj2.stream_create_default_file_stream(filename, True)
-                stack.callback(opj2.stream_destroy, stream)
-            else:
-                fptr = libc.fopen(self.filename, 'rb')
-                stack.callback(libc.fclose, fptr)
-                stream = opj2.stream_create_default_file_stream(fptr, True)
-                stack.callback(opj2.stream_destroy, stream)
-            codec = opj2.create_decompress(self._codec_format)
-            stack.callback(opj2.destroy_codec, codec)
-
-            opj2.set_error_handler(codec, _ERROR_CALLBACK)
-            opj2.set_warning_handler(codec, _WARNING_CALLBACK)
-
-            if self._verbose or verbose:
-                opj2.set_info_handler(codec, _INFO_CALLBACK)
-            else:
-                opj2.set_info_handler(codec, None)
+        tile_cache = self._tile_cache
+        if tile_cache is not None and tile is None:
+            return self._read_cached(dparams, tile_cache,
+                                     verbose=self._verbose or verbose,
+                                     num_threads=num_threads, out=out,
+                                     components=components)
 
-            opj2.setup_decoder(codec, self._dparams)
-            raw_image = opj2.read_header(stream, codec)
-            stack.callback(opj2.image_destroy, raw_image)
+        with ExitStack() as stack:
+            stream, codec, raw_image = self._setup_openjp2_decoder(
+                stack, dparams, verbose=self._verbose or verbose,
+                num_threads=num_threads, components=components)
 
-            if self._dparams.nb_tile_to_decode:
+            if dparams.nb_tile_to_decode:
                 opj2.get_decoded_tile(codec, stream, raw_image,
-                                      self._dparams.tile_index)
+                                      dparams.tile_index)
             else:
                 opj2.set_decode_area(codec, raw_image,
-                                     self._dparams.DA_x0, self._dparams.DA_y0,
-                                     self._dparams.DA_x1, self._dparams.DA_y1)
+                                     dparams.DA_x0, dparams.DA_y0,
+                                     dparams.DA_x1, dparams.DA_y1)
                 opj2.decode(codec, stream, raw_image)
 
             opj2.end_decompress(codec, stream)
 
+            if out is not None:
+                return self._extract_image(raw_image, out=out)
+
             image = self._extract_image(raw_image)
 
         if image.shape[2] == 1:
@@ -1314,7 +2149,357 @@ class Jp2k(Jp2kBox):
 
         return image
 
-    def _populate_dparams(self, rlevel, tile=None, area=None):
+    def _read_cached(self, dparams, tile_cache, verbose=False,
+                     num_threads=None, out=None, components=None):
+        """Assemble an image window from the tile cache.
+
+        Only the tiles that are not already cached are decoded.  The library
+        cannot decode a subset of the components of a single tile, so all
+        bands of a missing tile are decoded and cached.
+
+        Parameters
+        ----------
+        dparams : DecompressionParametersType
+            Decompression parameters made by _populate_dparams.
+        tile_cache : TileCache
+            Cache to use.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of threads used by the library to decode the image.
+        out : ndarray, optional
+            Destination array for the image data.
+        components : list, optional
+            Unique indices of the components to return.
+
+        Returns
+        -------
+        image : ndarray
+            The image data, or the destination array if one was given.
+        """
+        rlevel = dparams.cp_reduce
+        layer = dparams.cp_layer
+
+        # The cache may be shared with other files.
+        if self.filename is None:
+            source = self._cache_token
+        else:
+            source = MetadataCache.key(self.filename)
+
+        (numrows, numcols), pieces = self._window_tiles(dparams)
+        numbands = 1 if len(self.shape) == 2 else self.shape[2]
+        bands = list(range(numbands)) if components is None else components
+        shape = (numrows, numcols, len(bands))
+        tiles = [piece[0] for piece in pieces]
+
+        cached = {}
+        missing = []
+        for tile in tiles:
+            for band in bands:
+                data = tile_cache.get((source, tile, rlevel, layer, band))
+                if data is None:
+                    if tile not in missing:
+                        missing.append(tile)
+                else:
+                    cached[tile, band] = data
+
+        for tile, image in self._decode_tiles(missing, dparams, verbose,
+                                              num_threads):
+            for band in range(numbands):
+                data = image[:, :, band].copy()
+                tile_cache.put((source, tile, rlevel, layer, band), data)
+                cached[tile, band] = data
+
+        if out is None:
+            dtype = np.result_type(*[data.dtype for data in cached.values()])
+            image = np.empty(shape, dtype=dtype)
+        else:
+            image = out[:, :, np.newaxis] if out.ndim == 2 else out
+            if image.shape != shape:
+                raise ValueError(_BAD_OUT_SHAPE.format(out.shape, shape))
+
+        for tile, src_rows, src_cols, dest_rows, dest_cols in pieces:
+            for k, band in enumerate(bands):
+                data = cached[tile, band]
+                image[dest_rows, dest_cols, k] = data[src_rows, src_cols]
+
+        if out is not None:
+            return out
+
+        if image.shape[2] == 1:
+            image.shape = image.shape[0:2]
+
+        return image
+
+    def _window_tiles(self, dparams):
+        """Lay out an image window over the tiles that it overlaps.
+
+        Parameters
+        ----------
+        dparams : DecompressionParametersType
+            Decompression parameters made by _populate_dparams.
+
+        Returns
+        -------
+        shape : tuple
+            Number of rows and columns of the decoded window.
+        pieces : list
+            (tile, src_rows, src_cols, dest_rows, dest_cols) for each tile
+            overlapping the window.  The slices locate the overlap within the
+            decoded tile and within the decoded window.
+
+        Raises
+        ------
+        IOError
+            If the window lies outside the image or is too small.
+        """
+        siz = self.codestream.segment[1]
+        rlevel = dparams.cp_reduce
+
+        # The window on the reference grid.  The library clips the decode
+        # area to the image, so do the same.
+        x0, y0 = max(dparams.DA_x0, siz.xosiz), max(dparams.DA_y0, siz.yosiz)
+        x1, y1 = dparams.DA_x1, dparams.DA_y1
+        if x1 == 0 and y1 == 0:
+            x1, y1 = siz.xsiz, siz.ysiz
+        x1, y1 = min(x1, siz.xsiz), min(y1, siz.ysiz)
+        if x0 >= x1 or y0 >= y1:
+            msg = "The decode area {0} lies outside the image."
+            raise IOError(msg.format((y0, x0, y1, x1)))
+
+        # Scale factors from the reference grid to the decoded image.
+        fx = siz.xrsiz[0] * 2 ** rlevel
+        fy = siz.yrsiz[0] * 2 ** rlevel
+
+        shape = (_ceildiv(y1, fy) - _ceildiv(y0, fy),
+                 _ceildiv(x1, fx) - _ceildiv(x0, fx))
+        if shape[0] == 0 or shape[1] == 0:
+            raise IOError("Decoded area is too small.")
+
+        num_tiles_x = _ceildiv(siz.xsiz - siz.xtosiz, siz.xtsiz)
+        pieces = []
+        for row in range((y0 - siz.ytosiz) // siz.ytsiz,
+                         _ceildiv(y1 - siz.ytosiz, siz.ytsiz)):
+            for col in range((x0 - siz.xtosiz) // siz.xtsiz,
+                             _ceildiv(x1 - siz.xtosiz, siz.xtsiz)):
+                tx0 = max(siz.xtosiz + col * siz.xtsiz, siz.xosiz)
+                ty0 = max(siz.ytosiz + row * siz.ytsiz, siz.yosiz)
+                tx1 = min(siz.xtosiz + (col + 1) * siz.xtsiz, siz.xsiz)
+                ty1 = min(siz.ytosiz + (row + 1) * siz.ytsiz, siz.ysiz)
+
+                # The overlap of the tile and the window in decoded
+                # coordinates.
+                r0, r1 = max(ty0, y0), min(ty1, y1)
+                c0, c1 = max(tx0, x0), min(tx1, x1)
+                r0, r1 = _ceildiv(r0, fy), _ceildiv(r1, fy)
+                c0, c1 = _ceildiv(c0, fx), _ceildiv(c1, fx)
+                if r0 == r1 or c0 == c1:
+                    continue
+
+                pieces.append((
+                    row * num_tiles_x + col,
+                    slice(r0 - _ceildiv(ty0, fy), r1 - _ceildiv(ty0, fy)),
+                    slice(c0 - _ceildiv(tx0, fx), c1 - _ceildiv(tx0, fx)),
+                    slice(r0 - _ceildiv(y0, fy), r1 - _ceildiv(y0, fy)),
+                    slice(c0 - _ceildiv(x0, fx), c1 - _ceildiv(x0, fx))))
+
+        return shape, pieces
+
+    def _decode_tiles(self, tiles, dparams, verbose=False, num_threads=None):
+        """Decode whole tiles, one after another.
+
+        Parameters
+        ----------
+        tiles : list
+            Indices of the tiles to decode.
+        dparams : DecompressionParametersType
+            Decompression parameters made by _populate_dparams.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of threads used by the library to decode the image.
+
+        Yields
+        ------
+        tile : int
+            Index of the tile.
+        image : ndarray
+            The decoded tile, always 3D.
+        """
+        if opj2.REDECODE_SUPPORTED:
+            groups = [tiles] if len(tiles) > 0 else []
+        else:
+            # Older libraries need a fresh codec for each tile.
+            groups = [[tile] for tile in tiles]
+
+        for group in groups:
+            with ExitStack() as stack:
+                stream, codec, raw_image = self._setup_openjp2_decoder(
+                    stack, dparams, verbose=verbose, num_threads=num_threads)
+                for tile in group:
+                    opj2.get_decoded_tile(codec, stream, raw_image, tile)
+                    yield tile, self._extract_image(raw_image)
+
+    def _setup_openjp2_decoder(self, stack, dparams, verbose=False,
+                               num_threads=None, components=None,
+                               streams=None):
+        """Create a libopenjp2 stream and codec and read the image header.
+
+        All resources are registered with the exit stack, so they are released
+        when the stack is closed.
+
+        Parameters
+        ----------
+        stack : ExitStack
+            Owns the library resources.
+        dparams : DecompressionParametersType
+            Decompression parameters made by _populate_dparams.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of decoding threads.  Defaults to the num_threads
+            property, or failing that, to the decoding options.
+        components : list, optional
+            Unique indices of the components to decode.  Defaults to all
+            components.
+        streams : list, optional
+            The _CallbackStream made for a buffer or range reader is appended,
+            so that read errors can be raised while the stack is still open.
+            They are raised when it is closed in any case.
+
+        Returns
+        -------
+        stream : STREAM_TYPE_P
+            The file stream, or a memory stream if there is no filename.
+        codec : CODEC_TYPE
+            The decompressor, set up with the decompression parameters.
+        image : reference to ImageType instance
+            The image structure initialized by reading the header.
+        """
+        if self._buffer is not None or self._reader is not None:
+            callback_stream = _CallbackStream(buffer=self._buffer,
+                                              reader=self._reader)
+            stream = callback_stream.open(stack)
+            if streams is not None:
+                streams.append(callback_stream)
+        elif re.match("2.1", version.openjpeg_version):
+            # API change in 2.1
+            filename = self.filename
+            stream = opj2.stream_create_default_file_stream(filename, True)
+            stack.callback(opj2.stream_destroy, stream)
+        else:
+            fptr = libc.fopen(self.filename, 'rb')
+            stack.callback(libc.fclose, fptr)
+            stream = opj2.stream_create_default_file_stream(fptr, True)
+            stack.callback(opj2.stream_destroy, stream)
+        codec = opj2.create_decompress(self._codec_format)
+        stack.callback(opj2.destroy_codec, codec)
+
+        # The codec is the handlers' user data, so that its messages are kept
+        # apart from those of codecs in use on other threads.
+        opj2.set_error_handler(codec, _ERROR_CALLBACK, codec)
+        opj2.set_warning_handler(codec, _WARNING_CALLBACK, codec)
+        if verbose:
+            opj2.set_info_handler(codec, _INFO_CALLBACK, codec)
+        else:
+            opj2.set_info_handler(codec, None)
+
+        opj2.setup_decoder(codec, dparams)
+        self._set_decoder_threads(codec, num_threads)
+        image = opj2.read_header(stream, codec)
+        stack.callback(opj2.image_destroy, image)
+
+        if components is not None:
+            opj2.set_decoded_components(codec, components)
+
+        return stream, codec, image
+
+    def _set_decoder_threads(self, codec, num_threads=None):
+        """Allocate worker threads for a decompressor.
+
+        The library only accepts this between setting up the decoder and
+        reading the header.  If the library cannot decode with threads, a
+        warning is issued and decoding proceeds in a single thread.
+
+        Parameters
+        ----------
+        codec : CODEC_TYPE
+            The decompressor.
+        num_threads : int, optional
+            Number of decoding threads.
+        """
+        if num_threads is None:
+            num_threads = self._num_threads
+        if num_threads is None:
+            num_threads = _decodeoptions['num_threads']
+        else:
+            _validate_num_threads(num_threads)
+
+        if num_threads == 1:
+            return
+
+        if (((not opj2.has_function('opj_codec_set_threads')) or
+             (not opj2.has_thread_support()))):
+            msg = "The OpenJPEG library ({0}) does not support multi-threaded "
+            msg += "decoding, so {1} threads cannot be used.  Decoding will "
+            msg += "proceed with a single thread."
+            msg = msg.format(version.openjpeg_version, num_threads)
+            warnings.warn(msg, UserWarning)
+            return
+
+        opj2.codec_set_threads(codec, num_threads)
+
+    def open_decoder(self, layer=None, verbose=False, num_threads=None):
+        """Open a decoder session for repeated reads of the same image.
+
+        The stream, codec, and image header are kept alive for the lifetime
+        of the session, so a sequence of small window reads does not pay for
+        setting up the codec and parsing the main header over and over again.
+        Windows of tiled images are put together from the tiles they overlap,
+        each of them decoded whole.  Changing the layer sets up the codec
+        again, as does every read with libraries that cannot decode twice
+        with the same codec.
+
+        Parameters
+        ----------
+        layer : int, optional
+            Number of quality layer to decode.  Defaults to the layer
+            property.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of threads used by the library to decode the image.
+            Defaults to the num_threads property.
+
+        Returns
+        -------
+        decoder : Decoder
+            Context manager, all library resources are released when the
+            context is exited.
+
+        Examples
+        --------
+        >>> import glymur
+        >>> jfile = glymur.data.nemo()
+        >>> jp2 = glymur.Jp2k(jfile)
+        >>> with jp2.open_decoder() as decoder:
+        ...     window = decoder.read(area=(0, 0, 256, 256))
+        ...     thumbnail = decoder.read(rlevel=1)
+        >>> window.shape
+        (256, 256, 3)
+        >>> thumbnail.shape
+        (728, 1296, 3)
+        """
+        if version.openjpeg_version_tuple[0] < 2:
+            raise RuntimeError("You must have at least version 2.0.0 of "
+                               "OpenJPEG installed before using this "
+                               "functionality.")
+        self._subsampling_sanity_check()
+        layer = self._layer if layer is None else layer
+        return Decoder(self, layer=layer, verbose=self._verbose or verbose,
+                       num_threads=num_threads)
+
+    def _populate_dparams(self, rlevel, tile=None, area=None, layer=None):
         """Populate decompression structure with appropriate input parameters.
 
         Parameters
@@ -1326,6 +2511,13 @@ class Jp2k(Jp2kBox):
             (first_row, first_col, last_row, last_col)
         tile : int
             Number of tile to decode.
+        layer : int, optional
+            Number of quality layer to decode.  Defaults to the layer property.
+
+        Returns
+        -------
+        dparam : DecompressionParametersType
+            The parameters, also kept as the _dparams attribute.
         """
         if opj2.OPENJP2 is not None:
             dparam = opj2.set_default_decoder_parameters()
@@ -1333,17 +2525,18 @@ class Jp2k(Jp2kBox):
             dparam = opj.DecompressionParametersType()
             opj.set_default_decoder_parameters(ctypes.byref(dparam))
 
-        infile = self.filename.encode()
-        nelts = opj2.PATH_LEN - len(infile)
-        infile += b'0' * nelts
-        dparam.infile = infile
+        if self.filename is not None:
+            infile = self.filename.encode()
+            nelts = opj2.PATH_LEN - len(infile)
+            infile += b'0' * nelts
+            dparam.infile = infile
 
         # Return raw codestream components instead of "interpolating" the
         # colormap?
         dparam.flags |= 1 if self.ignore_pclr_cmap_cdef else 0
 
         dparam.decod_format = self._codec_format
-        dparam.cp_layer = self._layer
+        dparam.cp_layer = self._layer if layer is None else layer
 
         # Must check the specified rlevel against the maximum.
         if rlevel != 0:
@@ -1374,9 +2567,11 @@ class Jp2k(Jp2kBox):
             dparam.nb_tile_to_decode = 1
 
         self._dparams = dparam
+        return dparam
 
     def read_bands(self, rlevel=0, layer=None, area=None, tile=None,
-                   verbose=False, ignore_pclr_cmap_cdef=False):
+                   verbose=False, ignore_pclr_cmap_cdef=False,
+                   num_threads=None, bands=None):
         """Read a JPEG 2000 image.
 
         The only time you should use this method is when the image has
@@ -1386,7 +2581,7 @@ class Jp2k(Jp2kBox):
         Parameters
         ----------
         layer : int, optional
-            Number of quality layer to decode.
+            Number of quality layer to decode.  Defaults to the layer property.
         rlevel : int, optional
             Factor by which to rlevel output resolution.
         area : tuple, optional
@@ -1399,6 +2594,12 @@ class Jp2k(Jp2kBox):
             color transformation.  Defaults to False.
         verbose : bool, optional
             Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of threads used by the library to decode the image.
+            Defaults to the num_threads property.
+        bands : sequence of int, optional
+            Indices of the bands to read.  When the library supports it, only
+            these components are decoded.  Defaults to all bands.
 
         Returns
         -------
@@ -1422,50 +2623,179 @@ class Jp2k(Jp2kBox):
                                "functionality.")
 
         self.ignore_pclr_cmap_cdef = ignore_pclr_cmap_cdef
-        if layer is not None:
-            self._layer = layer
-        self._populate_dparams(rlevel, tile=tile, area=area)
+        dparams = self._populate_dparams(rlevel, tile=tile, area=area,
+                                         layer=layer)
 
-        with ExitStack() as stack:
-            if re.match("2.1", version.openjpeg_version):
-                # API change in 2.1
-                filename = self.filename
-                stream = opj2.stream_create_default_file_stream(filename, True)
-                stack.callback(opj2.stream_destroy, stream)
-            else:
-                fptr = libc.fopen(self.filename, 'rb')
-                stack.callback(libc.fclose, fptr)
-                stream = opj2.stream_create_default_file_stream(fptr, True)
-                stack.callback(opj2.stream_destroy, stream)
-            codec = opj2.create_decompress(self._codec_format)
-            stack.callback(opj2.destroy_codec, codec)
-
-            opj2.set_error_handler(codec, _ERROR_CALLBACK)
-            opj2.set_warning_handler(codec, _WARNING_CALLBACK)
-            if verbose:
-                opj2.set_info_handler(codec, _INFO_CALLBACK)
-            else:
-                opj2.set_info_handler(codec, None)
+        components = None
+        if bands is not None:
+            bands = [int(band) for band in bands]
+            components = self._decodable_components(bands)
 
-            opj2.setup_decoder(codec, self._dparams)
-            image = opj2.read_header(stream, codec)
-            stack.callback(opj2.image_destroy, image)
+        with ExitStack() as stack:
+            stream, codec, image = self._setup_openjp2_decoder(
+                stack, dparams, verbose=verbose, num_threads=num_threads,
+                components=components)
 
-            if self._dparams.nb_tile_to_decode:
+            if dparams.nb_tile_to_decode:
                 opj2.get_decoded_tile(codec, stream, image,
-                                      self._dparams.tile_index)
+                                      dparams.tile_index)
             else:
                 opj2.set_decode_area(codec, image,
-                                     self._dparams.DA_x0, self._dparams.DA_y0,
-                                     self._dparams.DA_x1, self._dparams.DA_y1)
+                                     dparams.DA_x0, dparams.DA_y0,
+                                     dparams.DA_x1, dparams.DA_y1)
                 opj2.decode(codec, stream, image)
                 opj2.end_decompress(codec, stream)
 
             lst = self._extract_image(image)
 
+        if bands is not None:
+            if components is None:
+                numbands = len(lst) if isinstance(lst, list) else lst.shape[2]
+                components = list(range(numbands))
+            lst = self._select_bands(lst, components, bands)
+
         return lst
 
-    def _extract_image(self, raw_image):
+    def iter_tiles(self, rlevel=0, layer=None, verbose=False,
+                   num_threads=None):
+        """Iterate over the decoded tiles of an image.
+
+        The tiles are decoded one at a time in codestream order by a single
+        codec, so the main header is only read once and no more than one
+        decoded tile is held in memory by the iterator.  The palette and
+        component mapping boxes are not applied.
+
+        Parameters
+        ----------
+        rlevel : int, optional
+            Factor by which to rlevel output resolution.  Use -1 to get the
+            lowest resolution thumbnail.
+        layer : int, optional
+            Number of quality layer to decode.  Defaults to the layer property.
+        verbose : bool, optional
+            Print informational messages produced by the OpenJPEG library.
+        num_threads : int, optional
+            Number of threads used by the library to decode each tile.
+            Defaults to the num_threads property.
+
+        Yields
+        ------
+        tile_index : int
+            Index of the tile in the codestream.
+        rows, cols : slice
+            Location of the tile in the image decoded at the same rlevel.
+        tile : ndarray
+            The decoded tile.
+
+        Examples
+        --------
+        >>> import glymur
+        >>> jfile = glymur.data.nemo()
+        >>> jp2 = glymur.Jp2k(jfile)
+        >>> for tile_index, rows, cols, tile in jp2.iter_tiles(rlevel=1):
+        ...     print('{0}: rows {1}-{2}, columns {3}-{4}'.format(
+        ...         tile_index, rows.start, rows.stop, cols.start, cols.stop))
+        0: rows 0-728, columns 0-1296
+        """
+        if version.openjpeg_version_tuple[0] < 2:
+            raise RuntimeError("You must have at least version 2.0.0 of "
+                               "OpenJPEG installed before using this "
+                               "functionality.")
+        self._subsampling_sanity_check()
+
+        # Validate the arguments now rather than upon the first iteration.
+        # Each sample must fit in the one or two bytes the tile data is
+        # taken apart by.
+        for prec in self.codestream.segment[1].bitdepth:
+            if prec > 16:
+                msg = "Unhandled precision: {0} bits.".format(prec)
+                raise RuntimeError(msg)
+        dparams = self._populate_dparams(rlevel, layer=layer)
+
+        return self._iter_tiles(dparams, verbose=self._verbose or verbose,
+                                num_threads=num_threads)
+
+    def _iter_tiles(self, dparams, verbose=False, num_threads=None):
+        """Generator behind iter_tiles."""
+        rlevel = dparams.cp_reduce
+        with ExitStack() as stack:
+            stream, codec, image = self._setup_openjp2_decoder(
+                stack, dparams, verbose=verbose, num_threads=num_threads)
+
+            ncomps = image.contents.numcomps
+            dtypes = [self._component2dtype(image.contents.comps[k])
+                      for k in range(ncomps)]
+
+            # All components share the same subsampling, so the tile extent
+            # on the reference grid maps to the same extent in every band.
+            dx = image.contents.comps[0].dx * 2 ** rlevel
+            dy = image.contents.comps[0].dy * 2 ** rlevel
+            siz = self.codestream.segment[1]
+            row_origin = _ceildiv(siz.yosiz, dy)
+            col_origin = _ceildiv(siz.xosiz, dx)
+
+            while True:
+                tile_index, data_size, x0, y0, x1, y1, _, go_on = \
+                    opj2.read_tile_header(codec, stream)
+                if not go_on:
+                    break
+
+                data = np.empty(data_size, dtype=np.uint8)
+                opj2.decode_tile_data(codec, tile_index, data, data_size,
+                                      stream)
+
+                row0, row1 = _ceildiv(y0, dy), _ceildiv(y1, dy)
+                col0, col1 = _ceildiv(x0, dx), _ceildiv(x1, dx)
+                tile = self._tile_data_to_array(data, row1 - row0,
+                                                col1 - col0, dtypes)
+
+                rows = slice(row0 - row_origin, row1 - row_origin)
+                cols = slice(col0 - col_origin, col1 - col_origin)
+                yield tile_index, rows, cols, tile
+
+            opj2.end_decompress(codec, stream)
+
+    def _tile_data_to_array(self, data, nrows, ncols, dtypes):
+        """Rearrange the output of decode_tile_data.
+
+        The library writes each component in turn, with each sample taking
+        either one or two bytes depending upon the precision.
+
+        Parameters
+        ----------
+        data : ndarray
+            The raw bytes written by the library.
+        nrows, ncols : int
+            The dimensions of each component.
+        dtypes : list
+            The numpy datatype of each component.
+
+        Returns
+        -------
+        tile : list or ndarray
+            If the components have differing datatypes, they are returned
+            in a list, otherwise a numpy array.
+        """
+        bands = []
+        offset = 0
+        for dtype in dtypes:
+            nbytes = nrows * ncols * np.dtype(dtype).itemsize
+            band = data[offset:offset + nbytes].view(dtype)
+            bands.append(band.reshape(nrows, ncols))
+            offset += nbytes
+
+        if any(dtype != dtypes[0] for dtype in dtypes):
+            return [band.copy() for band in bands]
+
+        if len(bands) == 1:
+            return bands[0].copy()
+
+        return np.dstack(bands)
+
+    @opj2.profiled('extract',
+                   bytes_in=lambda args, _: opj2.image_nbytes(args[1]),
+                   bytes_out=_extracted_nbytes)
+    def _extract_image(self, raw_image, out=None):
         """
         Extract unequally-sized image bands.
 
@@ -1473,13 +2803,22 @@ class Jp2k(Jp2kBox):
         ----------
         raw_image : reference to openjpeg ImageType instance
             The image structure initialized with image characteristics.
+        out : ndarray, optional
+            Destination array for equally-sized bands.  Either 3D, or 2D if
+            there is just a single band.  The component data is cast directly
+            into it without any intermediate copies.
 
         Returns
         -------
         image : list or numpy array
             If the JPEG 2000 image has unequally-sized images, they are
-            extracted into a list, otherwise a numpy array.
+            extracted into a list, otherwise a numpy array.  If a destination
+            array was given, it is returned.
 
+        Raises
+        ------
+        ValueError
+            If the destination array does not match the image dimensions.
         """
         ncomps = raw_image.contents.numcomps
 
@@ -1491,13 +2830,23 @@ class Jp2k(Jp2kBox):
             dtypes.append(self._component2dtype(component))
             nrows.append(component.h)
             ncols.append(component.w)
-        is_cube = all(r == nrows[0] and c == ncols[0] and d == dtypes[0]
-                      for r, c, d in zip(nrows, ncols, dtypes))
-
-        if is_cube:
-            image = np.zeros((nrows[0], ncols[0], ncomps), dtypes[0])
+        if out is not None:
+            # The data is cast to the destination datatype, so only the
+            # dimensions need to agree.
+            image = out[:, :, np.newaxis] if out.ndim == 2 else out
+            shape = (nrows[0], ncols[0], ncomps)
+            if (((image.shape != shape) or
+                 any(r != nrows[0] or c != ncols[0]
+                     for r, c in zip(nrows, ncols)))):
+                raise ValueError(_BAD_OUT_SHAPE.format(out.shape, shape))
+            is_cube = True
         else:
-            image = []
+            is_cube = all(r == nrows[0] and c == ncols[0] and d == dtypes[0]
+                          for r, c, d in zip(nrows, ncols, dtypes))
+            if is_cube:
+                image = np.empty((nrows[0], ncols[0], ncomps), dtypes[0])
+            else:
+                image = []
 
         for k in range(raw_image.contents.numcomps):
             component = raw_image.contents.comps[k]
@@ -1511,12 +2860,18 @@ class Jp2k(Jp2kBox):
                 band = np.ctypeslib.as_array(
                     (ctypes.c_int32 * nelts).from_address(addr))
                 if is_cube:
-                    image[:, :, k] = np.reshape(band.astype(dtypes[k]),
-                                                (nrows[k], ncols[k]))
+                    # Cast straight from the library's buffer into the
+                    # destination rather than going through astype.
+                    np.copyto(image[:, :, k],
+                              np.reshape(band, (nrows[k], ncols[k])),
+                              casting='unsafe')
                 else:
                     image.append(np.reshape(band.astype(dtypes[k]),
                                  (nrows[k], ncols[k])))
 
+        if out is not None:
+            return out
+
         return image
 
     def _component2dtype(self, component):
@@ -1581,7 +2936,7 @@ class Jp2k(Jp2kBox):
             Signed:  (False, False, False)
             Vertical, Horizontal Subsampling:  ((1, 1), (1, 1), (1, 1))
         """
-        with open(self.filename, 'rb') as fptr:
+        with self._open_source() as fptr:
             if self._codec_format == opj2.CODEC_J2K:
                 codestream = Codestream(fptr, self.length,
                                         header_only=header_only)
@@ -1593,7 +2948,7 @@ class Jp2k(Jp2kBox):
                 if box_length == 0:
                     # The length of the box is presumed to last until the end
                     # of the file.  Compute the effective length of the box.
-                    box_length = os.path.getsize(fptr.name) - fptr.tell() + 8
+                    box_length = self.length - fptr.tell() + 8
                 elif box_length == 1:
                     # Seek past the XL field.
                     read_buffer = fptr.read(8)
@@ -1614,7 +2969,28 @@ class Jp2k(Jp2kBox):
             Image data to be written to file.
         """
 
-        numrows, numcols, num_comps = imgdata.shape
+        self._populate_image_header(image, imgdata.shape)
+
+        # Stage the image data to the openjpeg data structure.
+        for k in range(0, imgdata.shape[2]):
+            layer = np.ascontiguousarray(imgdata[:, :, k], dtype=np.int32)
+            dest = image.contents.comps[k].data
+            src = layer.ctypes.data
+            ctypes.memmove(dest, src, layer.nbytes)
+
+        return image
+
+    def _populate_image_header(self, image, shape):
+        """Populates the parts of the image struct that describe the image.
+
+        Parameters
+        ----------
+        image : ImageType(ctypes.Structure)
+            Corresponds to image_t type in openjp2 headers.
+        shape : tuple
+            Image dimensions (numrows, numcols, num_comps).
+        """
+        numrows, numcols, num_comps = shape
 
         # set image offset and reference grid
         image.contents.x0 = self._cparams.image_offset_x0
@@ -1624,7 +3000,6 @@ class Jp2k(Jp2kBox):
         image.contents.y1 = (image.contents.y0 +
                              (numrows - 1) * self._cparams.subsampling_dy + 1)
 
-        # Stage the image data to the openjpeg data structure.
         for k in range(0, num_comps):
             if re.match("2.0", version.openjpeg_version) is not None:
                 # 2.0 API
@@ -1638,13 +3013,6 @@ class Jp2k(Jp2kBox):
                     image.contents.comps[k].prec = 12
                     image.contents.comps[k].bpp = 12
 
-            layer = np.ascontiguousarray(imgdata[:, :, k], dtype=np.int32)
-            dest = image.contents.comps[k].data
-            src = layer.ctypes.data
-            ctypes.memmove(dest, src, layer.nbytes)
-
-        return image
-
     def _populate_comptparms(self, img_array):
         """Instantiate and populate comptparms structure.
 
@@ -1935,16 +3303,820 @@ class Jp2k(Jp2kBox):
                     self._validate_label(box.box)
 
 
+def encode(data, codec_format='jp2', **kwargs):
+    """Encode an image as JPEG 2000 without touching the file system.
+
+    Parameters
+    ----------
+    data : ndarray
+        Image data to be encoded.
+    codec_format : str, optional
+        Either 'jp2' for a JP2 file or 'j2k' for a raw codestream.
+    kwargs : dict, optional
+        Compression options, the same as those accepted by Jp2k when
+        writing a file.
+
+    Returns
+    -------
+    bytes
+        The encoded image.
+
+    Raises
+    ------
+    IOError
+        The codec format is not recognized.
+
+    Examples
+    --------
+    >>> import glymur
+    >>> image = glymur.Jp2k(glymur.data.nemo())[::2, ::2]
+    >>> payload = glymur.encode(image, cratios=[20])
+    >>> glymur.Jp2k.from_bytes(payload).shape
+    (728, 1296, 3)
+    """
+    formats = {'jp2': opj2.CODEC_JP2, 'j2k': opj2.CODEC_J2K}
+    try:
+        codec_format = formats[codec_format.lower()]
+    except KeyError:
+        msg = "The codec format must be one of {0}, not '{1}'."
+        raise IOError(msg.format(sorted(formats), codec_format))
+
+    jp2 = Jp2k(None, shape=data.shape)
+    jp2._codec_format = codec_format
+    jp2._write(data, **kwargs)
+    return jp2.to_bytes()
+
+
+def read_many(paths, rlevel=0, area=None, layer=None, workers=None,
+              ordered=True, executor=None, max_in_flight=None):
+    """Decode many files with a pool of worker processes.
+
+    The worker processes are reused from one file to the next, and load the
+    OpenJPEG library once when they start.  No more than max_in_flight files
+    are submitted to the workers at any time, so a long or endless iterable
+    of paths is consumed only as fast as the results are.  A file that cannot
+    be read is reported along with its error, and the rest of the batch is
+    still decoded.
+
+    Parameters
+    ----------
+    paths : iterable
+        Paths to the JPEG 2000 files.
+    rlevel : int, optional
+        Factor by which to rlevel output resolution.  Use -1 to get the
+        lowest resolution thumbnail.
+    area : tuple, optional
+        Specifies decoding image area,
+        (first_row, first_col, last_row, last_col)
+    layer : int, optional
+        Number of quality layer to decode.
+    workers : int, optional
+        Number of worker processes if no executor is given.  Defaults to the
+        number of processors.
+    ordered : bool, optional
+        If true, the results are yielded in the order of the paths, otherwise
+        as soon as they are ready.
+    executor : concurrent.futures.Executor, optional
+        Executor to run the workers, e.g. a process pool used for several
+        batches.  It is not shut down afterwards.  By default a process pool
+        is started for the duration of the batch.
+    max_in_flight : int, optional
+        Number of files submitted to the workers but not yet yielded.
+        Defaults to twice the number of workers.
+
+    Returns
+    -------
+    iterator
+        Yields (path, image, error) for each file, where image is the image
+        data, or None if the file could not be read, and error is the reason
+        that it could not be read, otherwise None.
+
+    Raises
+    ------
+    ValueError
+        If max_in_flight is not positive.
+
+    Examples
+    --------
+    >>> import glymur
+    >>> paths = [glymur.data.nemo(), glymur.data.goodstuff()]
+    >>> for path, image, error in glymur.read_many(paths, rlevel=1,
+    ...                                            workers=2):
+    ...     print(image.shape)  # doctest: +SKIP
+    (728, 1296, 3)
+    (400, 240, 3)
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    if max_in_flight < 1:
+        msg = "max_in_flight must be a positive integer, not {0}."
+        raise ValueError(msg.format(max_in_flight))
+
+    return _iter_read_many(paths, rlevel, area, layer, workers, ordered,
+                           executor, max_in_flight)
+
+
+def _iter_read_many(paths, rlevel, area, layer, workers, ordered, executor,
+                    max_in_flight):
+    """Generator behind read_many."""
+    import concurrent.futures
+    try:
+        from concurrent.futures.process import BrokenProcessPool
+    except ImportError:
+        # The futures backport for Python 2 has no such error, so catch
+        # nothing.
+        BrokenProcessPool = ()
+
+    def start_pool():
+        if sys.hexversion < 0x03070000:
+            # There is no initializer before 3.7.  The library is then loaded
+            # along with this module when a worker is given its first file.
+            return concurrent.futures.ProcessPoolExecutor(workers)
+        return concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker)
+
+    pool = None
+    if executor is None:
+        pool = executor = start_pool()
+
+    # Any object may be a path, so the end is marked by one of our own.
+    exhausted = object()
+    paths = iter(paths)
+    pending = deque()
+    try:
+        while True:
+            # Keep the workers busy, but no more than that.
+            while len(pending) < max_in_flight:
+                path = next(paths, exhausted)
+                if path is exhausted:
+                    break
+                args = (_read_file, path, rlevel, area, layer)
+                try:
+                    future = executor.submit(*args)
+                except BrokenProcessPool as error:
+                    # A worker died, and the files it was given have failed
+                    # with this same error.  A pool of our own is started
+                    # again, one given to us is of no more use.
+                    if pool is None:
+                        future = concurrent.futures.Future()
+                        future.set_exception(error)
+                    else:
+                        pool.shutdown(wait=False)
+                        pool = executor = start_pool()
+                        future = executor.submit(*args)
+                pending.append((path, future))
+            if not pending:
+                return
+
+            if ordered:
+                path, future = pending.popleft()
+            else:
+                concurrent.futures.wait([item[1] for item in pending],
+                                        return_when='FIRST_COMPLETED')
+                item = next(item for item in pending if item[1].done())
+                pending.remove(item)
+                path, future = item
+
+            try:
+                image = future.result()
+            except Exception as error:
+                yield path, None, error
+            else:
+                yield path, image, None
+    finally:
+        # The consumer may have stopped early.
+        for _, future in pending:
+            future.cancel()
+        if pool is not None:
+            pool.shutdown()
+
+
+_BAD_OUT_SHAPE = "The output array has shape {0}, but {1} is required."
+
+
+def _ceildiv(a, b):
+    """Integer division, rounding up."""
+    return -(-a // b)
+
+
+def _read_partition(filename, shm_name, shape, dtype, area, rows, cols,
+                    rlevel, layer, ignore_pclr_cmap_cdef, verbose):
+    """Decode one partition of an image into shared memory.
+
+    Runs in a worker process of Jp2k.read_parallel.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the JPEG 2000 file.
+    shm_name : str
+        Name of the shared memory block holding the output image.
+    shape, dtype : tuple, numpy.dtype
+        Shape and datatype of the output image, always 3D.
+    area : tuple
+        (first_row, first_col, last_row, last_col) to decode.
+    rows, cols : slice
+        Location of the partition in the output image.
+    rlevel, layer : int
+        Resolution level and quality layer to decode.
+    ignore_pclr_cmap_cdef, verbose : bool
+        Properties of the Jp2k object being read.
+    """
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        jp2 = Jp2k(filename)
+        jp2.ignore_pclr_cmap_cdef = ignore_pclr_cmap_cdef
+        jp2._read(area=area, rlevel=rlevel, layer=layer, verbose=verbose,
+                  out=image[rows, cols])
+        # The view must be gone before the block can be closed.
+        del image
+    finally:
+        shm.close()
+
+
+def _init_worker():
+    """Start a worker process of read_many.
+
+    The OpenJPEG library is loaded when the process starts rather than with
+    the first file.  Forked processes have it already.
+    """
+    import glymur.lib.openjp2
+
+
+def _read_file(path, rlevel, area, layer):
+    """Decode a file in a worker process of read_many."""
+    kwargs = {'rlevel': rlevel, 'area': area}
+    if layer is not None:
+        kwargs['layer'] = layer
+    return Jp2k(path)._read(**kwargs)
+
+
+_decodeoptions = {'num_threads': 1}
+
+
+def _validate_num_threads(num_threads):
+    """Check that a thread count is a positive integer."""
+    if not isinstance(num_threads, numbers.Integral) or num_threads < 1:
+        msg = "The number of threads must be a positive integer, not {0}."
+        raise ValueError(msg.format(num_threads))
+
+
+def set_decodeoptions(**kwargs):
+    """Set decoding options.
+
+    These options determine the way libopenjp2 decodes images when nothing
+    more specific is given to the Jp2k object or to the reading method.
+
+    Parameters
+    ----------
+    num_threads : int, optional
+        Number of threads the library uses to decode an image.  Values
+        larger than 1 require a library version of 2.2 or higher that was
+        built with thread support, otherwise a warning is issued and a single
+        thread is used.
+
+    See also
+    --------
+    get_decodeoptions
+
+    Examples
+    --------
+    To put back the default options, you can use:
+
+    >>> import glymur
+    >>> glymur.set_decodeoptions(num_threads=1)
+    """
+    for key, value in kwargs.items():
+        if key not in ['num_threads']:
+            raise TypeError('"{0}" not a valid keyword parameter.'.format(key))
+        if key == 'num_threads':
+            _validate_num_threads(value)
+        _decodeoptions[key] = value
+
+
+def get_decodeoptions():
+    """Return the current decoding options.
+
+    Returns
+    -------
+    decode_opts : dict
+        Dictionary of current decoding options with keys
+
+          - num_threads : int
+
+        For a full description of these options, see `set_decodeoptions`.
+
+    See also
+    --------
+    set_decodeoptions
+    """
+    return _decodeoptions
+
+
+class Decoder(object):
+    """Decoder session keeping a libopenjp2 codec alive across reads.
+
+    Instances are created by :py:meth:`Jp2k.open_decoder` and should be used
+    as context managers.
+
+    Attributes
+    ----------
+    jp2k : Jp2k
+        The JPEG 2000 file being decoded.
+    layer : int
+        Zero-based number of quality layer to decode.
+    """
+    def __init__(self, jp2k, layer=0, verbose=False, num_threads=None):
+        self.jp2k = jp2k
+        self.layer = layer
+        self._verbose = verbose
+        self._num_threads = num_threads
+        self._stack = None
+        self._rlevel = 0
+
+        # The library can only decode an area again with the same codec when
+        # the image is a single tile.  Windows of tiled images are put
+        # together from their tiles instead.
+        siz = jp2k.codestream.segment[1]
+        self._single_tile = (
+            _ceildiv(siz.xsiz - siz.xtosiz, siz.xtsiz) == 1 and
+            _ceildiv(siz.ysiz - siz.ytosiz, siz.ytsiz) == 1)
+
+    def __enter__(self):
+        self._open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open(self, rlevel=0):
+        """Create the stream and codec, then read the main header."""
+        self._dparams = self.jp2k._populate_dparams(rlevel, layer=self.layer)
+
+        self._stack = ExitStack()
+        self._streams = []
+        try:
+            items = self.jp2k._setup_openjp2_decoder(
+                self._stack, self._dparams, verbose=self._verbose,
+                num_threads=self._num_threads, streams=self._streams)
+        except BaseException:
+            self._stack.close()
+            self._stack = None
+            raise
+        self._stream, self._codec, self._image = items
+        self._rlevel = self._dparams.cp_reduce
+
+    def close(self):
+        """Release the stream, codec, and image header."""
+        if self._stack is not None:
+            self._stack.close()
+            self._stack = None
+
+    def read(self, area=None, rlevel=0, layer=None, out=None):
+        """Decode a region of the image.
+
+        Parameters
+        ----------
+        area : tuple, optional
+            Specifies decoding image area,
+            (first_row, first_col, last_row, last_col)
+        rlevel : int, optional
+            Factor by which to rlevel output resolution.  Use -1 to get the
+            lowest resolution thumbnail.
+        layer : int, optional
+            Number of quality layer to decode.  Changing the layer requires
+            setting up the codec again.
+        out : ndarray, optional
+            Destination array for the image data.
+
+        Returns
+        -------
+        image : ndarray
+            The image data, or the destination array if one was given.
+        """
+        if self._stack is None:
+            raise RuntimeError("The decoder session is closed.")
+
+        # Validate the area and rlevel, resolving an rlevel of -1.
+        dparams = self.jp2k._populate_dparams(rlevel, area=area,
+                                              layer=self.layer)
+
+        if layer is not None and layer != self.layer:
+            self.layer = layer
+            self._reopen(dparams.cp_reduce)
+        elif not opj2.REDECODE_SUPPORTED:
+            # Older libraries cannot decode twice with the same codec.
+            self._reopen(dparams.cp_reduce)
+        elif dparams.cp_reduce != self._rlevel:
+            opj2.set_decoded_resolution_factor(self._codec,
+                                               dparams.cp_reduce)
+            self._rlevel = dparams.cp_reduce
+
+        if opj2.REDECODE_SUPPORTED and not self._single_tile:
+            return self._read_tiles(dparams, out=out)
+
+        try:
+            opj2.set_decode_area(self._codec, self._image,
+                                 dparams.DA_x0, dparams.DA_y0,
+                                 dparams.DA_x1, dparams.DA_y1)
+            opj2.decode(self._codec, self._stream, self._image)
+        finally:
+            for stream in self._streams:
+                stream.raise_error()
+
+        if out is not None:
+            return self.jp2k._extract_image(self._image, out=out)
+
+        image = self.jp2k._extract_image(self._image)
+        if image.shape[2] == 1:
+            image.shape = image.shape[0:2]
+
+        return image
+
+    def _read_tiles(self, dparams, out=None):
+        """Put a window of a tiled image together from its tiles.
+
+        Each tile overlapping the window is decoded whole with the codec of
+        the session.
+
+        Parameters
+        ----------
+        dparams : DecompressionParametersType
+            Decompression parameters made by _populate_dparams.
+        out : ndarray, optional
+            Destination array for the image data.
+
+        Returns
+        -------
+        image : ndarray
+            The image data, or the destination array if one was given.
+        """
+        (numrows, numcols), pieces = self.jp2k._window_tiles(dparams)
+        shape = self.jp2k.shape
+        shape = (numrows, numcols, 1 if len(shape) == 2 else shape[2])
+        if out is None:
+            image = None
+        else:
+            image = out[:, :, np.newaxis] if out.ndim == 2 else out
+            if image.shape != shape:
+                raise ValueError(_BAD_OUT_SHAPE.format(out.shape, shape))
+
+        try:
+            for tile, src_rows, src_cols, dest_rows, dest_cols in pieces:
+                opj2.get_decoded_tile(self._codec, self._stream, self._image,
+                                      tile)
+                data = self.jp2k._extract_image(self._image)
+                if image is None:
+                    image = np.empty(shape, dtype=data.dtype)
+                image[dest_rows, dest_cols] = data[src_rows, src_cols]
+        finally:
+            for stream in self._streams:
+                stream.raise_error()
+
+        if out is not None:
+            return out
+
+        if image.shape[2] == 1:
+            image.shape = image.shape[0:2]
+
+        return image
+
+    def _reopen(self, rlevel):
+        """Tear down the codec and set it up again."""
+        self.close()
+        self._open(rlevel)
+
+
+class TileWriter(object):
+    """Encoder session accepting one tile at a time.
+
+    Instances are created by :py:meth:`Jp2k.tile_writer` and should be used
+    as context managers.  Tiles are assigned with ``writer[tile_row,
+    tile_col] = block`` or supplied in raster order to :py:meth:`write`.
+
+    Attributes
+    ----------
+    jp2k : Jp2k
+        The JPEG 2000 file being written.
+    tile_grid : tuple
+        Number of tile rows and tile columns.
+    """
+    def __init__(self, jp2k, dtype=np.uint8, verbose=False,
+                 max_pending=None):
+        if max_pending is not None and max_pending < 0:
+            raise ValueError("max_pending must not be negative.")
+        self.jp2k = jp2k
+        self._dtype = dtype
+        self._verbose = verbose
+        self._max_pending = max_pending
+        self._stack = None
+
+        shape = jp2k.shape
+        self._numrows, self._numcols = shape[0], shape[1]
+        self._numbands = 1 if len(shape) == 2 else shape[2]
+
+        cparams = jp2k._cparams
+        self._tile_height, self._tile_width = cparams.cp_tdy, cparams.cp_tdx
+        self.tile_grid = (_ceildiv(self._numrows, self._tile_height),
+                          _ceildiv(self._numcols, self._tile_width))
+
+        self._next_tile = 0
+        self._pending = {}
+
+    def __enter__(self):
+        jp2k = self.jp2k
+        shape = (self._numrows, self._numcols, self._numbands)
+
+        self._stack = ExitStack()
+        try:
+            image = opj2.image_tile_create(jp2k._comptparms, jp2k._colorspace)
+            self._stack.callback(opj2.image_destroy, image)
+            jp2k._populate_image_header(image, shape)
+
+            self._codec, self._stream = jp2k._setup_openjp2_encoder(
+                self._stack, image, verbose=self._verbose)
+            opj2.start_compress(self._codec, image, self._stream)
+        except BaseException:
+            self._stack.close()
+            self._stack = None
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        failed = exc_type is not None
+        try:
+            if not failed:
+                self._finish()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._stack.close()
+            self._stack = None
+            if failed:
+                self._discard()
+
+        if not failed:
+            # Refresh the metadata.
+            self.jp2k.parse()
+
+    def _finish(self):
+        """End the codestream once all tiles have been written."""
+        num_tiles = self.tile_grid[0] * self.tile_grid[1]
+        if self._next_tile != num_tiles:
+            msg = "Only {0} of {1} tiles were written."
+            raise IOError(msg.format(self._next_tile, num_tiles))
+        opj2.end_compress(self._codec, self._stream)
+
+    def _discard(self):
+        """Remove the file left incomplete by a failed write."""
+        filename = self.jp2k.filename
+        if filename is not None and os.path.exists(filename):
+            os.remove(filename)
+
+    def tile_slices(self, tile_row, tile_col):
+        """Locate a tile in the image.
+
+        Parameters
+        ----------
+        tile_row, tile_col : int
+            Position of the tile in the tile grid.
+
+        Returns
+        -------
+        rows, cols : slice
+            The rows and columns of the image covered by the tile.
+        """
+        if not (0 <= tile_row < self.tile_grid[0] and
+                0 <= tile_col < self.tile_grid[1]):
+            msg = "Tile ({0}, {1}) lies outside the {2} tile grid."
+            raise IndexError(msg.format(tile_row, tile_col, self.tile_grid))
+        row0 = tile_row * self._tile_height
+        col0 = tile_col * self._tile_width
+        rows = slice(row0, min(row0 + self._tile_height, self._numrows))
+        cols = slice(col0, min(col0 + self._tile_width, self._numcols))
+        return rows, cols
+
+    def __setitem__(self, index, block):
+        """Write the tile at (tile_row, tile_col)."""
+        if self._stack is None:
+            raise RuntimeError("The tile writer is not open.")
+
+        tile_row, tile_col = index
+        rows, cols = self.tile_slices(tile_row, tile_col)
+        shape = (rows.stop - rows.start, cols.stop - cols.start)
+        if len(self.jp2k.shape) == 3:
+            shape += (self._numbands,)
+
+        block = np.asarray(block)
+        if block.shape != shape:
+            msg = "Tile ({0}, {1}) must have shape {2}, not {3}."
+            raise ValueError(msg.format(tile_row, tile_col, shape,
+                                        block.shape))
+        if block.dtype != self._dtype:
+            msg = "Tile ({0}, {1}) must have datatype {2}, not {3}."
+            raise ValueError(msg.format(tile_row, tile_col,
+                                        np.dtype(self._dtype), block.dtype))
+        if block.ndim == 2:
+            block = block[:, :, np.newaxis]
+
+        # The library wants each component in turn.
+        data = np.empty((self._numbands, shape[0], shape[1]),
+                        dtype=self._dtype)
+        for k in range(self._numbands):
+            data[k] = block[:, :, k]
+
+        tile_index = tile_row * self.tile_grid[1] + tile_col
+        if tile_index < self._next_tile or tile_index in self._pending:
+            msg = "Tile ({0}, {1}) has already been written."
+            raise IOError(msg.format(tile_row, tile_col))
+        if (tile_index != self._next_tile and
+                self._max_pending is not None and
+                len(self._pending) >= self._max_pending):
+            msg = ("Tile ({0}, {1}) cannot be held, {2} tiles are already "
+                   "waiting for the preceding tiles to be written.")
+            raise IOError(msg.format(tile_row, tile_col, len(self._pending)))
+        self._pending[tile_index] = data
+
+        while self._next_tile in self._pending:
+            data = self._pending.pop(self._next_tile)
+            opj2.write_tile(self._codec, self._next_tile, data, data.nbytes,
+                            self._stream)
+            self._next_tile += 1
+
+    def write(self, tiles):
+        """Write tiles supplied in raster order.
+
+        Writing starts with the first tile that has not yet been written.
+
+        Parameters
+        ----------
+        tiles : iterable
+            The tiles, e.g. a generator yielding one tile at a time.
+        """
+        num_tiles = self.tile_grid[0] * self.tile_grid[1]
+        tile_index = self._next_tile
+        for block in tiles:
+            while tile_index in self._pending:
+                tile_index += 1
+            if tile_index >= num_tiles:
+                msg = "More than the {0} tiles in the tile grid were given."
+                raise IOError(msg.format(num_tiles))
+            self[divmod(tile_index, self.tile_grid[1])] = block
+            tile_index += 1
+
+
+class _CallbackStream(object):
+    """Connects Python data to a libopenjp2 stream.
+
+    The library calls back into the read, write, skip, and seek methods.  A
+    buffer given for reading is used in place without being copied, a range
+    reader is asked for one block at a time, and the bytes written by the
+    library accumulate in a bytearray.
+
+    Attributes
+    ----------
+    buffer : buffer or bytearray
+        The data being read, or the data written so far.  None when reading
+        through a range reader.
+    error : Exception
+        Raised by the range reader during a library call, or None.  An
+        exception cannot pass through the library, so it is kept here and
+        raised once the library call has returned.
+    """
+    # (size_t)-1 signals the end of the data or a failure.
+    _EOF = ctypes.c_size_t(-1).value
+
+    def __init__(self, buffer=None, reader=None):
+        self.buffer = buffer
+        self._reader = reader
+        self._source = None
+        if reader is not None:
+            self._length = reader.length
+        elif buffer is not None:
+            self._source = np.frombuffer(buffer, dtype=np.uint8)
+            self._length = self._source.size
+        else:
+            self.buffer = bytearray()
+        self._position = 0
+        self.error = None
+
+        # The library only holds raw function pointers, so the callbacks
+        # must be kept alive for as long as the stream exists.
+        self._read_function = opj2.STREAM_READ_FUNC(self._read)
+        self._write_function = opj2.STREAM_WRITE_FUNC(self._write)
+        self._skip_function = opj2.STREAM_SKIP_FUNC(self._skip)
+        self._seek_function = opj2.STREAM_SEEK_FUNC(self._seek)
+
+    def open(self, stack):
+        """Create the library stream.
+
+        Parameters
+        ----------
+        stack : ExitStack
+            Destroys the stream, and keeps this object alive until then.
+
+        Returns
+        -------
+        stream : STREAM_TYPE_P
+            A read stream if a buffer or reader was given, otherwise a write
+            stream.
+        """
+        if self._reader is not None:
+            # Each library read becomes one fetch, so let the reader decide.
+            buffer_size = self._reader.block_size
+        else:
+            buffer_size = opj2.STREAM_CHUNK_SIZE
+        isa_read_stream = self._source is not None or self._reader is not None
+        stream = opj2.stream_create(buffer_size, isa_read_stream)
+        stack.callback(self._destroy, stream)
+        stack.callback(self.raise_error)
+
+        if isa_read_stream:
+            opj2.stream_set_read_function(stream, self._read_function)
+            opj2.stream_set_user_data_length(stream, self._length)
+        else:
+            opj2.stream_set_write_function(stream, self._write_function)
+        opj2.stream_set_skip_function(stream, self._skip_function)
+        opj2.stream_set_seek_function(stream, self._seek_function)
+        return stream
+
+    def _destroy(self, stream):
+        opj2.stream_destroy(stream)
+
+    def raise_error(self):
+        """Raise the exception kept from a failed read, if there is one."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    @opj2.profiled('stream_read', bytes_in=_stream_nbytes)
+    def _read(self, dest, nbytes, _):
+        remaining = self._length - self._position
+        if remaining <= 0:
+            return self._EOF
+        nbytes = min(nbytes, remaining)
+        if self._reader is not None:
+            try:
+                data = self._reader.read_range(self._position, nbytes)
+            except BaseException as error:
+                self.error = error
+                return self._EOF
+            nbytes = len(data)
+            if nbytes == 0:
+                # Otherwise the library would ask for the same bytes forever.
+                msg = "The range reader returned no data at offset {0}."
+                self.error = IOError(msg.format(self._position))
+                return self._EOF
+            ctypes.memmove(dest, data, nbytes)
+        else:
+            ctypes.memmove(dest, self._source.ctypes.data + self._position,
+                           nbytes)
+        self._position += nbytes
+        return nbytes
+
+    @opj2.profiled('stream_write', bytes_out=_stream_nbytes)
+    def _write(self, src, nbytes, _):
+        # A skip or seek may have moved past the end, leaving a gap.
+        gap = self._position - len(self.buffer)
+        if gap > 0:
+            self.buffer.extend(b'\x00' * gap)
+        end = self._position + nbytes
+        self.buffer[self._position:end] = ctypes.string_at(src, nbytes)
+        self._position = end
+        return nbytes
+
+    def _skip(self, nbytes, _):
+        if self._position + nbytes < 0:
+            return -1
+        self._position += nbytes
+        return nbytes
+
+    def _seek(self, position, _):
+        if position < 0:
+            return opj2.FALSE
+        self._position = position
+        return opj2.TRUE
+
+
 # Setup the default callback handlers.  See the callback functions subsection
 # in the ctypes section of the Python documentation for a solid explanation of
 # what's going on here.
 _CMPFUNC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p)
 
 
-def _default_error_handler(msg, _):
-    """Default error handler callback for libopenjp2."""
+def _default_error_handler(msg, codec):
+    """Default error handler callback for libopenjp2.
+
+    The user data is the codec reporting the error, if any.
+    """
     msg = "OpenJPEG library error:  {0}".format(msg.decode('utf-8').rstrip())
-    opj2.set_error_message(msg)
+    opj2.set_error_message(msg, codec)
 
 
 def _default_info_handler(msg, _):
@@ -1952,12 +4124,14 @@ def _default_info_handler(msg, _):
     print("[INFO] {0}".format(msg.decode('utf-8').rstrip()))
 
 
-def _default_warning_handler(library_msg, _):
+def _default_warning_handler(library_msg, codec):
     """Default warning handler callback."""
     library_msg = library_msg.decode('utf-8').rstrip()
     msg = "OpenJPEG library warning:  {0}".format(library_msg)
+    opj2.set_warning_message(msg, codec)
     warnings.warn(msg)
 
+
 _ERROR_CALLBACK = _CMPFUNC(_default_error_handler)
 _INFO_CALLBACK = _CMPFUNC(_default_info_handler)
 _WARNING_CALLBACK = _CMPFUNC(_default_warning_handler)
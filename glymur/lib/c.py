@@ -5,9 +5,16 @@ Wraps fopen and fclose functions in libc.
 import ctypes
 import ctypes.util
 
+from .config import FunctionTable
+
 LIBC_PATH = ctypes.util.find_library('c')
 C_LIB = ctypes.CDLL(LIBC_PATH)
 
+_FUNCTIONS = FunctionTable(C_LIB, [
+    ('fopen', [ctypes.c_char_p, ctypes.c_char_p], ctypes.c_void_p),
+    ('fclose', [ctypes.c_void_p], ctypes.c_int32),
+])
+
 
 def fopen(filename, mode):
     """Opens the file with the specified mode.
@@ -24,10 +31,8 @@ def fopen(filename, mode):
     fptr : ctypes.c_void_p
         File pointer.
     """
-    C_LIB.fopen.restype = ctypes.c_void_p
-    C_LIB.fopen.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
-    fptr = C_LIB.fopen(ctypes.c_char_p(filename.encode()),
-                       ctypes.c_char_p(mode.encode()))
+    fptr = _FUNCTIONS.fopen(ctypes.c_char_p(filename.encode()),
+                            ctypes.c_char_p(mode.encode()))
     return fptr
 
 
@@ -39,8 +44,6 @@ def fclose(fptr):
     fptr : ctypes.c_void_p
         File pointer.
     """
-    C_LIB.fclose.argtypes = [ctypes.c_void_p]
-    C_LIB.fclose.restype = ctypes.c_int32
-    status = C_LIB.fclose(fptr)
+    status = _FUNCTIONS.fclose(fptr)
     if status != 0:
         raise IOError("Unable to close file.")
@@ -105,6 +105,45 @@ def load_library_handle(path):
     return opj_lib
 
 
+class FunctionTable(object):
+    """Library functions with their argument and result types already set.
+
+    Assigning argtypes and restype to a ctypes function costs more than the
+    call itself does for many of the library routines, so it is done only
+    once, when the table is built, rather than by the wrappers on every call.
+    Functions that the library does not export, e.g. those first appearing in
+    a later version, are left out of the table, so using one raises
+    AttributeError just as the library handle itself would.
+
+    Parameters
+    ----------
+    library : ctypes.CDLL or None
+        Library handle.  The table is empty if there is no library.
+    prototypes : iterable
+        (name, argtypes, restype) of each function, optionally followed by a
+        function to set as its errcheck attribute.
+    """
+    def __init__(self, library, prototypes):
+        if library is None:
+            return
+        for prototype in prototypes:
+            name, argtypes, restype = prototype[:3]
+            try:
+                # Indexing makes a function object of our own, so nothing
+                # else using the library handle can change its prototype.
+                func = library[name]
+            except AttributeError:
+                continue
+            func.argtypes = argtypes
+            func.restype = restype
+            if len(prototype) > 3:
+                func.errcheck = prototype[3]
+            setattr(self, name, func)
+
+    def __contains__(self, name):
+        return name in self.__dict__
+
+
 def read_config_file(libname):
     """
     Extract library locations from a configuration file.
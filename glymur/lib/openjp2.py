@@ -3,11 +3,14 @@ Wraps individual functions in openjp2 library.
 """
 
 import ctypes
+import functools
 import re
 import sys
 import textwrap
+import threading
+import timeit
 
-from .config import glymur_config
+from .config import glymur_config, FunctionTable
 
 OPENJP2, OPENJPEG = glymur_config()
 
@@ -25,13 +28,210 @@ def version():
     else:
         return library_version
 
+
 if OPENJP2 is not None:
     _MAJOR, _MINOR, _PATCH = version().split('.')
 else:
     _MINOR = 0
 
+
+def has_function(name):
+    """Determine if the loaded openjp2 library exports a given function.
+
+    Parameters
+    ----------
+    name : str
+        Name of the library function, e.g. 'opj_codec_set_threads'.
+
+    Returns
+    -------
+    bool
+        True if the library is loaded and provides the function.
+    """
+    if OPENJP2 is None:
+        return False
+    return hasattr(OPENJP2, name)
+
+
+# Starting with the 2.3 series, a codec can decode several areas or
+# resolutions of a single tile image without re-reading the main header.  That
+# series is also the one that introduced opj_set_decoded_components, so use
+# that as the indicator.  Areas of images of several tiles still need a fresh
+# codec, but whole tiles can be decoded one after another.
+REDECODE_SUPPORTED = has_function('opj_set_decoded_components')
+
 ERROR_MSG_LST = []
 
+# Profilers currently recording.  Rebound rather than modified, so that a
+# wrapper can check it without a lock.
+_PROFILERS = ()
+_PROFILERS_LOCK = threading.Lock()
+
+
+class Profiler(object):
+    """Time, calls, and bytes of each stage of reading or writing an image.
+
+    While a profiler is active, every call to a wrapped library function and
+    to the main stages of Jp2k (box parsing, whole reads and writes, reads
+    from in-memory streams, and extracting the image from the library's
+    buffers) is recorded under the name of its stage.  Bytes are counted
+    where they pass through glymur, e.g. the decoded samples handed out by
+    decode and the array filled by extract.  When no profiler is active, the
+    only cost is one check per call.
+
+    Parameters
+    ----------
+    sink : callable, optional
+        Called as sink(stage, seconds, bytes_in, bytes_out) after every
+        recorded call, in the thread that made it.
+
+    Attributes
+    ----------
+    stats : dict
+        For each stage, a dictionary with keys 'calls', 'seconds',
+        'bytes_in', and 'bytes_out'.
+
+    Examples
+    --------
+    >>> import glymur
+    >>> jp2 = glymur.Jp2k(glymur.data.nemo())
+    >>> with glymur.Profiler() as profiler:
+    ...     image = jp2[::2, ::2]
+    >>> stats = profiler.to_dict()
+    >>> stats['decode']['calls'], stats['extract']['bytes_out'] == image.nbytes
+    (1, True)
+    """
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __repr__(self):
+        return 'glymur.Profiler(sink={0!r})'.format(self.sink)
+
+    def __str__(self):
+        fmt = '{0:<24}  {1:>7}  {2:>10}  {3:>12}  {4:>12}'
+        lines = [fmt.format('stage', 'calls', 'seconds', 'bytes in',
+                            'bytes out')]
+        fmt = '{0:<24}  {1:>7}  {2:>10.6f}  {3:>12}  {4:>12}'
+        stats = self.to_dict()
+        for stage in sorted(stats, key=lambda k: -stats[k]['seconds']):
+            stat = stats[stage]
+            lines.append(fmt.format(stage, stat['calls'], stat['seconds'],
+                                    stat['bytes_in'], stat['bytes_out']))
+        return '\n'.join(lines)
+
+    def start(self):
+        """Start recording."""
+        global _PROFILERS
+        with _PROFILERS_LOCK:
+            if self not in _PROFILERS:
+                _PROFILERS = _PROFILERS + (self,)
+
+    def stop(self):
+        """Stop recording, the statistics are kept."""
+        global _PROFILERS
+        with _PROFILERS_LOCK:
+            _PROFILERS = tuple(p for p in _PROFILERS if p is not self)
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.stats = {}
+
+    def record(self, stage, seconds, bytes_in=0, bytes_out=0):
+        """Record one call.
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage, e.g. 'decode'.
+        seconds : float
+            Wall clock time of the call.
+        bytes_in, bytes_out : int, optional
+            Bytes consumed and produced by the call.
+        """
+        with self._lock:
+            try:
+                stat = self.stats[stage]
+            except KeyError:
+                stat = self.stats[stage] = {'calls': 0, 'seconds': 0.0,
+                                            'bytes_in': 0, 'bytes_out': 0}
+            stat['calls'] += 1
+            stat['seconds'] += seconds
+            stat['bytes_in'] += bytes_in
+            stat['bytes_out'] += bytes_out
+        if self.sink is not None:
+            self.sink(stage, seconds, bytes_in, bytes_out)
+
+    def to_dict(self):
+        """Copy of the statistics of each stage."""
+        with self._lock:
+            return dict((stage, dict(stat))
+                        for stage, stat in self.stats.items())
+
+
+def profiling():
+    """True if any profiler is recording."""
+    return len(_PROFILERS) > 0
+
+
+def record(stage, seconds, bytes_in=0, bytes_out=0):
+    """Report a call to every active profiler."""
+    for profiler in _PROFILERS:
+        profiler.record(stage, seconds, bytes_in, bytes_out)
+
+
+def profiled(stage, bytes_in=None, bytes_out=None):
+    """Decorator recording each call of a function with the profilers.
+
+    Parameters
+    ----------
+    stage : str
+        Name under which the calls are recorded.
+    bytes_in, bytes_out : callable, optional
+        Called as bytes_in(args, result) to count the bytes consumed or
+        produced by a successful call.  Only called while profiling.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _PROFILERS:
+                return func(*args, **kwargs)
+            start = timeit.default_timer()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                record(stage, timeit.default_timer() - start)
+                raise
+            seconds = timeit.default_timer() - start
+            record(stage, seconds,
+                   0 if bytes_in is None else bytes_in(args, result),
+                   0 if bytes_out is None else bytes_out(args, result))
+            return result
+        return wrapper
+    return decorate
+
+
+def image_nbytes(image):
+    """Size of the sample buffers of an ImageType pointer.
+
+    The library holds every sample as a 32-bit integer.
+    """
+    if not image:
+        return 0
+    contents = image.contents
+    return sum(4 * contents.comps[k].w * contents.comps[k].h
+               for k in range(contents.numcomps))
+
+
 # Map certain atomic OpenJPEG datatypes to the ctypes equivalents.
 BOOL_TYPE = ctypes.c_int32
 CODEC_TYPE = ctypes.c_void_p
@@ -40,6 +240,19 @@ CINEMA_MODE_TYPE = ctypes.c_int32
 RSIZ_CAPABILITIES_TYPE = ctypes.c_int32
 STREAM_TYPE_P = ctypes.c_void_p
 
+# Signatures of the user-supplied stream functions.
+STREAM_READ_FUNC = ctypes.CFUNCTYPE(ctypes.c_size_t, ctypes.c_void_p,
+                                    ctypes.c_size_t, ctypes.c_void_p)
+STREAM_WRITE_FUNC = ctypes.CFUNCTYPE(ctypes.c_size_t, ctypes.c_void_p,
+                                     ctypes.c_size_t, ctypes.c_void_p)
+STREAM_SKIP_FUNC = ctypes.CFUNCTYPE(ctypes.c_int64, ctypes.c_int64,
+                                    ctypes.c_void_p)
+STREAM_SEEK_FUNC = ctypes.CFUNCTYPE(BOOL_TYPE, ctypes.c_int64,
+                                    ctypes.c_void_p)
+
+# Default size of the internal buffer of a stream, 1MB.
+STREAM_CHUNK_SIZE = 0x100000
+
 PATH_LEN = 4096
 J2K_MAXRLVLS = 33
 J2K_MAXBANDS = (3 * J2K_MAXRLVLS - 2)
@@ -593,6 +806,224 @@ def check_error(status):
             raise IOError("OpenJPEG function failure.")
 
 
+class ErrorContext(object):
+    """Errors and warnings reported by the library for one codec.
+
+    Every codec made by create_compress or create_decompress gets its own
+    context.  Glymur's message handlers are given the codec handle as their
+    user data, so messages land with the codec that produced them even when
+    several codecs are in use on different threads at once, or when the
+    library reports them from its own worker threads.  When a library call on
+    the codec fails, the errors collected so far are raised as an IOError.
+
+    Attributes
+    ----------
+    errors, warnings : list of str
+        Messages received so far.  The errors are cleared when raised.
+    """
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+
+    def __repr__(self):
+        return 'ErrorContext(errors={0!r}, warnings={1!r})'.format(
+            self.errors, self.warnings)
+
+    def pop_errors(self):
+        """Return the errors received so far and forget them."""
+        errors, self.errors = self.errors, []
+        return errors
+
+
+# Contexts of the codecs that have not been destroyed, keyed by handle.
+_CONTEXTS = {}
+
+
+def _handle(codec):
+    """Address of a codec as an int, whichever way ctypes passes it."""
+    return getattr(codec, 'value', codec)
+
+
+def error_context(codec):
+    """Error context of a codec.
+
+    Parameters
+    ----------
+    codec : CODEC_TYPE
+        Codec created by create_compress or create_decompress, or the user
+        data given to a message handler.
+
+    Returns
+    -------
+    ErrorContext or None
+        None if the codec has been destroyed or was not made by glymur.
+    """
+    if codec is None:
+        return None
+    return _CONTEXTS.get(_handle(codec))
+
+
+def _codec_errcheck(position):
+    """Make an errcheck function for routines that take a codec.
+
+    Parameters
+    ----------
+    position : int
+        Position of the codec among the arguments of the routine.
+    """
+    def errcheck(status, func, arguments):
+        if status != 1:
+            context = error_context(arguments[position])
+            if context is None:
+                # Not one of ours, fall back to the shared list.
+                check_error(status)
+            errors = context.pop_errors()
+            if len(errors) > 0:
+                raise IOError('\n'.join(errors))
+            raise IOError("OpenJPEG function failure.")
+        return status
+    return errcheck
+
+
+# Most routines take the codec first, opj_read_header takes it second.
+_CHECK_CODEC = _codec_errcheck(0)
+_CHECK_SECOND_CODEC = _codec_errcheck(1)
+
+
+# The file stream constructor took a FILE pointer in the 2.0 series and a
+# file name thereafter.
+if re.match(r'''2.0''', version()):
+    _FILE_STREAM_ARGTYPES = [ctypes.c_void_p, ctypes.c_int32]
+else:
+    _FILE_STREAM_ARGTYPES = [ctypes.c_char_p, ctypes.c_int32]
+
+# (name, argtypes, restype[, errcheck]) of each library function.  Routines
+# returning a BOOL_TYPE status raise IOError with their codec's errors.
+_PROTOTYPES = [
+    ('opj_codec_set_threads', [CODEC_TYPE, ctypes.c_int],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_create_compress', [CODEC_FORMAT_TYPE], CODEC_TYPE),
+    ('opj_create_decompress', [CODEC_FORMAT_TYPE], CODEC_TYPE),
+    ('opj_decode', [CODEC_TYPE, STREAM_TYPE_P, ctypes.POINTER(ImageType)],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_decode_tile_data', [CODEC_TYPE,
+                              ctypes.c_uint32,
+                              ctypes.POINTER(ctypes.c_uint8),
+                              ctypes.c_uint32,
+                              STREAM_TYPE_P], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_destroy_codec', [CODEC_TYPE], ctypes.c_void_p),
+    ('opj_encode', [CODEC_TYPE, STREAM_TYPE_P], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_end_compress', [CODEC_TYPE, STREAM_TYPE_P], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_end_decompress', [CODEC_TYPE, STREAM_TYPE_P],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_get_decoded_tile', [CODEC_TYPE,
+                              STREAM_TYPE_P,
+                              ctypes.POINTER(ImageType),
+                              ctypes.c_uint32], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_has_thread_support', [], BOOL_TYPE),
+    ('opj_image_create', [ctypes.c_uint32,
+                          ctypes.POINTER(ImageComptParmType),
+                          COLOR_SPACE_TYPE], ctypes.POINTER(ImageType)),
+    ('opj_image_destroy', [ctypes.POINTER(ImageType)], ctypes.c_void_p),
+    ('opj_image_tile_create', [ctypes.c_uint32,
+                               ctypes.POINTER(ImageComptParmType),
+                               COLOR_SPACE_TYPE], ctypes.POINTER(ImageType)),
+    ('opj_read_header', [STREAM_TYPE_P,
+                         CODEC_TYPE,
+                         ctypes.POINTER(ctypes.POINTER(ImageType))],
+     BOOL_TYPE, _CHECK_SECOND_CODEC),
+    ('opj_read_tile_header', [CODEC_TYPE,
+                              STREAM_TYPE_P,
+                              ctypes.POINTER(ctypes.c_uint32),
+                              ctypes.POINTER(ctypes.c_uint32),
+                              ctypes.POINTER(ctypes.c_int32),
+                              ctypes.POINTER(ctypes.c_int32),
+                              ctypes.POINTER(ctypes.c_int32),
+                              ctypes.POINTER(ctypes.c_int32),
+                              ctypes.POINTER(ctypes.c_uint32),
+                              ctypes.POINTER(BOOL_TYPE)],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_set_decode_area', [CODEC_TYPE,
+                             ctypes.POINTER(ImageType),
+                             ctypes.c_int32,
+                             ctypes.c_int32,
+                             ctypes.c_int32,
+                             ctypes.c_int32], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_set_decoded_components', [CODEC_TYPE,
+                                    ctypes.c_uint32,
+                                    ctypes.POINTER(ctypes.c_uint32),
+                                    BOOL_TYPE], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_set_decoded_resolution_factor', [CODEC_TYPE, ctypes.c_uint32],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_set_default_decoder_parameters',
+     [ctypes.POINTER(DecompressionParametersType)], ctypes.c_void_p),
+    ('opj_set_default_encoder_parameters',
+     [ctypes.POINTER(CompressionParametersType)], ctypes.c_void_p),
+    ('opj_set_error_handler', [CODEC_TYPE, ctypes.c_void_p, ctypes.c_void_p],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_set_info_handler', [CODEC_TYPE, ctypes.c_void_p, ctypes.c_void_p],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_set_warning_handler', [CODEC_TYPE, ctypes.c_void_p, ctypes.c_void_p],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_setup_decoder', [CODEC_TYPE,
+                           ctypes.POINTER(DecompressionParametersType)],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_setup_encoder', [CODEC_TYPE,
+                           ctypes.POINTER(CompressionParametersType),
+                           ctypes.POINTER(ImageType)],
+     BOOL_TYPE, _CHECK_CODEC),
+    ('opj_start_compress', [CODEC_TYPE,
+                            ctypes.POINTER(ImageType),
+                            STREAM_TYPE_P], BOOL_TYPE, _CHECK_CODEC),
+    ('opj_stream_create', [ctypes.c_size_t, BOOL_TYPE], STREAM_TYPE_P),
+    ('opj_stream_create_default_file_stream', _FILE_STREAM_ARGTYPES,
+     STREAM_TYPE_P),
+    ('opj_stream_destroy', [STREAM_TYPE_P], ctypes.c_void_p),
+    ('opj_stream_set_read_function', [STREAM_TYPE_P, STREAM_READ_FUNC],
+     ctypes.c_void_p),
+    ('opj_stream_set_seek_function', [STREAM_TYPE_P, STREAM_SEEK_FUNC],
+     ctypes.c_void_p),
+    ('opj_stream_set_skip_function', [STREAM_TYPE_P, STREAM_SKIP_FUNC],
+     ctypes.c_void_p),
+    ('opj_stream_set_user_data_length', [STREAM_TYPE_P, ctypes.c_uint64],
+     ctypes.c_void_p),
+    ('opj_stream_set_write_function', [STREAM_TYPE_P, STREAM_WRITE_FUNC],
+     ctypes.c_void_p),
+    ('opj_write_tile', [CODEC_TYPE,
+                        ctypes.c_uint32,
+                        ctypes.POINTER(ctypes.c_uint8),
+                        ctypes.c_uint32,
+                        STREAM_TYPE_P], BOOL_TYPE, _CHECK_CODEC),
+]
+
+# The library functions, typed once here rather than on every call.  Those
+# that the loaded library version does not have are absent.
+_FUNCTIONS = FunctionTable(OPENJP2, _PROTOTYPES)
+
+
+@profiled('codec_set_threads')
+def codec_set_threads(codec, num_threads):
+    """Allocates worker threads for the compressor/decompressor.
+
+    Wraps the openjp2 library function opj_codec_set_threads, which first
+    appeared in the 2.2 series.
+
+    Parameters
+    ----------
+    codec : CODEC_TYPE
+        Codec initialized by create_decompress function.
+    num_threads : int
+        Number of threads to use.  Zero disables threading.
+
+    Raises
+    ------
+    IOError
+        If the OpenJPEG library routine opj_codec_set_threads fails.
+    """
+    _FUNCTIONS.opj_codec_set_threads(codec, ctypes.c_int(num_threads))
+
+
+@profiled('create_compress')
 def create_compress(codec_format):
     """Creates a J2K/JP2 compress structure.
 
@@ -607,13 +1038,12 @@ def create_compress(codec_format):
     -------
     codec :  Reference to CODEC_TYPE instance.
     """
-    OPENJP2.opj_create_compress.restype = CODEC_TYPE
-    OPENJP2.opj_create_compress.argtypes = [CODEC_FORMAT_TYPE]
-
-    codec = OPENJP2.opj_create_compress(codec_format)
+    codec = _FUNCTIONS.opj_create_compress(codec_format)
+    _CONTEXTS[codec] = ErrorContext()
     return codec
 
 
+@profiled('decode', bytes_out=lambda args, _: image_nbytes(args[2]))
 def decode(codec, stream, image):
     """Reads an entire image.
 
@@ -633,13 +1063,10 @@ def decode(codec, stream, image):
     RuntimeError
         If the OpenJPEG library routine opj_decode fails.
     """
-    OPENJP2.opj_decode.argtypes = [CODEC_TYPE, STREAM_TYPE_P,
-                                   ctypes.POINTER(ImageType)]
-    OPENJP2.opj_decode.restype = check_error
-
-    OPENJP2.opj_decode(codec, stream, image)
+    _FUNCTIONS.opj_decode(codec, stream, image)
 
 
+@profiled('decode_tile_data', bytes_out=lambda args, _: args[3])
 def decode_tile_data(codec, tidx, data, data_size, stream):
     """Reads tile data.
 
@@ -663,21 +1090,15 @@ def decode_tile_data(codec, tidx, data, data_size, stream):
     RuntimeError
         If the OpenJPEG library routine opj_decode fails.
     """
-    OPENJP2.opj_decode_tile_data.argtypes = [CODEC_TYPE,
-                                             ctypes.c_uint32,
-                                             ctypes.POINTER(ctypes.c_uint8),
-                                             ctypes.c_uint32,
-                                             STREAM_TYPE_P]
-    OPENJP2.opj_decode_tile_data.restype = check_error
-
     datap = data.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
-    OPENJP2.opj_decode_tile_data(codec,
-                                 ctypes.c_uint32(tidx),
-                                 datap,
-                                 ctypes.c_uint32(data_size),
-                                 stream)
+    _FUNCTIONS.opj_decode_tile_data(codec,
+                                    ctypes.c_uint32(tidx),
+                                    datap,
+                                    ctypes.c_uint32(data_size),
+                                    stream)
 
 
+@profiled('create_decompress')
 def create_decompress(codec_format):
     """Creates a J2K/JP2 decompress structure.
 
@@ -692,13 +1113,12 @@ def create_decompress(codec_format):
     -------
     codec : Reference to CODEC_TYPE instance.
     """
-    OPENJP2.opj_create_decompress.argtypes = [CODEC_FORMAT_TYPE]
-    OPENJP2.opj_create_decompress.restype = CODEC_TYPE
-
-    codec = OPENJP2.opj_create_decompress(codec_format)
+    codec = _FUNCTIONS.opj_create_decompress(codec_format)
+    _CONTEXTS[codec] = ErrorContext()
     return codec
 
 
+@profiled('destroy_codec')
 def destroy_codec(codec):
     """Destroy a decompressor handle.
 
@@ -709,11 +1129,11 @@ def destroy_codec(codec):
     codec : CODEC_TYPE
         Decompressor handle to destroy.
     """
-    OPENJP2.opj_destroy_codec.argtypes = [CODEC_TYPE]
-    OPENJP2.opj_destroy_codec.restype = ctypes.c_void_p
-    OPENJP2.opj_destroy_codec(codec)
+    _FUNCTIONS.opj_destroy_codec(codec)
+    _CONTEXTS.pop(_handle(codec), None)
 
 
+@profiled('encode')
 def encode(codec, stream):
     """Wraps openjp2 library function opj_encode.
 
@@ -731,12 +1151,11 @@ def encode(codec, stream):
     RuntimeError
         If the OpenJPEG library routine opj_encode fails.
     """
-    OPENJP2.opj_encode.argtypes = [CODEC_TYPE, STREAM_TYPE_P]
-    OPENJP2.opj_encode.restype = check_error
-
-    OPENJP2.opj_encode(codec, stream)
+    _FUNCTIONS.opj_encode(codec, stream)
 
 
+@profiled('get_decoded_tile',
+          bytes_out=lambda args, _: image_nbytes(args[2]))
 def get_decoded_tile(codec, stream, imagep, tile_index):
     """get the decoded tile from the codec
 
@@ -758,15 +1177,10 @@ def get_decoded_tile(codec, stream, imagep, tile_index):
     RuntimeError
         If the OpenJPEG library routine opj_get_decoded_tile fails.
     """
-    OPENJP2.opj_get_decoded_tile.argtypes = [CODEC_TYPE,
-                                             STREAM_TYPE_P,
-                                             ctypes.POINTER(ImageType),
-                                             ctypes.c_uint32]
-    OPENJP2.opj_get_decoded_tile.restype = check_error
-
-    OPENJP2.opj_get_decoded_tile(codec, stream, imagep, tile_index)
+    _FUNCTIONS.opj_get_decoded_tile(codec, stream, imagep, tile_index)
 
 
+@profiled('end_compress')
 def end_compress(codec, stream):
     """End of compressing the current image.
 
@@ -784,11 +1198,10 @@ def end_compress(codec, stream):
     RuntimeError
         If the OpenJPEG library routine opj_end_compress fails.
     """
-    OPENJP2.opj_end_compress.argtypes = [CODEC_TYPE, STREAM_TYPE_P]
-    OPENJP2.opj_end_compress.restype = check_error
-    OPENJP2.opj_end_compress(codec, stream)
+    _FUNCTIONS.opj_end_compress(codec, stream)
 
 
+@profiled('end_decompress')
 def end_decompress(codec, stream):
     """End of decompressing the current image.
 
@@ -806,11 +1219,27 @@ def end_decompress(codec, stream):
     RuntimeError
         If the OpenJPEG library routine opj_end_decompress fails.
     """
-    OPENJP2.opj_end_decompress.argtypes = [CODEC_TYPE, STREAM_TYPE_P]
-    OPENJP2.opj_end_decompress.restype = check_error
-    OPENJP2.opj_end_decompress(codec, stream)
+    _FUNCTIONS.opj_end_decompress(codec, stream)
+
+
+def has_thread_support():
+    """Determine if the library was built with thread support.
+
+    Wraps the openjp2 library function opj_has_thread_support.  Libraries
+    older than the 2.2 series have no thread support at all.
+
+    Returns
+    -------
+    bool
+        True if the library can decode with multiple threads.
+    """
+    if not has_function('opj_has_thread_support'):
+        return False
+
+    return bool(_FUNCTIONS.opj_has_thread_support())
 
 
+@profiled('image_destroy')
 def image_destroy(image):
     """Deallocate any resources associated with an image.
 
@@ -821,12 +1250,10 @@ def image_destroy(image):
     image : ImageType pointer
         Image resource to be disposed.
     """
-    OPENJP2.opj_image_destroy.argtypes = [ctypes.POINTER(ImageType)]
-    OPENJP2.opj_image_destroy.restype = ctypes.c_void_p
-
-    OPENJP2.opj_image_destroy(image)
+    _FUNCTIONS.opj_image_destroy(image)
 
 
+@profiled('image_create')
 def image_create(comptparms, clrspc):
     """Creates a new image structure.
 
@@ -844,17 +1271,13 @@ def image_create(comptparms, clrspc):
     image : ImageType
         Reference to ImageType instance.
     """
-    OPENJP2.opj_image_create.argtypes = [ctypes.c_uint32,
-                                         ctypes.POINTER(ImageComptParmType),
-                                         COLOR_SPACE_TYPE]
-    OPENJP2.opj_image_create.restype = ctypes.POINTER(ImageType)
-
-    image = OPENJP2.opj_image_create(len(comptparms),
-                                     comptparms,
-                                     clrspc)
+    image = _FUNCTIONS.opj_image_create(len(comptparms),
+                                        comptparms,
+                                        clrspc)
     return image
 
 
+@profiled('image_tile_create')
 def image_tile_create(comptparms, clrspc):
     """Creates a new image structure.
 
@@ -872,18 +1295,13 @@ def image_tile_create(comptparms, clrspc):
     image : ImageType
         Reference to ImageType instance.
     """
-    ARGTYPES = [ctypes.c_uint32,
-                ctypes.POINTER(ImageComptParmType),
-                COLOR_SPACE_TYPE]
-    OPENJP2.opj_image_tile_create.argtypes = ARGTYPES
-    OPENJP2.opj_image_tile_create.restype = ctypes.POINTER(ImageType)
-
-    image = OPENJP2.opj_image_tile_create(len(comptparms),
-                                          comptparms,
-                                          clrspc)
+    image = _FUNCTIONS.opj_image_tile_create(len(comptparms),
+                                             comptparms,
+                                             clrspc)
     return image
 
 
+@profiled('read_header')
 def read_header(stream, codec):
     """Decodes an image header.
 
@@ -906,16 +1324,12 @@ def read_header(stream, codec):
     RuntimeError
         If the OpenJPEG library routine opj_read_header fails.
     """
-    ARGTYPES = [STREAM_TYPE_P, CODEC_TYPE,
-                ctypes.POINTER(ctypes.POINTER(ImageType))]
-    OPENJP2.opj_read_header.argtypes = ARGTYPES
-    OPENJP2.opj_read_header.restype = check_error
-
     imagep = ctypes.POINTER(ImageType)()
-    OPENJP2.opj_read_header(stream, codec, ctypes.byref(imagep))
+    _FUNCTIONS.opj_read_header(stream, codec, ctypes.byref(imagep))
     return imagep
 
 
+@profiled('read_tile_header')
 def read_tile_header(codec, stream):
     """Reads a tile header.
 
@@ -948,19 +1362,6 @@ def read_tile_header(codec, stream):
     RuntimeError
         If the OpenJPEG library routine opj_read_tile_header fails.
     """
-    ARGTYPES = [CODEC_TYPE,
-                STREAM_TYPE_P,
-                ctypes.POINTER(ctypes.c_uint32),
-                ctypes.POINTER(ctypes.c_uint32),
-                ctypes.POINTER(ctypes.c_int32),
-                ctypes.POINTER(ctypes.c_int32),
-                ctypes.POINTER(ctypes.c_int32),
-                ctypes.POINTER(ctypes.c_int32),
-                ctypes.POINTER(ctypes.c_uint32),
-                ctypes.POINTER(BOOL_TYPE)]
-    OPENJP2.opj_read_tile_header.argtypes = ARGTYPES
-    OPENJP2.opj_read_tile_header.restype = check_error
-
     tile_index = ctypes.c_uint32()
     data_size = ctypes.c_uint32()
     col0 = ctypes.c_int32()
@@ -969,16 +1370,16 @@ def read_tile_header(codec, stream):
     row1 = ctypes.c_int32()
     ncomps = ctypes.c_uint32()
     go_on = BOOL_TYPE()
-    OPENJP2.opj_read_tile_header(codec,
-                                 stream,
-                                 ctypes.byref(tile_index),
-                                 ctypes.byref(data_size),
-                                 ctypes.byref(col0),
-                                 ctypes.byref(row0),
-                                 ctypes.byref(col1),
-                                 ctypes.byref(row1),
-                                 ctypes.byref(ncomps),
-                                 ctypes.byref(go_on))
+    _FUNCTIONS.opj_read_tile_header(codec,
+                                    stream,
+                                    ctypes.byref(tile_index),
+                                    ctypes.byref(data_size),
+                                    ctypes.byref(col0),
+                                    ctypes.byref(row0),
+                                    ctypes.byref(col1),
+                                    ctypes.byref(row1),
+                                    ctypes.byref(ncomps),
+                                    ctypes.byref(go_on))
     go_on = bool(go_on.value)
     return (tile_index.value,
             data_size.value,
@@ -990,6 +1391,38 @@ def read_tile_header(codec, stream):
             go_on)
 
 
+@profiled('set_decoded_components')
+def set_decoded_components(codec, comps_indices, apply_color_transforms=False):
+    """Wraps openjp2 library function opj_set_decoded_components.
+
+    Restricts decoding to a subset of the image components.  Only the
+    selected components are entropy-decoded and they are returned in the
+    given order.  Must be called after read_header.
+
+    Parameters
+    ----------
+    codec : CODEC_TYPE
+        Codec initialized by create_decompress function.
+    comps_indices : sequence of int
+        Unique indices of the components to decode.
+    apply_color_transforms : bool, optional
+        Must be False, the library does not support color transforms on a
+        subset of the components.
+
+    Raises
+    ------
+    IOError
+        If the OpenJPEG library routine opj_set_decoded_components fails.
+    """
+    numcomps = len(comps_indices)
+    indices = (ctypes.c_uint32 * numcomps)(*comps_indices)
+    _FUNCTIONS.opj_set_decoded_components(codec,
+                                          ctypes.c_uint32(numcomps),
+                                          indices,
+                                          BOOL_TYPE(apply_color_transforms))
+
+
+@profiled('set_decode_area')
 def set_decode_area(codec, image, start_x=0, start_y=0, end_x=0, end_y=0):
     """Wraps openjp2 library function opj_set_decode area.
 
@@ -1012,19 +1445,35 @@ def set_decode_area(codec, image, start_x=0, start_y=0, end_x=0, end_y=0):
     RuntimeError
         If the OpenJPEG library routine opj_set_decode_area fails.
     """
-    OPENJP2.opj_set_decode_area.argtypes = [CODEC_TYPE,
-                                            ctypes.POINTER(ImageType),
-                                            ctypes.c_int32,
-                                            ctypes.c_int32,
-                                            ctypes.c_int32,
-                                            ctypes.c_int32]
-    OPENJP2.opj_set_decode_area.restype = check_error
+    _FUNCTIONS.opj_set_decode_area(codec, image,
+                                   ctypes.c_int32(start_x),
+                                   ctypes.c_int32(start_y),
+                                   ctypes.c_int32(end_x),
+                                   ctypes.c_int32(end_y))
 
-    OPENJP2.opj_set_decode_area(codec, image,
-                                ctypes.c_int32(start_x),
-                                ctypes.c_int32(start_y),
-                                ctypes.c_int32(end_x),
-                                ctypes.c_int32(end_y))
+
+@profiled('set_decoded_resolution_factor')
+def set_decoded_resolution_factor(codec, res_factor):
+    """Wraps openjp2 library function opj_set_decoded_resolution_factor.
+
+    Sets the number of highest resolution levels to be discarded, overriding
+    the cp_reduce value given to setup_decoder.
+
+    Parameters
+    ----------
+    codec : CODEC_TYPE
+        Codec initialized by create_decompress function.
+    res_factor : int
+        Number of highest resolution levels to discard.
+
+    Raises
+    ------
+    RuntimeError
+        If the OpenJPEG library routine opj_set_decoded_resolution_factor
+        fails.
+    """
+    _FUNCTIONS.opj_set_decoded_resolution_factor(codec,
+                                                 ctypes.c_uint32(res_factor))
 
 
 def set_default_decoder_parameters():
@@ -1037,12 +1486,8 @@ def set_default_decoder_parameters():
     dparam : DecompressionParametersType
         Decompression parameters.
     """
-    ARGTYPES = [ctypes.POINTER(DecompressionParametersType)]
-    OPENJP2.opj_set_default_decoder_parameters.argtypes = ARGTYPES
-    OPENJP2.opj_set_default_decoder_parameters.restype = ctypes.c_void_p
-
     dparams = DecompressionParametersType()
-    OPENJP2.opj_set_default_decoder_parameters(ctypes.byref(dparams))
+    _FUNCTIONS.opj_set_default_decoder_parameters(ctypes.byref(dparams))
     return dparams
 
 
@@ -1076,12 +1521,8 @@ def set_default_encoder_parameters():
     cparameters : CompressionParametersType
         Compression parameters.
     """
-    ARGTYPES = [ctypes.POINTER(CompressionParametersType)]
-    OPENJP2.opj_set_default_encoder_parameters.argtypes = ARGTYPES
-    OPENJP2.opj_set_default_encoder_parameters.restype = ctypes.c_void_p
-
     cparams = CompressionParametersType()
-    OPENJP2.opj_set_default_encoder_parameters(ctypes.byref(cparams))
+    _FUNCTIONS.opj_set_default_encoder_parameters(ctypes.byref(cparams))
     return cparams
 
 
@@ -1096,19 +1537,17 @@ def set_error_handler(codec, handler, data=None):
         Codec initialized by create_compress function.
     handler : python function
         The callback function to be used.
-    user_data : anything
-        User/client data.
+    data : int, optional
+        User data handed to the callback along with each message.  Glymur
+        passes the codec itself, so that the callback can find the codec's
+        error context.
 
     Raises
     ------
     RuntimeError
         If the OpenJPEG library routine opj_set_error_handler fails.
     """
-    OPENJP2.opj_set_error_handler.argtypes = [CODEC_TYPE,
-                                              ctypes.c_void_p,
-                                              ctypes.c_void_p]
-    OPENJP2.opj_set_error_handler.restype = check_error
-    OPENJP2.opj_set_error_handler(codec, handler, data)
+    _FUNCTIONS.opj_set_error_handler(codec, handler, data)
 
 
 def set_info_handler(codec, handler, data=None):
@@ -1122,19 +1561,17 @@ def set_info_handler(codec, handler, data=None):
         Codec initialized by create_compress function.
     handler : python function
         The callback function to be used.
-    user_data : anything
-        User/client data.
+    data : int, optional
+        User data handed to the callback along with each message.  Glymur
+        passes the codec itself, so that the callback can find the codec's
+        error context.
 
     Raises
     ------
     RuntimeError
         If the OpenJPEG library routine opj_set_info_handler fails.
     """
-    OPENJP2.opj_set_info_handler.argtypes = [CODEC_TYPE,
-                                             ctypes.c_void_p,
-                                             ctypes.c_void_p]
-    OPENJP2.opj_set_info_handler.restype = check_error
-    OPENJP2.opj_set_info_handler(codec, handler, data)
+    _FUNCTIONS.opj_set_info_handler(codec, handler, data)
 
 
 def set_warning_handler(codec, handler, data=None):
@@ -1148,22 +1585,20 @@ def set_warning_handler(codec, handler, data=None):
         Codec initialized by create_compress function.
     handler : python function
         The callback function to be used.
-    user_data : anything
-        User/client data.
+    data : int, optional
+        User data handed to the callback along with each message.  Glymur
+        passes the codec itself, so that the callback can find the codec's
+        error context.
 
     Raises
     ------
     RuntimeError
         If the OpenJPEG library routine opj_set_warning_handler fails.
     """
-    OPENJP2.opj_set_warning_handler.argtypes = [CODEC_TYPE,
-                                                ctypes.c_void_p,
-                                                ctypes.c_void_p]
-    OPENJP2.opj_set_warning_handler.restype = check_error
-
-    OPENJP2.opj_set_warning_handler(codec, handler, data)
+    _FUNCTIONS.opj_set_warning_handler(codec, handler, data)
 
 
+@profiled('setup_decoder')
 def setup_decoder(codec, dparams):
     """Wraps openjp2 library function opj_setup_decoder.
 
@@ -1181,13 +1616,10 @@ def setup_decoder(codec, dparams):
     RuntimeError
         If the OpenJPEG library routine opj_setup_decoder fails.
     """
-    ARGTYPES = [CODEC_TYPE, ctypes.POINTER(DecompressionParametersType)]
-    OPENJP2.opj_setup_decoder.argtypes = ARGTYPES
-    OPENJP2.opj_setup_decoder.restype = check_error
-
-    OPENJP2.opj_setup_decoder(codec, ctypes.byref(dparams))
+    _FUNCTIONS.opj_setup_decoder(codec, ctypes.byref(dparams))
 
 
+@profiled('setup_encoder')
 def setup_encoder(codec, cparams, image):
     """Wraps openjp2 library function opj_setup_encoder.
 
@@ -1208,14 +1640,10 @@ def setup_encoder(codec, cparams, image):
     RuntimeError
         If the OpenJPEG library routine opj_setup_encoder fails.
     """
-    ARGTYPES = [CODEC_TYPE,
-                ctypes.POINTER(CompressionParametersType),
-                ctypes.POINTER(ImageType)]
-    OPENJP2.opj_setup_encoder.argtypes = ARGTYPES
-    OPENJP2.opj_setup_encoder.restype = check_error
-    OPENJP2.opj_setup_encoder(codec, ctypes.byref(cparams), image)
+    _FUNCTIONS.opj_setup_encoder(codec, ctypes.byref(cparams), image)
 
 
+@profiled('start_compress')
 def start_compress(codec, image, stream):
     """Wraps openjp2 library function opj_start_compress.
 
@@ -1235,14 +1663,34 @@ def start_compress(codec, image, stream):
     RuntimeError
         If the OpenJPEG library routine opj_start_compress fails.
     """
-    OPENJP2.opj_start_compress.argtypes = [CODEC_TYPE,
-                                           ctypes.POINTER(ImageType),
-                                           STREAM_TYPE_P]
-    OPENJP2.opj_start_compress.restype = check_error
+    _FUNCTIONS.opj_start_compress(codec, image, stream)
+
 
-    OPENJP2.opj_start_compress(codec, image, stream)
+@profiled('stream_create')
+def stream_create(buffer_size=STREAM_CHUNK_SIZE, isa_read_stream=True):
+    """Wraps openjp2 library function opj_stream_create.
 
+    Creates a stream without any data source or destination.  The read,
+    write, skip, and seek functions must be supplied before it can be used.
 
+    Parameters
+    ----------
+    buffer_size : int, optional
+        Size of the internal buffer of the stream.
+    isa_read_stream:  bool
+        True (read) or False (write)
+
+    Returns
+    -------
+    stream : STREAM_TYPE_P
+        An OpenJPEG stream.
+    """
+    read_stream = 1 if isa_read_stream else 0
+    stream = _FUNCTIONS.opj_stream_create(buffer_size, read_stream)
+    return stream
+
+
+@profiled('stream_create')
 def _stream_create_default_file_stream_2p0(fptr, isa_read_stream):
     """Wraps openjp2 library function opj_stream_create_default_vile_stream.
 
@@ -1261,14 +1709,13 @@ def _stream_create_default_file_stream_2p0(fptr, isa_read_stream):
     stream : stream_t
         An OpenJPEG file stream.
     """
-    ARGTYPES = [ctypes.c_void_p, ctypes.c_int32]
-    OPENJP2.opj_stream_create_default_file_stream.argtypes = ARGTYPES
-    OPENJP2.opj_stream_create_default_file_stream.restype = STREAM_TYPE_P
     read_stream = 1 if isa_read_stream else 0
-    stream = OPENJP2.opj_stream_create_default_file_stream(fptr, read_stream)
+    stream = _FUNCTIONS.opj_stream_create_default_file_stream(fptr,
+                                                              read_stream)
     return stream
 
 
+@profiled('stream_create')
 def _stream_create_default_file_stream_2p1(fname, isa_read_stream):
     """Wraps openjp2 library function opj_stream_create_default_vile_stream.
 
@@ -1287,21 +1734,20 @@ def _stream_create_default_file_stream_2p1(fname, isa_read_stream):
     stream : stream_t
         An OpenJPEG file stream.
     """
-    ARGTYPES = [ctypes.c_char_p, ctypes.c_int32]
-    OPENJP2.opj_stream_create_default_file_stream.argtypes = ARGTYPES
-    OPENJP2.opj_stream_create_default_file_stream.restype = STREAM_TYPE_P
     read_stream = 1 if isa_read_stream else 0
     file_argument = ctypes.c_char_p(fname.encode())
-    stream = OPENJP2.opj_stream_create_default_file_stream(file_argument,
-                                                           read_stream)
+    stream = _FUNCTIONS.opj_stream_create_default_file_stream(file_argument,
+                                                              read_stream)
     return stream
 
+
 if re.match(r'''2.0''', version()):
     stream_create_default_file_stream = _stream_create_default_file_stream_2p0
 else:
     stream_create_default_file_stream = _stream_create_default_file_stream_2p1
 
 
+@profiled('stream_destroy')
 def stream_destroy(stream):
     """Wraps openjp2 library function opj_stream_destroy.
 
@@ -1312,11 +1758,83 @@ def stream_destroy(stream):
     stream : STREAM_TYPE_P
         The file stream.
     """
-    OPENJP2.opj_stream_destroy.argtypes = [STREAM_TYPE_P]
-    OPENJP2.opj_stream_destroy.restype = ctypes.c_void_p
-    OPENJP2.opj_stream_destroy(stream)
+    _FUNCTIONS.opj_stream_destroy(stream)
+
 
+def stream_set_read_function(stream, read_function):
+    """Wraps openjp2 library function opj_stream_set_read_function.
 
+    Parameters
+    ----------
+    stream : STREAM_TYPE_P
+        The stream.
+    read_function : STREAM_READ_FUNC
+        Copies up to the requested number of bytes into the library buffer
+        and returns the number of bytes copied, or (size_t)-1 at the end of
+        the data.  The caller must keep a reference to it for as long as the
+        stream exists.
+    """
+    _FUNCTIONS.opj_stream_set_read_function(stream, read_function)
+
+
+def stream_set_seek_function(stream, seek_function):
+    """Wraps openjp2 library function opj_stream_set_seek_function.
+
+    Parameters
+    ----------
+    stream : STREAM_TYPE_P
+        The stream.
+    seek_function : STREAM_SEEK_FUNC
+        Moves to an absolute position, returning true on success.  The caller
+        must keep a reference to it for as long as the stream exists.
+    """
+    _FUNCTIONS.opj_stream_set_seek_function(stream, seek_function)
+
+
+def stream_set_skip_function(stream, skip_function):
+    """Wraps openjp2 library function opj_stream_set_skip_function.
+
+    Parameters
+    ----------
+    stream : STREAM_TYPE_P
+        The stream.
+    skip_function : STREAM_SKIP_FUNC
+        Moves by a relative number of bytes, returning the number of bytes
+        skipped or -1 on failure.  The caller must keep a reference to it for
+        as long as the stream exists.
+    """
+    _FUNCTIONS.opj_stream_set_skip_function(stream, skip_function)
+
+
+def stream_set_user_data_length(stream, length):
+    """Wraps openjp2 library function opj_stream_set_user_data_length.
+
+    Parameters
+    ----------
+    stream : STREAM_TYPE_P
+        The stream.
+    length : int
+        Total number of bytes available to a read stream.
+    """
+    _FUNCTIONS.opj_stream_set_user_data_length(stream, length)
+
+
+def stream_set_write_function(stream, write_function):
+    """Wraps openjp2 library function opj_stream_set_write_function.
+
+    Parameters
+    ----------
+    stream : STREAM_TYPE_P
+        The stream.
+    write_function : STREAM_WRITE_FUNC
+        Consumes the given number of bytes from the library buffer and
+        returns the number of bytes written, or (size_t)-1 on failure.  The
+        caller must keep a reference to it for as long as the stream exists.
+    """
+    _FUNCTIONS.opj_stream_set_write_function(stream, write_function)
+
+
+@profiled('write_tile', bytes_in=lambda args, _: args[3])
 def write_tile(codec, tile_index, data, data_size, stream):
     """Wraps openjp2 library function opj_write_tile.
 
@@ -1340,21 +1858,42 @@ def write_tile(codec, tile_index, data, data_size, stream):
     RuntimeError
         If the OpenJPEG library routine opj_write_tile fails.
     """
-    OPENJP2.opj_write_tile.argtypes = [CODEC_TYPE,
-                                       ctypes.c_uint32,
-                                       ctypes.POINTER(ctypes.c_uint8),
-                                       ctypes.c_uint32,
-                                       STREAM_TYPE_P]
-    OPENJP2.opj_write_tile.restype = check_error
-
     datap = data.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8))
-    OPENJP2.opj_write_tile(codec,
-                           ctypes.c_uint32(int(tile_index)),
-                           datap,
-                           ctypes.c_uint32(int(data_size)),
-                           stream)
+    _FUNCTIONS.opj_write_tile(codec,
+                              ctypes.c_uint32(int(tile_index)),
+                              datap,
+                              ctypes.c_uint32(int(data_size)),
+                              stream)
 
 
-def set_error_message(msg):
-    """The openjpeg error handler has recorded an error message."""
-    ERROR_MSG_LST.append(msg)
+def set_error_message(msg, codec=None):
+    """The openjpeg error handler has recorded an error message.
+
+    Parameters
+    ----------
+    msg : str
+        The message.
+    codec : CODEC_TYPE, optional
+        Codec reporting the error, i.e. the handler's user data.  Without an
+        error context, the message goes to the shared ERROR_MSG_LST.
+    """
+    context = error_context(codec)
+    if context is None:
+        ERROR_MSG_LST.append(msg)
+    else:
+        context.errors.append(msg)
+
+
+def set_warning_message(msg, codec=None):
+    """The openjpeg warning handler has recorded a warning message.
+
+    Parameters
+    ----------
+    msg : str
+        The message.
+    codec : CODEC_TYPE, optional
+        Codec reporting the warning, i.e. the handler's user data.
+    """
+    context = error_context(codec)
+    if context is not None:
+        context.warnings.append(msg)
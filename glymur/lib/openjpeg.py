@@ -4,7 +4,7 @@
 import ctypes
 import sys
 
-from .config import glymur_config
+from .config import glymur_config, FunctionTable
 
 _, OPENJPEG = glymur_config()
 
@@ -419,37 +419,66 @@ class ImageType(ctypes.Structure):
                 ("icc_profile_len", ctypes.c_int)]
 
 
+_PROTOTYPES = [
+    ('cio_tell', [ctypes.POINTER(CioType)], ctypes.c_int),
+    ('opj_cio_close', [ctypes.POINTER(CioType)], None),
+    ('opj_cio_open', [ctypes.POINTER(CommonStructType),
+                      ctypes.c_char_p,
+                      ctypes.c_int], ctypes.POINTER(CioType)),
+    ('opj_create_compress', [ctypes.c_int],
+     ctypes.POINTER(CompressionInfoType)),
+    ('opj_create_decompress', [ctypes.c_int],
+     ctypes.POINTER(DecompressionInfoType)),
+    ('opj_decode', [ctypes.POINTER(DecompressionInfoType),
+                    ctypes.POINTER(CioType)], ctypes.POINTER(ImageType)),
+    ('opj_destroy_compress', [ctypes.POINTER(CompressionInfoType)], None),
+    ('opj_destroy_decompress', [ctypes.POINTER(DecompressionInfoType)], None),
+    ('opj_encode', [ctypes.POINTER(CompressionInfoType),
+                    ctypes.POINTER(CioType),
+                    ctypes.POINTER(ImageType)], ctypes.c_int),
+    ('opj_image_create', [ctypes.c_int,
+                          ctypes.POINTER(ImageComptParmType),
+                          ctypes.c_int], ctypes.POINTER(ImageType)),
+    ('opj_image_destroy', [ctypes.POINTER(ImageType)], None),
+    ('opj_set_default_decoder_parameters',
+     [ctypes.POINTER(DecompressionParametersType)], None),
+    ('opj_set_default_encoder_parameters',
+     [ctypes.POINTER(CompressionParametersType)], None),
+    ('opj_set_event_mgr', [ctypes.POINTER(CommonStructType),
+                           ctypes.POINTER(EventMgrType),
+                           ctypes.c_void_p], ctypes.c_void_p),
+    ('opj_setup_decoder', [ctypes.POINTER(DecompressionInfoType),
+                           ctypes.POINTER(DecompressionParametersType)], None),
+    ('opj_setup_encoder', [ctypes.POINTER(CompressionInfoType),
+                           ctypes.POINTER(CompressionParametersType),
+                           ctypes.POINTER(ImageType)], None),
+]
+
+# The library functions, typed once here rather than on every call.
+_FUNCTIONS = FunctionTable(OPENJPEG, _PROTOTYPES)
+
+
 def cio_open(cinfo, src=None):
     """Wrapper for openjpeg library function opj_cio_open."""
-    argtypes = [ctypes.POINTER(CommonStructType), ctypes.c_char_p,
-                ctypes.c_int]
-    OPENJPEG.opj_cio_open.argtypes = argtypes
-    OPENJPEG.opj_cio_open.restype = ctypes.POINTER(CioType)
-
     if src is None:
         length = 0
     else:
         length = len(src)
 
-    cio = OPENJPEG.opj_cio_open(ctypes.cast(cinfo,
-                                            ctypes.POINTER(CommonStructType)),
-                                src,
-                                length)
+    common = ctypes.cast(cinfo, ctypes.POINTER(CommonStructType))
+    cio = _FUNCTIONS.opj_cio_open(common, src, length)
     return cio
 
 
 def cio_close(cio):
     """Wraps openjpeg library function cio_close.
     """
-    OPENJPEG.opj_cio_close.argtypes = [ctypes.POINTER(CioType)]
-    OPENJPEG.opj_cio_close(cio)
+    _FUNCTIONS.opj_cio_close(cio)
 
 
 def cio_tell(cio):
     """Get position in byte stream."""
-    OPENJPEG.cio_tell.argtypes = [ctypes.POINTER(CioType)]
-    OPENJPEG.cio_tell.restype = ctypes.c_int
-    pos = OPENJPEG.cio_tell(cio)
+    pos = _FUNCTIONS.cio_tell(cio)
     return pos
 
 
@@ -458,29 +487,21 @@ def create_compress(fmt):
 
     Creates a J2K/JPT/JP2 compression structure.
     """
-    OPENJPEG.opj_create_compress.argtypes = [ctypes.c_int]
-    OPENJPEG.opj_create_compress.restype = ctypes.POINTER(CompressionInfoType)
-    cinfo = OPENJPEG.opj_create_compress(fmt)
+    cinfo = _FUNCTIONS.opj_create_compress(fmt)
     return cinfo
 
 
 def create_decompress(fmt):
     """Wraps openjpeg library function opj_create_decompress.
     """
-    OPENJPEG.opj_create_decompress.argtypes = [ctypes.c_int]
-    restype = ctypes.POINTER(DecompressionInfoType)
-    OPENJPEG.opj_create_decompress.restype = restype
-    dinfo = OPENJPEG.opj_create_decompress(fmt)
+    dinfo = _FUNCTIONS.opj_create_decompress(fmt)
     return dinfo
 
 
 def decode(dinfo, cio):
     """Wrapper for opj_decode.
     """
-    argtypes = [ctypes.POINTER(DecompressionInfoType), ctypes.POINTER(CioType)]
-    OPENJPEG.opj_decode.argtypes = argtypes
-    OPENJPEG.opj_decode.restype = ctypes.POINTER(ImageType)
-    image = OPENJPEG.opj_decode(dinfo, cio)
+    image = _FUNCTIONS.opj_decode(dinfo, cio)
     return image
 
 
@@ -489,9 +510,7 @@ def destroy_compress(cinfo):
 
     Release resources for a compressor handle.
     """
-    argtypes = [ctypes.POINTER(CompressionInfoType)]
-    OPENJPEG.opj_destroy_compress.argtypes = argtypes
-    OPENJPEG.opj_destroy_compress(cinfo)
+    _FUNCTIONS.opj_destroy_compress(cinfo)
 
 
 def encode(cinfo, cio, image):
@@ -507,81 +526,54 @@ def encode(cinfo, cio, image):
 
     image : image to encode
     """
-    argtypes = [ctypes.POINTER(CompressionInfoType),
-                ctypes.POINTER(CioType),
-                ctypes.POINTER(ImageType)]
-    OPENJPEG.opj_encode.argtypes = argtypes
-    OPENJPEG.opj_encode.restype = ctypes.c_int
-    status = OPENJPEG.opj_encode(cinfo, cio, image)
+    status = _FUNCTIONS.opj_encode(cinfo, cio, image)
     return status
 
 
 def destroy_decompress(dinfo):
     """Wraps openjpeg library function opj_destroy_decompress."""
-    argtypes = [ctypes.POINTER(DecompressionInfoType)]
-    OPENJPEG.opj_destroy_decompress.argtypes = argtypes
-    OPENJPEG.opj_destroy_decompress(dinfo)
+    _FUNCTIONS.opj_destroy_decompress(dinfo)
 
 
 def image_create(cmptparms, cspace):
     """Wrapper for openjpeg library function opj_image_create.
     """
-    lst = [ctypes.c_int, ctypes.POINTER(ImageComptParmType), ctypes.c_int]
-    OPENJPEG.opj_image_create.argtypes = lst
-    OPENJPEG.opj_image_create.restype = ctypes.POINTER(ImageType)
 
-    image = OPENJPEG.opj_image_create(len(cmptparms), cmptparms, cspace)
+    image = _FUNCTIONS.opj_image_create(len(cmptparms), cmptparms, cspace)
     return(image)
 
 
 def image_destroy(image):
     """Wraps openjpeg library function opj_image_destroy."""
-    OPENJPEG.opj_image_destroy.argtypes = [ctypes.POINTER(ImageType)]
-    OPENJPEG.opj_image_destroy(image)
+    _FUNCTIONS.opj_image_destroy(image)
 
 
 def set_default_encoder_parameters():
     """Wrapper for openjpeg library function opj_set_default_encoder_parameters.
     """
     cparams = CompressionParametersType()
-    argtypes = [ctypes.POINTER(CompressionParametersType)]
-    OPENJPEG.opj_set_default_encoder_parameters.argtypes = argtypes
-    OPENJPEG.opj_set_default_encoder_parameters(ctypes.byref(cparams))
+    _FUNCTIONS.opj_set_default_encoder_parameters(ctypes.byref(cparams))
     return cparams
 
 
 def set_default_decoder_parameters(dparams_p):
     """Wrapper for opj_set_default_decoder_parameters.
     """
-    argtypes = [ctypes.POINTER(DecompressionParametersType)]
-    OPENJPEG.opj_set_default_decoder_parameters.argtypes = argtypes
-    OPENJPEG.opj_set_default_decoder_parameters(dparams_p)
+    _FUNCTIONS.opj_set_default_decoder_parameters(dparams_p)
 
 
 def set_event_mgr(dinfo, event_mgr, context=None):
     """Wrapper for openjpeg library function opj_set_event_mgr.
     """
-    argtypes = [ctypes.POINTER(CommonStructType),
-                ctypes.POINTER(EventMgrType),
-                ctypes.c_void_p]
-    OPENJPEG.opj_set_event_mgr.argtypes = argtypes
-    OPENJPEG.opj_set_event_mgr(ctypes.cast(dinfo,
-                                           ctypes.POINTER(CommonStructType)),
-                               event_mgr, context)
+    common = ctypes.cast(dinfo, ctypes.POINTER(CommonStructType))
+    _FUNCTIONS.opj_set_event_mgr(common, event_mgr, context)
 
 
 def setup_encoder(cinfo, cparameters, image):
     """Wrapper for openjpeg library function opj_setup_decoder."""
-    argtypes = [ctypes.POINTER(CompressionInfoType),
-                ctypes.POINTER(CompressionParametersType),
-                ctypes.POINTER(ImageType)]
-    OPENJPEG.opj_setup_encoder.argtypes = argtypes
-    OPENJPEG.opj_setup_encoder(cinfo, cparameters, image)
+    _FUNCTIONS.opj_setup_encoder(cinfo, cparameters, image)
 
 
 def setup_decoder(dinfo, dparams):
     """Wrapper for openjpeg library function opj_setup_decoder."""
-    argtypes = [ctypes.POINTER(DecompressionInfoType),
-                ctypes.POINTER(DecompressionParametersType)]
-    OPENJPEG.opj_setup_decoder.argtypes = argtypes
-    OPENJPEG.opj_setup_decoder(dinfo, dparams)
+    _FUNCTIONS.opj_setup_decoder(dinfo, dparams)
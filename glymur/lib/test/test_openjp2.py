@@ -1,6 +1,8 @@
 """
 Tests for libopenjp2 wrapping functions.
 """
+import ctypes
+import doctest
 import os
 import re
 import tempfile
@@ -12,6 +14,14 @@ import glymur
 from glymur.lib import openjp2
 
 
+# Doc tests should be run as well.
+def load_tests(loader, tests, ignore):
+    """Should run doc tests as well"""
+    if openjp2.OPENJP2 is not None:
+        tests.addTests(doctest.DocTestSuite('glymur.lib.openjp2'))
+    return tests
+
+
 @unittest.skipIf(os.name == "nt", "Temporary file issue on window.")
 @unittest.skipIf(openjp2.OPENJP2 is None,
                  "Missing openjp2 library.")
@@ -148,6 +158,146 @@ class TestOpenJP2(unittest.TestCase):
         self.assertTrue(True)
 
 
+@unittest.skipIf(openjp2.OPENJP2 is None, "Missing openjp2 library.")
+class TestProfiler(unittest.TestCase):
+    """Test recording library calls and Jp2k stages."""
+
+    def setUp(self):
+        self.jp2 = glymur.Jp2k(glymur.data.nemo())
+
+    def test_read(self):
+        """Each stage of a read is recorded with its bytes"""
+        with glymur.Profiler() as profiler:
+            image = self.jp2[::2, ::2]
+        stats = profiler.to_dict()
+        for stage in ['stream_create', 'create_decompress', 'setup_decoder',
+                      'read_header', 'set_decode_area', 'decode',
+                      'end_decompress', 'extract', 'read']:
+            self.assertEqual(stats[stage]['calls'], 1, stage)
+
+        # The library holds 32-bit samples, the image is 8-bit.
+        self.assertEqual(stats['decode']['bytes_out'], 4 * image.nbytes)
+        self.assertEqual(stats['extract']['bytes_in'], 4 * image.nbytes)
+        self.assertEqual(stats['extract']['bytes_out'], image.nbytes)
+        self.assertLessEqual(stats['decode']['seconds'],
+                             stats['read']['seconds'])
+
+    def test_parse_and_stream(self):
+        """Box parsing and in-memory stream reads are recorded"""
+        with open(glymur.data.nemo(), 'rb') as f:
+            data = f.read()
+        with glymur.Profiler() as profiler:
+            jp2 = glymur.Jp2k.from_bytes(data)
+            jp2[::2, ::2]
+        stats = profiler.to_dict()
+        self.assertEqual(stats['parse']['calls'], 1)
+        self.assertGreater(stats['stream_read']['bytes_in'], 0)
+        self.assertLessEqual(stats['stream_read']['bytes_in'], len(data))
+
+    def test_write(self):
+        """Encoding stages are recorded"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            with glymur.Profiler() as profiler:
+                glymur.Jp2k(tfile.name, data=np.zeros((32, 32), np.uint8))
+        stats = profiler.to_dict()
+        for stage in ['setup_encoder', 'start_compress', 'encode',
+                      'end_compress', 'write']:
+            self.assertEqual(stats[stage]['calls'], 1, stage)
+
+    def test_inactive(self):
+        """Nothing is recorded before start or after stop"""
+        profiler = glymur.Profiler()
+        self.jp2[::2, ::2]
+        self.assertEqual(profiler.to_dict(), {})
+
+        profiler.start()
+        self.jp2[::2, ::2]
+        profiler.stop()
+        expected = profiler.to_dict()
+        self.jp2[::2, ::2]
+        self.assertEqual(profiler.to_dict(), expected)
+        self.assertFalse(openjp2.profiling())
+
+        profiler.reset()
+        self.assertEqual(profiler.stats, {})
+
+    def test_sink(self):
+        """A sink sees every call"""
+        calls = []
+        with glymur.Profiler(sink=lambda *args: calls.append(args)) as prof:
+            self.jp2[::2, ::2]
+        stats = prof.to_dict()
+        self.assertEqual(len(calls), sum(s['calls'] for s in stats.values()))
+        decodes = [c for c in calls if c[0] == 'decode']
+        self.assertEqual(decodes[0][3], stats['decode']['bytes_out'])
+
+    def test_several_profilers(self):
+        """Profilers running at the same time each record everything"""
+        with glymur.Profiler() as outer:
+            self.jp2[::2, ::2]
+            with glymur.Profiler() as inner:
+                self.jp2[::2, ::2]
+        self.assertEqual(outer.stats['decode']['calls'], 2)
+        self.assertEqual(inner.stats['decode']['calls'], 1)
+
+    def test_failure(self):
+        """Calls that raise are recorded too"""
+        @openjp2.profiled('failing')
+        def fail():
+            raise IOError('bad')
+
+        with glymur.Profiler() as profiler:
+            with self.assertRaises(IOError):
+                fail()
+        self.assertEqual(profiler.stats['failing']['calls'], 1)
+
+
+@unittest.skipIf(openjp2.OPENJP2 is None, "Missing openjp2 library.")
+class TestFunctionTable(unittest.TestCase):
+    """Test typing the library functions once when the library loads."""
+
+    def test_prototypes(self):
+        """Every wrapped function is typed once, at import"""
+        for prototype in openjp2._PROTOTYPES:
+            name, argtypes, restype = prototype[:3]
+            if name not in openjp2._FUNCTIONS:
+                # Not in this version of the library.
+                self.assertFalse(openjp2.has_function(name))
+                continue
+            func = getattr(openjp2._FUNCTIONS, name)
+            self.assertEqual(list(func.argtypes), list(argtypes))
+            self.assertIs(func.restype, restype)
+            if len(prototype) > 3:
+                self.assertIs(func.errcheck, prototype[3])
+
+    def test_not_retyped(self):
+        """Wrappers call the typed functions without changing them"""
+        func = openjp2._FUNCTIONS.opj_decode
+        glymur.Jp2k(glymur.data.nemo())[::2, ::2]
+        self.assertIs(openjp2._FUNCTIONS.opj_decode, func)
+        self.assertIs(func.errcheck, openjp2._CHECK_CODEC)
+
+        # Changing the library handle's own copy makes no difference.
+        openjp2.OPENJP2.opj_decode.argtypes = []
+        try:
+            glymur.Jp2k(glymur.data.nemo())[::2, ::2]
+        finally:
+            openjp2.OPENJP2.opj_decode.argtypes = None
+
+    def test_missing_function(self):
+        """Functions the library lacks are left out"""
+        table = glymur.lib.config.FunctionTable(
+            openjp2.OPENJP2, [('opj_not_a_function', [], None),
+                              ('opj_version', [], ctypes.c_char_p)])
+        self.assertNotIn('opj_not_a_function', table)
+        self.assertIn('opj_version', table)
+        with self.assertRaises(AttributeError):
+            table.opj_not_a_function()
+
+        table = glymur.lib.config.FunctionTable(None, openjp2._PROTOTYPES)
+        self.assertNotIn('opj_decode', table)
+
+
 def tile_encoder(**kwargs):
     """Fixture used by many tests."""
     num_tiles = ((kwargs['image_width'] / kwargs['tile_width']) *
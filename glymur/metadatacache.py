@@ -0,0 +1,497 @@
+"""This file is part of glymur, a Python interface for accessing JPEG 2000.
+
+http://glymur.readthedocs.org
+
+Copyright 2013 John Evans
+
+License:  MIT
+"""
+import array
+import base64
+import datetime
+import hashlib
+import json
+import numbers
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from uuid import UUID
+
+import lxml.etree as ET
+import numpy as np
+
+from . import _uuid_io, codestream, jp2box, version
+
+
+class MetadataCache(object):
+    """Persistent cache of parsed file metadata.
+
+    Each entry holds the parsed box tree and main codestream header of one
+    file, along with its tile index, keyed by the path, size, modification
+    time, and inode of the file.  The boxes and the codestream header are
+    rebuilt from the entry as they were when stored, so nothing is parsed and
+    the file itself is not read.  An entry whose file has changed since it
+    was stored is invalidated.  The cache is used when it is given to
+    set_parseoptions.
+
+    Entries are stored as JSON, nothing in the cache is ever executed.  Only
+    glymur boxes and marker segments are rebuilt from an entry.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding one file per entry, or SQLite database file.
+    backend : str, optional
+        Either 'directory' or 'sqlite'.
+
+    Attributes
+    ----------
+    path : str
+        Location of the cache.
+    backend : str
+        Either 'directory' or 'sqlite'.
+    hits, misses, invalidations : int
+        Number of entries found, entries not found, and entries found to be
+        out of date.  Out of date entries also count as misses.
+
+    Examples
+    --------
+    >>> import glymur, tempfile
+    >>> cache = glymur.MetadataCache(tempfile.mkdtemp())
+    >>> glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+    >>> glymur.Jp2k(glymur.data.nemo()).shape
+    (1456, 2592, 3)
+    >>> glymur.Jp2k(glymur.data.nemo()).shape
+    (1456, 2592, 3)
+    >>> cache.hits, cache.misses
+    (1, 1)
+    >>> glymur.set_parseoptions(full_codestream=False, metadata_cache=None)
+    """
+    def __init__(self, path, backend='directory'):
+        if backend not in ('directory', 'sqlite'):
+            msg = 'The metadata cache backend must be either "directory" or '
+            msg += '"sqlite", not "{0}".'
+            raise IOError(msg.format(backend))
+
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+        if backend == 'directory':
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            self._connection = None
+        else:
+            self._connection = sqlite3.connect(self.path,
+                                               check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS metadata ('
+                    'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                    'inode INTEGER, version TEXT, payload BLOB)')
+
+    def __repr__(self):
+        msg = "glymur.MetadataCache('{0}', backend='{1}')"
+        return msg.format(self.path, self.backend)
+
+    def __str__(self):
+        msg = 'Metadata Cache:  {0} ({1})\n'
+        msg += '    Hits:  {2}, Misses:  {3}, Invalidations:  {4}'
+        return msg.format(self.path, self.backend, self.hits, self.misses,
+                          self.invalidations)
+
+    @staticmethod
+    def key(filename):
+        """Identity of a file as it is now.
+
+        Parameters
+        ----------
+        filename : str
+            Path to the file.
+
+        Returns
+        -------
+        tuple
+            (absolute path, size, modification time in nanoseconds, inode)
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        mtime_ns = getattr(stat, 'st_mtime_ns', int(stat.st_mtime * 1e9))
+        return (path, stat.st_size, mtime_ns, stat.st_ino)
+
+    def get(self, key):
+        """Look up the metadata stored for a file.
+
+        Parameters
+        ----------
+        key : tuple
+            File identity, as returned by the key method.
+
+        Returns
+        -------
+        dict or None
+            The metadata, see put, or None if there is no entry for the file
+            as it is now.
+        """
+        with self._lock:
+            stored = self._load(key[0])
+            if stored is None:
+                self.misses += 1
+                return None
+
+            stored_key, stored_version, payload = stored
+            metadata = None
+            if stored_key == key and stored_version == version.version:
+                try:
+                    metadata = _decode(payload)
+                except _BAD_ENTRY:
+                    # Truncated or otherwise not a cache entry.
+                    metadata = None
+
+            if metadata is None:
+                self.invalidations += 1
+                self.misses += 1
+                self._remove(key[0])
+                return None
+
+            self.hits += 1
+            return metadata
+
+    def put(self, key, metadata):
+        """Store the metadata of a file.
+
+        Parameters
+        ----------
+        key : tuple
+            File identity, as returned by the key method.
+        metadata : dict
+            The codec format and length of the file, its list of boxes, and
+            its codestream header with the tile index built.
+
+        Raises
+        ------
+        TypeError
+            If the metadata holds a value that cannot be stored.
+        """
+        payload = _encode(metadata)
+        with self._lock:
+            self._store(key, version.version, payload)
+
+    def clear(self):
+        """Remove all entries, the counters are left alone."""
+        with self._lock:
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute('DELETE FROM metadata')
+            else:
+                for name in os.listdir(self.path):
+                    if name.endswith('.json'):
+                        os.remove(os.path.join(self.path, name))
+
+    def close(self):
+        """Close the SQLite database."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _entry_file(self, path):
+        """File holding the directory entry for a path."""
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.json')
+
+    def _load(self, path):
+        """(key, version, payload) stored for a path, or None.
+
+        The payload has already been rebuilt by _rebuild.
+        """
+        if self._connection is not None:
+            row = self._connection.execute(
+                'SELECT path, size, mtime_ns, inode, version, payload '
+                'FROM metadata WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                return None
+            try:
+                payload = json.loads(row[5], object_hook=_rebuild)
+            except _BAD_ENTRY:
+                payload = None
+            return tuple(row[:4]), row[4], payload
+
+        try:
+            with open(self._entry_file(path), 'rb') as fptr:
+                stored = fptr.read()
+        except (IOError, OSError):
+            return None
+
+        try:
+            # The payload is rebuilt along with the rest of the entry, so the
+            # file is decoded only once.
+            stored = json.loads(stored.decode('utf-8'), object_hook=_rebuild)
+            return tuple(stored['key']), stored['version'], stored['payload']
+        except _BAD_ENTRY:
+            # Truncated or otherwise unreadable, treat it as out of date.
+            return (None, None, None)
+
+    def _store(self, key, version_string, payload):
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO metadata '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    tuple(key) + (version_string, json.dumps(payload)))
+            return
+
+        # Write to a temporary file first so that readers never see a
+        # partial entry.
+        stored = json.dumps({'key': list(key), 'version': version_string,
+                             'payload': payload})
+        tfile = tempfile.NamedTemporaryFile(dir=self.path, suffix='.tmp',
+                                            delete=False)
+        try:
+            with tfile:
+                tfile.write(stored.encode('utf-8'))
+            if hasattr(os, 'replace'):
+                os.replace(tfile.name, self._entry_file(key[0]))
+            else:
+                os.rename(tfile.name, self._entry_file(key[0]))
+        finally:
+            if os.path.exists(tfile.name):
+                os.remove(tfile.name)
+
+    def _remove(self, path):
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute(
+                    'DELETE FROM metadata WHERE path = ?', (path,))
+            return
+        try:
+            os.remove(self._entry_file(path))
+        except (IOError, OSError):
+            pass
+
+
+def _encode(metadata):
+    """Metadata as something json.dumps takes, see _dump."""
+    return {'codec_format': metadata['codec_format'],
+            'length': metadata['length'],
+            'box': _dump(metadata['box']),
+            'codestream': _dump(metadata['codestream'])}
+
+
+def _decode(payload):
+    """Metadata from the JSON payload, as rebuilt by _rebuild.
+
+    Raises
+    ------
+    Exception
+        One of _BAD_ENTRY, if the payload is not a cache entry.
+    """
+    if not isinstance(payload['codestream'], codestream.Codestream):
+        raise TypeError('The cache entry holds no codestream.')
+    return {'codec_format': int(payload['codec_format']),
+            'length': int(payload['length']),
+            'box': list(payload['box']),
+            'codestream': payload['codestream']}
+
+
+# Raised when rebuilding something that is not a cache entry, e.g. a file
+# that was cut short.
+_BAD_ENTRY = (AttributeError, IndexError, KeyError, TypeError, ValueError)
+
+if sys.hexversion >= 0x03000000:
+    _TEXT_TYPES = (str,)
+else:
+    _TEXT_TYPES = (unicode,)
+
+
+def _dump(value):
+    """A parsed value as something json.dumps takes, see _rebuild.
+
+    Lists and JSON scalars are kept as they are.  Anything else becomes a
+    JSON object with a single item whose name, starting with '$', tells what
+    to rebuild.  Boxes and marker segments also have their attributes as
+    items, so that they come back with exactly the attributes they had.
+
+    Raises
+    ------
+    TypeError
+        If the value is of a type that is not stored.
+    """
+    if value is None or isinstance(value, (bool, float) + _TEXT_TYPES):
+        return value
+    if (isinstance(value, numbers.Integral) and
+            not isinstance(value, np.generic)):
+        return value
+    if isinstance(value, list):
+        if len(value) > 0 and all(type(item) is tuple for item in value):
+            # One JSON object for the whole list, e.g. the tile parts of the
+            # tile index, rather than one for each tuple.
+            return {'$tuples': [[_dump(field) for field in item]
+                                for item in value]}
+        return [_dump(item) for item in value]
+    if isinstance(value, tuple):
+        return {'$tuple': [_dump(item) for item in value]}
+    if isinstance(value, dict):
+        kind = '$odict' if isinstance(value, OrderedDict) else '$dict'
+        return {kind: [[_dump(key), _dump(item)]
+                       for key, item in value.items()]}
+    if isinstance(value, bytes):
+        # Also str on Python 2.
+        return {'$bytes': _b64encode(value)}
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        return {'$ndarray': [_dump_dtype(value.dtype), list(value.shape),
+                             _b64encode(value.tobytes())]}
+    if isinstance(value, np.generic) and not value.dtype.hasobject:
+        return {'$scalar': [_dump_dtype(value.dtype),
+                            _b64encode(value.tobytes())]}
+    if isinstance(value, np.dtype):
+        return {'$dtype': _dump_dtype(value)}
+    if isinstance(value, array.array):
+        if hasattr(value, 'tobytes'):
+            data = value.tobytes()
+        else:
+            data = value.tostring()
+        return {'$array': [value.typecode, _b64encode(data)]}
+    if isinstance(value, UUID):
+        return {'$uuid': str(value)}
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        return {'$datetime': [value.year, value.month, value.day,
+                              value.hour, value.minute, value.second,
+                              value.microsecond]}
+    if isinstance(value, ET._ElementTree):
+        return {'$xml': _b64encode(ET.tostring(value, encoding='utf-8'))}
+    if isinstance(value, ET._Element):
+        return {'$element': _b64encode(ET.tostring(value, encoding='utf-8'))}
+    if type(value).__module__ in _MODULES:
+        obj = dict((key, _dump(item))
+                   for key, item in value.__dict__.items())
+        obj['$object'] = type(value).__module__ + '.' + type(value).__name__
+        return obj
+
+    msg = 'A {0} is not stored in the metadata cache.'
+    raise TypeError(msg.format(type(value).__name__))
+
+
+def _rebuild(obj):
+    """Rebuild a JSON object written by _dump.
+
+    This is the object hook given to json.loads, so anything within the
+    object has already been rebuilt.
+
+    Raises
+    ------
+    Exception
+        One of _BAD_ENTRY, if the object did not come from _dump.
+    """
+    if '$object' in obj:
+        module, _, name = obj.pop('$object').rpartition('.')
+        cls = getattr(_MODULES.get(module), str(name), None)
+        if not isinstance(cls, type):
+            msg = '{0}.{1} is not stored in the metadata cache.'
+            raise ValueError(msg.format(module, name))
+        instance = cls.__new__(cls)
+        if sys.hexversion >= 0x03000000:
+            instance.__dict__.update(obj)
+        else:
+            instance.__dict__.update((str(key), item)
+                                     for key, item in obj.items())
+        return instance
+
+    if len(obj) != 1:
+        # Not written by _dump, e.g. the entry itself.
+        return obj
+    kind, value = list(obj.items())[0]
+    if not kind.startswith('$'):
+        return obj
+    return _REBUILDERS[kind](value)
+
+
+def _rebuild_ndarray(value):
+    dtype, shape, data = value
+    data = np.frombuffer(_b64decode(data), dtype=_load_dtype(dtype))
+    return data.reshape(shape).copy()
+
+
+def _rebuild_scalar(value):
+    dtype, data = value
+    return np.frombuffer(_b64decode(data), dtype=_load_dtype(dtype))[0]
+
+
+def _rebuild_array(value):
+    typecode, data = value
+    result = array.array(str(typecode))
+    if hasattr(result, 'frombytes'):
+        result.frombytes(_b64decode(data))
+    else:
+        result.fromstring(_b64decode(data))
+    return result
+
+
+_REBUILDERS = {
+    '$tuple': tuple,
+    '$tuples': lambda items: [tuple(item) for item in items],
+    '$dict': lambda items: dict(tuple(item) for item in items),
+    '$odict': lambda items: OrderedDict(tuple(item) for item in items),
+    '$bytes': lambda text: _b64decode(text),
+    '$ndarray': _rebuild_ndarray,
+    '$scalar': _rebuild_scalar,
+    '$dtype': lambda text: _load_dtype(text),
+    '$array': _rebuild_array,
+    '$uuid': UUID,
+    '$datetime': lambda fields: datetime.datetime(*fields),
+    '$xml': lambda text: ET.ElementTree(ET.fromstring(_b64decode(text))),
+    '$element': lambda text: ET.fromstring(_b64decode(text)),
+}
+
+
+def _dump_dtype(dtype):
+    """A dtype as text, JSON for a structured one."""
+    if dtype.names is None:
+        return dtype.str
+    return json.dumps(dtype.descr)
+
+
+def _load_dtype(text):
+    """The dtype written by _dump_dtype."""
+    try:
+        return _DTYPES[text]
+    except KeyError:
+        pass
+    if text.startswith('['):
+        dtype = np.dtype(_dtype_fields(json.loads(text)))
+    else:
+        dtype = np.dtype(str(text))
+    _DTYPES[text] = dtype
+    return dtype
+
+
+def _dtype_fields(descr):
+    """JSON lists of a structured dtype description back into tuples."""
+    fields = []
+    for field in descr:
+        dtype = field[1]
+        dtype = _dtype_fields(dtype) if isinstance(dtype, list) else str(dtype)
+        fields.append((str(field[0]), dtype) + tuple(tuple(shape)
+                                                     for shape in field[2:]))
+    return fields
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _b64decode(text):
+    return base64.b64decode(text.encode('ascii'))
+
+
+# Dtypes already read from cache entries, by their text.
+_DTYPES = {}
+
+# Modules whose classes are rebuilt from cache entries, by name.
+_MODULES = dict((module.__name__, module)
+                for module in (_uuid_io, codestream, jp2box))
@@ -0,0 +1,162 @@
+"""This file is part of glymur, a Python interface for accessing JPEG 2000.
+
+http://glymur.readthedocs.org
+
+Copyright 2013 John Evans
+
+License:  MIT
+"""
+from collections import deque
+import os
+import threading
+
+
+class RangeReader(object):
+    """Seekable file-like view of a source that is read by byte range.
+
+    Jp2k objects created from a RangeReader fetch only the byte ranges that
+    box parsing, codestream parsing, and decoding actually need.  The fetches
+    are counted, and the most recent of them may be kept in a log.
+
+    Parameters
+    ----------
+    read_range : callable
+        Called as read_range(offset, length) and returning the bytes in that
+        range.  Fewer bytes may be returned only at the end of the source.
+    length : int
+        Total size of the source in bytes.
+    block_size : int, optional
+        Size of the reads the decoder makes through the reader.  Smaller
+        blocks fetch fewer unneeded bytes, larger blocks need fewer fetches.
+    fetch_log : int, optional
+        Number of the most recent fetches to keep in the fetches log.  By
+        default none are kept.
+
+    Attributes
+    ----------
+    length : int
+        Total size of the source in bytes.
+    block_size : int
+        Size of the decoder reads.
+    num_fetches, bytes_fetched : int
+        Number of ranges and of bytes fetched so far.
+    fetches : deque
+        (offset, number of bytes) of the most recent ranges fetched, no more
+        than fetch_log of them.
+
+    Examples
+    --------
+    >>> import glymur
+    >>> reader = glymur.RangeReader.from_file(open(glymur.data.nemo(), 'rb'))
+    >>> jp2 = glymur.Jp2k(reader)
+    >>> jp2.shape
+    (1456, 2592, 3)
+    >>> reader.bytes_fetched < 4096
+    True
+    """
+    def __init__(self, read_range, length, block_size=16 * 1024,
+                 fetch_log=0):
+        self._read_range = read_range
+        self.length = length
+        self.block_size = block_size
+        self.num_fetches = 0
+        self.bytes_fetched = 0
+        self.fetches = deque(maxlen=fetch_log)
+        self._stats_lock = threading.Lock()
+        self._position = 0
+
+    @classmethod
+    def from_file(cls, fptr, block_size=16 * 1024, fetch_log=0):
+        """Create a reader over a seekable file object.
+
+        Parameters
+        ----------
+        fptr : file
+            Any object with read, seek, and tell methods.  The reader does
+            not close it.
+        block_size : int, optional
+            Size of the decoder reads.
+        fetch_log : int, optional
+            Number of the most recent fetches to keep in the fetches log.
+
+        Returns
+        -------
+        RangeReader
+            Reader fetching through the file object.
+        """
+        fptr.seek(0, os.SEEK_END)
+        length = fptr.tell()
+
+        # Reads on several threads share the file position.
+        lock = threading.Lock()
+
+        def read_range(offset, length):
+            with lock:
+                fptr.seek(offset)
+                return fptr.read(length)
+
+        return cls(read_range, length, block_size=block_size,
+                   fetch_log=fetch_log)
+
+    def __repr__(self):
+        msg = 'glymur.RangeReader({0!r}, {1}, block_size={2})'
+        return msg.format(self._read_range, self.length, self.block_size)
+
+    def __str__(self):
+        msg = 'Range Reader:  {0} bytes\n'
+        msg += '    Fetches:  {1}, Bytes fetched:  {2}'
+        return msg.format(self.length, self.num_fetches, self.bytes_fetched)
+
+    def reset_stats(self):
+        """Forget the fetches made so far."""
+        with self._stats_lock:
+            self.num_fetches = 0
+            self.bytes_fetched = 0
+            self.fetches.clear()
+
+    def read_range(self, offset, length):
+        """Fetch a byte range, without moving the file position.
+
+        Parameters
+        ----------
+        offset, length : int
+            Start and size of the range.  The range is clipped to the end
+            of the source.
+
+        Returns
+        -------
+        bytes
+            The contents of the range.
+        """
+        length = max(min(length, self.length - offset), 0)
+        if length == 0:
+            return b''
+        data = self._read_range(offset, length)
+        with self._stats_lock:
+            self.num_fetches += 1
+            self.bytes_fetched += len(data)
+            self.fetches.append((offset, len(data)))
+        return data
+
+    def read(self, size=-1):
+        """Read from the current position, as a file object would."""
+        if size is None or size < 0:
+            size = self.length - self._position
+        data = self.read_range(self._position, size)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move the current position, as a file object would."""
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        if offset < 0:
+            raise IOError('Cannot seek to a negative position.')
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        """Return the current position."""
+        return self._position
@@ -0,0 +1,189 @@
+"""
+Test cases for the asyncio facade, imported by test_aio on Python versions
+that can compile them.
+"""
+import asyncio
+import concurrent.futures
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+import glymur
+from glymur import Jp2k, AsyncJp2k
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestAsyncJp2k(unittest.TestCase):
+    """Test reading without blocking the event loop."""
+
+    @classmethod
+    def setUpClass(self):
+        data = Jp2k(glymur.data.goodstuff())[:]
+
+        # 800 x 480 with 256 x 128 tiles leaves partial tiles at the edges.
+        self.tfile = tempfile.NamedTemporaryFile(suffix='.j2k', delete=False)
+        self.tfile.close()
+        self.jp2 = Jp2k(self.tfile.name, data=data, tilesize=(256, 128),
+                        cratios=[20, 5, 1], numres=4)
+
+    @classmethod
+    def tearDownClass(self):
+        os.unlink(self.tfile.name)
+
+    def setUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_read_matches_slicing(self):
+        """Windows and reduced resolutions match array-style slicing"""
+        async def read():
+            jp2 = await AsyncJp2k.open(self.tfile.name,
+                                       executor=self.executor)
+            return await asyncio.gather(
+                jp2.read(),
+                jp2.read(area=(100, 50, 700, 400)),
+                jp2.read(area=(100, 50, 700, 400), rlevel=2),
+                jp2.read(rlevel=-1))
+
+        full, window, reduced, thumbnail = asyncio.run(read())
+        np.testing.assert_array_equal(full, self.jp2[:])
+        np.testing.assert_array_equal(window, self.jp2[100:700, 50:400])
+        np.testing.assert_array_equal(reduced,
+                                      self.jp2[100:700:4, 50:400:4])
+        np.testing.assert_array_equal(thumbnail, self.jp2[::8, ::8])
+
+    def test_layer(self):
+        """A quality layer can be chosen"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor)
+        actual = asyncio.run(jp2.read(layer=1))
+        self.jp2.layer = 1
+        expected = self.jp2[:]
+        self.jp2.layer = 0
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_single_band_uint16(self):
+        """Single band 16-bit images come back as 2D arrays"""
+        data = np.arange(300 * 200, dtype=np.uint16).reshape(300, 200)
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = AsyncJp2k(Jp2k(tfile.name, data=data, tilesize=(128, 128)),
+                            executor=self.executor)
+            actual = asyncio.run(jp2.read(area=(10, 10, 290, 190)))
+        self.assertEqual(actual.dtype, np.uint16)
+        np.testing.assert_array_equal(actual, data[10:290, 10:190])
+
+    def test_max_decodes(self):
+        """No more than max_decodes reads of a file are decoding at once"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor,
+                        max_decodes=2)
+        lock = threading.Lock()
+        counts = {'active': 0, 'peak': 0}
+        read = jp2.jp2k._read
+
+        def counting_read(**kwargs):
+            with lock:
+                counts['active'] += 1
+                counts['peak'] = max(counts['peak'], counts['active'])
+            try:
+                return read(**kwargs)
+            finally:
+                with lock:
+                    counts['active'] -= 1
+
+        jp2.jp2k._read = counting_read
+
+        async def read_many():
+            return await asyncio.gather(*[jp2.read() for _ in range(4)])
+
+        for image in asyncio.run(read_many()):
+            np.testing.assert_array_equal(image, self.jp2[:])
+        self.assertEqual(counts['peak'], 2)
+
+    def test_one_job_per_tile_row(self):
+        """Each row of tiles in the window is decoded by a single job"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor)
+        areas = []
+        read = jp2.jp2k._read
+
+        def recording_read(**kwargs):
+            areas.append(kwargs['area'])
+            return read(**kwargs)
+
+        jp2.jp2k._read = recording_read
+        image = asyncio.run(jp2.read(area=(100, 50, 700, 400)))
+        np.testing.assert_array_equal(image, self.jp2[100:700, 50:400])
+        self.assertEqual(areas, [(100, 50, 256, 400), (256, 50, 512, 400),
+                                 (512, 50, 700, 400)])
+
+    def test_setup_in_executor(self):
+        """The read is set up by the executor, not the event loop"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor)
+        threads = []
+        populate = jp2.jp2k._populate_dparams
+
+        def recording_populate(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return populate(*args, **kwargs)
+
+        jp2.jp2k._populate_dparams = recording_populate
+        image = asyncio.run(jp2.read(rlevel=1))
+        np.testing.assert_array_equal(image, self.jp2[::2, ::2])
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_event_loops(self):
+        """An object can be read from one event loop after another"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor,
+                        max_decodes=1)
+
+        async def read_many():
+            return await asyncio.gather(*[jp2.read(rlevel=2)
+                                          for _ in range(3)])
+
+        for _ in range(2):
+            for image in asyncio.run(read_many()):
+                np.testing.assert_array_equal(image, self.jp2[::4, ::4])
+
+    def test_cancel_between_rows(self):
+        """A cancelled read decodes no more rows of tiles"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def blocking_read(**kwargs):
+            calls.append(kwargs['area'])
+            started.set()
+            release.wait(10)
+
+        jp2.jp2k._read = blocking_read
+
+        async def cancel():
+            task = asyncio.ensure_future(jp2.read())
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, started.wait, 10)
+            task.cancel()
+            release.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel())
+        self.executor.shutdown()
+        self.assertEqual(len(calls), 1)
+
+    def test_bad_area(self):
+        """The area and rlevel are validated"""
+        jp2 = AsyncJp2k(Jp2k(self.tfile.name), executor=self.executor)
+        with self.assertRaises(IOError):
+            asyncio.run(jp2.read(area=(900, 0, 1000, 100)))
+        with self.assertRaises(IOError):
+            asyncio.run(jp2.read(rlevel=10))
+
+    def test_bad_max_decodes(self):
+        """At least one decode must be allowed"""
+        with self.assertRaises(ValueError):
+            AsyncJp2k(Jp2k(self.tfile.name), max_decodes=0)
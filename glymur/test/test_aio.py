@@ -0,0 +1,20 @@
+"""
+Test suite for the asyncio facade.
+"""
+import doctest
+import sys
+
+import glymur
+
+# The test cases use syntax not available before Python 3.7.
+if sys.hexversion >= 0x03070000:
+    from ._aio_cases import TestAsyncJp2k
+
+
+# Doc tests should be run as well.
+def load_tests(loader, tests, ignore):
+    """Should run doc tests as well"""
+    if (sys.hexversion >= 0x03070000 and
+            glymur.lib.openjp2.OPENJP2 is not None):
+        tests.addTests(doctest.DocTestSuite('glymur.aio'))
+    return tests
@@ -1,6 +1,7 @@
 """
 Test suite for openjpeg's callback functions.
 """
+import concurrent.futures
 import os
 import re
 import sys
@@ -15,6 +16,8 @@ else:
     from unittest.mock import patch
     from io import StringIO
 
+import numpy as np
+
 import glymur
 
 from .fixtures import WARNING_INFRASTRUCTURE_ISSUE, WARNING_INFRASTRUCTURE_MSG
@@ -97,3 +100,93 @@ class TestCallbacks(unittest.TestCase):
                 self.assertRegexpMatches(actual, regex)
             else:
                 self.assertRegex(actual, regex)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestThreadSafety(unittest.TestCase):
+    """Reads on several threads at once keep their errors apart."""
+
+    def setUp(self):
+        self.jp2 = glymur.Jp2k(glymur.data.nemo())
+        self.j2k = glymur.Jp2k(glymur.data.goodstuff())
+
+    def test_concurrent_reads(self):
+        """Windows read on many threads match those read on one"""
+        windows = [(slice(r, r + 200), slice(c, c + 300))
+                   for r in range(0, 1200, 300) for c in range(0, 2400, 600)]
+        expected = [self.jp2[window] for window in windows]
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            for _ in range(3):
+                actual = list(executor.map(self.jp2.__getitem__, windows))
+                for a, e in zip(actual, expected):
+                    np.testing.assert_array_equal(a, e)
+
+    def test_concurrent_errors(self):
+        """Each failing read raises the errors of its own codec"""
+        def read(k):
+            if k % 2 == 0:
+                return self.j2k[::2, ::2].shape
+            with self.assertRaises(IOError) as cm:
+                self.j2k.read(tile=1000 + k)
+            return str(cm.exception)
+
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(read, range(64)))
+
+        for k, result in enumerate(results):
+            if k % 2 == 0:
+                self.assertEqual(result, (400, 240, 3))
+            else:
+                msg = 'incorrect {0} (max = 0)'.format(1000 + k)
+                self.assertIn(msg, result)
+                self.assertEqual(result.count('OpenJPEG library error'), 1)
+
+        # Nothing is left behind.
+        self.assertEqual(glymur.lib.openjp2.ERROR_MSG_LST, [])
+        self.assertEqual(glymur.lib.openjp2._CONTEXTS, {})
+
+    def test_shared_tile_cache(self):
+        """A tile cache may be shared by threads"""
+        jp2 = glymur.Jp2k(glymur.data.goodstuff())
+        jp2.tile_cache = glymur.TileCache()
+        windows = [(slice(r, r + 100), slice(0, 100))
+                   for r in range(0, 700, 100)] * 4
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            actual = list(executor.map(jp2.__getitem__, windows))
+        for window, image in zip(windows, actual):
+            np.testing.assert_array_equal(image, self.j2k[window])
+
+    def test_concurrent_layers(self):
+        """A layer given to a read applies to that read only"""
+        with tempfile.NamedTemporaryFile(suffix='.j2k') as tfile:
+            jp2 = glymur.Jp2k(tfile.name, data=self.j2k[:],
+                              cratios=[20, 5, 1])
+            expected = [jp2.read(layer=layer) for layer in range(3)]
+            self.assertEqual(jp2.layer, 0)
+
+            def read(k):
+                return jp2.read(layer=k % 3, area=(0, 0, 800, 480))
+
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                actual = list(executor.map(read, range(24)))
+            for k, image in enumerate(actual):
+                np.testing.assert_array_equal(image, expected[k % 3])
+            self.assertEqual(jp2.layer, 0)
+
+    def test_error_context(self):
+        """Messages go to the context of the codec given as user data"""
+        codec = glymur.lib.openjp2.create_decompress(
+            glymur.lib.openjp2.CODEC_J2K)
+        try:
+            context = glymur.lib.openjp2.error_context(codec)
+            glymur.lib.openjp2.set_error_message('bad', codec)
+            glymur.lib.openjp2.set_warning_message('odd', codec)
+            self.assertEqual(context.errors, ['bad'])
+            self.assertEqual(context.warnings, ['odd'])
+            self.assertEqual(glymur.lib.openjp2.ERROR_MSG_LST, [])
+            self.assertEqual(context.pop_errors(), ['bad'])
+            self.assertEqual(context.errors, [])
+        finally:
+            glymur.lib.openjp2.destroy_codec(codec)
+        self.assertIsNone(glymur.lib.openjp2.error_context(codec))
@@ -1,6 +1,7 @@
 """
 Test suite specifically targeting JP2 box layout.
 """
+import concurrent.futures
 import doctest
 import os
 import re
@@ -11,6 +12,11 @@ import tempfile
 from uuid import UUID
 import unittest
 
+if sys.hexversion <= 0x03030000:
+    from mock import patch
+else:
+    from unittest.mock import patch
+
 import lxml.etree as ET
 import numpy as np
 
@@ -1030,6 +1036,112 @@ class TestJp2Boxes(unittest.TestCase):
                          j.box[5].offset + 8)
 
 
+class TestLazyParsing(unittest.TestCase):
+    """Tests for deferring the parsing of box payloads."""
+
+    def setUp(self):
+        glymur.set_parseoptions(full_codestream=False, lazy=True)
+
+    def tearDown(self):
+        glymur.set_parseoptions(full_codestream=False, lazy=False)
+
+    def test_payloads_deferred(self):
+        """Only the boxes needed for validation are parsed on open"""
+        with patch('glymur.jp2box.UUIDBox.parse',
+                   wraps=glymur.jp2box.UUIDBox.parse) as mock_parse:
+            jp2 = Jp2k(glymur.data.nemo())
+            uuid_box = jp2.box[3]
+            self.assertEqual(uuid_box.box_id, 'uuid')
+            self.assertEqual(uuid_box.offset, 77)
+            self.assertEqual(mock_parse.call_count, 0)
+
+            # Parsed upon first use, and only once.
+            self.assertEqual(uuid_box.uuid,
+                             UUID('be7acfcb-97a9-42e8-9c71-999491e3afac'))
+            str(uuid_box)
+            self.assertEqual(mock_parse.call_count, 1)
+        self.assertIsInstance(uuid_box, glymur.jp2box.UUIDBox)
+
+    def test_same_as_eager(self):
+        """Lazily parsed files print the same as eagerly parsed ones"""
+        for filename in [glymur.data.nemo(), glymur.data.jpxfile()]:
+            lazy = str(Jp2k(filename))
+            glymur.set_parseoptions(full_codestream=False, lazy=False)
+            eager = str(Jp2k(filename))
+            glymur.set_parseoptions(full_codestream=False, lazy=True)
+            self.assertEqual(lazy, eager)
+
+    def test_superbox_children_deferred(self):
+        """The children of a superbox are deferred as well"""
+        jpx = Jp2k(glymur.data.jpxfile())
+        asoc = jpx.box[-1]
+        self.assertEqual(asoc.box_id, 'asoc')
+        self.assertTrue(all('_deferred' in box.__dict__
+                            for box in asoc.box))
+        nlst = asoc.box[0].box[0]
+        self.assertEqual(nlst.box_id, 'nlst')
+        self.assertTrue('_deferred' in nlst.__dict__)
+        self.assertEqual(len(nlst.associations), 2)
+
+    def test_in_memory(self):
+        """Deferred boxes from an in-memory file are parsed from memory"""
+        with open(glymur.data.nemo(), 'rb') as f:
+            jp2 = Jp2k.from_bytes(f.read())
+        self.assertEqual(jp2.box[3].uuid,
+                         UUID('be7acfcb-97a9-42e8-9c71-999491e3afac'))
+        self.assertEqual(jp2.shape, (1456, 2592, 3))
+
+    def test_failed_parse_stays_deferred(self):
+        """A payload that could not be read can be parsed again"""
+        jp2 = Jp2k(glymur.data.nemo())
+        with patch('glymur.jp2box.Jp2kBox._parse_this_box',
+                   side_effect=IOError):
+            with self.assertRaises(IOError):
+                jp2.box[3].uuid
+        self.assertEqual(jp2.box[3].uuid,
+                         UUID('be7acfcb-97a9-42e8-9c71-999491e3afac'))
+
+    def test_shared_source_threads(self):
+        """Boxes sharing an in-memory file may be parsed on many threads"""
+        with open(glymur.data.jpxfile(), 'rb') as f:
+            data = f.read()
+        glymur.set_parseoptions(full_codestream=False, lazy=False)
+        expected = [str(box) for box in Jp2k.from_bytes(data).box]
+        glymur.set_parseoptions(full_codestream=False, lazy=True)
+
+        for _ in range(5):
+            jpx = Jp2k.from_bytes(data)
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                actual = list(executor.map(str, jpx.box))
+            self.assertEqual(actual, expected)
+
+    def test_missing_attribute(self):
+        """Attributes a box does not have are still errors"""
+        jp2 = Jp2k(glymur.data.nemo())
+        with self.assertRaises(AttributeError):
+            jp2.box[3].not_an_attribute
+        with self.assertRaises(AttributeError):
+            jp2.not_an_attribute
+
+    def test_full_codestream_default(self):
+        """full_codestream may be given by position or left to its default"""
+        try:
+            glymur.set_parseoptions()
+            self.assertTrue(glymur.get_parseoptions()['full_codestream'])
+            glymur.set_parseoptions(False)
+            self.assertFalse(glymur.get_parseoptions()['full_codestream'])
+        finally:
+            glymur.set_parseoptions(full_codestream=False)
+
+        # The other options are left as they are.
+        self.assertTrue(glymur.get_parseoptions()['lazy'])
+
+    def test_bad_option(self):
+        """Only known parse options can be set"""
+        with self.assertRaises(TypeError):
+            glymur.set_parseoptions(lazy_boxes=True)
+
+
 class TestRepr(MetadataBase):
     """Tests for __repr__ methods."""
     def test_default_jp2k(self):
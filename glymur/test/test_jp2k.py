@@ -1,9 +1,12 @@
 """
 Tests for general glymur functionality.
 """
+import concurrent.futures
 import doctest
+import io
 import os
 import re
+import shutil
 import struct
 import sys
 import tempfile
@@ -16,6 +19,7 @@ if sys.hexversion <= 0x03030000:
     from mock import patch
 else:
     from unittest.mock import patch
+    from concurrent.futures.process import BrokenProcessPool
 
 import numpy as np
 import pkg_resources
@@ -49,6 +53,7 @@ def load_tests(loader, tests, ignore):
     if glymur.lib.openjp2.OPENJP2 is not None:
         tests.addTests(doctest.DocTestSuite('glymur.jp2k',
                                             tearDown=docTearDown))
+        tests.addTests(doctest.DocTestSuite('glymur.codestream'))
     return tests
 
 
@@ -232,6 +237,895 @@ class TestSliceProtocolRead(SliceProtocolBase):
         np.testing.assert_array_equal(actual, expected)
 
 
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestDecoderSession(unittest.TestCase):
+    """
+    Test repeated reads through a single decoder session.
+    """
+    @classmethod
+    def setUpClass(self):
+        self.j2k = Jp2k(glymur.data.goodstuff())
+        self.j2k_data = self.j2k[:]
+        self.j2k_data_r1 = self.j2k[::2, ::2]
+
+    def test_windows(self):
+        """Successive windows match slices of the full image"""
+        areas = [(10, 20, 100, 200), (300, 100, 400, 300), (0, 0, 800, 480)]
+        with self.j2k.open_decoder() as decoder:
+            for area in areas:
+                actual = decoder.read(area=area)
+                expected = self.j2k_data[area[0]:area[2], area[1]:area[3]]
+                np.testing.assert_array_equal(actual, expected)
+
+    def test_change_rlevel(self):
+        """Can switch resolutions within a session"""
+        with self.j2k.open_decoder() as decoder:
+            actual = decoder.read(rlevel=1)
+            np.testing.assert_array_equal(actual, self.j2k_data_r1)
+            actual = decoder.read()
+            np.testing.assert_array_equal(actual, self.j2k_data)
+
+    def test_change_layer(self):
+        """Changing the layer sets up the codec again"""
+        with self.j2k.open_decoder() as decoder:
+            decoder.read(area=(0, 0, 32, 32))
+            actual = decoder.read(layer=0)
+        np.testing.assert_array_equal(actual, self.j2k_data)
+
+    def test_library_cannot_redecode(self):
+        """Older libraries get a fresh codec for each read"""
+        with patch('glymur.lib.openjp2.REDECODE_SUPPORTED', new=False):
+            with self.j2k.open_decoder() as decoder:
+                actual = decoder.read(area=(10, 20, 100, 200))
+                np.testing.assert_array_equal(actual,
+                                              self.j2k_data[10:100, 20:200])
+                actual = decoder.read(rlevel=1)
+                np.testing.assert_array_equal(actual, self.j2k_data_r1)
+
+    @unittest.skipIf(not glymur.lib.openjp2.REDECODE_SUPPORTED,
+                     "The library cannot decode twice with the same codec.")
+    def test_multiple_tiles(self):
+        """Windows of tiled images are decoded with the same codec"""
+        data = np.arange(512 * 512, dtype=np.uint16).reshape(512, 512)
+        with tempfile.NamedTemporaryFile(suffix='.j2k') as tfile:
+            jp2 = Jp2k(tfile.name, data=data, tilesize=(128, 128))
+            expected_r1 = jp2[::2, ::2]
+            with patch.object(jp2, '_setup_openjp2_decoder',
+                              wraps=jp2._setup_openjp2_decoder) as setup:
+                with jp2.open_decoder() as decoder:
+                    for area in [(10, 20, 100, 200), (200, 100, 500, 400),
+                                 (0, 0, 512, 512)]:
+                        actual = decoder.read(area=area)
+                        np.testing.assert_array_equal(
+                            actual, data[area[0]:area[2], area[1]:area[3]])
+                    actual = decoder.read(rlevel=1)
+                    np.testing.assert_array_equal(actual, expected_r1)
+
+                    out = np.zeros((45, 90), dtype=np.uint16)
+                    actual = decoder.read(area=(130, 250, 220, 430),
+                                          rlevel=1, out=out)
+                    self.assertIs(actual, out)
+                    np.testing.assert_array_equal(out,
+                                                  expected_r1[65:110, 125:215])
+            self.assertEqual(setup.call_count, 1)
+
+    def test_multiple_tiles_cannot_redecode(self):
+        """Older libraries get a fresh codec for each read of a tiled image"""
+        data = np.arange(512 * 512, dtype=np.uint16).reshape(512, 512)
+        with tempfile.NamedTemporaryFile(suffix='.j2k') as tfile:
+            jp2 = Jp2k(tfile.name, data=data, tilesize=(128, 128))
+            with patch('glymur.lib.openjp2.REDECODE_SUPPORTED', new=False):
+                with patch.object(jp2, '_setup_openjp2_decoder',
+                                  wraps=jp2._setup_openjp2_decoder) as setup:
+                    with jp2.open_decoder() as decoder:
+                        for area in [(10, 20, 100, 200),
+                                     (200, 100, 500, 400)]:
+                            actual = decoder.read(area=area)
+                            np.testing.assert_array_equal(
+                                actual,
+                                data[area[0]:area[2], area[1]:area[3]])
+            self.assertEqual(setup.call_count, 3)
+
+    def test_read_after_close(self):
+        """Cannot read once the context has been exited"""
+        with self.j2k.open_decoder() as decoder:
+            pass
+        with self.assertRaises(RuntimeError):
+            decoder.read()
+
+    def test_bad_rlevel(self):
+        """rlevel is validated just as when slicing"""
+        with self.j2k.open_decoder() as decoder:
+            with self.assertRaises(IOError):
+                decoder.read(rlevel=10)
+
+
+@unittest.skipIf(OPENJPEG_NOT_AVAILABLE, OPENJPEG_NOT_AVAILABLE_MSG)
+class TestReadInto(unittest.TestCase):
+    """
+    Test decoding into caller-supplied arrays.
+    """
+    @classmethod
+    def setUpClass(self):
+        self.jp2 = Jp2k(glymur.data.nemo())
+        self.jp2_data = self.jp2[:]
+        self.jp2_data_r1 = self.jp2[::2, ::2]
+
+    def test_full_image(self):
+        """The destination array is filled and returned"""
+        out = np.zeros_like(self.jp2_data)
+        actual = self.jp2.read_into(out)
+        self.assertIs(actual, out)
+        np.testing.assert_array_equal(out, self.jp2_data)
+
+    def test_rlevel_and_area(self):
+        """Same index as for slicing"""
+        out = np.zeros((728, 1296, 3), dtype=np.uint8)
+        self.jp2.read_into(out, np.s_[::2, ::2])
+        np.testing.assert_array_equal(out, self.jp2_data_r1)
+
+        out = np.zeros((100, 200, 3), dtype=np.uint8)
+        self.jp2.read_into(out, np.s_[10:110, 20:220])
+        np.testing.assert_array_equal(out, self.jp2_data[10:110, 20:220])
+
+    def test_integer_indices(self):
+        """Integer indices reduce the dimensionality of the destination"""
+        out = np.zeros((2592, 3), dtype=np.uint8)
+        self.jp2.read_into(out, 5)
+        np.testing.assert_array_equal(out, self.jp2_data[5])
+
+        out = np.zeros((100, 200), dtype=np.uint8)
+        self.jp2.read_into(out, np.s_[10:110, 20:220, 1])
+        np.testing.assert_array_equal(out, self.jp2_data[10:110, 20:220, 1])
+
+    def test_strided_destination(self):
+        """The destination can be a non-contiguous view"""
+        big = np.zeros((1456, 2592 * 2, 3), dtype=np.uint8)
+        self.jp2.read_into(big[:, ::2], Ellipsis)
+        np.testing.assert_array_equal(big[:, ::2], self.jp2_data)
+        np.testing.assert_array_equal(big[:, 1::2], 0)
+
+    def test_memmap_destination(self):
+        """The destination can be memory-mapped"""
+        with tempfile.NamedTemporaryFile() as tfile:
+            out = np.memmap(tfile.name, dtype=np.uint8, mode='w+',
+                            shape=self.jp2_data.shape)
+            self.jp2.read_into(out)
+            np.testing.assert_array_equal(out, self.jp2_data)
+            del out
+
+    def test_cast_to_destination_datatype(self):
+        """The image data is cast to the destination datatype"""
+        out = np.zeros((728, 1296, 3), dtype=np.float32)
+        self.jp2.read_into(out, np.s_[::2, ::2])
+        np.testing.assert_array_equal(out, self.jp2_data_r1)
+
+    def test_bad_shape(self):
+        """The destination must have the shape of the slice"""
+        out = np.zeros((728, 1296, 3), dtype=np.uint8)
+        with self.assertRaises(ValueError):
+            self.jp2.read_into(out)
+
+    @unittest.skipIf(WARNING_INFRASTRUCTURE_ISSUE, WARNING_INFRASTRUCTURE_MSG)
+    def test_read_method(self):
+        """The deprecated read method also takes an out keyword"""
+        out = np.zeros((728, 1296, 3), dtype=np.uint8)
+        with self.assertWarns(DeprecationWarning):
+            self.jp2.read(rlevel=1, out=out)
+        np.testing.assert_array_equal(out, self.jp2_data_r1)
+
+    @unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                     "Missing openjp2 library.")
+    def test_decoder_session(self):
+        """Decoder sessions take an out keyword"""
+        out = np.zeros((256, 256, 3), dtype=np.uint8)
+        with self.jp2.open_decoder() as decoder:
+            actual = decoder.read(area=(0, 0, 256, 256), out=out)
+        self.assertIs(actual, out)
+        np.testing.assert_array_equal(out, self.jp2_data[:256, :256])
+
+
+@unittest.skipIf(not glymur.lib.openjp2.has_function(
+                     'opj_set_decoded_components'),
+                 "Requires opj_set_decoded_components.")
+class TestComponentSelection(unittest.TestCase):
+    """
+    Test decoding only the requested bands.
+    """
+    @classmethod
+    def setUpClass(self):
+        data = Jp2k(glymur.data.goodstuff())[:]
+        data = np.dstack((data, data[:, :, 0] // 2))
+
+        self.files = []
+        for mct in [False, True]:
+            tfile = tempfile.NamedTemporaryFile(suffix='.jp2', delete=False)
+            tfile.close()
+            Jp2k(tfile.name, data=data, mct=mct, cratios=[10])
+            self.files.append(tfile.name)
+        self.jp2, self.jp2_mct = [Jp2k(filename) for filename in self.files]
+        self.jp2_data = self.jp2[:]
+        self.jp2_mct_data = self.jp2_mct[:]
+
+    @classmethod
+    def tearDownClass(self):
+        for filename in self.files:
+            os.unlink(filename)
+
+    def test_slicing(self):
+        """Only the requested components are decoded"""
+        func = glymur.lib.openjp2.set_decoded_components
+        with patch('glymur.lib.openjp2.set_decoded_components',
+                   wraps=func) as mock_set_components:
+            for bands in [1, slice(1, 3), [2, 0], [3, 3]]:
+                actual = self.jp2[:, :, bands]
+                expected = self.jp2_data[:, :, bands]
+                np.testing.assert_array_equal(actual, expected)
+        components = [args[0][1]
+                      for args in mock_set_components.call_args_list]
+        self.assertEqual(components, [[1], [1, 2], [0, 2], [3]])
+
+    def test_area_and_rlevel(self):
+        """Band selection combines with areas and reduced resolutions"""
+        actual = self.jp2[10:50, 20:60, 3]
+        np.testing.assert_array_equal(actual, self.jp2_data[10:50, 20:60, 3])
+
+        actual = self.jp2[::2, ::2, 1:3]
+        np.testing.assert_array_equal(actual, self.jp2[::2, ::2][:, :, 1:3])
+
+    def test_all_bands(self):
+        """No component selection is needed for all of the bands"""
+        func = glymur.lib.openjp2.set_decoded_components
+        with patch('glymur.lib.openjp2.set_decoded_components',
+                   wraps=func) as mock_set_components:
+            actual = self.jp2[:, :, ::-1]
+        self.assertFalse(mock_set_components.called)
+        np.testing.assert_array_equal(actual, self.jp2_data[:, :, ::-1])
+
+    def test_mct(self):
+        """The library skips the MCT for a subset of the first 3 bands"""
+        func = glymur.lib.openjp2.set_decoded_components
+        with patch('glymur.lib.openjp2.set_decoded_components',
+                   wraps=func) as mock_set_components:
+            actual = self.jp2_mct[:, :, 1]
+            np.testing.assert_array_equal(actual, self.jp2_mct_data[:, :, 1])
+            self.assertFalse(mock_set_components.called)
+
+            # The 4th band is not part of the MCT.
+            actual = self.jp2_mct[:, :, 3]
+            np.testing.assert_array_equal(actual, self.jp2_mct_data[:, :, 3])
+            self.assertEqual(mock_set_components.call_args[0][1], [3])
+
+    def test_mct_cod_not_third(self):
+        """The COD segment need not follow the SIZ segment"""
+        data = self.jp2_mct.to_bytes()
+        jp2c = [box for box in self.jp2_mct.box if box.box_id == 'jp2c'][0]
+        codestream = data[jp2c.offset + 8:jp2c.offset + jp2c.length]
+
+        # Put a COM segment between the SIZ and COD segments.
+        siz_end = 4 + struct.unpack_from('>H', codestream, 4)[0]
+        com = struct.pack('>HHH', 0xff64, 8, 1) + b'glym'
+        j2k = Jp2k.from_bytes(codestream[:siz_end] + com +
+                              codestream[siz_end:])
+        self.assertEqual(j2k.codestream.segment[2].marker_id, 'CME')
+
+        func = glymur.lib.openjp2.set_decoded_components
+        with patch('glymur.lib.openjp2.set_decoded_components',
+                   wraps=func) as mock_set_components:
+            actual = j2k[:, :, 1]
+        self.assertFalse(mock_set_components.called)
+        np.testing.assert_array_equal(actual, self.jp2_mct_data[:, :, 1])
+
+    def test_read_into(self):
+        """Selected bands can be decoded into a destination array"""
+        out = np.zeros((800, 480), dtype=np.uint8)
+        self.jp2.read_into(out, np.s_[:, :, 3])
+        np.testing.assert_array_equal(out, self.jp2_data[:, :, 3])
+
+    def test_read_bands(self):
+        """read_bands takes a list of bands"""
+        actual = self.jp2.read_bands(bands=[3, 1])
+        np.testing.assert_array_equal(actual, self.jp2_data[:, :, [3, 1]])
+
+        actual = self.jp2_mct.read_bands(bands=[0])
+        np.testing.assert_array_equal(actual, self.jp2_mct_data[:, :, [0]])
+
+    def test_library_cannot_select(self):
+        """Without library support, all components are decoded"""
+        with patch('glymur.lib.openjp2.has_function', return_value=False):
+            actual = self.jp2[:, :, 2]
+        np.testing.assert_array_equal(actual, self.jp2_data[:, :, 2])
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestNumThreads(unittest.TestCase):
+    """
+    Test decoding with the library's thread pool.
+    """
+    @classmethod
+    def setUpClass(self):
+        self.j2k = Jp2k(glymur.data.goodstuff())
+        self.j2k_data = self.j2k[:]
+        self.j2k_data_r1 = self.j2k[::2, ::2]
+
+    def setUp(self):
+        self.j2k.num_threads = None
+
+    def tearDown(self):
+        glymur.set_decodeoptions(num_threads=1)
+
+    @unittest.skipIf(not glymur.lib.openjp2.has_thread_support(),
+                     "Library not built with thread support.")
+    def test_property(self):
+        """Slicing uses the num_threads property"""
+        self.j2k.num_threads = 2
+        func = glymur.lib.openjp2.codec_set_threads
+        with patch('glymur.lib.openjp2.codec_set_threads',
+                   wraps=func) as mock_set_threads:
+            actual = self.j2k[:]
+        self.assertEqual(mock_set_threads.call_args[0][1], 2)
+        np.testing.assert_array_equal(actual, self.j2k_data)
+
+    @unittest.skipIf(not glymur.lib.openjp2.has_thread_support(),
+                     "Library not built with thread support.")
+    def test_global_default(self):
+        """The decoding options supply the default"""
+        glymur.set_decodeoptions(num_threads=3)
+        self.assertEqual(glymur.get_decodeoptions()['num_threads'], 3)
+        func = glymur.lib.openjp2.codec_set_threads
+        with patch('glymur.lib.openjp2.codec_set_threads',
+                   wraps=func) as mock_set_threads:
+            actual = self.j2k[::2, ::2]
+        self.assertEqual(mock_set_threads.call_args[0][1], 3)
+        np.testing.assert_array_equal(actual, self.j2k_data_r1)
+
+    @unittest.skipIf(not glymur.lib.openjp2.has_thread_support(),
+                     "Library not built with thread support.")
+    def test_read_bands(self):
+        """Keyword to read_bands overrides the property"""
+        self.j2k.num_threads = 4
+        func = glymur.lib.openjp2.codec_set_threads
+        with patch('glymur.lib.openjp2.codec_set_threads',
+                   wraps=func) as mock_set_threads:
+            bands = self.j2k.read_bands(num_threads=2)
+        self.assertEqual(mock_set_threads.call_args[0][1], 2)
+        np.testing.assert_array_equal(bands, self.j2k_data)
+
+    def test_single_thread_skips_library(self):
+        """No library call is made for the single-threaded default"""
+        with patch('glymur.lib.openjp2.codec_set_threads') as mock_set_threads:
+            self.j2k[:]
+        self.assertFalse(mock_set_threads.called)
+
+    @unittest.skipIf(WARNING_INFRASTRUCTURE_ISSUE, WARNING_INFRASTRUCTURE_MSG)
+    def test_library_without_threads(self):
+        """Warn and decode with one thread when the library cannot thread"""
+        self.j2k.num_threads = 2
+        with patch('glymur.lib.openjp2.has_thread_support',
+                   return_value=False):
+            with self.assertWarns(UserWarning):
+                actual = self.j2k[:]
+        np.testing.assert_array_equal(actual, self.j2k_data)
+
+    def test_bad_num_threads(self):
+        """Thread counts must be positive integers"""
+        with self.assertRaises(ValueError):
+            self.j2k.num_threads = 0
+        with self.assertRaises(ValueError):
+            glymur.set_decodeoptions(num_threads=1.5)
+        with self.assertRaises(TypeError):
+            glymur.set_decodeoptions(threads=2)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestIterTiles(unittest.TestCase):
+    """
+    Test iterating over the tiles of an image.
+    """
+    @classmethod
+    def setUpClass(self):
+        data = Jp2k(glymur.data.goodstuff())[:]
+
+        # 800 x 480 with 256 x 128 tiles leaves partial tiles at the edges.
+        self.tfile = tempfile.NamedTemporaryFile(suffix='.j2k', delete=False)
+        self.tfile.close()
+        self.jp2 = Jp2k(self.tfile.name, data=data, tilesize=(256, 128),
+                        cratios=[20, 5, 1], numres=4)
+
+    @classmethod
+    def tearDownClass(self):
+        os.unlink(self.tfile.name)
+
+    def test_tiles_match_slices(self):
+        """Tiles are located by their row and column slices"""
+        expected = self.jp2[:]
+        lst = list(self.jp2.iter_tiles())
+        self.assertEqual([item[0] for item in lst], list(range(16)))
+        for _, rows, cols, tile in lst:
+            np.testing.assert_array_equal(tile, expected[rows, cols])
+
+        # The tiles cover the image.
+        self.assertEqual(lst[-1][1].stop, 800)
+        self.assertEqual(lst[-1][2].stop, 480)
+
+    def test_rlevel(self):
+        """Tiles can be read at reduced resolution"""
+        expected = self.jp2[::4, ::4]
+        for _, rows, cols, tile in self.jp2.iter_tiles(rlevel=2):
+            np.testing.assert_array_equal(tile, expected[rows, cols])
+
+        expected = self.jp2[::8, ::8]
+        for _, rows, cols, tile in self.jp2.iter_tiles(rlevel=-1):
+            np.testing.assert_array_equal(tile, expected[rows, cols])
+
+    def test_layer(self):
+        """Tiles can be read at a lower quality layer"""
+        self.jp2.layer = 1
+        expected = self.jp2[:]
+        self.jp2.layer = 0
+        for _, rows, cols, tile in self.jp2.iter_tiles(layer=1):
+            np.testing.assert_array_equal(tile, expected[rows, cols])
+
+        # The layer property is left alone.
+        self.assertEqual(self.jp2.layer, 0)
+
+    def test_single_band_uint16(self):
+        """Single band 16-bit tiles come back as 2D arrays"""
+        data = np.arange(300 * 200, dtype=np.uint16).reshape(300, 200)
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, data=data, tilesize=(128, 128))
+            for _, rows, cols, tile in jp2.iter_tiles():
+                self.assertEqual(tile.dtype, np.uint16)
+                np.testing.assert_array_equal(tile, data[rows, cols])
+
+    def test_bad_rlevel(self):
+        """rlevel is validated before iterating"""
+        with self.assertRaises(IOError):
+            self.jp2.iter_tiles(rlevel=10)
+
+    def test_precision_too_high(self):
+        """Samples wider than 16 bits are rejected before iterating"""
+        jp2 = Jp2k(self.tfile.name)
+        jp2.codestream.segment[1].bitdepth = (24, 24, 24)
+        with self.assertRaises(RuntimeError):
+            jp2.iter_tiles()
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+@unittest.skipIf(sys.hexversion < 0x03080000,
+                 "Requires multiprocessing.shared_memory")
+class TestReadParallel(unittest.TestCase):
+    """
+    Test decoding partitions of an image in worker processes.
+    """
+    @classmethod
+    def setUpClass(self):
+        data = Jp2k(glymur.data.goodstuff())[:]
+
+        # 800 x 480 with 256 x 128 tiles leaves partial tiles at the edges.
+        self.tfile = tempfile.NamedTemporaryFile(suffix='.j2k', delete=False)
+        self.tfile.close()
+        self.jp2 = Jp2k(self.tfile.name, data=data, tilesize=(256, 128),
+                        cratios=[20, 5, 1], numres=4)
+
+    @classmethod
+    def tearDownClass(self):
+        os.unlink(self.tfile.name)
+
+    def setUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_process_pool(self):
+        """By default the partitions are decoded in a process pool"""
+        actual = self.jp2.read_parallel(workers=2)
+        np.testing.assert_array_equal(actual, self.jp2[:])
+
+    def test_partitions(self):
+        """Partitions consist of whole tiles and cover the image"""
+        self.assertEqual(self.jp2._tile_partitions(2),
+                         [(0, 0, 512, 480), (512, 0, 800, 480)])
+
+        # More partitions than tile rows splits the columns as well.
+        areas = self.jp2._tile_partitions(8)
+        self.assertEqual(len(areas), 8)
+        self.assertEqual(areas[1], (0, 256, 256, 480))
+
+        # Never more partitions than tiles.
+        self.assertEqual(len(self.jp2._tile_partitions(100)), 16)
+
+    def test_rlevel_layer(self):
+        """Reduced resolutions and quality layers can be decoded"""
+        for workers in 1, 3, 8, 100:
+            actual = self.jp2.read_parallel(workers=workers, rlevel=2,
+                                            executor=self.executor)
+            np.testing.assert_array_equal(actual, self.jp2[::4, ::4])
+
+        actual = self.jp2.read_parallel(rlevel=-1, layer=1, workers=4,
+                                        executor=self.executor)
+        self.jp2.layer = 1
+        expected = self.jp2[::8, ::8]
+        self.jp2.layer = 0
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_single_band_uint16(self):
+        """Single band 16-bit images come back as 2D arrays"""
+        data = np.arange(300 * 200, dtype=np.uint16).reshape(300, 200)
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, data=data, tilesize=(128, 128))
+            actual = jp2.read_parallel(workers=3, executor=self.executor)
+        self.assertEqual(actual.dtype, np.uint16)
+        np.testing.assert_array_equal(actual, data)
+
+    def test_single_tile(self):
+        """An image with a single tile is decoded by one worker"""
+        jp2 = Jp2k(glymur.data.nemo())
+        self.assertEqual(len(jp2._tile_partitions(4)), 1)
+        actual = jp2.read_parallel(workers=4, rlevel=1,
+                                   executor=self.executor)
+        np.testing.assert_array_equal(actual, jp2[::2, ::2])
+
+    def test_worker_error(self):
+        """Errors in the workers are raised in the caller"""
+        with patch('glymur.jp2k.Jp2k._read', side_effect=IOError('bad')):
+            with self.assertRaises(IOError):
+                self.jp2.read_parallel(workers=4, executor=self.executor)
+
+    def test_bad_rlevel(self):
+        """rlevel is validated before starting any workers"""
+        with self.assertRaises(IOError):
+            self.jp2.read_parallel(rlevel=10, executor=self.executor)
+
+    def test_not_a_file(self):
+        """Images held in memory cannot be read in parallel"""
+        jp2 = Jp2k.from_bytes(self.jp2.to_bytes())
+        with self.assertRaises(RuntimeError):
+            jp2.read_parallel(executor=self.executor)
+
+
+def _crashing_read_file(path, rlevel, area, layer):
+    """Stand-in for the read_many worker that kills its process"""
+    if path == 'crash.jp2':
+        os._exit(1)
+    return Jp2k(path)._read(rlevel=rlevel, area=area)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestReadMany(unittest.TestCase):
+    """
+    Test decoding batches of files.
+    """
+    def setUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(2)
+        self.paths = [glymur.data.nemo(), glymur.data.goodstuff()] * 3
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_process_pool(self):
+        """By default the files are decoded in a process pool"""
+        results = list(glymur.read_many(self.paths, rlevel=1, workers=2))
+        self.assertEqual([item[0] for item in results], self.paths)
+        for path, image, error in results:
+            self.assertIsNone(error)
+            np.testing.assert_array_equal(image, Jp2k(path)[::2, ::2])
+
+    def test_no_initializer(self):
+        """Pools are started without an initializer before Python 3.7"""
+        def start_pool(workers):
+            # ProcessPoolExecutor takes nothing else before 3.7.
+            return concurrent.futures.ThreadPoolExecutor(workers)
+
+        with patch('sys.hexversion', new=0x03060000):
+            with patch('concurrent.futures.ProcessPoolExecutor',
+                       side_effect=start_pool):
+                results = list(glymur.read_many(self.paths, rlevel=1,
+                                                workers=2))
+        for path, image, error in results:
+            self.assertIsNone(error)
+            np.testing.assert_array_equal(image, Jp2k(path)[::2, ::2])
+
+    def test_unordered(self):
+        """Results may be yielded as soon as they are ready"""
+        results = list(glymur.read_many(self.paths, area=(0, 0, 64, 64),
+                                        ordered=False,
+                                        executor=self.executor))
+        self.assertEqual(sorted(item[0] for item in results),
+                         sorted(self.paths))
+        for path, image, error in results:
+            np.testing.assert_array_equal(image, Jp2k(path)[0:64, 0:64])
+
+    def test_layer(self):
+        """A quality layer can be chosen"""
+        with tempfile.NamedTemporaryFile(suffix='.j2k') as tfile:
+            jp2 = Jp2k(tfile.name, data=Jp2k(glymur.data.goodstuff())[:],
+                       cratios=[20, 5, 1])
+            _, actual, _ = next(glymur.read_many([tfile.name], layer=1,
+                                                 executor=self.executor))
+            jp2.layer = 1
+            np.testing.assert_array_equal(actual, jp2[:])
+
+    def test_failures(self):
+        """A file that cannot be read does not abort the batch"""
+        paths = [glymur.data.nemo(), 'no-such-file.jp2',
+                 glymur.data.goodstuff()]
+        results = list(glymur.read_many(paths, rlevel=1,
+                                        executor=self.executor))
+        self.assertEqual([item[0] for item in results], paths)
+        self.assertIsNone(results[1][1])
+        self.assertIsInstance(results[1][2], EnvironmentError)
+        self.assertEqual(results[2][1].shape, (400, 240, 3))
+
+    def test_none_path(self):
+        """A None among the paths does not end the batch"""
+        paths = [glymur.data.nemo(), None, glymur.data.goodstuff()]
+        results = list(glymur.read_many(paths, rlevel=1,
+                                        executor=self.executor))
+        self.assertEqual([item[0] for item in results], paths)
+        self.assertIsNotNone(results[1][2])
+        self.assertEqual(results[2][1].shape, (400, 240, 3))
+
+    @unittest.skipIf(os.name != 'posix', "Requires fork")
+    @unittest.skipIf(sys.hexversion < 0x03030000,
+                     "A dead worker hangs the futures backport.")
+    def test_dead_worker(self):
+        """A worker that dies fails its own file, the pool is restarted"""
+        paths = [glymur.data.goodstuff(), 'crash.jp2',
+                 glymur.data.goodstuff(), glymur.data.goodstuff()]
+        with patch('glymur.jp2k._read_file', new=_crashing_read_file):
+            results = list(glymur.read_many(paths, rlevel=1, workers=1,
+                                            max_in_flight=1))
+        self.assertEqual([item[0] for item in results], paths)
+        self.assertIsInstance(results[1][2], BrokenProcessPool)
+        for _, image, error in results[0:1] + results[2:]:
+            self.assertIsNone(error)
+            self.assertEqual(image.shape, (400, 240, 3))
+
+    def test_backpressure(self):
+        """No more than max_in_flight files are submitted ahead"""
+        consumed = []
+
+        def paths():
+            for path in self.paths:
+                consumed.append(path)
+                yield path
+
+        results = glymur.read_many(paths(), rlevel=-1, max_in_flight=2,
+                                   executor=self.executor)
+        self.assertEqual(consumed, [])
+        next(results)
+        self.assertEqual(len(consumed), 2)
+        next(results)
+        self.assertEqual(len(consumed), 3)
+        results.close()
+
+    def test_bad_max_in_flight(self):
+        """At least one file must be in flight"""
+        with self.assertRaises(ValueError):
+            glymur.read_many(self.paths, max_in_flight=0)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestTileWriter(unittest.TestCase):
+    """
+    Test writing images one tile at a time.
+    """
+    @classmethod
+    def setUpClass(self):
+        self.image = Jp2k(glymur.data.goodstuff())[:]
+
+    def test_assignment(self):
+        """Tiles assigned in raster order"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, shape=self.image.shape)
+            with jp2.tile_writer(self.image.shape, (256, 128)) as writer:
+                self.assertEqual(writer.tile_grid, (4, 4))
+                for tile_row, tile_col in np.ndindex(writer.tile_grid):
+                    rows, cols = writer.tile_slices(tile_row, tile_col)
+                    writer[tile_row, tile_col] = self.image[rows, cols]
+
+            self.assertEqual(jp2.codestream.segment[1].ytsiz, 256)
+            self.assertEqual(jp2.codestream.segment[1].xtsiz, 128)
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_out_of_order(self):
+        """Tiles assigned out of order are held until their turn"""
+        with tempfile.NamedTemporaryFile(suffix='.j2k') as tfile:
+            jp2 = Jp2k(tfile.name, shape=self.image.shape)
+            with jp2.tile_writer(None, (256, 128)) as writer:
+                indices = list(np.ndindex(writer.tile_grid))
+                for tile_row, tile_col in reversed(indices):
+                    rows, cols = writer.tile_slices(tile_row, tile_col)
+                    writer[tile_row, tile_col] = self.image[rows, cols]
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def temporary_file(self, suffix):
+        """Path of a file that the test may remove"""
+        tdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tdir)
+        return os.path.join(tdir, 'tiles' + suffix)
+
+    def test_max_pending(self):
+        """No more than max_pending tiles are held out of order"""
+        filename = self.temporary_file('.j2k')
+        jp2 = Jp2k(filename, shape=self.image.shape)
+        with self.assertRaises(IOError):
+            with jp2.tile_writer(None, (256, 128), max_pending=2) as writer:
+                indices = list(np.ndindex(writer.tile_grid))
+                for tile_row, tile_col in reversed(indices):
+                    rows, cols = writer.tile_slices(tile_row, tile_col)
+                    writer[tile_row, tile_col] = self.image[rows, cols]
+        self.assertEqual(len(writer._pending), 2)
+
+        # The incomplete file is not left behind.
+        self.assertFalse(os.path.exists(filename))
+
+    def test_generator(self):
+        """Tiles supplied by a generator, with compression parameters"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, shape=self.image.shape)
+            with jp2.tile_writer(self.image.shape, (256, 256),
+                                 cratios=[20, 5, 1], numres=4) as writer:
+                writer.write(self.image[writer.tile_slices(*index)]
+                             for index in np.ndindex(writer.tile_grid))
+
+            self.assertEqual(jp2.codestream.segment[2].layers, 3)
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_single_band_uint16(self):
+        """2D images take 2D tiles"""
+        data = np.arange(300 * 200, dtype=np.uint16).reshape(300, 200)
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, shape=data.shape)
+            with jp2.tile_writer(data.shape, (128, 64),
+                                 dtype=np.uint16) as writer:
+                writer.write(data[writer.tile_slices(*index)]
+                             for index in np.ndindex(writer.tile_grid))
+            actual = jp2[:]
+            self.assertEqual(actual.dtype, np.uint16)
+            np.testing.assert_array_equal(actual, data)
+
+    def test_missing_tiles(self):
+        """Every tile must be written, or the file is removed"""
+        filename = self.temporary_file('.jp2')
+        jp2 = Jp2k(filename, shape=self.image.shape)
+        with self.assertRaises(IOError):
+            with jp2.tile_writer(self.image.shape, (256, 128)) as writer:
+                writer[0, 0] = self.image[0:256, 0:128]
+        self.assertFalse(os.path.exists(filename))
+
+    def test_wrong_datatype(self):
+        """Tiles are not cast to the datatype of the writer"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, shape=self.image.shape)
+            with jp2.tile_writer(self.image.shape, (256, 128)) as writer:
+                with self.assertRaises(ValueError):
+                    writer[0, 0] = self.image[0:256, 0:128].astype(np.uint16)
+                writer.write(self.image[writer.tile_slices(*index)]
+                             for index in np.ndindex(writer.tile_grid))
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_bad_tile(self):
+        """Tiles must fit the tile grid"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, shape=self.image.shape)
+            writer = jp2.tile_writer(self.image.shape, (256, 128))
+            with writer:
+                with self.assertRaises(ValueError):
+                    # The bottom row of tiles is only 32 rows tall.
+                    writer[3, 0] = self.image[0:256, 0:128]
+                with self.assertRaises(IndexError):
+                    writer[4, 0] = self.image[0:256, 0:128]
+                writer[0, 0] = self.image[0:256, 0:128]
+                with self.assertRaises(IOError):
+                    writer[0, 0] = self.image[0:256, 0:128]
+
+                # Carries on from the 2nd tile.
+                indices = list(np.ndindex(writer.tile_grid))[1:]
+                writer.write(self.image[writer.tile_slices(*index)]
+                             for index in indices)
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_bad_datatype(self):
+        """Only uint8 and uint16 are supported"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, shape=self.image.shape)
+            with self.assertRaises(RuntimeError):
+                jp2.tile_writer(self.image.shape, (256, 128), dtype=np.int32)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestInMemory(unittest.TestCase):
+    """
+    Test decoding from and encoding to bytes.
+    """
+    @classmethod
+    def setUpClass(self):
+        with open(glymur.data.goodstuff(), 'rb') as f:
+            self.payload = f.read()
+        self.image = Jp2k(glymur.data.goodstuff())[:]
+        self.thumbnail = Jp2k(glymur.data.goodstuff())[::2, ::2]
+
+    def test_from_bytes(self):
+        """Decoding from bytes, bytearrays, and memoryviews"""
+        with patch('glymur.lib.openjp2.stream_create_default_file_stream',
+                   side_effect=AssertionError) as mock_stream:
+            for buffer in [self.payload, bytearray(self.payload),
+                           memoryview(self.payload)]:
+                jp2 = Jp2k.from_bytes(buffer)
+                self.assertIsNone(jp2.filename)
+                self.assertEqual(jp2.codestream.segment[1].xsiz, 480)
+                np.testing.assert_array_equal(jp2[:], self.image)
+                np.testing.assert_array_equal(jp2[::2, ::2], self.thumbnail)
+        self.assertEqual(mock_stream.call_count, 0)
+
+    def test_from_jp2_bytes(self):
+        """The box structure of JP2 data is parsed"""
+        jp2 = Jp2k.from_bytes(Jp2k(self.jp2file).to_bytes())
+        self.assertEqual([box.box_id for box in jp2.box],
+                         ['jP  ', 'ftyp', 'jp2h', 'uuid', 'jp2c'])
+        self.assertEqual(jp2.box[-1].codestream.segment[1].xsiz, 2592)
+        np.testing.assert_array_equal(jp2[::2, ::2],
+                                      Jp2k(self.jp2file)[::2, ::2])
+        self.assertEqual(repr(jp2), 'glymur.Jp2k.from_bytes(<{0} bytes>)'
+                         .format(jp2.length))
+
+    def test_encode(self):
+        """Encoding to bytes round trips losslessly"""
+        for codec_format, signature in [('jp2', b'\x00\x00\x00\x0cjP  '),
+                                        ('j2k', b'\xff\x4f')]:
+            payload = glymur.encode(self.image, codec_format=codec_format,
+                                    tilesize=(256, 256))
+            self.assertTrue(payload.startswith(signature))
+            jp2 = Jp2k.from_bytes(payload)
+            self.assertEqual(jp2.codestream.segment[1].xtsiz, 256)
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_encode_matches_file(self):
+        """Encoding to bytes gives the same result as writing a file"""
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = Jp2k(tfile.name, data=self.image, cratios=[20, 5])
+            expected = jp2.to_bytes()
+        self.assertEqual(glymur.encode(self.image, cratios=[20, 5]),
+                         expected)
+
+    def test_encode_bad_codec_format(self):
+        """Only JP2 and J2K can be encoded"""
+        with self.assertRaises(IOError):
+            glymur.encode(self.image, codec_format='jpx')
+
+    def test_not_jpeg2000(self):
+        """Buffers must hold JPEG 2000 data"""
+        with self.assertRaises(IOError):
+            Jp2k.from_bytes(b'\x00\x00\x00\x0cjP  ' + bytes(bytearray(20)))
+
+    def test_wrap(self):
+        """In-memory codestreams can be wrapped into JP2 files"""
+        jp2 = Jp2k.from_bytes(self.payload)
+        with tempfile.NamedTemporaryFile(suffix='.jp2') as tfile:
+            jp2 = jp2.wrap(tfile.name)
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_append(self):
+        """Boxes cannot be appended to in-memory images"""
+        jp2 = Jp2k.from_bytes(glymur.encode(self.image))
+        xml = ET.ElementTree(ET.fromstring('<data>0</data>'))
+        with self.assertRaises(IOError):
+            jp2.append(glymur.jp2box.XMLBox(xml=xml))
+
+    def setUp(self):
+        self.jp2file = glymur.data.nemo()
+
+
 class TestJp2k(unittest.TestCase):
     """These tests should be run by just about all configuration."""
 
@@ -1335,6 +2229,49 @@ class TestCodestream(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def test_scan_sources_agree(self):
+        """Full codestream scans agree for files, buffers, and readers"""
+        with open(glymur.data.goodstuff(), 'rb') as f:
+            payload = f.read()
+        sources = [Jp2k(glymur.data.goodstuff()),
+                   Jp2k.from_bytes(payload),
+                   Jp2k(glymur.RangeReader.from_file(io.BytesIO(payload)))]
+        expected = None
+        for jp2 in sources:
+            c = jp2.get_codestream(header_only=False)
+            actual = [(seg.marker_id, seg.offset, seg.length)
+                      for seg in c.segment]
+            if expected is None:
+                expected = actual
+            self.assertEqual(actual, expected)
+        self.assertEqual(expected[-1][0], 'EOC')
+
+    @unittest.skipIf(OPENJPEG_NOT_AVAILABLE, OPENJPEG_NOT_AVAILABLE_MSG)
+    def test_scan_sop_eph(self):
+        """SOP and EPH segments are found in every tile part"""
+        image = Jp2k(glymur.data.goodstuff())[:64, :64]
+        payload = glymur.encode(image, codec_format='j2k', tilesize=(32, 32),
+                                sop=True, eph=True)
+        c = Jp2k.from_bytes(payload).get_codestream(header_only=False)
+        sop = [seg for seg in c.segment if seg.marker_id == 'SOP']
+        eph = [seg for seg in c.segment if seg.marker_id == 'EPH']
+        self.assertGreater(len(sop), 0)
+        self.assertEqual(len(sop), len(eph))
+        for seg in sop:
+            self.assertEqual(payload[seg.offset:seg.offset + 2], b'\xff\x91')
+        for seg in eph:
+            self.assertEqual(payload[seg.offset:seg.offset + 2], b'\xff\x92')
+        self.assertEqual(sum(seg.marker_id == 'SOT' for seg in c.segment), 4)
+
+    def test_file_position_after_main_header(self):
+        """The file is left just past the first SOT marker"""
+        with open(glymur.data.goodstuff(), 'rb') as f:
+            c = glymur.codestream.Codestream(f, os.path.getsize(f.name))
+            sot = Jp2k(glymur.data.goodstuff()).get_codestream(
+                header_only=False).segment[len(c.segment)]
+            self.assertEqual(sot.marker_id, 'SOT')
+            self.assertEqual(f.tell(), sot.offset + 2)
+
     def test_siz_segment_ssiz_unsigned(self):
         """ssiz attribute to be removed in future release"""
         j = Jp2k(self.jp2file)
@@ -1344,3 +2281,237 @@ class TestCodestream(unittest.TestCase):
         # The first 7 bits are interpreted as the bitdepth, the MSB determines
         # whether or not it is signed.
         self.assertEqual(codestream.segment[1].ssiz, (7, 7, 7))
+
+
+@unittest.skipIf(OPENJPEG_NOT_AVAILABLE, OPENJPEG_NOT_AVAILABLE_MSG)
+class TestTileIndex(unittest.TestCase):
+    """Test locating the tile parts of each tile."""
+
+    @classmethod
+    def setUpClass(self):
+        # 64 x 64 with 32 x 32 tiles.
+        image = Jp2k(glymur.data.goodstuff())[:64, :64]
+        self.payload = glymur.encode(image, codec_format='j2k',
+                                     tilesize=(32, 32))
+        c = Jp2k.from_bytes(self.payload).get_codestream(header_only=False)
+        self.sot = [seg for seg in c.segment if seg.marker_id == 'SOT']
+
+    def insert_tlm(self, stlm, fmt, values):
+        """Insert a TLM segment into the main header, before the first SOT"""
+        body = struct.pack('>BB', 0, stlm) + struct.pack('>' + fmt, *values)
+        tlm = struct.pack('>HH', 0xff55, len(body) + 2) + body
+        pos = self.sot[0].offset
+        return self.payload[:pos] + tlm + self.payload[pos:], len(tlm)
+
+    def test_skip_scan(self):
+        """Without TLM segments, the tile parts are found from SOT"""
+        reader = glymur.RangeReader.from_file(io.BytesIO(self.payload))
+        c = Jp2k(reader).get_codestream()
+        index = c.tile_index
+        self.assertEqual(index.method, 'SOT')
+        self.assertEqual(len(index), 4)
+        for seg in self.sot:
+            self.assertEqual(index[seg.isot], [(seg.offset, seg.psot)])
+
+        # The bit streams were not fetched.
+        self.assertLess(reader.bytes_fetched, len(self.payload) // 2)
+
+    def test_full_codestream(self):
+        """The SOT segments of a full parse are reused"""
+        c = Jp2k.from_bytes(self.payload).get_codestream(header_only=False)
+        expected = [(seg.isot, seg.offset, seg.psot) for seg in self.sot]
+        self.assertEqual(c.tile_index.tile_parts, expected)
+
+    def test_tlm(self):
+        """TLM segments lay out the tile parts without reading them"""
+        # Ttlm 16 bits, Ptlm 32 bits.
+        values = []
+        for seg in self.sot:
+            values.extend([seg.isot, seg.psot])
+        payload, nbytes = self.insert_tlm(0x60, 'HI' * len(self.sot), values)
+
+        reader = glymur.RangeReader.from_file(io.BytesIO(payload))
+        c = Jp2k(reader).get_codestream()
+        reader.reset_stats()
+        index = c.tile_index
+        self.assertEqual(reader.num_fetches, 0)
+        self.assertEqual(index.method, 'TLM')
+        expected = [(seg.isot, seg.offset + nbytes, seg.psot)
+                    for seg in self.sot]
+        self.assertEqual(index.tile_parts, expected)
+
+        # The skip scan agrees.
+        c = Jp2k.from_bytes(payload).get_codestream()
+        self.assertEqual(c._skip_scan_tile_parts(io.BytesIO(payload)),
+                         expected)
+
+    def test_tlm_tiles_in_order(self):
+        """Without Ttlm, there is one tile part per tile in order"""
+        # No Ttlm, Ptlm 16 bits.
+        values = [seg.psot for seg in self.sot]
+        payload, nbytes = self.insert_tlm(0x00, 'H' * len(self.sot), values)
+        index = Jp2k.from_bytes(payload).get_codestream().tile_index
+        self.assertEqual(index.method, 'TLM')
+        self.assertEqual([index[tile] for tile in range(4)],
+                         [[(seg.offset + nbytes, seg.psot)]
+                          for seg in self.sot])
+
+    @unittest.skipIf(WARNING_INFRASTRUCTURE_ISSUE, WARNING_INFRASTRUCTURE_MSG)
+    def test_tlm_bad_lengths(self):
+        """TLM lengths running past the end fall back to the SOT scan"""
+        values = []
+        for seg in self.sot:
+            values.extend([seg.isot, seg.psot * 2])
+        payload, _ = self.insert_tlm(0x60, 'HI' * len(self.sot), values)
+        c = Jp2k.from_bytes(payload).get_codestream()
+        with self.assertWarns(UserWarning):
+            index = c.tile_index
+        self.assertEqual(index.method, 'SOT')
+        self.assertEqual(len(index.tile_parts), 4)
+
+    def test_byte_ranges(self):
+        """Adjacent tile parts are merged into one range"""
+        index = Jp2k.from_bytes(self.payload).get_codestream().tile_index
+        sot = self.sot
+        self.assertEqual(index.byte_ranges([1, 0, 3]),
+                         [(sot[0].offset, sot[0].psot + sot[1].psot),
+                          (sot[3].offset, sot[3].psot)])
+
+    def test_path(self):
+        """Files given by path are reopened for the skip scan"""
+        c = Jp2k(self.jp2file).get_codestream()
+        self.assertEqual(c.tile_index[0], [(3344, 1132173)])
+
+    def setUp(self):
+        self.jp2file = glymur.data.nemo()
+
+
+@unittest.skipIf(OPENJPEG_NOT_AVAILABLE, OPENJPEG_NOT_AVAILABLE_MSG)
+class TestSegmentSequence(unittest.TestCase):
+    """Test the compact storage of tile part segments."""
+
+    @classmethod
+    def setUpClass(self):
+        image = Jp2k(glymur.data.goodstuff())[:64, :64]
+        self.payload = glymur.encode(image, codec_format='j2k',
+                                     tilesize=(32, 32), sop=True, eph=True)
+        jp2 = Jp2k.from_bytes(self.payload)
+        self.codestream = jp2.get_codestream(header_only=False)
+
+    def test_arrays(self):
+        """SOT, SOD, SOP, and EPH segments are rows of structured arrays"""
+        segments = self.codestream.segment
+        self.assertEqual(len(segments.sot), 4)
+        markers = segments.packets['marker']
+        self.assertEqual(np.count_nonzero(markers == 0xff93), 4)
+        self.assertEqual(np.count_nonzero(markers == 0xff91),
+                         np.count_nonzero(markers == 0xff92))
+
+        # Only the main header and EOC segments are objects.
+        self.assertEqual(len(segments._objects) + len(segments.sot) +
+                         len(segments.packets), len(segments))
+        self.assertEqual(segments._objects[-1].marker_id, 'EOC')
+
+    def test_indexing(self):
+        """Segments are created on demand in codestream order"""
+        segments = self.codestream.segment
+        lst = list(segments)
+        self.assertEqual(len(lst), len(segments))
+        for j in [0, 1, 5, len(lst) // 2, len(lst) - 2, -1]:
+            self.assertEqual(segments[j].marker_id, lst[j].marker_id)
+            self.assertEqual(segments[j].offset, lst[j].offset)
+        self.assertEqual([seg.offset for seg in segments[3:9]],
+                         [seg.offset for seg in lst[3:9]])
+
+        offsets = [seg.offset for seg in lst]
+        self.assertEqual(offsets, sorted(offsets))
+
+        sop = [seg for seg in lst if seg.marker_id == 'SOP']
+        self.assertEqual([seg.nsop for seg in sop[:3]], [0, 1, 2])
+
+        with self.assertRaises(IndexError):
+            segments[len(lst)]
+
+    def test_bit_stream_edge_cases(self):
+        """SOP needs room for its fields, Nsop is big-endian"""
+        # SOP at 0, EPH at 6 and 9, an SOP at 11 cut short by the end.
+        sop_eph = (b'\xff\x91\x00\x04\x01\x02' + b'\xff\x92' +
+                   b'\xff\xff\x92' + b'\xff\x91\x00\x04\x00')
+        expected = [(0xff91, 100, 4, 258), (0xff92, 106, 0, 0),
+                    (0xff92, 109, 0, 0)]
+        for data, expected in [(sop_eph, expected), (b'\x00\xff', [])]:
+            c = Jp2k.from_bytes(self.payload).get_codestream()
+            c.segment = glymur.codestream._SegmentSequence()
+            # The bit stream starts at byte 100.
+            fptr = io.BytesIO(bytes(bytearray(100)) + data)
+            buf = glymur.codestream._CodestreamBuffer(fptr, 0)
+            sod = glymur.codestream.SODsegment(0, 98)
+            c._parse_tile_part_bit_stream(buf, sod, len(data))
+            buf.close()
+            self.assertEqual(c.segment.packets.tolist(), expected)
+
+    def test_append(self):
+        """Appended segments go to the end whatever their kind"""
+        segments = glymur.codestream._SegmentSequence(self.codestream.segment)
+        self.assertEqual(len(segments), len(self.codestream.segment))
+        segments.append(glymur.codestream.EOCsegment(0, 10 ** 6))
+        self.assertEqual(segments[-1].offset, 10 ** 6)
+        self.assertEqual(segments[-2].marker_id, 'EOC')
+
+    def test_modify_main_header(self):
+        """Main header segments can be replaced, inserted, and deleted"""
+        segments = glymur.codestream._SegmentSequence(self.codestream.segment)
+        expected = list(segments)
+        com = glymur.codestream.CMEsegment(1, b'hello', 9, 100)
+
+        segments.insert(2, com)
+        expected.insert(2, com)
+        segments[1] = com
+        expected[1] = com
+        del segments[2]
+        del expected[2]
+        self.assertEqual(len(segments), len(expected))
+        self.assertIs(segments[1], com)
+        self.assertEqual([seg.offset for seg in segments],
+                         [seg.offset for seg in expected])
+        self.assertEqual(len(segments.sot), 4)
+
+    def test_modify_tile_parts(self):
+        """Tile part segments can be replaced, inserted, and deleted"""
+        segments = glymur.codestream._SegmentSequence(self.codestream.segment)
+        expected = list(segments)
+        sot_index = [j for j, seg in enumerate(expected)
+                     if seg.marker_id == 'SOT']
+        sot = glymur.codestream.SOTsegment(7, 100, 0, 1, 10, 123)
+
+        segments[sot_index[1]] = sot
+        expected[sot_index[1]] = sot
+        del segments[sot_index[2] + 1]
+        del expected[sot_index[2] + 1]
+        eph = glymur.codestream.EPHsegment(0, 456)
+        segments.insert(sot_index[3], eph)
+        expected.insert(sot_index[3], eph)
+        segments.insert(0, sot)
+        expected.insert(0, sot)
+        del segments[-3:]
+        del expected[-3:]
+
+        self.assertEqual([(seg.marker_id, seg.offset) for seg in segments],
+                         [(seg.marker_id, seg.offset) for seg in expected])
+        self.assertEqual(segments.sot['isot'].tolist(), [7, 0, 7, 2, 3])
+        self.assertEqual(len(segments._objects) + len(segments.sot) +
+                         len(segments.packets), len(segments))
+
+    @unittest.skipIf(sys.hexversion < 0x03000000,
+                     "Memory maps only track exports on Python 3.")
+    def test_close_with_export(self):
+        """A buffer still in use by an array cannot be closed"""
+        with tempfile.TemporaryFile() as tfile:
+            tfile.write(b'abcdef')
+            tfile.flush()
+            buf = glymur.codestream._CodestreamBuffer(tfile, 0)
+            data = buf.array(2, 2)
+            with self.assertRaises(BufferError):
+                buf.close()
+            del data
+            buf.close()
@@ -0,0 +1,193 @@
+"""
+Test suite for the persistent metadata cache.
+"""
+import doctest
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+if sys.hexversion <= 0x03030000:
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+import glymur
+from glymur import Jp2k, MetadataCache
+
+
+# Doc tests should be run as well.
+def load_tests(loader, tests, ignore):
+    """Should run doc tests as well"""
+    tests.addTests(doctest.DocTestSuite('glymur.metadatacache'))
+    return tests
+
+
+class TestMetadataCache(unittest.TestCase):
+    """Test both backends of the metadata cache."""
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+
+        # A copy of the file, so that it can be changed.
+        self.jp2file = os.path.join(self.tdir, 'nemo.jp2')
+        shutil.copyfile(glymur.data.nemo(), self.jp2file)
+
+    def tearDown(self):
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=None)
+        shutil.rmtree(self.tdir)
+
+    def caches(self):
+        """One cache of each kind"""
+        return [MetadataCache(os.path.join(self.tdir, 'cache')),
+                MetadataCache(os.path.join(self.tdir, 'cache.db'),
+                              backend='sqlite')]
+
+    def test_hit_skips_reading(self):
+        """Files are not read again once their metadata is stored"""
+        for cache in self.caches():
+            glymur.set_parseoptions(full_codestream=False,
+                                    metadata_cache=cache)
+            expected = str(Jp2k(self.jp2file))
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+            with patch('glymur.jp2k.open', create=True,
+                       side_effect=AssertionError):
+                with patch('glymur.codestream.open', create=True,
+                           side_effect=AssertionError):
+                    with patch.object(Jp2k, '_parse',
+                                      side_effect=AssertionError):
+                        jp2 = Jp2k(self.jp2file)
+                    self.assertEqual(jp2.shape, (1456, 2592, 3))
+                    self.assertEqual(jp2.codestream.tile_index[0],
+                                     [(3344, 1132173)])
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            # XML and XMP survive the trip.
+            self.assertEqual(str(jp2), expected)
+            cache.close()
+
+    def test_invalidation(self):
+        """A file that has changed is parsed again"""
+        for cache in self.caches():
+            glymur.set_parseoptions(full_codestream=False,
+                                    metadata_cache=cache)
+            Jp2k(self.jp2file)
+
+            # Same size, but a different modification time.
+            stat = os.stat(self.jp2file)
+            os.utime(self.jp2file, (stat.st_atime, stat.st_mtime + 10))
+            Jp2k(self.jp2file)
+            self.assertEqual(cache.invalidations, 1)
+            self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+            # The new entry is good.
+            Jp2k(self.jp2file)
+            self.assertEqual(cache.hits, 1)
+            cache.close()
+
+    def test_key(self):
+        """Files are identified by path, size, mtime, and inode"""
+        key = MetadataCache.key(self.jp2file)
+        stat = os.stat(self.jp2file)
+        self.assertEqual(key[0], os.path.abspath(self.jp2file))
+        self.assertEqual(key[1], stat.st_size)
+        self.assertEqual(key[3], stat.st_ino)
+
+    def test_version_mismatch(self):
+        """Entries written by another version of glymur are not used"""
+        cache = self.caches()[0]
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+        Jp2k(self.jp2file)
+        with patch('glymur.version.version', new='0.0.0'):
+            Jp2k(self.jp2file)
+        self.assertEqual((cache.hits, cache.invalidations), (0, 1))
+
+    def test_corrupt_entry(self):
+        """Unreadable directory entries are treated as out of date"""
+        cache = self.caches()[0]
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+        Jp2k(self.jp2file)
+        for name in os.listdir(cache.path):
+            with open(os.path.join(cache.path, name), 'wb') as f:
+                f.write(b'not json')
+        self.assertEqual(Jp2k(self.jp2file).shape, (1456, 2592, 3))
+        self.assertEqual((cache.hits, cache.invalidations), (0, 1))
+
+    def test_entries_are_json(self):
+        """Entries are plain JSON, a pickle is never loaded"""
+        cache = self.caches()[0]
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+        Jp2k(self.jp2file)
+        name = os.listdir(cache.path)[0]
+        with open(os.path.join(cache.path, name), 'rb') as f:
+            entry = json.loads(f.read().decode('utf-8'))
+        self.assertEqual(entry['key'][0], os.path.abspath(self.jp2file))
+
+        with patch('pickle.loads', side_effect=AssertionError):
+            Jp2k(self.jp2file)
+        self.assertEqual(cache.hits, 1)
+
+    def test_foreign_class(self):
+        """Entries naming a class outside of glymur are out of date"""
+        cache = self.caches()[0]
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+        expected = str(Jp2k(self.jp2file))
+
+        name = os.path.join(cache.path, os.listdir(cache.path)[0])
+        with open(name, 'rb') as f:
+            entry = json.loads(f.read().decode('utf-8'))
+        entry['payload']['codestream']['$object'] = 'os.popen'
+        with open(name, 'wb') as f:
+            f.write(json.dumps(entry).encode('utf-8'))
+
+        self.assertEqual(str(Jp2k(self.jp2file)), expected)
+        self.assertEqual((cache.hits, cache.invalidations), (0, 1))
+
+    def test_roundtrip(self):
+        """Boxes and segments come back with the attributes they had"""
+        cache = self.caches()[0]
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+        for filename in (glymur.data.jpxfile(), glymur.data.goodstuff()):
+            jp2 = Jp2k(filename)
+            cached = Jp2k(filename)
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(str(cached), str(jp2))
+            self.assertEqual(cached.codestream.to_dict(),
+                             jp2.codestream.to_dict())
+            self.assertEqual([box.to_dict() for box in cached.box],
+                             [box.to_dict() for box in jp2.box])
+            self.assertEqual(cached.codestream.tile_index.tile_parts,
+                             jp2.codestream.tile_index.tile_parts)
+            cache.hits = 0
+
+    def test_not_used(self):
+        """Nothing is cached for full codestreams or non-path sources"""
+        cache = self.caches()[0]
+        glymur.set_parseoptions(full_codestream=False, metadata_cache=cache)
+        with open(self.jp2file, 'rb') as f:
+            Jp2k.from_bytes(f.read())
+        glymur.set_parseoptions(full_codestream=True)
+        try:
+            Jp2k(self.jp2file)
+        finally:
+            glymur.set_parseoptions(full_codestream=False)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_clear(self):
+        """Clearing removes the entries"""
+        for cache in self.caches():
+            glymur.set_parseoptions(full_codestream=False,
+                                    metadata_cache=cache)
+            Jp2k(self.jp2file)
+            cache.clear()
+            Jp2k(self.jp2file)
+            self.assertEqual((cache.hits, cache.misses), (0, 2))
+            cache.close()
+
+    def test_bad_backend(self):
+        """Only directory and sqlite backends are known"""
+        with self.assertRaises(IOError):
+            MetadataCache(self.tdir, backend='redis')
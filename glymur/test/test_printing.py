@@ -1,8 +1,10 @@
 # -*- coding:  utf-8 -*-
 """Test suite for printing.
 """
+import json
 import os
 import re
+import shutil
 import struct
 import sys
 import tempfile
@@ -19,6 +21,12 @@ else:
     from unittest.mock import patch
 
 import lxml.etree as ET
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 import glymur
 from glymur import Jp2k, command_line
@@ -1143,3 +1151,226 @@ class TestJp2dump(unittest.TestCase):
         expected.extend(lines[104:140])
         expected = '\n'.join(expected)
         self.assertEqual(actual, expected)
+
+    def run_jp2dump_ndjson(self, args):
+        """Run jp2dump with NDJSON output, return the records."""
+        sys.argv = ['', '--ndjson'] + args
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            status = command_line.main()
+        records = [json.loads(line)
+                   for line in fake_out.getvalue().splitlines()]
+        return status, records
+
+    def test_ndjson(self):
+        """One record per file with the metadata of the file"""
+        status, records = self.run_jp2dump_ndjson([self.jp2file,
+                                                   self.j2kfile])
+        self.assertEqual(status, 0)
+        self.assertEqual([r['path'] for r in records],
+                         [self.jp2file, self.j2kfile])
+
+        jp2 = Jp2k(self.jp2file)
+        metadata = json.loads(json.dumps(jp2.metadata()))
+        self.assertEqual(records[0]['format'], 'jp2')
+        self.assertEqual(records[0]['shape'], [1456, 2592, 3])
+        self.assertEqual(records[0]['box'], metadata['box'])
+        self.assertEqual(records[0]['codestream'], metadata['codestream'])
+        jp2h = records[0]['box'][2]
+        self.assertEqual([box['box_id'] for box in jp2h['box']],
+                         ['ihdr', 'colr'])
+        self.assertEqual(records[0]['warnings'], [])
+
+        self.assertEqual(records[1]['format'], 'j2k')
+        self.assertEqual(records[1]['box'], [])
+
+    def test_ndjson_codestream_levels(self):
+        """-c 0 leaves out the codestream, -c 2 gives all of it"""
+        _, records = self.run_jp2dump_ndjson(['-c', '0', self.jp2file])
+        self.assertNotIn('codestream', records[0])
+
+        _, records = self.run_jp2dump_ndjson(['-c', '2', self.j2kfile])
+        segments = records[0]['codestream']['segment']
+        self.assertIn('SOT', [segment['marker_id'] for segment in segments])
+        self.assertEqual(segments[-1]['marker_id'], 'EOC')
+
+    def test_ndjson_error(self):
+        """Files that cannot be read get a record with the error"""
+        path = os.path.join(tempfile.gettempdir(), 'no', 'such.jp2')
+        status, records = self.run_jp2dump_ndjson([path, self.jp2file])
+        self.assertEqual(status, 1)
+        self.assertEqual(records[0]['path'], path)
+        self.assertIn('error', records[0])
+        self.assertEqual(records[1]['path'], self.jp2file)
+
+    def test_many_files_text(self):
+        """Each file is printed in turn"""
+        sys.argv = ['', '-c', '0', self.jp2file, self.jpxfile]
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            command_line.main()
+        files = re.findall('^File:  (.*)$', fake_out.getvalue(), re.M)
+        self.assertEqual(files, ['nemo.jp2', 'heliov.jpx'])
+
+    def test_directory_and_glob(self):
+        """Directories are searched and patterns are expanded"""
+        tdir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(tdir, 'sub'))
+            shutil.copyfile(self.jp2file, os.path.join(tdir, 'a.jp2'))
+            shutil.copyfile(self.j2kfile, os.path.join(tdir, 'sub', 'b.j2k'))
+            with open(os.path.join(tdir, 'c.txt'), 'w') as f:
+                f.write('not an image')
+
+            _, records = self.run_jp2dump_ndjson([tdir])
+            self.assertEqual([os.path.basename(r['path']) for r in records],
+                             ['a.jp2', 'b.j2k'])
+
+            _, records = self.run_jp2dump_ndjson([os.path.join(tdir, '*.j*')])
+            self.assertEqual([os.path.basename(r['path']) for r in records],
+                             ['a.jp2'])
+        finally:
+            shutil.rmtree(tdir)
+
+    def test_recursive_glob(self):
+        """"**" spans directories where glob supports it"""
+        tdir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(tdir, 'sub', 'deeper'))
+            shutil.copyfile(self.jp2file, os.path.join(tdir, 'a.jp2'))
+            shutil.copyfile(self.j2kfile,
+                            os.path.join(tdir, 'sub', 'deeper', 'b.j2k'))
+            pattern = os.path.join(tdir, '**', '*.j*')
+            if sys.hexversion >= 0x03050000:
+                paths = list(command_line._paths([pattern]))
+                self.assertEqual([os.path.basename(path) for path in paths],
+                                 ['a.jp2', 'b.j2k'])
+
+            # Older versions of glob take "**" to be "*".
+            with patch('sys.hexversion', 0x03040000):
+                paths = list(command_line._paths([pattern]))
+            self.assertEqual(paths, [pattern])
+        finally:
+            shutil.rmtree(tdir)
+
+    def test_from_file(self):
+        """Paths can be listed in a file"""
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as tfile:
+            tfile.write('{0}\n\n{1}\n'.format(self.jpxfile, self.jp2file))
+            tfile.flush()
+            _, records = self.run_jp2dump_ndjson(['-f', tfile.name,
+                                                  self.j2kfile])
+        self.assertEqual([r['path'] for r in records],
+                         [self.j2kfile, self.jpxfile, self.jp2file])
+
+    def test_jobs(self):
+        """Worker processes give the same records, in order if asked"""
+        paths = [self.jp2file, self.jpxfile, self.j2kfile] * 4
+        _, expected = self.run_jp2dump_ndjson(paths)
+
+        _, records = self.run_jp2dump_ndjson(['-j', '2'] + paths)
+        self.assertEqual(records, expected)
+
+        _, records = self.run_jp2dump_ndjson(['-j', '2', '--unordered'] +
+                                             paths)
+        self.assertEqual(sorted(records, key=lambda r: r['path']),
+                         sorted(expected, key=lambda r: r['path']))
+
+    def test_jobs_options(self):
+        """Worker processes use the same print options"""
+        sys.argv = ['', '-s', self.jp2file]
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            command_line.main()
+        expected = fake_out.getvalue()
+
+        glymur.set_printoptions(short=False)
+        sys.argv = ['', '-s', '-j', '2', self.jp2file]
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            command_line.main()
+        self.assertEqual(fake_out.getvalue(), expected)
+
+
+class TestToDict(unittest.TestCase):
+    """Tests for the structured form of the metadata."""
+    def setUp(self):
+        self.jpxfile = glymur.data.jpxfile()
+        self.jp2file = glymur.data.nemo()
+        self.j2kfile = glymur.data.goodstuff()
+
+    def tearDown(self):
+        glymur.set_parseoptions(full_codestream=False, lazy=False)
+
+    def test_metadata(self):
+        """The metadata has the boxes and the codestream header"""
+        jp2 = Jp2k(self.jp2file)
+        metadata = jp2.metadata()
+        self.assertEqual(metadata['filename'], self.jp2file)
+        self.assertEqual(metadata['shape'], [1456, 2592, 3])
+        self.assertEqual([box['box_id'] for box in metadata['box']],
+                         ['jP  ', 'ftyp', 'jp2h', 'uuid', 'jp2c'])
+
+        jp2h = metadata['box'][2]
+        self.assertEqual(jp2h['longname'], 'JP2 Header')
+        self.assertEqual((jp2h['offset'], jp2h['length']), (32, 45))
+        ihdr = jp2h['box'][0]
+        self.assertEqual((ihdr['height'], ihdr['width']), (1456, 2592))
+        self.assertNotIn('box', ihdr)
+
+        # The XMP packet is given as a string.
+        self.assertTrue(metadata['box'][3]['data'].startswith('<?xpacket'))
+        self.assertNotIn('raw_data', metadata['box'][3])
+
+        segments = metadata['codestream']['segment']
+        self.assertEqual([segment['marker_id'] for segment in segments],
+                         ['SOC', 'SIZ', 'COD', 'QCD', 'CME'])
+        self.assertEqual(segments[2]['layers'], 2)
+        self.assertEqual(segments[4]['ccme'],
+                         'Created by OpenJPEG version 2.0.0')
+
+    def test_json(self):
+        """The metadata of every sample file can be written as JSON"""
+        for filename in [self.jp2file, self.jpxfile, self.j2kfile]:
+            metadata = Jp2k(filename).metadata()
+            self.assertEqual(json.loads(json.dumps(metadata)), metadata)
+
+    def test_raw_codestream(self):
+        """Raw codestreams have no boxes"""
+        metadata = Jp2k(self.j2kfile).metadata()
+        self.assertEqual(metadata['box'], [])
+        self.assertEqual(metadata['codestream']['segment'][1]['xsiz'], 480)
+
+    def test_lazy(self):
+        """Deferred boxes are parsed for their dictionaries"""
+        expected = Jp2k(self.jpxfile).metadata()
+        glymur.set_parseoptions(full_codestream=False, lazy=True)
+        self.assertEqual(Jp2k(self.jpxfile).metadata(), expected)
+
+    def test_to_builtin(self):
+        """Values are converted to types json and msgpack know"""
+        from glymur.core import _to_builtin
+        value = {'a': np.arange(3, dtype=np.uint8),
+                 'b': (np.int64(4), b'\x0f'),
+                 1: ET.ElementTree(ET.fromstring('<x>y</x>'))}
+        self.assertEqual(_to_builtin(value),
+                         {'a': [0, 1, 2], 'b': [4, '0f'], '1': '<x>y</x>'})
+
+    def test_full_codestream(self):
+        """Tile part segments give the same dictionaries as their objects"""
+        with tempfile.NamedTemporaryFile(suffix='.j2k') as tfile:
+            data = np.zeros((64, 64), dtype=np.uint8)
+            Jp2k(tfile.name, data=data, tilesize=(32, 32), sop=True,
+                 eph=True)
+            codestream = Jp2k(tfile.name).get_codestream(header_only=False)
+
+        actual = codestream.to_dict()
+        expected = [segment.to_dict() for segment in codestream.segment]
+        self.assertEqual(actual['segment'], expected)
+        self.assertEqual([d['marker_id'] for d in expected].count('SOT'), 4)
+        self.assertIn('SOP', [d['marker_id'] for d in expected])
+        self.assertEqual(list(actual['segment'][-2].keys()),
+                         list(expected[-2].keys()))
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        """The metadata can be written with msgpack"""
+        metadata = Jp2k(self.jpxfile).metadata()
+        actual = msgpack.unpackb(msgpack.packb(metadata))
+        self.assertEqual(actual, json.loads(json.dumps(metadata)))
@@ -0,0 +1,182 @@
+"""
+Test suite for reading through file objects and range readers.
+"""
+import doctest
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+if sys.hexversion <= 0x03030000:
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+import numpy as np
+
+import glymur
+from glymur import Jp2k, RangeReader
+
+
+# Doc tests should be run as well.
+def load_tests(loader, tests, ignore):
+    """Should run doc tests as well"""
+    if glymur.lib.openjp2.OPENJP2 is not None:
+        tests.addTests(doctest.DocTestSuite('glymur.rangereader'))
+    return tests
+
+
+class TestRangeReader(unittest.TestCase):
+    """Test the file object interface and the fetch bookkeeping."""
+
+    def setUp(self):
+        self.data = bytes(bytearray(range(100)))
+        self.reader = RangeReader(lambda offset, length:
+                                  self.data[offset:offset + length],
+                                  len(self.data))
+
+    def test_read_seek_tell(self):
+        """Reads advance the position"""
+        self.assertEqual(self.reader.read(4), self.data[0:4])
+        self.assertEqual(self.reader.tell(), 4)
+        self.reader.seek(10, os.SEEK_CUR)
+        self.assertEqual(self.reader.read(2), self.data[14:16])
+        self.reader.seek(-3, os.SEEK_END)
+        self.assertEqual(self.reader.read(), self.data[97:])
+        self.assertEqual(self.reader.read(10), b'')
+
+    def test_fetches(self):
+        """Every range fetched is counted"""
+        self.reader.read(4)
+        self.reader.read_range(50, 100)
+        self.assertEqual(self.reader.num_fetches, 2)
+        self.assertEqual(self.reader.bytes_fetched, 54)
+        self.assertEqual(len(self.reader.fetches), 0)
+
+        # Reading past the end does not reach the source.
+        self.reader.read_range(100, 10)
+        self.assertEqual(self.reader.num_fetches, 2)
+
+        self.reader.reset_stats()
+        self.assertEqual(self.reader.num_fetches, 0)
+        self.assertEqual(self.reader.bytes_fetched, 0)
+
+    def test_fetch_log(self):
+        """Only the most recent fetches are logged"""
+        reader = RangeReader(lambda offset, length:
+                             self.data[offset:offset + length],
+                             len(self.data), fetch_log=2)
+        for offset in range(0, 40, 10):
+            reader.read_range(offset, 5)
+        self.assertEqual(list(reader.fetches), [(20, 5), (30, 5)])
+        self.assertEqual(reader.num_fetches, 4)
+        self.assertEqual(reader.bytes_fetched, 20)
+
+        reader.reset_stats()
+        self.assertEqual(list(reader.fetches), [])
+
+    def test_negative_seek(self):
+        """Cannot seek before the start"""
+        with self.assertRaises(IOError):
+            self.reader.seek(-1)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestJp2kRangeReader(unittest.TestCase):
+    """Test Jp2k objects reading through file objects."""
+
+    @classmethod
+    def setUpClass(self):
+        self.image = Jp2k(glymur.data.goodstuff())[:]
+
+        # 800 x 480 with 128 x 128 tiles.
+        self.tfile = tempfile.NamedTemporaryFile(suffix='.jp2', delete=False)
+        self.tfile.close()
+        Jp2k(self.tfile.name, data=self.image, tilesize=(128, 128))
+        with open(self.tfile.name, 'rb') as f:
+            self.payload = f.read()
+
+    @classmethod
+    def tearDownClass(self):
+        os.unlink(self.tfile.name)
+
+    def test_file_object(self):
+        """Any object with read, seek, and tell can be decoded"""
+        with patch('glymur.lib.openjp2.stream_create_default_file_stream',
+                   side_effect=AssertionError):
+            jp2 = Jp2k(io.BytesIO(self.payload))
+            self.assertIsNone(jp2.filename)
+            self.assertEqual(jp2.box[-1].codestream.segment[1].xtsiz, 128)
+            np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_raw_codestream(self):
+        """Raw codestreams can be read through a file object"""
+        with open(glymur.data.goodstuff(), 'rb') as f:
+            jp2 = Jp2k(f)
+            np.testing.assert_array_equal(jp2[:], self.image)
+            self.assertEqual(jp2.codestream.segment[1].xsiz, 480)
+            self.assertFalse(f.closed)
+
+    def test_parse_fetches_headers_only(self):
+        """Parsing fetches the box and main headers, not the image"""
+        reader = RangeReader.from_file(io.BytesIO(self.payload))
+        jp2 = Jp2k(reader)
+        self.assertEqual(jp2.shape, (800, 480, 3))
+        self.assertLess(reader.bytes_fetched, 1024)
+
+    def test_window_fetches_needed_tiles(self):
+        """Decoding a window skips the tiles outside of it"""
+        reader = RangeReader.from_file(io.BytesIO(self.payload),
+                                       block_size=512)
+        jp2 = Jp2k(reader)
+        reader.reset_stats()
+        actual = jp2[0:100, 0:100]
+        np.testing.assert_array_equal(actual, self.image[0:100, 0:100])
+
+        # One of 28 tiles is needed, the rest are mostly skipped.
+        self.assertLess(reader.bytes_fetched, len(self.payload) // 5)
+
+    def test_reader_raises(self):
+        """Errors of the reader are raised once the library returns"""
+        def read_range(offset, length):
+            if offset > len(self.payload) // 2:
+                raise ValueError('connection reset')
+            return self.payload[offset:offset + length]
+
+        jp2 = Jp2k(RangeReader(read_range, len(self.payload)))
+        with self.assertRaises(ValueError):
+            jp2[:]
+        with jp2.open_decoder() as decoder:
+            with self.assertRaises(ValueError):
+                decoder.read(area=(700, 0, 800, 100))
+
+    def test_reader_runs_dry(self):
+        """A reader returning no data before the end is an error"""
+        def read_range(offset, length):
+            if offset > len(self.payload) // 2:
+                return b''
+            return self.payload[offset:offset + length]
+
+        jp2 = Jp2k(RangeReader(read_range, len(self.payload)))
+        with self.assertRaises(IOError):
+            jp2[:]
+
+    def test_short_reads(self):
+        """Readers may return fewer bytes than asked for"""
+        def read_range(offset, length):
+            return self.payload[offset:offset + min(length, 100)]
+
+        jp2 = Jp2k(RangeReader(read_range, len(self.payload)))
+        np.testing.assert_array_equal(jp2[:], self.image)
+
+    def test_write_to_file_object(self):
+        """Writing requires a path"""
+        with self.assertRaises(IOError):
+            Jp2k(io.BytesIO(), data=self.image)
+
+    def test_to_bytes(self):
+        """The whole source can be fetched"""
+        jp2 = Jp2k(RangeReader.from_file(io.BytesIO(self.payload)))
+        self.assertEqual(jp2.to_bytes(), self.payload)
@@ -0,0 +1,203 @@
+"""
+Test suite for the decoded tile cache.
+"""
+import doctest
+import os
+import sys
+import tempfile
+import unittest
+
+if sys.hexversion <= 0x03030000:
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+import numpy as np
+
+import glymur
+from glymur import Jp2k, TileCache
+
+
+# Doc tests should be run as well.
+def load_tests(loader, tests, ignore):
+    """Should run doc tests as well"""
+    if glymur.lib.openjp2.OPENJP2 is not None:
+        tests.addTests(doctest.DocTestSuite('glymur.tilecache'))
+    return tests
+
+
+class TestTileCache(unittest.TestCase):
+    """Test the LRU bookkeeping."""
+
+    def test_hits_and_misses(self):
+        """Lookups are counted"""
+        cache = TileCache()
+        self.assertIsNone(cache.get((0, 0, 0, 0)))
+        cache.put((0, 0, 0, 0), np.zeros((4, 4), dtype=np.uint8))
+        self.assertEqual(cache.get((0, 0, 0, 0)).shape, (4, 4))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        """The least recently used entries are evicted first"""
+        cache = TileCache(max_bytes=48)
+        for tile in range(3):
+            cache.put((tile, 0, 0, 0), np.zeros(16, dtype=np.uint8))
+        self.assertEqual(cache.nbytes, 48)
+
+        # Touch tile 0, so that tile 1 is now the oldest.
+        cache.get((0, 0, 0, 0))
+        cache.put((3, 0, 0, 0), np.zeros(16, dtype=np.uint8))
+        self.assertNotIn((1, 0, 0, 0), cache)
+        self.assertIn((0, 0, 0, 0), cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.nbytes, 48)
+
+    def test_too_large(self):
+        """Arrays larger than the budget are not cached"""
+        cache = TileCache(max_bytes=8)
+        cache.put((0, 0, 0, 0), np.zeros(16, dtype=np.uint8))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_replace(self):
+        """Putting an existing key replaces it"""
+        cache = TileCache()
+        cache.put((0, 0, 0, 0), np.zeros(16, dtype=np.uint8))
+        cache.put((0, 0, 0, 0), np.zeros(8, dtype=np.uint8))
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 8)
+
+    def test_read_only(self):
+        """Cached arrays cannot be modified"""
+        cache = TileCache()
+        cache.put((0, 0, 0, 0), np.zeros(16, dtype=np.uint8))
+        with self.assertRaises(ValueError):
+            cache.get((0, 0, 0, 0))[0] = 1
+
+    def test_clear(self):
+        """Clearing empties the cache"""
+        cache = TileCache()
+        cache.put((0, 0, 0, 0), np.zeros(16, dtype=np.uint8))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestJp2kTileCache(unittest.TestCase):
+    """Test slicing through the tile cache."""
+
+    @classmethod
+    def setUpClass(self):
+        data = Jp2k(glymur.data.goodstuff())[:]
+        data = np.dstack((data, data[:, :, 0] // 2))
+
+        # 800 x 480 with 256 x 128 tiles leaves partial tiles at the edges.
+        self.tfile = tempfile.NamedTemporaryFile(suffix='.jp2', delete=False)
+        self.tfile.close()
+        Jp2k(self.tfile.name, data=data, tilesize=(256, 128), mct=False,
+             cratios=[20, 5, 1], numres=4)
+        jp2 = Jp2k(self.tfile.name)
+        self.expected = dict((rlevel, jp2[::2 ** rlevel, ::2 ** rlevel])
+                             for rlevel in range(4))
+
+    @classmethod
+    def tearDownClass(self):
+        os.unlink(self.tfile.name)
+
+    def setUp(self):
+        self.jp2 = Jp2k(self.tfile.name)
+        self.jp2.tile_cache = TileCache()
+
+    def test_windows(self):
+        """Windows assembled from tiles match windows decoded directly"""
+        for rows, cols in [(slice(10, 300), slice(100, 150)),
+                           (slice(0, 800), slice(0, 480)),
+                           (slice(700, 800), slice(470, 480))]:
+            actual = self.jp2[rows, cols]
+            np.testing.assert_array_equal(actual, self.expected[0][rows, cols])
+
+    def test_overlapping_windows(self):
+        """Tiles decoded for one window are reused by the next"""
+        with patch('glymur.lib.openjp2.get_decoded_tile',
+                   wraps=glymur.lib.openjp2.get_decoded_tile) as mock_decode:
+            self.jp2[0:200, 0:200]
+            self.assertEqual(mock_decode.call_count, 2)
+
+            # One new tile.
+            actual = self.jp2[100:250, 50:300]
+            self.assertEqual(mock_decode.call_count, 3)
+        expected = self.expected[0][100:250, 50:300]
+        np.testing.assert_array_equal(actual, expected)
+        self.assertEqual(self.jp2.tile_cache.hits, 8)
+        self.assertEqual(self.jp2.tile_cache.misses, 12)
+
+    def test_rlevel(self):
+        """Windows at reduced resolutions"""
+        actual = self.jp2[100:501:4, 50:301:4]
+        expected = self.expected[2][25:126, 13:76]
+        np.testing.assert_array_equal(actual, expected)
+
+        actual = self.jp2[::8, ::8]
+        np.testing.assert_array_equal(actual, self.expected[3])
+
+    def test_bands(self):
+        """Band selections are served from the same cached tiles"""
+        actual = self.jp2[10:300, 20:200, 3]
+        np.testing.assert_array_equal(actual,
+                                      self.expected[0][10:300, 20:200, 3])
+        actual = self.jp2[10:300, 20:200, [2, 0]]
+        np.testing.assert_array_equal(actual,
+                                      self.expected[0][10:300, 20:200, [2, 0]])
+        self.assertEqual(self.jp2.tile_cache.hits, 8)
+
+    def test_read_into(self):
+        """Windows can be assembled into a destination array"""
+        out = np.zeros((100, 50, 4), dtype=np.uint16)
+        self.jp2.read_into(out, np.s_[10:110, 100:150])
+        np.testing.assert_array_equal(out, self.expected[0][10:110, 100:150])
+
+    def test_eviction(self):
+        """A small budget evicts tiles"""
+        # Room for one band of one full tile.
+        self.jp2.tile_cache = TileCache(max_bytes=256 * 128)
+        actual = self.jp2[:]
+        np.testing.assert_array_equal(actual, self.expected[0])
+        self.assertLessEqual(self.jp2.tile_cache.nbytes, 256 * 128)
+        self.assertEqual(self.jp2.tile_cache.evictions,
+                         64 - len(self.jp2.tile_cache))
+
+    def test_layer(self):
+        """The quality layer is part of the key"""
+        self.jp2[0:100, 0:100]
+        self.jp2.layer = 1
+        actual = self.jp2[0:100, 0:100]
+        jp2 = Jp2k(self.tfile.name)
+        jp2.layer = 1
+        np.testing.assert_array_equal(actual, jp2[0:100, 0:100])
+        self.assertEqual(self.jp2.tile_cache.hits, 0)
+
+    def test_shared_by_files(self):
+        """Tiles of different files sharing a cache are kept apart"""
+        other = Jp2k(glymur.data.goodstuff())
+        other.tile_cache = self.jp2.tile_cache
+        self.jp2[0:100, 0:100]
+        np.testing.assert_array_equal(other[0:100, 0:100],
+                                      self.expected[0][0:100, 0:100, 0:3])
+        with open(self.tfile.name, 'rb') as f:
+            in_memory = Jp2k.from_bytes(f.read())
+        in_memory.tile_cache = self.jp2.tile_cache
+        in_memory[0:100, 0:100]
+        self.assertEqual(self.jp2.tile_cache.hits, 0)
+
+        # Another object for the same file uses the same tiles.
+        jp2 = Jp2k(self.tfile.name)
+        jp2.tile_cache = self.jp2.tile_cache
+        jp2[0:100, 0:100]
+        self.assertEqual(self.jp2.tile_cache.hits, 4)
+
+    def test_area_too_small(self):
+        """Windows that vanish at the requested rlevel are errors"""
+        with self.assertRaises(IOError):
+            self.jp2[100:101:8, 100:101:8]
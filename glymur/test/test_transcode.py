@@ -0,0 +1,208 @@
+"""
+Test suite for rewriting codestreams without decoding them.
+"""
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import glymur
+from glymur import Jp2k
+from glymur.transcode import truncate_layers
+
+
+def _sop_to_plt(codestream):
+    """Replace the SOP segments of a codestream with PLT and TLM segments.
+
+    Every packet must start with an SOP segment, and there must be no other
+    segments in the tile part headers.
+    """
+    # The SIZ segment follows the SOC marker.
+    siz_end = 4 + struct.unpack_from('>H', codestream, 4)[0]
+    pos = codestream.index(b'\xff\x90')
+    main_header = bytearray(codestream[:pos])
+
+    # Clear the SOP flag of the COD segment.
+    cod = main_header.index(b'\xff\x52', siz_end)
+    main_header[cod + 4] &= 0xfd
+
+    tile_parts = []
+    while codestream[pos:pos + 2] == b'\xff\x90':
+        isot, psot = struct.unpack_from('>HI', codestream, pos + 4)
+        data = codestream[pos + 14:pos + psot]
+        packets = [b'\xff\x91\x00\x04' + packet
+                   for packet in data.split(b'\xff\x91\x00\x04')[1:]]
+        # Drop Nsop along with the rest of the SOP segment.
+        packets = [packet[6:] for packet in packets]
+
+        iplt = bytearray()
+        for packet in packets:
+            length = len(packet)
+            encoded = [length & 0x7f]
+            length >>= 7
+            while length:
+                encoded.append((length & 0x7f) | 0x80)
+                length >>= 7
+            iplt.extend(reversed(encoded))
+        plt = struct.pack('>HHB', 0xff58, len(iplt) + 3, 0) + bytes(iplt)
+
+        body = plt + b'\xff\x93' + b''.join(packets)
+        sot = bytearray(codestream[pos:pos + 12])
+        struct.pack_into('>I', sot, 6, 12 + len(body))
+        tile_parts.append((isot, bytes(sot) + body))
+        pos += psot
+
+    # Ttlm and Ptlm of 2 and 4 bytes.
+    entries = b''.join(struct.pack('>HI', isot, len(tile_part))
+                       for isot, tile_part in tile_parts)
+    tlm = struct.pack('>HHBB', 0xff55, len(entries) + 4, 0, 0x60) + entries
+    main_header[siz_end:siz_end] = tlm
+
+    return (bytes(main_header) +
+            b''.join(tile_part for _, tile_part in tile_parts) +
+            codestream[pos:])
+
+
+@unittest.skipIf(glymur.lib.openjp2.OPENJP2 is None,
+                 "Missing openjp2 library.")
+class TestTruncateLayers(unittest.TestCase):
+    """Test dropping quality layers."""
+
+    @classmethod
+    def setUpClass(self):
+        self.image = Jp2k(glymur.data.goodstuff())[:]
+
+    def setUp(self):
+        self.tdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for filename in os.listdir(self.tdir):
+            os.unlink(os.path.join(self.tdir, filename))
+        os.rmdir(self.tdir)
+
+    def _write(self, name, **kwargs):
+        filename = os.path.join(self.tdir, name)
+        return Jp2k(filename, data=self.image, cratios=[80, 20, 5, 1],
+                    sop=True, **kwargs)
+
+    def _verify(self, src, dest, layers):
+        """The kept layers decode as the same layers of the source"""
+        cod = [seg for seg in dest.get_codestream().segment
+               if seg.marker_id == 'COD'][0]
+        self.assertEqual(cod.layers, layers)
+        src.layer = layers
+        np.testing.assert_array_equal(dest[:], src[:])
+        src.layer = 0
+
+    def test_progression_orders(self):
+        """Packets are dropped in every progression order"""
+        for prog in 'LRCP', 'RLCP', 'RPCL', 'PCRL', 'CPRL':
+            src = self._write(prog + '.j2k', prog=prog, tilesize=(256, 256),
+                              psizes=[(128, 128)])
+            for layers in 1, 2:
+                dest = src.truncate_layers(
+                    os.path.join(self.tdir, 'dest.j2k'), layers=layers)
+                self._verify(src, dest, layers)
+                self.assertLess(dest.length, src.length)
+
+    def test_subsampled(self):
+        """Components may be subsampled"""
+        src = self._write('subsampled.j2k', prog='RLCP', subsam=(2, 2),
+                          tilesize=(256, 128))
+        dest = src.truncate_layers(os.path.join(self.tdir, 'dest.j2k'), 2)
+        self._verify(src, dest, 2)
+
+    def test_jp2(self):
+        """The boxes of a JP2 file are kept"""
+        src = self._write('src.jp2', prog='RPCL')
+        dest = src.truncate_layers(os.path.join(self.tdir, 'dest.jp2'), 1)
+        self.assertEqual([box.box_id for box in dest.box],
+                         [box.box_id for box in src.box])
+        self._verify(src, dest, 1)
+
+    def test_plt_and_tlm(self):
+        """Packets are located by PLT segments, TLM segments are fixed up"""
+        src = self._write('sop.j2k', prog='PCRL', tilesize=(256, 256))
+        filename = os.path.join(self.tdir, 'plt.j2k')
+        with open(filename, 'wb') as ofile:
+            ofile.write(_sop_to_plt(src.to_bytes()))
+        src = Jp2k(filename)
+        c = src.get_codestream(header_only=False)
+        cod = [seg for seg in c.segment if seg.marker_id == 'COD'][0]
+        self.assertFalse(cod.scod & 2)
+        self.assertIn('PLT', [seg.marker_id for seg in c.segment])
+
+        dest = src.truncate_layers(os.path.join(self.tdir, 'dest.j2k'), 2)
+        self._verify(src, dest, 2)
+
+        # The TLM and SOT segments agree on where the tile parts are.
+        tlm_index = dest.get_codestream().tile_index
+        self.assertEqual(tlm_index.method, 'TLM')
+        c = dest.get_codestream(header_only=False)
+        self.assertEqual(tlm_index.tile_parts, c.tile_index.tile_parts)
+
+        # The PLT segments list the packets left.
+        plt = [seg for seg in c.segment if seg.marker_id == 'PLT']
+        sod = [seg for seg in c.segment if seg.marker_id == 'SOD']
+        sot = [seg for seg in c.segment if seg.marker_id == 'SOT']
+        for plt_seg, sod_seg, sot_seg in zip(plt, sod, sot):
+            self.assertEqual(sum(plt_seg.iplt),
+                             sot_seg.offset + sot_seg.psot -
+                             sod_seg.offset - 2)
+
+    def test_all_layers(self):
+        """Keeping every layer leaves the codestream as it is"""
+        src = self._write('src.j2k', prog='LRCP')
+        codestream = src.to_bytes()
+        self.assertEqual(truncate_layers(codestream, 4), codestream)
+        self.assertEqual(truncate_layers(codestream, 10), codestream)
+
+    def test_sop_renumbered(self):
+        """The packets left are numbered in sequence"""
+        src = self._write('src.j2k', prog='RPCL')
+        dest = src.truncate_layers(os.path.join(self.tdir, 'dest.j2k'), 2)
+        c = dest.get_codestream(header_only=False)
+        nsop = [seg.nsop for seg in c.segment if seg.marker_id == 'SOP']
+        self.assertEqual(nsop, list(range(len(nsop))))
+
+    def test_packets_not_located(self):
+        """Without SOP or PLT segments the packets cannot be located"""
+        filename = os.path.join(self.tdir, 'nosop.j2k')
+        src = Jp2k(filename, data=self.image, cratios=[20, 5, 1])
+        with self.assertRaises(IOError):
+            src.truncate_layers(os.path.join(self.tdir, 'dest.j2k'), 1)
+
+    def test_plm(self):
+        """Packet lengths in the main header are not rewritten"""
+        src = self._write('src.j2k', prog='LRCP')
+        codestream = src.to_bytes()
+        siz_end = 4 + struct.unpack_from('>H', codestream, 4)[0]
+        plm = struct.pack('>HHBBB', 0xff57, 5, 0, 1, 0x10)
+        codestream = codestream[:siz_end] + plm + codestream[siz_end:]
+        with self.assertRaises(IOError):
+            truncate_layers(codestream, 1)
+
+    def test_in_place(self):
+        """The source file may be overwritten"""
+        src = self._write('src.jp2', prog='RPCL')
+        expected = src.truncate_layers(os.path.join(self.tdir, 'dest.jp2'),
+                                       1).to_bytes()
+        dest = src.truncate_layers(src.filename, 1)
+        self.assertEqual(dest.to_bytes(), expected)
+
+    def test_from_bytes(self):
+        """An in-memory source is truncated like a file"""
+        src = self._write('src.jp2', prog='RPCL')
+        expected = src.truncate_layers(os.path.join(self.tdir, 'dest.jp2'),
+                                       2).to_bytes()
+        src = Jp2k.from_bytes(src.to_bytes())
+        dest = src.truncate_layers(os.path.join(self.tdir, 'mem.jp2'), 2)
+        self.assertEqual(dest.to_bytes(), expected)
+
+    def test_bad_layers(self):
+        """At least one layer must be kept"""
+        src = self._write('src.j2k')
+        with self.assertRaises(ValueError):
+            src.truncate_layers(os.path.join(self.tdir, 'dest.j2k'), 0)
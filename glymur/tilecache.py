@@ -0,0 +1,124 @@
+"""This file is part of glymur, a Python interface for accessing JPEG 2000.
+
+http://glymur.readthedocs.org
+
+Copyright 2013 John Evans
+
+License:  MIT
+"""
+from collections import OrderedDict
+import threading
+
+
+class TileCache(object):
+    """Least-recently-used cache of decoded tiles.
+
+    Each entry is a single decoded band of a single tile, keyed by
+    (source, tile, rlevel, layer, component).  The source is the path, size,
+    modification time, and inode of a file given by path, and a token held
+    by the Jp2k object otherwise, so a cache may be shared by several Jp2k
+    objects.  When the total size of the cached arrays exceeds the byte
+    budget, the least recently used entries are evicted.  A cache may be
+    shared by several threads reading at once.
+
+    Attributes
+    ----------
+    max_bytes : int
+        Byte budget for the cached arrays.
+    hits, misses, evictions : int
+        Number of successful lookups, failed lookups, and evicted entries.
+
+    Examples
+    --------
+    >>> import glymur
+    >>> jp2 = glymur.Jp2k(glymur.data.nemo())
+    >>> jp2.tile_cache = glymur.TileCache(max_bytes=64 * 1024 ** 2)
+    >>> window = jp2[0:256, 0:256]
+    >>> window = jp2[128:384, 128:384]
+    >>> jp2.tile_cache.hits, jp2.tile_cache.misses
+    (3, 3)
+    """
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'glymur.TileCache(max_bytes={0})'.format(self.max_bytes)
+
+    def __str__(self):
+        msg = 'Tile Cache:  {0} entries, {1} of {2} bytes\n'
+        msg += '    Hits:  {3}, Misses:  {4}, Evictions:  {5}'
+        return msg.format(len(self), self._nbytes, self.max_bytes,
+                          self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def __contains__(self, key):
+        return key in self._tiles
+
+    @property
+    def nbytes(self):
+        """Total size of the cached arrays."""
+        return self._nbytes
+
+    def get(self, key):
+        """Look up a decoded tile band, marking it as recently used.
+
+        Parameters
+        ----------
+        key : tuple
+            (source, tile, rlevel, layer, component)
+
+        Returns
+        -------
+        ndarray or None
+            The cached band, or None if it is not in the cache.
+        """
+        with self._lock:
+            try:
+                band = self._tiles.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._tiles[key] = band
+            self.hits += 1
+            return band
+
+    def put(self, key, band):
+        """Add a decoded tile band, evicting older entries as needed.
+
+        Bands larger than the entire byte budget are not cached.
+
+        Parameters
+        ----------
+        key : tuple
+            (source, tile, rlevel, layer, component)
+        band : ndarray
+            The decoded band.  It is marked read-only.
+        """
+        with self._lock:
+            if key in self._tiles:
+                self._nbytes -= self._tiles.pop(key).nbytes
+            if band.nbytes > self.max_bytes:
+                return
+
+            band.flags.writeable = False
+            self._tiles[key] = band
+            self._nbytes += band.nbytes
+
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries, the counters are left alone."""
+        with self._lock:
+            self._tiles.clear()
+            self._nbytes = 0
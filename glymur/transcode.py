@@ -0,0 +1,469 @@
+"""This file is part of glymur, a Python interface for accessing JPEG 2000.
+
+http://glymur.readthedocs.org
+
+Copyright 2013 John Evans
+
+License:  MIT
+
+Rewriting of codestreams without decoding them.
+"""
+import struct
+
+from .core import LRCP, RLCP
+
+_SOT = 0xff90
+_SOD = 0xff93
+_EOC = 0xffd9
+_COD = 0xff52
+_COC = 0xff53
+_TLM = 0xff55
+_PLM = 0xff57
+_PLT = 0xff58
+_POC = 0xff5f
+_PPM = 0xff60
+_PPT = 0xff61
+_SIZ = 0xff51
+
+_MAIN_HEADER_NAMES = {_POC: 'POC', _PPM: 'PPM', _PLM: 'PLM'}
+
+# The start of an SOP marker segment, including Lsop.
+_SOP = b'\xff\x91\x00\x04'
+
+# Largest number of bytes of packet lengths in one PLT segment.
+_MAX_IPLT = 0xffff - 3
+
+
+def truncate_layers(codestream, layers):
+    """Keep only the first quality layers of a codestream.
+
+    The packets of the other layers are dropped, and the layer counts of
+    the COD segments, the lengths of the tile parts in the SOT and TLM
+    segments, the packet lengths of the PLT segments, and the sequence
+    numbers of the SOP segments are fixed up to match.  No packet is decoded,
+    so the tile parts must give the packet boundaries, either with PLT
+    segments or with SOP segments in front of every packet.
+
+    Parameters
+    ----------
+    codestream : bytes
+        The raw codestream, from the SOC marker to the EOC marker.
+    layers : int
+        Number of quality layers to keep.
+
+    Returns
+    -------
+    bytes
+        The truncated codestream.
+
+    Raises
+    ------
+    ValueError
+        If the number of layers is not positive.
+    IOError
+        If the packet boundaries are not known, or if the codestream has
+        progression order changes (POC), packed packet headers (PPM, PPT), or
+        packet lengths in the main header (PLM).
+    """
+    if layers < 1:
+        msg = "At least one quality layer must be kept, not {0}."
+        raise ValueError(msg.format(layers))
+
+    codestream = memoryview(codestream)
+    main_header, pos = _read_header(codestream, 2)
+
+    siz = [seg for marker, seg in main_header if marker == _SIZ][0]
+    coding = _CodingStyle(siz)
+    for marker, segment in main_header:
+        if marker in (_POC, _PPM, _PLM):
+            # The packet lengths of a PLM segment would go stale.
+            msg = "Codestreams with {0} segments in the main header cannot "
+            msg += "be truncated."
+            raise IOError(msg.format(_MAIN_HEADER_NAMES[marker]))
+        coding.update(marker, segment)
+
+    tiles = {}
+    tile_parts = []
+    while pos < len(codestream) - 2:
+        marker, _, isot, psot = struct.unpack_from('>HHHI', codestream, pos)
+        if marker != _SOT:
+            break
+        if psot == 0:
+            # The last tile part runs up to the EOC marker.
+            psot = len(codestream) - 2 - pos
+        end = pos + psot
+
+        header, sod = _read_header(codestream, pos + 12)
+        if isot not in tiles:
+            tiles[isot] = _TileState(coding, isot, header, layers)
+        tile_parts.append(tiles[isot].truncate(codestream[pos:pos + 12],
+                                               header,
+                                               codestream[sod + 2:end]))
+        pos = end
+
+    for tile in tiles.values():
+        tile.check_complete()
+
+    lengths = [len(tile_part) for tile_part in tile_parts]
+    out = [b'\xff\x4f']
+    tlm_lengths = iter(lengths)
+    for marker, segment in main_header:
+        if marker == _COD:
+            segment = _set_cod_layers(segment, layers)
+        elif marker == _TLM:
+            segment = _set_tlm_lengths(segment, tlm_lengths)
+        out.append(_to_bytes(segment))
+    out.extend(tile_parts)
+    out.append(_to_bytes(codestream[pos:]))
+    return b''.join(out)
+
+
+def _to_bytes(data):
+    """Bytes of a memoryview or bytearray.
+
+    Python 2 turns a memoryview given to bytes into its repr.
+    """
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return bytes(data)
+
+
+def _read_header(codestream, pos):
+    """Read the marker segments of a main or tile part header.
+
+    Parameters
+    ----------
+    codestream : memoryview
+        The codestream.
+    pos : int
+        Offset of the first marker segment.
+
+    Returns
+    -------
+    segments : list
+        (marker, segment) of each marker segment, where the segment includes
+        the marker.
+    pos : int
+        Offset of the SOT or SOD marker ending the header.
+    """
+    segments = []
+    while True:
+        marker, = struct.unpack_from('>H', codestream, pos)
+        if marker in (_SOT, _SOD, _EOC):
+            return segments, pos
+        length, = struct.unpack_from('>H', codestream, pos + 2)
+        segments.append((marker, codestream[pos:pos + 2 + length]))
+        pos += 2 + length
+
+
+def _set_cod_layers(segment, layers):
+    """COD segment keeping no more than the given number of layers."""
+    segment = bytearray(segment)
+    num_layers, = struct.unpack_from('>H', segment, 6)
+    struct.pack_into('>H', segment, 6, min(layers, num_layers))
+    return segment
+
+
+def _set_tlm_lengths(segment, lengths):
+    """TLM segment with its tile part lengths taken from an iterator."""
+    segment = bytearray(segment)
+    stlm = segment[5]
+    st = (stlm >> 4) & 0x03
+    fmt = '>I' if stlm & 0x40 else '>H'
+    size = st + struct.calcsize(fmt)
+    for pos in range(6 + st, len(segment), size):
+        try:
+            struct.pack_into(fmt, segment, pos, next(lengths))
+        except StopIteration:
+            break
+    return segment
+
+
+def _ceildiv(a, b):
+    """Integer division, rounding up."""
+    return -(-a // b)
+
+
+class _CodingStyle(object):
+    """Coding style in effect for a tile, from the COD and COC segments.
+
+    Attributes
+    ----------
+    scod : int
+        Coding style of the COD segment.
+    order : int
+        Progression order.
+    layers : int
+        Number of quality layers.
+    components : list
+        Number of decomposition levels and precinct sizes of each component.
+    """
+    def __init__(self, siz):
+        (self.xsiz, self.ysiz, self.xosiz, self.yosiz, self.xtsiz,
+         self.ytsiz, self.xtosiz, self.ytosiz, csiz) = struct.unpack_from(
+             '>8IH', siz, 6)
+        self.subsampling = [struct.unpack_from('>BB', siz, 41 + 3 * k)
+                            for k in range(csiz)]
+        self.scod = 0
+        self.order = LRCP
+        self.layers = 1
+        self.components = [(0, None)] * csiz
+
+        # Components whose coding style was set by a COC segment.
+        self._coc = set()
+
+    def copy(self):
+        """A copy to be updated by the segments of a tile part header."""
+        other = _CodingStyle.__new__(_CodingStyle)
+        other.__dict__.update(self.__dict__)
+        other.components = list(self.components)
+        other._coc = set()
+        return other
+
+    def update(self, marker, segment):
+        """Apply a COD or COC segment, ignoring other segments.
+
+        A COC segment takes precedence over a COD segment of the same header
+        whichever comes first.
+        """
+        if marker == _COD:
+            self.scod, self.order, self.layers = struct.unpack_from(
+                '>BBH', segment, 4)
+            params = self._component_style(segment[9:], self.scod & 1)
+            for k in range(len(self.components)):
+                if k not in self._coc:
+                    self.components[k] = params
+        elif marker == _COC:
+            if len(self.components) <= 256:
+                component, scoc = struct.unpack_from('>BB', segment, 4)
+                params = segment[6:]
+            else:
+                component, scoc = struct.unpack_from('>HB', segment, 4)
+                params = segment[7:]
+            style = self._component_style(params, scoc & 1)
+            self.components[component] = style
+            self._coc.add(component)
+
+    def _component_style(self, params, has_precincts):
+        """Decomposition levels and precinct sizes of SPcod or SPcoc."""
+        levels = bytearray(params[:1])[0]
+        if not has_precincts:
+            return levels, None
+        precincts = [(byte & 0x0f, byte >> 4)
+                     for byte in bytearray(params[5:6 + levels])]
+        return levels, precincts
+
+    def packet_layers(self, tile):
+        """Quality layer of each packet of a tile, in codestream order.
+
+        Parameters
+        ----------
+        tile : int
+            Index of the tile.
+
+        Returns
+        -------
+        list
+            One layer number per packet.
+        """
+        num_tiles_x = _ceildiv(self.xsiz - self.xtosiz, self.xtsiz)
+        row, col = divmod(tile, num_tiles_x)
+        tx0 = max(self.xtosiz + col * self.xtsiz, self.xosiz)
+        ty0 = max(self.ytosiz + row * self.ytsiz, self.yosiz)
+        tx1 = min(self.xtosiz + (col + 1) * self.xtsiz, self.xsiz)
+        ty1 = min(self.ytosiz + (row + 1) * self.ytsiz, self.ysiz)
+
+        # Number of precincts of each resolution of each component.
+        counts = []
+        for (dx, dy), (levels, precincts) in zip(self.subsampling,
+                                                 self.components):
+            tcx0, tcx1 = _ceildiv(tx0, dx), _ceildiv(tx1, dx)
+            tcy0, tcy1 = _ceildiv(ty0, dy), _ceildiv(ty1, dy)
+            resolutions = []
+            for r in range(levels + 1):
+                scale = 2 ** (levels - r)
+                trx0, trx1 = _ceildiv(tcx0, scale), _ceildiv(tcx1, scale)
+                try0, try1 = _ceildiv(tcy0, scale), _ceildiv(tcy1, scale)
+                ppx, ppy = (15, 15) if precincts is None else precincts[r]
+                if trx1 > trx0 and try1 > try0:
+                    npx = _ceildiv(trx1, 2 ** ppx) - trx0 // 2 ** ppx
+                    npy = _ceildiv(try1, 2 ** ppy) - try0 // 2 ** ppy
+                    resolutions.append(npx * npy)
+                else:
+                    resolutions.append(0)
+            counts.append(resolutions)
+
+        num_resolutions = max(len(resolutions) for resolutions in counts)
+        per_resolution = [sum(resolutions[r] for resolutions in counts
+                              if r < len(resolutions))
+                          for r in range(num_resolutions)]
+
+        if self.order == LRCP:
+            return [layer for layer in range(self.layers)
+                    for _ in range(sum(per_resolution))]
+        if self.order == RLCP:
+            return [layer for count in per_resolution
+                    for layer in range(self.layers)
+                    for _ in range(count)]
+
+        # The layer is the innermost loop of the other progressions.
+        return list(range(self.layers)) * sum(per_resolution)
+
+
+class _TileState(object):
+    """Packets of one tile seen so far.
+
+    Parameters
+    ----------
+    coding : _CodingStyle
+        Coding style of the main header.
+    tile : int
+        Index of the tile.
+    header : list
+        Marker segments of the first tile part header.
+    layers : int
+        Number of quality layers to keep.
+    """
+    def __init__(self, coding, tile, header, layers):
+        coding = coding.copy()
+        for marker, segment in header:
+            coding.update(marker, segment)
+        self._tile = tile
+        self._sop = bool(coding.scod & 0x02)
+        self._packet_layers = coding.packet_layers(tile)
+        self._layers = layers
+        self._num_packets = 0
+        self._num_kept = 0
+
+    def truncate(self, sot, header, data):
+        """Rewrite a tile part, keeping the packets of the first layers.
+
+        Parameters
+        ----------
+        sot : memoryview
+            The SOT marker segment.
+        header : list
+            Marker segments of the tile part header.
+        data : memoryview
+            Packets of the tile part, following the SOD marker.
+
+        Returns
+        -------
+        bytes
+            The new tile part.
+        """
+        lengths = self._packet_lengths(header, data)
+        if self._num_packets + len(lengths) > len(self._packet_layers):
+            msg = "Tile {0} has more than the {1} packets expected from its "
+            msg += "coding style."
+            raise IOError(msg.format(self._tile, len(self._packet_layers)))
+
+        kept_lengths = []
+        packets = []
+        pos = 0
+        for length in lengths:
+            layer = self._packet_layers[self._num_packets]
+            if layer < self._layers:
+                packet = data[pos:pos + length]
+                if _to_bytes(packet[:4]) == _SOP:
+                    # Renumber the packets left.
+                    packet = bytearray(packet)
+                    struct.pack_into('>H', packet, 4,
+                                     self._num_kept & 0xffff)
+                    self._num_kept += 1
+                packets.append(_to_bytes(packet))
+                kept_lengths.append(length)
+            self._num_packets += 1
+            pos += length
+
+        segments = []
+        plt_done = False
+        for marker, segment in header:
+            if marker == _COD:
+                segment = _set_cod_layers(segment, self._layers)
+            elif marker == _PLT:
+                if plt_done:
+                    continue
+                segments.extend(_plt_segments(kept_lengths))
+                plt_done = True
+                continue
+            segments.append(_to_bytes(segment))
+
+        body = b''.join(segments) + b'\xff\x93' + b''.join(packets)
+        sot = bytearray(sot)
+        struct.pack_into('>I', sot, 6, len(sot) + len(body))
+        return bytes(sot) + body
+
+    def _packet_lengths(self, header, data):
+        """Lengths of the packets of a tile part."""
+        for marker, _ in header:
+            if marker in (_POC, _PPT):
+                msg = "Tile {0} has {1} segments and cannot be truncated."
+                name = 'POC' if marker == _POC else 'PPT'
+                raise IOError(msg.format(self._tile, name))
+
+        plt = [segment for marker, segment in header if marker == _PLT]
+        if plt:
+            lengths = []
+            length = 0
+            for segment in plt:
+                for byte in bytearray(segment[5:]):
+                    length = (length << 7) | (byte & 0x7f)
+                    if not byte & 0x80:
+                        lengths.append(length)
+                        length = 0
+            if sum(lengths) != len(data):
+                msg = "The packet lengths of the PLT segments of tile {0} do "
+                msg += "not add up to the length of the tile part."
+                raise IOError(msg.format(self._tile))
+            return lengths
+
+        if not self._sop:
+            msg = "The packets of tile {0} can only be located with PLT or "
+            msg += "SOP segments."
+            raise IOError(msg.format(self._tile))
+
+        # Neither the packet headers nor the code-block data can contain
+        # an SOP marker, so each one starts a packet.
+        data = _to_bytes(data)
+        starts = []
+        pos = data.find(_SOP)
+        while pos >= 0:
+            starts.append(pos)
+            pos = data.find(_SOP, pos + 4)
+        if len(data) > 0 and (not starts or starts[0] != 0):
+            msg = "The packets of tile {0} do not all start with an SOP "
+            msg += "segment."
+            raise IOError(msg.format(self._tile))
+        return [end - start
+                for start, end in zip(starts, starts[1:] + [len(data)])]
+
+    def check_complete(self):
+        """Verify that every packet of the tile was seen."""
+        if self._num_packets != len(self._packet_layers):
+            msg = "Tile {0} has {1} packets, but {2} were expected from its "
+            msg += "coding style."
+            raise IOError(msg.format(self._tile, self._num_packets,
+                                     len(self._packet_layers)))
+
+
+def _plt_segments(lengths):
+    """PLT segments listing the given packet lengths."""
+    if not lengths:
+        return []
+    iplt = bytearray()
+    segments = []
+    for length in lengths:
+        encoded = [length & 0x7f]
+        length >>= 7
+        while length:
+            encoded.append((length & 0x7f) | 0x80)
+            length >>= 7
+        encoded.reverse()
+        if len(iplt) + len(encoded) > _MAX_IPLT:
+            segments.append(iplt)
+            iplt = bytearray()
+        iplt.extend(encoded)
+    segments.append(iplt)
+    return [struct.pack('>HHB', _PLT, len(iplt) + 3, zplt) + bytes(iplt)
+            for zplt, iplt in enumerate(segments)]
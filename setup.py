@@ -10,7 +10,7 @@ kwargs = {'name': 'Glymur',
           'author_email': 'john.g.evans.ne@gmail.com',
           'url': 'https://github.com/quintusdias/glymur',
           'packages': ['glymur', 'glymur.data', 'glymur.test', 'glymur.lib',
-                       'glymur.lib.test'],
+                       'glymur.lib.test', 'glymur.bench'],
           'package_data': {'glymur': ['data/*.jp2',
                                       'data/*.j2k',
                                       'data/*.jpx']},
@@ -24,6 +24,7 @@ install_requires = ['numpy>=1.7.0', 'lxml>=3.0.0']
 if sys.hexversion < 0x03030000:
     install_requires.append('contextlib2>=0.4')
     install_requires.append('mock>=1.0.1')
+    install_requires.append('futures>=3.0')
 kwargs['install_requires'] = install_requires
 
 clssfrs = ["Programming Language :: Python",